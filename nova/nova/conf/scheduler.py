@@ -173,6 +173,25 @@ Possible values:
 
 * An integer, where the integer corresponds to the size of a host subset. Any
   integer is valid, although any value less than 1 will be treated as 1
+"""),
+    cfg.BoolOpt("batch_placement",
+        default=False,
+        help="""
+Place the instances of multi-instance requests in a single pass.
+
+By default, the scheduler runs all the filters and weighers on all the hosts
+again for each instance of a request. When this option is enabled, the hosts
+are filtered and weighed once, kept ordered by weight, and after each instance
+is placed only the host it was placed on is filtered and weighed again. This
+makes large multi-instance requests much faster and selects the same hosts.
+
+Filters and weighers whose result for a host may change when an instance is
+placed on another host must set their ``depends_on_placements`` attribute, as
+the server group affinity and anti-affinity filters do; such filters are run
+on all the remaining hosts after each placement.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
 """),
     cfg.IntOpt("max_io_ops_per_host",
         default=8,
@@ -230,6 +249,64 @@ this option will improve performance. It may also be disabled when the tracking
 overhead proves too heavy, although this will cause classes requiring host
 usage data to query the database on each request instead.
 
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+"""),
+    cfg.BoolOpt("incremental_host_state_refresh",
+        default=False,
+        help="""
+Only reload compute nodes and services that changed since the last request.
+
+By default the scheduler loads every compute node and compute service record
+from each cell database for every scheduling request. When this option is
+enabled, the host manager keeps those records cached between requests and only
+loads the ones created, updated or deleted since its previous refresh, which
+greatly reduces the database load and request latency in large deployments.
+A full reload is still done periodically, see
+``host_state_full_refresh_interval``.
+
+This option is only used by the FilterScheduler and its subclasses; if you use
+a different scheduler, this option has no effect.
+
+Related options:
+
+* host_state_full_refresh_interval
+"""),
+    cfg.IntOpt("host_state_full_refresh_interval",
+        default=600,
+        min=0,
+        help="""
+Interval in seconds between full reloads of the cached host states.
+
+When ``incremental_host_state_refresh`` is enabled, all the compute node and
+service records of a cell are reloaded after this many seconds, which bounds
+how long a missed change can stay in the cache.
+
+Possible values:
+
+* 0: Never do a full reload after the first one.
+* Any positive integer representing the interval in seconds.
+
+Related options:
+
+* incremental_host_state_refresh
+"""),
+    cfg.BoolOpt("vectorized_filtering_and_weighing",
+        default=False,
+        help="""
+Run the filters and weighers supporting it on all the hosts at once.
+
+By default each filter and weigher is called once per host. When this option
+is enabled, the filters and weighers which have a vectorized implementation,
+currently the RamFilter, CoreFilter, DiskFilter, NumInstancesFilter,
+IoOpsFilter and AvailabilityZoneFilter filters and the RAMWeigher, DiskWeigher
+and IoOpsWeigher weighers, work on NumPy arrays of the attributes of all the
+hosts instead, which is much faster in deployments with many hosts. The other
+filters and weighers are still called once per host.
+
+This requires NumPy to be installed; if it is not, a warning is logged and this
+option has no effect.
+
 This option is only used by the FilterScheduler and its subclasses; if you use
 a different scheduler, this option has no effect.
 """),
@@ -146,6 +146,16 @@ def service_get_all_by_binary(context, binary, include_disabled=False):
                                           include_disabled=include_disabled)
 
 
+def service_get_all_by_binary_changed_since(context, binary, since):
+    """Get services for a given binary created, updated or deleted after
+    the given time.
+
+    Includes disabled and deleted services.
+    """
+    return IMPL.service_get_all_by_binary_changed_since(context, binary,
+                                                        since)
+
+
 def service_get_all_computes_by_hv_type(context, hv_type,
                                         include_disabled=False):
     """Get all compute services for a given hypervisor type.
@@ -267,6 +277,21 @@ def compute_node_get_all_by_pagination(context, limit=None, marker=None):
                                                    limit=limit, marker=marker)
 
 
+def compute_node_get_all_changed_since(context, since):
+    """Get compute nodes created, updated or deleted after the given time.
+
+    Deleted compute nodes are only included if the context reads deleted
+    records.
+
+    :param context: The security context
+    :param since: A datetime; only compute nodes with a created_at,
+                  updated_at or deleted_at later than this are returned
+
+    :returns: List of dictionaries each containing compute node properties
+    """
+    return IMPL.compute_node_get_all_changed_since(context, since)
+
+
 def compute_node_get_all_by_host(context, host):
     """Get compute nodes by host name
 
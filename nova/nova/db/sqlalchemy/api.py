@@ -522,6 +522,16 @@ def service_get_all_by_binary(context, binary, include_disabled=False):
     return query.all()
 
 
+@pick_context_manager_reader
+def service_get_all_by_binary_changed_since(context, binary, since):
+    return model_query(context, models.Service, read_deleted="yes").\
+        filter_by(binary=binary).\
+        filter(or_(models.Service.created_at > since,
+                   models.Service.updated_at > since,
+                   models.Service.deleted_at > since)).\
+        all()
+
+
 @pick_context_manager_reader
 def service_get_all_computes_by_hv_type(context, hv_type,
                                         include_disabled=False):
@@ -624,6 +634,11 @@ def _compute_node_select(context, filters=None, limit=None, marker=None):
     if "hypervisor_hostname" in filters:
         hyp_hostname = filters["hypervisor_hostname"]
         select = select.where(cn_tbl.c.hypervisor_hostname == hyp_hostname)
+    if "changed_since" in filters:
+        since = filters["changed_since"]
+        select = select.where(or_(cn_tbl.c.created_at > since,
+                                  cn_tbl.c.updated_at > since,
+                                  cn_tbl.c.deleted_at > since))
     if marker is not None:
         try:
             compute_node_get(context, marker)
@@ -706,6 +721,11 @@ def compute_node_get_all_by_pagination(context, limit=None, marker=None):
     return _compute_node_fetchall(context, limit=limit, marker=marker)
 
 
+@pick_context_manager_reader
+def compute_node_get_all_changed_since(context, since):
+    return _compute_node_fetchall(context, {"changed_since": since})
+
+
 @pick_context_manager_reader
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
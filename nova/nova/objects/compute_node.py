@@ -15,6 +15,7 @@
 
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 from oslo_utils import versionutils
 
@@ -26,6 +27,7 @@ from nova import objects
 from nova.objects import base
 from nova.objects import fields
 from nova.objects import pci_device_pool
+from nova import utils
 
 CONF = nova.conf.CONF
 LOG = logging.getLogger(__name__)
@@ -363,7 +365,8 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
     # Version 1.14 ComputeNode version 1.14
     # Version 1.15 Added get_by_pagination()
     # Version 1.16: Added get_all_by_uuids()
-    VERSION = '1.16'
+    # Version 1.17: Added get_all_changed_since()
+    VERSION = '1.17'
     fields = {
         'objects': fields.ListOfObjectsField('ComputeNode'),
         }
@@ -427,3 +430,26 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
                                                             compute_uuids)
         return base.obj_make_list(context, cls(context), objects.ComputeNode,
                                   db_computes)
+
+    @base.remotable_classmethod
+    def _get_all_changed_since(cls, context, since):
+        # The since timestamp is sent as a string over RPC, convert it back
+        # to a datetime for the DB API call.
+        since = timeutils.normalize_time(timeutils.parse_isotime(since))
+        db_computes = db.compute_node_get_all_changed_since(
+            context.elevated(read_deleted='yes'), since)
+        return base.obj_make_list(context, cls(context), objects.ComputeNode,
+                                  db_computes)
+
+    @classmethod
+    def get_all_changed_since(cls, context, since):
+        """Get the compute nodes created, updated or deleted after a time.
+
+        Deleted compute nodes are returned too, with their deleted field
+        set, so that callers caching compute nodes can drop them.
+
+        :param context: The security context
+        :param since: A datetime.datetime
+        :returns: A ComputeNodeList
+        """
+        return cls._get_all_changed_since(context, utils.isotime(since))
@@ -13,6 +13,7 @@
 #    under the License.
 
 from oslo_log import log as logging
+from oslo_utils import timeutils
 from oslo_utils import versionutils
 
 from nova import availability_zones
@@ -24,6 +25,7 @@ from nova.notifications.objects import service as service_notification
 from nova import objects
 from nova.objects import base
 from nova.objects import fields
+from nova import utils
 
 
 LOG = logging.getLogger(__name__)
@@ -414,7 +416,8 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
     # Version 1.17: Service version 1.19
     # Version 1.18: Added include_disabled parameter to get_by_binary()
     # Version 1.19: Added get_all_computes_by_hv_type()
-    VERSION = '1.19'
+    # Version 1.20: Added get_by_binary_changed_since()
+    VERSION = '1.20'
 
     fields = {
         'objects': fields.ListOfObjectsField('Service'),
@@ -456,3 +459,26 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
             context, hv_type, include_disabled=False)
         return base.obj_make_list(context, cls(context), objects.Service,
                                   db_services)
+
+    @base.remotable_classmethod
+    def _get_by_binary_changed_since(cls, context, binary, since):
+        since = timeutils.normalize_time(timeutils.parse_isotime(since))
+        db_services = db.service_get_all_by_binary_changed_since(
+            context, binary, since)
+        return base.obj_make_list(context, cls(context), objects.Service,
+                                  db_services)
+
+    @classmethod
+    def get_by_binary_changed_since(cls, context, binary, since):
+        """Get the services of a binary created, updated or deleted after
+        a time.
+
+        Disabled and deleted services are returned too.
+
+        :param context: The security context
+        :param binary: The service binary, e.g. nova-compute
+        :param since: A datetime.datetime
+        :returns: A ServiceList
+        """
+        return cls._get_by_binary_changed_since(context, binary,
+                                                utils.isotime(since))
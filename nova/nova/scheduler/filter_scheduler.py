@@ -19,9 +19,12 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
+import itertools
 import random
 
 from oslo_log import log as logging
+import six
 from six.moves import range
 
 import nova.conf
@@ -31,12 +34,63 @@ from nova.objects import fields
 from nova import rpc
 from nova.scheduler import client as scheduler_client
 from nova.scheduler import driver
+from nova.scheduler import weights
+from nova import weights as base_weights
 
 
 CONF = nova.conf.CONF
 LOG = logging.getLogger(__name__)
 
 
+class WeighedHostQueue(object):
+    """Weighed hosts kept in the order HostManager.get_weighed_hosts()
+    returns them, best first, where the weight of one host can be updated
+    without sorting all of them again.
+
+    Hosts of equal weight are ordered by their position in the list of hosts
+    they were weighed from, as sorted() keeps them.
+    """
+
+    def __init__(self, weighed_hosts, positions):
+        # Dict of the position of each HostState, keyed by its id()
+        self.positions = positions
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        for weighed_host in weighed_hosts:
+            self.push(weighed_host)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, weighed_host):
+        """Add a WeighedHost, replacing any for the same HostState."""
+        self.remove(weighed_host.obj)
+        # The counter avoids comparing the WeighedHosts of a replaced entry
+        # and of its replacement
+        entry = [-weighed_host.weight, self.positions[id(weighed_host.obj)],
+                 next(self._counter), weighed_host, True]
+        self._entries[id(weighed_host.obj)] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, host_state):
+        """Remove the WeighedHost of a HostState, if any."""
+        entry = self._entries.pop(id(host_state), None)
+        if entry is not None:
+            entry[-1] = False
+
+    def best(self, count):
+        """Return the count best WeighedHosts, best first."""
+        best = []
+        while self._heap and len(best) < count:
+            entry = heapq.heappop(self._heap)
+            if entry[-1]:
+                best.append(entry)
+        for entry in best:
+            heapq.heappush(self._heap, entry)
+        return [entry[3] for entry in best]
+
+
 class FilterScheduler(driver.Scheduler):
     """Scheduler that can be used for filtering and weighing."""
     def __init__(self, *args, **kwargs):
@@ -101,6 +155,10 @@ class FilterScheduler(driver.Scheduler):
         # are being scanned in a filter or weighing function.
         hosts = self._get_all_host_states(elevated, spec_obj)
 
+        if (CONF.filter_scheduler.batch_placement and
+                spec_obj.num_instances > 1):
+            return self._schedule_batch(spec_obj, hosts)
+
         selected_hosts = []
         num_instances = spec_obj.num_instances
         for num in range(num_instances):
@@ -128,13 +186,142 @@ class FilterScheduler(driver.Scheduler):
 
             # Now consume the resources so the filter/weights
             # will change for the next instance.
-            chosen_host.obj.consume_from_request(spec_obj)
-            if spec_obj.instance_group is not None:
-                spec_obj.instance_group.hosts.append(chosen_host.obj.host)
-                # hosts has to be not part of the updates when saving
-                spec_obj.instance_group.obj_reset_changes(['hosts'])
+            self._consume_selected_host(chosen_host, spec_obj)
+        return selected_hosts
+
+    @staticmethod
+    def _consume_selected_host(chosen_host, spec_obj):
+        chosen_host.obj.consume_from_request(spec_obj)
+        if spec_obj.instance_group is not None:
+            spec_obj.instance_group.hosts.append(chosen_host.obj.host)
+            # hosts has to be not part of the updates when saving
+            spec_obj.instance_group.obj_reset_changes(['hosts'])
+
+    def _schedule_batch(self, spec_obj, hosts):
+        """Returns the same list of hosts as _schedule() but only filters and
+        weighs all the hosts once.
+
+        After each instance is placed, only the host it was placed on is
+        filtered and weighed again, and the filters depending on placements
+        are run on the other hosts. All the hosts are filtered or weighed
+        again when that would not select the same hosts as _schedule(): when
+        a filter not run for the previous instance is run for the next one, or
+        when the normalization of the weights changed.
+        """
+        host_subset_size = CONF.filter_scheduler.host_subset_size
+        selected_hosts = []
+        queue = None
+        positions = None
+        num_instances = spec_obj.num_instances
+        for num in range(num_instances):
+            if queue is None:
+                hosts = self.host_manager.get_filtered_hosts(hosts,
+                        spec_obj, index=num)
+                if not hosts:
+                    # Can't get any more locally.
+                    break
+                hosts = list(hosts)
+                if positions is None:
+                    positions = {id(host): i for i, host in enumerate(hosts)}
+                queue = WeighedHostQueue(
+                    self.host_manager.get_weighed_hosts(hosts, spec_obj),
+                    positions)
+            elif not hosts:
+                break
+
+            chosen_host = random.choice(queue.best(host_subset_size))
+
+            LOG.debug("Selected host: %(host)s", {'host': chosen_host})
+            selected_hosts.append(chosen_host)
+
+            # Now consume the resources so the filter/weights
+            # will change for the next instance.
+            self._consume_selected_host(chosen_host, spec_obj)
+            if num + 1 < num_instances:
+                hosts, queue = self._update_batch(hosts, queue, chosen_host,
+                                                  spec_obj, num + 1)
         return selected_hosts
 
+    def _update_batch(self, hosts, queue, chosen_host, spec_obj, index):
+        """Filter and weigh again what changed after an instance was placed.
+
+        :returns: a tuple of the list of the hosts still passing the filters,
+                  in their original order, and the updated WeighedHostQueue,
+                  or None if all the hosts have to be filtered again
+        """
+        enabled_filters = self.host_manager.enabled_filters
+        previous_filters = set(filter_ for filter_ in enabled_filters
+                               if filter_.run_filter_for_index(index - 1))
+        host_filters = [filter_ for filter_ in enabled_filters
+                        if filter_.run_filter_for_index(index)]
+        if any(filter_ not in previous_filters for filter_ in host_filters):
+            return hosts, None
+
+        chosen = chosen_host.obj
+        if not (spec_obj.force_hosts or spec_obj.force_nodes):
+            # NOTE: Forced hosts are not filtered, see get_filtered_hosts()
+            chosen_passes = bool(
+                self._run_filters(host_filters, [chosen], spec_obj))
+            placement_filters = [filter_ for filter_ in host_filters
+                                 if filter_.depends_on_placements]
+            if placement_filters:
+                others = [host for host in hosts if host is not chosen]
+                passing = set(id(host) for host in self._run_filters(
+                    placement_filters, others, spec_obj))
+                passing.add(id(chosen))
+            else:
+                passing = set(id(host) for host in hosts)
+            if not chosen_passes:
+                passing.discard(id(chosen))
+            for host in hosts:
+                if id(host) not in passing:
+                    queue.remove(host)
+            hosts = [host for host in hosts if id(host) in passing]
+            if not chosen_passes:
+                chosen = None
+
+        # NOTE: get_weighed_objects() gives a single host a weight of 0.0
+        # rather than weighing it, so a single remaining host is weighed again
+        # with get_weighed_hosts() like the sequential path does
+        weighers = self.host_manager.weighers
+        if len(hosts) > 1 and all(self._weighs_hosts_separately(weigher)
+                                  for weigher in weighers):
+            if chosen is None:
+                # The weights of the other hosts did not change
+                return hosts, queue
+            weighed_host = weights.WeighedHost(chosen, 0.0)
+            if self.host_manager.weight_handler.weigh_object(
+                    weighers, weighed_host, spec_obj):
+                queue.push(weighed_host)
+                return hosts, queue
+
+        LOG.debug("Weighing all the %(count)d remaining hosts again",
+                  {'count': len(hosts)})
+        return hosts, WeighedHostQueue(
+            self.host_manager.get_weighed_hosts(hosts, spec_obj),
+            queue.positions)
+
+    @staticmethod
+    def _run_filters(host_filters, hosts, spec_obj):
+        for filter_ in host_filters:
+            hosts = filter_.filter_all(hosts, spec_obj)
+            if hosts is None:
+                return []
+            hosts = list(hosts)
+            if not hosts:
+                break
+        return hosts
+
+    @staticmethod
+    def _weighs_hosts_separately(weigher):
+        """Return True if the weight of a host given by the weigher only
+        depends on that host.
+        """
+        weigh_objects = six.get_unbound_function(type(weigher).weigh_objects)
+        return (not weigher.depends_on_placements and
+                weigh_objects is six.get_unbound_function(
+                    base_weights.BaseWeigher.weigh_objects))
+
     def _get_resources_per_request_spec(self, spec_obj):
         resources = {}
 
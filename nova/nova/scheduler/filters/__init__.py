@@ -16,26 +16,79 @@
 """
 Scheduler host filters
 """
+import copy
+
 from nova import filters
 
 
 class BaseHostFilter(filters.BaseFilter):
     """Base class for host filters."""
+
+    # Set to True in a subclass which implements hosts_pass()
+    vectorized = False
+
+    # The HostStateColumns the filter runs on, see with_columns()
+    columns = None
+
+    # Set to True in a subclass if whether a host passes may change when an
+    # instance of the request is placed on another host, like for the server
+    # group filters. Otherwise, when placing several instances in a batch,
+    # only the host the previous instance was placed on is filtered again.
+    depends_on_placements = False
+
     def _filter_one(self, obj, filter_properties):
         """Return True if the object passes the filter, otherwise False."""
         return self.host_passes(obj, filter_properties)
 
+    def filter_all(self, filter_obj_list, spec_obj):
+        if self.columns is None:
+            return super(BaseHostFilter, self).filter_all(filter_obj_list,
+                                                          spec_obj)
+        view = self.columns.view(filter_obj_list)
+        return view.select(self.hosts_pass(view, spec_obj))
+
     def host_passes(self, host_state, filter_properties):
         """Return True if the HostState passes the filter, otherwise False.
         Override this in a subclass.
         """
         raise NotImplementedError()
 
+    def hosts_pass(self, view, spec_obj):
+        """Return a NumPy array of booleans telling which of the HostStates
+        of a nova.scheduler.vectorized.HostStateView pass the filter.
+
+        Override this in a subclass setting vectorized, it must have the same
+        outcome and side effects as host_passes().
+        """
+        raise NotImplementedError()
+
+    def with_columns(self, columns):
+        """Return a copy of the filter running hosts_pass() on the given
+        HostStateColumns.
+        """
+        filter_ = copy.copy(self)
+        filter_.columns = columns
+        return filter_
+
 
 class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
 
+    def get_filtered_objects(self, filters, objs, spec_obj, index=0,
+                             columns=None):
+        """Filter the HostStates.
+
+        If columns, a HostStateColumns of the HostStates, is given, the
+        filters supporting it are vectorized.
+        """
+        if columns is not None:
+            filters = [filter_.with_columns(columns)
+                       if filter_.vectorized else filter_
+                       for filter_ in filters]
+        return super(HostFilterHandler, self).get_filtered_objects(
+            filters, objs, spec_obj, index=index)
+
 
 def all_filters():
     """Return a list of filter classes found in this directory.
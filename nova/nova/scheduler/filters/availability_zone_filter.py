@@ -35,6 +35,8 @@ class AvailabilityZoneFilter(filters.BaseHostFilter):
     # Availability zones do not change within a request
     run_filter_once_per_request = True
 
+    vectorized = True
+
     def host_passes(self, host_state, spec_obj):
         availability_zone = spec_obj.availability_zone
 
@@ -59,3 +61,12 @@ class AvailabilityZoneFilter(filters.BaseHostFilter):
                        'host_az': host_az})
 
         return hosts_passes
+
+    def hosts_pass(self, view, spec_obj):
+        # Hosts in the same aggregates are in the same availability zones,
+        # so only check one host of each set of aggregates.
+        return view.map(
+            lambda host_state: self.host_passes(host_state, spec_obj),
+            lambda host_state: frozenset(agg.id
+                                         for agg in host_state.aggregates),
+            dtype=bool)
@@ -77,9 +77,31 @@ class BaseCoreFilter(filters.BaseHostFilter):
 class CoreFilter(BaseCoreFilter):
     """CoreFilter filters based on CPU core utilization."""
 
+    vectorized = True
+
     def _get_cpu_allocation_ratio(self, host_state, spec_obj):
         return host_state.cpu_allocation_ratio
 
+    def hosts_pass(self, view, spec_obj):
+        instance_vcpus = spec_obj.vcpus
+        host_vcpus = view.get('vcpus_total')
+        vcpus_total = host_vcpus * view.get('cpu_allocation_ratio')
+        # Fail safe, hosts without VCPUs set are assumed to have their CPU
+        # collection broken
+        unknown = (host_vcpus == 0) | view.missing('vcpus_total')
+        limited = vcpus_total > 0
+
+        free_vcpus = vcpus_total - view.get('vcpus_used')
+        passes = unknown | (~(limited & (instance_vcpus > host_vcpus)) &
+                            ~(free_vcpus < instance_vcpus))
+
+        # Only provide a VCPU limit to compute if the virt driver is reporting
+        # an accurate count of installed VCPUs. (XenServer driver does not)
+        for host_state, limit in zip(view.select(limited),
+                                     vcpus_total[limited].tolist()):
+            host_state.limits['vcpu'] = limit
+        return passes
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
@@ -28,6 +28,8 @@ CONF = nova.conf.CONF
 class DiskFilter(filters.BaseHostFilter):
     """Disk Filter with over subscription flag."""
 
+    vectorized = True
+
     def _get_disk_allocation_ratio(self, host_state, spec_obj):
         return host_state.disk_allocation_ratio
 
@@ -72,6 +74,25 @@ class DiskFilter(filters.BaseHostFilter):
         host_state.limits['disk_gb'] = disk_gb_limit
         return True
 
+    def hosts_pass(self, view, spec_obj):
+        requested_disk = (1024 * (spec_obj.root_gb +
+                                  spec_obj.ephemeral_gb) +
+                          spec_obj.swap)
+
+        total_usable_disk_mb = view.get('total_usable_disk_gb') * 1024
+        disk_mb_limit = (total_usable_disk_mb *
+                         view.get('disk_allocation_ratio'))
+        used_disk_mb = total_usable_disk_mb - view.get('free_disk_mb')
+        usable_disk_mb = disk_mb_limit - used_disk_mb
+        passes = ((total_usable_disk_mb >= requested_disk) &
+                  (usable_disk_mb >= requested_disk))
+
+        disk_gb_limit = disk_mb_limit / 1024
+        for host_state, limit in zip(view.select(passes),
+                                     disk_gb_limit[passes].tolist()):
+            host_state.limits['disk_gb'] = limit
+        return passes
+
 
 class AggregateDiskFilter(DiskFilter):
     """AggregateDiskFilter with per-aggregate disk allocation ratio flag.
@@ -80,6 +101,8 @@ class AggregateDiskFilter(DiskFilter):
     found.
     """
 
+    vectorized = False
+
     def _get_disk_allocation_ratio(self, host_state, spec_obj):
         aggregate_vals = utils.aggregate_values_from_key(
             host_state,
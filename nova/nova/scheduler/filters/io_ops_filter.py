@@ -28,6 +28,8 @@ CONF = nova.conf.CONF
 class IoOpsFilter(filters.BaseHostFilter):
     """Filter out hosts with too many concurrent I/O operations."""
 
+    vectorized = True
+
     def _get_max_io_ops_per_host(self, host_state, spec_obj):
         return CONF.filter_scheduler.max_io_ops_per_host
 
@@ -46,6 +48,10 @@ class IoOpsFilter(filters.BaseHostFilter):
                          'max_io_ops': max_io_ops})
         return passes
 
+    def hosts_pass(self, view, spec_obj):
+        max_io_ops = CONF.filter_scheduler.max_io_ops_per_host
+        return view.get('num_io_ops') < max_io_ops
+
 
 class AggregateIoOpsFilter(IoOpsFilter):
     """AggregateIoOpsFilter with per-aggregate the max io operations.
@@ -53,6 +59,8 @@ class AggregateIoOpsFilter(IoOpsFilter):
     Fall back to global max_io_ops_per_host if no per-aggregate setting found.
     """
 
+    vectorized = False
+
     def _get_max_io_ops_per_host(self, host_state, spec_obj):
         max_io_ops_per_host = CONF.filter_scheduler.max_io_ops_per_host
         aggregate_vals = utils.aggregate_values_from_key(
@@ -67,9 +67,27 @@ class BaseRamFilter(filters.BaseHostFilter):
 class RamFilter(BaseRamFilter):
     """Ram Filter with over subscription flag."""
 
+    vectorized = True
+
     def _get_ram_allocation_ratio(self, host_state, spec_obj):
         return host_state.ram_allocation_ratio
 
+    def hosts_pass(self, view, spec_obj):
+        requested_ram = spec_obj.memory_mb
+        total_usable_ram_mb = view.get('total_usable_ram_mb')
+        memory_mb_limit = (total_usable_ram_mb *
+                           view.get('ram_allocation_ratio'))
+        used_ram_mb = total_usable_ram_mb - view.get('free_ram_mb')
+        usable_ram = memory_mb_limit - used_ram_mb
+        passes = ((total_usable_ram_mb >= requested_ram) &
+                  (usable_ram >= requested_ram))
+
+        # save oversubscription limit for compute node to test against:
+        for host_state, limit in zip(view.select(passes),
+                                     memory_mb_limit[passes].tolist()):
+            host_state.limits['memory_mb'] = limit
+        return passes
+
 
 class AggregateRamFilter(BaseRamFilter):
     """AggregateRamFilter with per-aggregate ram subscription flag.
@@ -18,6 +18,7 @@ Manage hosts in the current zone.
 """
 
 import collections
+import datetime
 import functools
 import time
 try:
@@ -38,6 +39,7 @@ from nova.i18n import _LI, _LW
 from nova import objects
 from nova.pci import stats as pci_stats
 from nova.scheduler import filters
+from nova.scheduler import vectorized
 from nova.scheduler import weights
 from nova import utils
 from nova.virt import hardware
@@ -47,6 +49,10 @@ CONF = nova.conf.CONF
 
 LOG = logging.getLogger(__name__)
 HOST_INSTANCE_SEMAPHORE = "host_instance"
+# Seconds subtracted from the time of the previous refresh when loading the
+# compute nodes and services changed since then, so that records written by
+# hosts whose clock is slightly behind are not missed.
+HOST_STATE_REFRESH_OVERLAP = 5
 
 
 class ReadOnlyDict(IterableUserDict):
@@ -75,6 +81,55 @@ class ReadOnlyDict(IterableUserDict):
         raise TypeError()
 
 
+class CellHostCache(object):
+    """Compute nodes and compute services of a cell, kept between scheduling
+    requests when the incremental host state refresh is enabled.
+    """
+
+    def __init__(self):
+        # Dict of ComputeNode objects keyed by their ID
+        self.compute_nodes = {}
+        # Dict of nova-compute Service objects keyed by their host
+        self.services = {}
+        # When the previous refresh and the previous full refresh started
+        self.last_refresh = None
+        self.last_full_refresh = None
+        # Figures about the previous refresh
+        self.refresh_duration = None
+        self.changed_compute_nodes = 0
+        self.changed_services = 0
+
+    def replace(self, compute_nodes, services):
+        """Replace the cached compute nodes and services."""
+        self.compute_nodes = {cn.id: cn for cn in compute_nodes}
+        self.services = {service.host: service for service in services}
+        self.changed_compute_nodes = len(compute_nodes)
+        self.changed_services = len(services)
+
+    def merge(self, compute_nodes, services):
+        """Apply lists of changed, possibly deleted, compute nodes and
+        services to the cache.
+        """
+        self._merge(self.compute_nodes, compute_nodes, lambda cn: cn.id)
+        self._merge(self.services, services, lambda service: service.host)
+        self.changed_compute_nodes = len(compute_nodes)
+        self.changed_services = len(services)
+
+    @staticmethod
+    def _merge(cached, changes, key):
+        # Deleted records are handled first so that a record deleted and then
+        # recreated with the same key, like a service of a host which was
+        # re-registered, ends up in the cache.
+        for obj in changes:
+            if obj.deleted:
+                current = cached.get(key(obj))
+                if current is not None and current.id == obj.id:
+                    del cached[key(obj)]
+        for obj in changes:
+            if not obj.deleted:
+                cached[key(obj)] = obj
+
+
 @utils.expects_func_args('self', 'spec_obj')
 def set_update_time_on_success(function):
     """Set updated time of HostState when consuming succeed."""
@@ -345,6 +400,12 @@ class HostManager(object):
         weigher_classes = self.weight_handler.get_matching_classes(
                 CONF.filter_scheduler.weight_classes)
         self.weighers = [cls() for cls in weigher_classes]
+        self.vectorized = (
+                CONF.filter_scheduler.vectorized_filtering_and_weighing)
+        if self.vectorized and not vectorized.is_available():
+            LOG.warning(_LW("NumPy is not installed, host filters and "
+                            "weighers will not be vectorized"))
+            self.vectorized = False
         # Dict of aggregates keyed by their ID
         self.aggs_by_id = {}
         # Dict of set of aggregate IDs keyed by the name of the host belonging
@@ -358,6 +419,13 @@ class HostManager(object):
         if self.track_instance_changes:
             self._init_instance_info()
         self.cells = None
+        self.incremental_refresh = (
+                CONF.filter_scheduler.incremental_host_state_refresh)
+        # Dict of CellHostCache keyed by cell UUID
+        self._cell_caches = {}
+        # Dict of the (compute, service) objects each HostState was last
+        # updated from, keyed by (host, node)
+        self._host_state_sources = {}
 
     def _load_filters(self):
         return CONF.filter_scheduler.enabled_filters
@@ -569,11 +637,20 @@ class HostManager(object):
                     return []
             hosts = six.itervalues(name_to_cls_map)
 
+        if self.vectorized:
+            hosts = list(hosts)
+            return self.filter_handler.get_filtered_objects(
+                self.enabled_filters, hosts, spec_obj, index,
+                columns=vectorized.HostStateColumns(hosts))
         return self.filter_handler.get_filtered_objects(self.enabled_filters,
                 hosts, spec_obj, index)
 
     def get_weighed_hosts(self, hosts, spec_obj):
         """Weigh the hosts."""
+        if self.vectorized:
+            hosts = list(hosts)
+            return self.weight_handler.get_weighed_objects(self.weighers,
+                hosts, spec_obj, columns=vectorized.HostStateColumns(hosts))
         return self.weight_handler.get_weighed_objects(self.weighers,
                 hosts, spec_obj)
 
@@ -590,6 +667,16 @@ class HostManager(object):
             LOG.debug('Getting compute nodes and services for cell %(cell)s',
                       {'cell': cell})
             with context_module.target_cell(context, cell):
+                if self.incremental_refresh:
+                    cache = self._refresh_cell_cache(context, cell)
+                    cell_computes = cache.compute_nodes.values()
+                    if compute_uuids is not None:
+                        wanted = set(compute_uuids)
+                        cell_computes = [cn for cn in cell_computes
+                                         if cn.uuid in wanted]
+                    compute_nodes.extend(cell_computes)
+                    services.update(cache.services)
+                    continue
                 if compute_uuids is None:
                     compute_nodes.extend(objects.ComputeNodeList.get_all(
                         context))
@@ -604,6 +691,86 @@ class HostManager(object):
                              include_disabled=True)})
         return compute_nodes, services
 
+    def _refresh_cell_cache(self, context, cell):
+        """Bring the cached compute nodes and services of a cell up to date.
+
+        Only the records created, updated or deleted since the previous
+        refresh are loaded, except for the first refresh and then every
+        host_state_full_refresh_interval seconds, when all of them are.
+
+        :param context: a context targeted at the cell
+        :param cell: the CellMapping of the cell
+        :returns: the CellHostCache of the cell
+        """
+        cache = self._cell_caches.setdefault(cell.uuid, CellHostCache())
+        interval = CONF.filter_scheduler.host_state_full_refresh_interval
+        full = (cache.last_refresh is None or
+                (interval and timeutils.is_older_than(
+                    cache.last_full_refresh, interval)))
+        start = time.time()
+        now = timeutils.utcnow()
+        if full:
+            compute_nodes = objects.ComputeNodeList.get_all(context)
+            services = objects.ServiceList.get_by_binary(
+                context, 'nova-compute', include_disabled=True)
+            cache.replace(compute_nodes, services)
+            cache.last_full_refresh = now
+        else:
+            since = cache.last_refresh - datetime.timedelta(
+                seconds=HOST_STATE_REFRESH_OVERLAP)
+            compute_nodes = objects.ComputeNodeList.get_all_changed_since(
+                context, since)
+            services = objects.ServiceList.get_by_binary_changed_since(
+                context, 'nova-compute', since)
+            cache.merge(compute_nodes, services)
+        # NOTE: Concurrent requests may refresh the same cell; whichever
+        # finishes last also sets the time it started from, so a change merged
+        # by another request and then overwritten is loaded again next time.
+        cache.last_refresh = now
+        cache.refresh_duration = time.time() - start
+        LOG.debug('%(kind)s refresh of the host states of cell %(cell)s took '
+                  '%(duration).3f seconds, %(computes)d compute nodes and '
+                  '%(services)d services changed, last full refresh was '
+                  '%(staleness).0f seconds ago',
+                  {'kind': 'Full' if full else 'Incremental',
+                   'cell': cell.uuid, 'duration': cache.refresh_duration,
+                   'computes': cache.changed_compute_nodes,
+                   'services': cache.changed_services,
+                   'staleness': timeutils.delta_seconds(
+                       cache.last_full_refresh, now)})
+        return cache
+
+    def get_host_state_cache_stats(self):
+        """Returns figures about the cached compute nodes and services of
+        each cell, keyed by cell UUID.
+
+        Empty unless the incremental host state refresh is enabled.
+        """
+        now = timeutils.utcnow()
+        return {cell_uuid: {
+                    'compute_nodes': len(cache.compute_nodes),
+                    'services': len(cache.services),
+                    'refresh_duration': cache.refresh_duration,
+                    'changed_compute_nodes': cache.changed_compute_nodes,
+                    'changed_services': cache.changed_services,
+                    'seconds_since_refresh': timeutils.delta_seconds(
+                        cache.last_refresh, now),
+                    'seconds_since_full_refresh': timeutils.delta_seconds(
+                        cache.last_full_refresh, now)}
+                for cell_uuid, cache in self._cell_caches.items()}
+
+    def _get_cached_nodes(self):
+        """Returns the (host, node) keys of the cached compute nodes that
+        have a compute service.
+        """
+        hosts = set()
+        for cache in self._cell_caches.values():
+            hosts.update(cache.services)
+        return set((cn.host, cn.hypervisor_hostname)
+                   for cache in self._cell_caches.values()
+                   for cn in cache.compute_nodes.values()
+                   if cn.host in hosts)
+
     def get_host_states_by_uuids(self, context, compute_uuids):
         compute_nodes, services = self._get_computes_all_cells(context,
                                                                compute_uuids)
@@ -642,20 +809,38 @@ class HostManager(object):
             # We force to update the aggregates info each time a new request
             # comes in, because some changes on the aggregates could have been
             # happening after setting this field for the first time
-            host_state.update(compute,
-                              dict(service),
-                              self._get_aggregates_info(host),
-                              self._get_instance_info(context, compute))
+            sources = self._host_state_sources.get(state_key)
+            if (sources is not None and sources[0] is compute and
+                    sources[1] is service):
+                # The cached compute node and service did not change since
+                # they were last applied to this host state.
+                host_state.update(None, None,
+                                  self._get_aggregates_info(host),
+                                  self._get_instance_info(context, compute))
+            else:
+                host_state.update(compute,
+                                  dict(service),
+                                  self._get_aggregates_info(host),
+                                  self._get_instance_info(context, compute))
+                if self.incremental_refresh:
+                    self._host_state_sources[state_key] = (compute, service)
 
             seen_nodes.add(state_key)
 
         # remove compute nodes from host_state_map if they are not active
-        dead_nodes = set(self.host_state_map.keys()) - seen_nodes
+        if self.incremental_refresh:
+            # Only some of the cached compute nodes may have been requested,
+            # the others are still active.
+            live_nodes = self._get_cached_nodes()
+        else:
+            live_nodes = seen_nodes
+        dead_nodes = set(self.host_state_map.keys()) - live_nodes
         for state_key in dead_nodes:
             host, node = state_key
             LOG.info(_LI("Removing dead compute node %(host)s:%(node)s "
                          "from scheduler"), {'host': host, 'node': node})
             del self.host_state_map[state_key]
+            self._host_state_sources.pop(state_key, None)
 
         return (self.host_state_map[host] for host in seen_nodes)
 
@@ -0,0 +1,132 @@
+# Copyright (c) 2017 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Columnar views of HostStates for the vectorized filters and weighers.
+
+Filters and weighers which set their ``vectorized`` attribute work on NumPy
+arrays holding one attribute of every HostState instead of being called once
+per HostState. NumPy is an optional dependency; without it the filters and
+weighers are always run one host at a time.
+"""
+
+from oslo_utils import importutils
+
+numpy = importutils.try_import('numpy')
+
+
+def is_available():
+    """Return True if NumPy can be imported."""
+    return numpy is not None
+
+
+class HostStateColumns(object):
+    """Lazily built columns of attributes of a list of HostStates.
+
+    Each column is built the first time it is asked for and is then shared by
+    all the filters and weighers of the request. Missing (None) numeric values
+    are stored as NaN, for which all comparisons are False.
+    """
+
+    def __init__(self, host_states):
+        self.host_states = list(host_states)
+        self._positions = {id(host_state): i
+                           for i, host_state in enumerate(self.host_states)}
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.host_states)
+
+    def column(self, name, dtype=float):
+        """Return the array of the given attribute of all the HostStates."""
+        key = (name, dtype)
+        if key not in self._columns:
+            values = [getattr(host_state, name)
+                      for host_state in self.host_states]
+            self._columns[key] = numpy.array(values, dtype=dtype)
+        return self._columns[key]
+
+    def view(self, host_states):
+        """Return a HostStateView over some of the HostStates."""
+        return HostStateView(self, host_states)
+
+
+class HostStateView(object):
+    """The columns of a subset of the HostStates of a HostStateColumns.
+
+    The host states must have been passed to the HostStateColumns, in any
+    order. Arrays returned by get() are in the order of the view.
+    """
+
+    def __init__(self, columns, host_states):
+        self.columns = columns
+        self.host_states = list(host_states)
+        self.positions = numpy.fromiter(
+            (columns._positions[id(host_state)]
+             for host_state in self.host_states),
+            dtype=int, count=len(self.host_states))
+
+    def __len__(self):
+        return len(self.host_states)
+
+    def get(self, name, dtype=float):
+        """Return the array of the given attribute of the HostStates."""
+        return self.columns.column(name, dtype=dtype)[self.positions]
+
+    def missing(self, name):
+        """Return an array telling which HostStates have the given numeric
+        attribute set to None.
+        """
+        return numpy.isnan(self.get(name))
+
+    def map(self, func, key, dtype=float):
+        """Return an array of func(host_state) for each HostState.
+
+        func is only called once for all the host states sharing the same
+        key(host_state), which is how non numeric attributes such as the
+        aggregates of the hosts are vectorized.
+        """
+        results = {}
+        values = []
+        for host_state in self.host_states:
+            host_key = key(host_state)
+            if host_key not in results:
+                results[host_key] = func(host_state)
+            values.append(results[host_key])
+        return numpy.array(values, dtype=dtype)
+
+    def select(self, mask):
+        """Return the list of the HostStates for which mask is True."""
+        return [self.host_states[i] for i in numpy.flatnonzero(mask)]
+
+
+def normalize(weights, minval=None, maxval=None):
+    """Normalize an array of weights between 0 and 1.0.
+
+    Like nova.weights.normalize(), the lower and upper values of the array are
+    used unless minval and/or maxval are given.
+    """
+    if not len(weights):
+        return weights
+
+    if maxval is None:
+        maxval = weights.max()
+
+    if minval is None:
+        minval = weights.min()
+
+    if minval == maxval:
+        return numpy.zeros(len(weights))
+    return (weights - minval) / float(maxval - minval)
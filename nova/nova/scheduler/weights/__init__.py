@@ -17,6 +17,7 @@
 Scheduler host weights
 """
 
+from nova.scheduler import vectorized
 from nova import weights
 
 
@@ -33,7 +34,38 @@ class WeighedHost(weights.WeighedObject):
 
 class BaseHostWeigher(weights.BaseWeigher):
     """Base class for host weights."""
-    pass
+
+    # Set to True in a subclass which implements _weigh_columns()
+    vectorized = False
+
+    # Set to True in a subclass if the weight of a host may change when an
+    # instance of the request is placed on another host. Otherwise, when
+    # placing several instances in a batch, only the host the previous
+    # instance was placed on is weighed again.
+    depends_on_placements = False
+
+    def _weigh_columns(self, view, weight_properties):
+        """Return a NumPy array of the weights of the HostStates of a
+        nova.scheduler.vectorized.HostStateView.
+
+        Override this in a subclass setting vectorized, it must return the
+        same weights as _weigh_object().
+        """
+        raise NotImplementedError()
+
+    def weigh_columns(self, view, weight_properties):
+        """Weigh the HostStates of a HostStateView at once, recording the
+        min and max values like weigh_objects() does.
+        """
+        weights = self._weigh_columns(view, weight_properties)
+        if len(weights):
+            minval = weights.min().item()
+            maxval = weights.max().item()
+            if self.minval is None or minval < self.minval:
+                self.minval = minval
+            if self.maxval is None or maxval > self.maxval:
+                self.maxval = maxval
+        return weights
 
 
 class HostWeightHandler(weights.BaseWeightHandler):
@@ -42,6 +74,44 @@ class HostWeightHandler(weights.BaseWeightHandler):
     def __init__(self):
         super(HostWeightHandler, self).__init__(BaseHostWeigher)
 
+    def get_weighed_objects(self, weighers, obj_list, weighing_properties,
+                            columns=None):
+        """Return a sorted (descending), normalized list of WeighedHosts.
+
+        If columns, a HostStateColumns of the HostStates, is given, the
+        weighers supporting it are vectorized.
+        """
+        if columns is None:
+            return super(HostWeightHandler, self).get_weighed_objects(
+                weighers, obj_list, weighing_properties)
+
+        weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
+
+        if len(weighed_objs) <= 1:
+            return weighed_objs
+
+        view = columns.view(obj_list)
+        total = vectorized.numpy.zeros(len(weighed_objs))
+        for weigher in weighers:
+            if weigher.vectorized:
+                weights = weigher.weigh_columns(view, weighing_properties)
+            else:
+                weights = vectorized.numpy.fromiter(
+                    weigher.weigh_objects(weighed_objs, weighing_properties),
+                    dtype=float, count=len(weighed_objs))
+
+            # Normalize the weights
+            weights = vectorized.normalize(weights,
+                                           minval=weigher.minval,
+                                           maxval=weigher.maxval)
+
+            total += weigher.weight_multiplier() * weights
+
+        for obj, weight in zip(weighed_objs, total.tolist()):
+            obj.weight = weight
+
+        return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
 
 def all_weighers():
     """Return a list of weight plugin classes found in this directory."""
@@ -29,6 +29,7 @@ CONF = nova.conf.CONF
 
 class IoOpsWeigher(weights.BaseHostWeigher):
     minval = 0
+    vectorized = True
 
     def weight_multiplier(self):
         """Override the weight multiplier."""
@@ -39,3 +40,6 @@ class IoOpsWeigher(weights.BaseHostWeigher):
         to be the default.
         """
         return host_state.num_io_ops
+
+    def _weigh_columns(self, view, weight_properties):
+        return view.get('num_io_ops')
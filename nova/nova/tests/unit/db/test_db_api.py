@@ -3674,6 +3674,25 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         real = db.service_get_all_by_binary(self.ctxt, 'b1')
         self._assertEqualListsOfObjects(expected, real)
 
+    def test_service_get_all_by_binary_changed_since(self):
+        time_fixture = self.useFixture(utils_fixture.TimeFixture(
+            datetime.datetime(2017, 1, 1, 12, 0, 0)))
+        old = self._create_service({'host': 'host1', 'binary': 'b1'})
+        deleted = self._create_service({'host': 'host2', 'binary': 'b1'})
+        time_fixture.advance_time_seconds(60)
+        since = timeutils.utcnow()
+        time_fixture.advance_time_seconds(60)
+        db.service_destroy(self.ctxt, deleted['id'])
+        new = self._create_service({'host': 'host3', 'binary': 'b1',
+                                    'disabled': True})
+        self._create_service({'host': 'host4', 'binary': 'b2'})
+
+        real = db.service_get_all_by_binary_changed_since(self.ctxt, 'b1',
+                                                          since)
+        self.assertEqual(set([deleted['id'], new['id']]),
+                         set([service['id'] for service in real]))
+        self.assertNotIn(old['id'], [service['id'] for service in real])
+
     def test_service_get_all_by_binary_include_disabled(self):
         values = [
             {'host': 'host1', 'binary': 'b1'},
@@ -7898,6 +7917,21 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
                           db.compute_node_get_all_by_pagination,
                           self.ctxt, limit=1, marker=999)
 
+    def test_compute_node_get_all_changed_since(self):
+        since = timeutils.utcnow() + datetime.timedelta(seconds=60)
+        self.assertEqual([], db.compute_node_get_all_changed_since(
+            self.ctxt, since))
+
+        with utils_fixture.TimeFixture(since + datetime.timedelta(
+                seconds=60)):
+            db.compute_node_delete(self.ctxt, self.item['id'])
+        nodes = db.compute_node_get_all_changed_since(
+            self.ctxt.elevated(read_deleted='yes'), since)
+        self.assertEqual([self.item['id']], [node['id'] for node in nodes])
+        self.assertTrue(nodes[0]['deleted'])
+        self.assertEqual([], db.compute_node_get_all_changed_since(
+            self.ctxt, since))
+
     def test_compute_node_get_all_deleted_compute_node(self):
         # Create a service and compute node and ensure we can find its stats;
         # delete the service and compute node when done and loop again
@@ -367,6 +367,19 @@ class _TestComputeNodeObject(object):
                          comparators=self.comparators())
         mock_get_all.assert_called_once_with(self.context)
 
+    @mock.patch.object(db, 'compute_node_get_all_changed_since')
+    def test_get_all_changed_since(self, mock_get):
+        mock_get.return_value = [fake_compute_node]
+        since = timeutils.utcnow().replace(microsecond=0)
+        computes = compute_node.ComputeNodeList.get_all_changed_since(
+            self.context, since)
+        self.assertEqual(1, len(computes))
+        self.compare_obj(computes[0], fake_compute_node,
+                         subs=self.subs(),
+                         comparators=self.comparators())
+        mock_get.assert_called_once_with(mock.ANY, since)
+        self.assertEqual('yes', mock_get.call_args[0][0].read_deleted)
+
     @mock.patch.object(db, 'compute_node_search_by_hypervisor')
     def test_get_by_hypervisor(self, mock_search):
         mock_search.return_value = [fake_compute_node]
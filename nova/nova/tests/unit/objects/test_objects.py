@@ -1073,7 +1073,7 @@ object_data = {
     'CellMapping': '1.0-7f1a7e85a22bbb7559fc730ab658b9bd',
     'CellMappingList': '1.0-4ee0d9efdfd681fed822da88376e04d2',
     'ComputeNode': '1.16-2436e5b836fa0306a3c4e6d9e5ddacec',
-    'ComputeNodeList': '1.16-40258d802a6ed045690a127a2088544b',
+    'ComputeNodeList': '1.17-e39e8ff29f966b7b0fb386f581cf0699',
     'DNSDomain': '1.0-7b0b2dab778454b6a7b6c66afe163a1a',
     'DNSDomainList': '1.0-4ee0d9efdfd681fed822da88376e04d2',
     'Destination': '1.0-4c59dd1288b2e7adbda6051a2de59183',
@@ -1158,7 +1158,7 @@ object_data = {
     'SecurityGroupRule': '1.1-ae1da17b79970012e8536f88cb3c6b29',
     'SecurityGroupRuleList': '1.2-0005c47fcd0fb78dd6d7fd32a1409f5b',
     'Service': '1.20-0f9c0bf701e68640b78638fd09e2cddc',
-    'ServiceList': '1.19-5325bce13eebcbf22edc9678285270cc',
+    'ServiceList': '1.20-42cc81467fc271fbf5705638cf04696f',
     'TaskLog': '1.0-78b0534366f29aa3eebb01860fbe18fe',
     'TaskLogList': '1.0-cc8cce1af8a283b9d28b55fcd682e777',
     'Tag': '1.1-8b8d7d5b48887651a0e01241672e2963',
@@ -221,6 +221,15 @@ class _TestServiceObject(object):
                                          'fake-binary',
                                          include_disabled=True)
 
+    @mock.patch('nova.db.service_get_all_by_binary_changed_since')
+    def test_get_by_binary_changed_since(self, mock_get):
+        mock_get.return_value = [fake_service]
+        since = timeutils.utcnow().replace(microsecond=0)
+        services = service.ServiceList.get_by_binary_changed_since(
+            self.context, 'fake-binary', since)
+        self.assertEqual(1, len(services))
+        mock_get.assert_called_once_with(self.context, 'fake-binary', since)
+
     def test_get_by_host(self):
         self.mox.StubOutWithMock(db, 'service_get_all_by_host')
         db.service_get_all_by_host(self.context, 'fake-host').AndReturn(
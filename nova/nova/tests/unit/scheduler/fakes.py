@@ -21,6 +21,7 @@ import datetime
 from nova import objects
 from nova.scheduler import driver
 from nova.scheduler import host_manager
+from nova.scheduler import weights
 from nova.tests import uuidsentinel
 
 NUMA_TOPOLOGY = objects.NUMATopology(
@@ -165,6 +166,15 @@ class FakeHostState(host_manager.HostState):
             setattr(self, key, val)
 
 
+class FakeRAMWeigher(weights.BaseHostWeigher):
+    """Weighs hosts by their free RAM like RAMWeigher, but leaves minval
+    unset, so that both ends of the normalization follow the hosts weighed.
+    """
+
+    def _weigh_object(self, host_state, weight_properties):
+        return host_state.free_ram_mb
+
+
 class FakeScheduler(driver.Scheduler):
 
     def select_destinations(self, context, request_spec, filter_properties):
@@ -16,8 +16,11 @@
 Tests For Filter Scheduler.
 """
 
+import random
+
 import mock
 
+from nova import context
 from nova import exception
 from nova import objects
 from nova.scheduler import filter_scheduler
@@ -34,6 +37,21 @@ def fake_get_filtered_hosts(hosts, filter_properties, index):
     return list(hosts)
 
 
+def _make_hosts(count, seed=42):
+    rand = random.Random(seed)
+    return [fakes.FakeHostState('host%d' % i, 'node%d' % i, {
+        'total_usable_ram_mb': 8192,
+        'free_ram_mb': rand.randint(0, 8192),
+        'ram_allocation_ratio': 1.0,
+        'free_disk_mb': rand.randint(0, 102400),
+        'vcpus_total': 8,
+        'vcpus_used': rand.randint(0, 8),
+        'cpu_allocation_ratio': 1.0,
+        'num_instances': rand.randint(0, 40),
+        'num_io_ops': rand.randint(0, 8),
+    }) for i in range(count)]
+
+
 class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
     """Test case for Filter Scheduler."""
 
@@ -391,3 +409,213 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         expected_resources = {'VCPU': 1,
                               'MEMORY_MB': 1024}
         self._test_get_resources_per_request_spec(flavor, expected_resources)
+
+
+class FilterSchedulerBatchTestCase(test.NoDBTestCase):
+    """Test case for the batch placement of the Filter Scheduler."""
+
+    def setUp(self):
+        super(FilterSchedulerBatchTestCase, self).setUp()
+        self.context = context.RequestContext('fake_user', 'fake_project')
+        self.flags(enabled_filters=['RamFilter', 'CoreFilter',
+                                    'NumInstancesFilter',
+                                    'ServerGroupAntiAffinityFilter'],
+                   weight_classes=['nova.scheduler.weights.ram.RAMWeigher',
+                                   'nova.scheduler.weights.disk.DiskWeigher',
+                                   'nova.scheduler.weights.io_ops.'
+                                   'IoOpsWeigher'],
+                   io_ops_weight_multiplier=-1.0,
+                   group='filter_scheduler')
+
+    @mock.patch.object(host_manager.HostManager, '_init_instance_info')
+    @mock.patch.object(host_manager.HostManager, '_init_aggregates')
+    def _get_driver(self, mock_init_agg, mock_init_inst):
+        return filter_scheduler.FilterScheduler()
+
+    def _get_spec_obj(self, num_instances, policies=None):
+        instance_group = None
+        if policies is not None:
+            instance_group = objects.InstanceGroup(policies=policies,
+                                                   hosts=[], members=[])
+        return objects.RequestSpec(
+            num_instances=num_instances,
+            instance_uuid=uuids.instance,
+            flavor=objects.Flavor(memory_mb=1024,
+                                  root_gb=10,
+                                  ephemeral_gb=0,
+                                  swap=0,
+                                  vcpus=2),
+            pci_requests=None,
+            numa_topology=None,
+            instance_group=instance_group,
+            ignore_hosts=[],
+            force_hosts=[],
+            force_nodes=[],
+            requested_destination=None)
+
+    def _schedule(self, batch, hosts, spec_obj, driver=None):
+        self.flags(batch_placement=batch, group='filter_scheduler')
+        driver = driver or self._get_driver()
+        choice = random.Random(7).choice
+        with test.nested(
+                mock.patch.object(driver, '_get_all_host_states',
+                                  return_value=iter(hosts)),
+                mock.patch.object(filter_scheduler.random, 'choice',
+                                  side_effect=choice)):
+            selected = driver._schedule(self.context, spec_obj)
+        return [(weighed.obj.nodename, weighed.weight)
+                for weighed in selected]
+
+    def _assert_same_hosts(self, num_instances, host_count=100,
+                           policies=None):
+        expected = self._schedule(False, _make_hosts(host_count),
+                                  self._get_spec_obj(num_instances, policies))
+        result = self._schedule(True, _make_hosts(host_count),
+                                self._get_spec_obj(num_instances, policies))
+        self.assertEqual(expected, result)
+        return result
+
+    def test_same_hosts(self):
+        self.flags(host_subset_size=1, group='filter_scheduler')
+        result = self._assert_same_hosts(40)
+        self.assertEqual(40, len(result))
+
+    def test_same_hosts_host_subset(self):
+        self.flags(host_subset_size=3, group='filter_scheduler')
+        result = self._assert_same_hosts(40)
+        self.assertEqual(40, len(result))
+
+    def test_same_hosts_anti_affinity(self):
+        result = self._assert_same_hosts(20, policies=['anti-affinity'])
+        self.assertEqual(20, len(result))
+        self.assertEqual(20, len(set(nodename for nodename, _ in result)))
+
+    def test_same_hosts_not_enough_hosts(self):
+        result = self._assert_same_hosts(50, host_count=10)
+        self.assertGreater(50, len(result))
+
+    def test_same_hosts_forced_host(self):
+        hosts = _make_hosts(10)
+        spec_obj = self._get_spec_obj(5)
+        spec_obj.force_hosts = ['host3']
+        expected = self._schedule(False, hosts, spec_obj)
+        hosts = _make_hosts(10)
+        spec_obj = self._get_spec_obj(5)
+        spec_obj.force_hosts = ['host3']
+        result = self._schedule(True, hosts, spec_obj)
+        self.assertEqual(expected, result)
+        self.assertEqual(['node3'] * 5, [nodename for nodename, _ in result])
+
+    def test_weighs_all_hosts_once(self):
+        self.flags(weight_classes=['nova.scheduler.weights.ram.RAMWeigher'],
+                   group='filter_scheduler')
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i, {
+            'total_usable_ram_mb': 8192,
+            'free_ram_mb': 2048 * (i + 1),
+            'ram_allocation_ratio': 1.0,
+            'vcpus_total': 8,
+            'vcpus_used': 0,
+            'cpu_allocation_ratio': 1.0,
+        }) for i in range(4)]
+        driver = self._get_driver()
+        with mock.patch.object(
+                driver.host_manager, 'get_weighed_hosts',
+                wraps=driver.host_manager.get_weighed_hosts) as weigh:
+            result = self._schedule(True, hosts, self._get_spec_obj(3),
+                                    driver=driver)
+        self.assertEqual(1, weigh.call_count)
+        self.assertEqual(['node3', 'node3', 'node2'],
+                         [nodename for nodename, _ in result])
+
+    def test_weighs_all_hosts_when_normalization_changes(self):
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i, {
+            'total_usable_ram_mb': 8192,
+            'free_ram_mb': 1536 + 512 * i,
+            'ram_allocation_ratio': 1.0,
+            'vcpus_total': 8,
+            'vcpus_used': 0,
+            'cpu_allocation_ratio': 1.0,
+        }) for i in range(2)]
+        driver = self._get_driver()
+        driver.host_manager.weighers = [fakes.FakeRAMWeigher()]
+        with mock.patch.object(
+                driver.host_manager, 'get_weighed_hosts',
+                wraps=driver.host_manager.get_weighed_hosts) as weigh:
+            result = self._schedule(True, hosts, self._get_spec_obj(2),
+                                    driver=driver)
+        # The second host goes below the lowest free RAM seen so far
+        self.assertEqual(2, weigh.call_count)
+        self.assertEqual([('node1', 1.0), ('node0', 0.5)], result)
+
+    def test_batch_not_used_for_one_instance(self):
+        self.flags(batch_placement=True, group='filter_scheduler')
+        driver = self._get_driver()
+        with test.nested(
+                mock.patch.object(driver, '_get_all_host_states',
+                                  return_value=iter(_make_hosts(10))),
+                mock.patch.object(driver, '_schedule_batch')
+        ) as (mock_get_hosts, mock_batch):
+            result = driver._schedule(self.context, self._get_spec_obj(1))
+        self.assertFalse(mock_batch.called)
+        self.assertEqual(1, len(result))
+
+    def test_weighs_hosts_separately(self):
+        class FakeWeigher(weights.BaseHostWeigher):
+            def _weigh_object(self, host_state, weight_properties):
+                return 0
+
+        class FakeGroupWeigher(FakeWeigher):
+            depends_on_placements = True
+
+        class FakeAllHostsWeigher(FakeWeigher):
+            def weigh_objects(self, weighed_obj_list, weight_properties):
+                return [len(weighed_obj_list)] * len(weighed_obj_list)
+
+        driver_cls = filter_scheduler.FilterScheduler
+        self.assertTrue(driver_cls._weighs_hosts_separately(FakeWeigher()))
+        self.assertFalse(
+            driver_cls._weighs_hosts_separately(FakeGroupWeigher()))
+        self.assertFalse(
+            driver_cls._weighs_hosts_separately(FakeAllHostsWeigher()))
+
+
+class WeighedHostQueueTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(WeighedHostQueueTestCase, self).setUp()
+        self.hosts = _make_hosts(4)
+        self.positions = {id(host): i for i, host in enumerate(self.hosts)}
+
+    def _get_queue(self, host_weights):
+        return filter_scheduler.WeighedHostQueue(
+            [weights.WeighedHost(host, weight)
+             for host, weight in zip(self.hosts, host_weights)],
+            self.positions)
+
+    def _best(self, queue, count):
+        return [weighed.obj.host for weighed in queue.best(count)]
+
+    def test_best(self):
+        queue = self._get_queue([1.0, 3.0, 2.0, 0.0])
+        self.assertEqual(['host1', 'host2'], self._best(queue, 2))
+        self.assertEqual(['host1', 'host2', 'host0', 'host3'],
+                         self._best(queue, 10))
+
+    def test_ties_in_original_order(self):
+        queue = self._get_queue([1.0, 2.0, 1.0, 2.0])
+        self.assertEqual(['host1', 'host3', 'host0', 'host2'],
+                         self._best(queue, 4))
+
+    def test_push_replaces_host(self):
+        queue = self._get_queue([1.0, 3.0, 2.0, 0.0])
+        queue.push(weights.WeighedHost(self.hosts[1], 0.0))
+        self.assertEqual(4, len(queue))
+        self.assertEqual(['host2', 'host0', 'host1', 'host3'],
+                         self._best(queue, 4))
+
+    def test_remove(self):
+        queue = self._get_queue([1.0, 3.0, 2.0, 0.0])
+        queue.remove(self.hosts[1])
+        queue.remove(self.hosts[1])
+        self.assertEqual(3, len(queue))
+        self.assertEqual(['host2', 'host0', 'host3'], self._best(queue, 4))
@@ -21,6 +21,7 @@ import datetime
 
 import mock
 from oslo_serialization import jsonutils
+from oslo_utils import fixture as utils_fixture
 from oslo_utils import versionutils
 import six
 
@@ -984,6 +985,171 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         self.assertEqual(len(host_states_map), 0)
 
 
+class HostManagerIncrementalRefreshTestCase(test.NoDBTestCase):
+    """Test case for the incremental refresh of the HostManager."""
+
+    @mock.patch.object(host_manager.HostManager, '_init_instance_info')
+    @mock.patch.object(host_manager.HostManager, '_init_aggregates')
+    def setUp(self, mock_init_agg, mock_init_inst):
+        super(HostManagerIncrementalRefreshTestCase, self).setUp()
+        self.flags(incremental_host_state_refresh=True,
+                   host_state_full_refresh_interval=600,
+                   group='filter_scheduler')
+        self.host_manager = host_manager.HostManager()
+        self.time_fixture = self.useFixture(utils_fixture.TimeFixture(
+            datetime.datetime(2017, 1, 1, 12, 0, 0)))
+        self.compute_nodes = []
+        for cn in fakes.COMPUTE_NODES[:4]:
+            cn = cn.obj_clone()
+            cn.uuid = getattr(uuids, cn.hypervisor_hostname)
+            self.compute_nodes.append(cn)
+        self.services = []
+        for i, service in enumerate(fakes.SERVICES):
+            service = service.obj_clone()
+            service.id = i + 1
+            self.services.append(service)
+
+        patcher = mock.patch('nova.objects.InstanceList.get_by_host',
+                             return_value=objects.InstanceList())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('nova.objects.ComputeNodeList.get_all',
+                             return_value=self.compute_nodes)
+        self.mock_cn_get_all = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('nova.objects.ServiceList.get_by_binary',
+                             return_value=self.services)
+        self.mock_sl_get_by_binary = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            'nova.objects.ComputeNodeList.get_all_changed_since',
+            return_value=[])
+        self.mock_cn_changed = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            'nova.objects.ServiceList.get_by_binary_changed_since',
+            return_value=[])
+        self.mock_sl_changed = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _changed_compute_node(self, index, deleted=False, **updates):
+        cn = self.compute_nodes[index].obj_clone()
+        cn.deleted = deleted
+        for key, value in updates.items():
+            setattr(cn, key, value)
+        return cn
+
+    def test_first_refresh_is_full(self):
+        self.host_manager.get_all_host_states('fake_context')
+        self.assertEqual(1, self.mock_cn_get_all.call_count)
+        self.assertEqual(1, self.mock_sl_get_by_binary.call_count)
+        self.assertFalse(self.mock_cn_changed.called)
+        self.assertEqual(4, len(self.host_manager.host_state_map))
+
+    def test_later_refresh_loads_changes_only(self):
+        self.host_manager.get_all_host_states('fake_context')
+        self.time_fixture.advance_time_seconds(30)
+        self.host_manager.get_all_host_states('fake_context')
+
+        self.assertEqual(1, self.mock_cn_get_all.call_count)
+        self.assertEqual(1, self.mock_sl_get_by_binary.call_count)
+        since = datetime.datetime(2017, 1, 1, 11, 59, 55)
+        self.mock_cn_changed.assert_called_once_with('fake_context', since)
+        self.mock_sl_changed.assert_called_once_with(
+            'fake_context', 'nova-compute', since)
+        self.assertEqual(4, len(self.host_manager.host_state_map))
+
+    def test_refresh_merges_changes(self):
+        self.host_manager.get_all_host_states('fake_context')
+        self.mock_cn_changed.return_value = [
+            self._changed_compute_node(0, free_ram_mb=256),
+            self._changed_compute_node(3, deleted=True)]
+
+        self.host_manager.get_all_host_states('fake_context')
+
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(set([('host1', 'node1'), ('host2', 'node2'),
+                              ('host3', 'node3')]),
+                         set(host_states_map.keys()))
+        self.assertEqual(256, host_states_map[('host1', 'node1')].free_ram_mb)
+        stats = self.host_manager.get_host_state_cache_stats()
+        cell_stats = list(stats.values())[0]
+        self.assertEqual(3, cell_stats['compute_nodes'])
+        self.assertEqual(2, cell_stats['changed_compute_nodes'])
+        self.assertEqual(0, cell_stats['changed_services'])
+
+    def test_refresh_removes_deleted_service(self):
+        self.host_manager.get_all_host_states('fake_context')
+        deleted = self.services[1].obj_clone()
+        deleted.deleted = True
+        self.mock_sl_changed.return_value = [deleted]
+
+        self.host_manager.get_all_host_states('fake_context')
+
+        self.assertNotIn(('host2', 'node2'), self.host_manager.host_state_map)
+        self.assertEqual(3, len(self.host_manager.host_state_map))
+
+    def test_refresh_keeps_recreated_service(self):
+        self.host_manager.get_all_host_states('fake_context')
+        deleted = self.services[1].obj_clone()
+        deleted.deleted = True
+        recreated = objects.Service(id=10, host='host2', disabled=True,
+                                    deleted=False)
+        self.mock_sl_changed.return_value = [recreated, deleted]
+
+        self.host_manager.get_all_host_states('fake_context')
+
+        self.assertIn(('host2', 'node2'), self.host_manager.host_state_map)
+        host_state = self.host_manager.host_state_map[('host2', 'node2')]
+        self.assertEqual(10, host_state.service['id'])
+
+    def test_unchanged_host_states_not_updated_from_compute(self):
+        self.host_manager.get_all_host_states('fake_context')
+        self.mock_cn_changed.return_value = [
+            self._changed_compute_node(0, free_ram_mb=256)]
+
+        with mock.patch.object(host_manager.HostState, 'update') as update:
+            list(self.host_manager.get_all_host_states('fake_context'))
+
+        self.assertEqual(4, update.call_count)
+        updated = [call[0][0] for call in update.call_args_list
+                   if call[0][0] is not None]
+        self.assertEqual(1, len(updated))
+        self.assertEqual('node1', updated[0].hypervisor_hostname)
+
+    def test_full_refresh_interval(self):
+        self.host_manager.get_all_host_states('fake_context')
+        self.time_fixture.advance_time_seconds(599)
+        self.host_manager.get_all_host_states('fake_context')
+        self.assertEqual(1, self.mock_cn_get_all.call_count)
+
+        self.time_fixture.advance_time_seconds(2)
+        self.host_manager.get_all_host_states('fake_context')
+        self.assertEqual(2, self.mock_cn_get_all.call_count)
+        self.assertEqual(2, self.mock_sl_get_by_binary.call_count)
+        self.assertEqual(1, self.mock_cn_changed.call_count)
+
+    def test_get_host_states_by_uuids_keeps_other_nodes(self):
+        self.host_manager.get_all_host_states('fake_context')
+
+        host_states = list(self.host_manager.get_host_states_by_uuids(
+            'fake_context', [uuids.node1, uuids.node3]))
+
+        self.assertEqual(['node1', 'node3'],
+                         sorted([hs.nodename for hs in host_states]))
+        self.assertEqual(4, len(self.host_manager.host_state_map))
+
+    def test_cell_host_cache_merge_ignores_stale_deleted_record(self):
+        cache = host_manager.CellHostCache()
+        cache.replace([], self.services)
+        stale = objects.Service(id=20, host='host1', disabled=False,
+                                deleted=True)
+
+        cache.merge([], [stale])
+
+        self.assertIs(self.services[0], cache.services['host1'])
+
+
 class HostStateTestCase(test.NoDBTestCase):
     """Test case for HostState class."""
 
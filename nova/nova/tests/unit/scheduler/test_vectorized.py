@@ -0,0 +1,279 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the vectorized scheduler filters and weighers.
+"""
+
+import random
+
+import mock
+
+from nova import objects
+from nova.scheduler import filters
+from nova.scheduler.filters import availability_zone_filter
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import num_instances_filter
+from nova.scheduler.filters import ram_filter
+from nova.scheduler import host_manager
+from nova.scheduler import vectorized
+from nova.scheduler import weights
+from nova.scheduler.weights import affinity
+from nova.scheduler.weights import disk
+from nova.scheduler.weights import io_ops
+from nova.scheduler.weights import ram
+from nova import test
+from nova.tests.unit.scheduler import fakes
+
+
+def _make_hosts(count, seed=42):
+    rand = random.Random(seed)
+    az1 = objects.Aggregate(id=1, metadata={'availability_zone': 'az1'})
+    az2 = objects.Aggregate(id=2, metadata={'availability_zone': 'az2'})
+    other = objects.Aggregate(id=3, metadata={'foo': 'bar'})
+    hosts = []
+    for i in range(count):
+        total_ram = rand.choice([512, 2048, 8192])
+        total_disk = rand.choice([10, 100, 1000])
+        vcpus = rand.choice([0, 2, 8])
+        hosts.append(fakes.FakeHostState('host%d' % i, 'node%d' % i, {
+            'total_usable_ram_mb': total_ram,
+            'free_ram_mb': rand.randint(-total_ram, total_ram),
+            'ram_allocation_ratio': rand.choice([1.0, 1.5]),
+            'total_usable_disk_gb': total_disk,
+            'free_disk_mb': rand.randint(-1024, total_disk * 1024),
+            'disk_allocation_ratio': rand.choice([1.0, 2.0]),
+            'vcpus_total': vcpus,
+            'vcpus_used': rand.randint(0, 16),
+            'cpu_allocation_ratio': rand.choice([1.0, 16.0]),
+            'num_instances': rand.randint(0, 60),
+            'num_io_ops': rand.randint(0, 10),
+            'aggregates': rand.choice([[], [az1], [az2], [az1, other]]),
+        }))
+    return hosts
+
+
+class VectorizedFiltersTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(VectorizedFiltersTestCase, self).setUp()
+        self.spec_obj = objects.RequestSpec(
+            availability_zone='az1',
+            flavor=objects.Flavor(memory_mb=1024, vcpus=4, root_gb=20,
+                                  ephemeral_gb=10, swap=512))
+
+    def _assert_same_outcome(self, filter_):
+        hosts = _make_hosts(200)
+        expected = [host for host in hosts
+                    if filter_.host_passes(host, self.spec_obj)]
+        expected_limits = [dict(host.limits) for host in hosts]
+
+        vectorized_hosts = _make_hosts(200)
+        columns = vectorized.HostStateColumns(vectorized_hosts)
+        result = list(filter_.with_columns(columns).filter_all(
+            vectorized_hosts, self.spec_obj))
+
+        self.assertEqual([host.nodename for host in expected],
+                         [host.nodename for host in result])
+        self.assertEqual(expected_limits,
+                         [host.limits for host in vectorized_hosts])
+        # Some hosts pass and some fail, so that both are checked
+        self.assertTrue(0 < len(expected) < len(hosts))
+
+    def test_ram_filter(self):
+        self._assert_same_outcome(ram_filter.RamFilter())
+
+    def test_core_filter(self):
+        self._assert_same_outcome(core_filter.CoreFilter())
+
+    def test_disk_filter(self):
+        self._assert_same_outcome(disk_filter.DiskFilter())
+
+    def test_num_instances_filter(self):
+        self._assert_same_outcome(num_instances_filter.NumInstancesFilter())
+
+    def test_io_ops_filter(self):
+        self.flags(max_io_ops_per_host=5, group='filter_scheduler')
+        self._assert_same_outcome(io_ops_filter.IoOpsFilter())
+
+    def test_availability_zone_filter(self):
+        self._assert_same_outcome(
+            availability_zone_filter.AvailabilityZoneFilter())
+
+    def test_aggregate_filters_not_vectorized(self):
+        self.assertFalse(ram_filter.AggregateRamFilter.vectorized)
+        self.assertFalse(core_filter.AggregateCoreFilter.vectorized)
+        self.assertFalse(disk_filter.AggregateDiskFilter.vectorized)
+        self.assertFalse(
+            num_instances_filter.AggregateNumInstancesFilter.vectorized)
+        self.assertFalse(io_ops_filter.AggregateIoOpsFilter.vectorized)
+
+    def test_with_columns_does_not_change_filter(self):
+        filter_ = ram_filter.RamFilter()
+        columns = vectorized.HostStateColumns([])
+        self.assertIs(columns, filter_.with_columns(columns).columns)
+        self.assertIsNone(filter_.columns)
+
+    def test_filter_on_subset_of_columns(self):
+        hosts = _make_hosts(50)
+        columns = vectorized.HostStateColumns(hosts)
+        subset = hosts[::-3]
+        filter_ = num_instances_filter.NumInstancesFilter()
+        result = list(filter_.with_columns(columns).filter_all(
+            subset, self.spec_obj))
+        self.assertEqual([host for host in subset
+                          if filter_.host_passes(host, self.spec_obj)],
+                         result)
+
+    def test_handler_mixes_vectorized_and_per_host_filters(self):
+        hosts = _make_hosts(100)
+        handler = filters.HostFilterHandler()
+        per_host_filter = ram_filter.AggregateRamFilter()
+        vectorized_filter = num_instances_filter.NumInstancesFilter()
+        expected = handler.get_filtered_objects(
+            [per_host_filter, vectorized_filter], hosts, self.spec_obj)
+
+        with mock.patch.object(vectorized_filter, 'host_passes') as passes:
+            result = handler.get_filtered_objects(
+                [per_host_filter, vectorized_filter], hosts, self.spec_obj,
+                columns=vectorized.HostStateColumns(hosts))
+            self.assertFalse(passes.called)
+
+        self.assertEqual(expected, result)
+
+
+class VectorizedWeighersTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(VectorizedWeighersTestCase, self).setUp()
+        self.weight_handler = weights.HostWeightHandler()
+        self.spec_obj = objects.RequestSpec(instance_group=None)
+
+    def _weigh(self, weighers, hosts, columns=None):
+        kwargs = {}
+        if columns is not None:
+            kwargs['columns'] = columns
+        return [(weighed.obj.nodename, weighed.weight)
+                for weighed in self.weight_handler.get_weighed_objects(
+                    weighers, hosts, self.spec_obj, **kwargs)]
+
+    def test_same_weights(self):
+        self.flags(ram_weight_multiplier=1.0, disk_weight_multiplier=2.0,
+                   io_ops_weight_multiplier=-1.0, group='filter_scheduler')
+        hosts = _make_hosts(200)
+        expected = self._weigh(
+            [ram.RAMWeigher(), disk.DiskWeigher(), io_ops.IoOpsWeigher()],
+            hosts)
+
+        result = self._weigh(
+            [ram.RAMWeigher(), disk.DiskWeigher(), io_ops.IoOpsWeigher()],
+            hosts, vectorized.HostStateColumns(hosts))
+
+        self.assertEqual(expected, result)
+
+    def test_same_weights_with_per_host_weigher(self):
+        hosts = _make_hosts(50)
+        expected = self._weigh(
+            [ram.RAMWeigher(), affinity.ServerGroupSoftAffinityWeigher()],
+            hosts)
+
+        result = self._weigh(
+            [ram.RAMWeigher(), affinity.ServerGroupSoftAffinityWeigher()],
+            hosts, vectorized.HostStateColumns(hosts))
+
+        self.assertEqual(expected, result)
+
+    def test_weigh_columns_records_min_and_max(self):
+        hosts = _make_hosts(20)
+        weigher = io_ops.IoOpsWeigher()
+        weigher.maxval = 1000
+        columns = vectorized.HostStateColumns(hosts)
+        weigher.weigh_columns(columns.view(hosts), self.spec_obj)
+        self.assertEqual(0, weigher.minval)
+        self.assertEqual(1000, weigher.maxval)
+
+    def test_single_host(self):
+        hosts = _make_hosts(1)
+        result = self.weight_handler.get_weighed_objects(
+            [ram.RAMWeigher()], hosts, self.spec_obj,
+            columns=vectorized.HostStateColumns(hosts))
+        self.assertEqual([(hosts[0], 0.0)],
+                         [(weighed.obj, weighed.weight)
+                          for weighed in result])
+
+
+class HostStateColumnsTestCase(test.NoDBTestCase):
+
+    def test_column_built_once(self):
+        hosts = _make_hosts(10)
+        columns = vectorized.HostStateColumns(hosts)
+        first = columns.column('free_ram_mb')
+        hosts[0].free_ram_mb += 1
+        self.assertIs(first, columns.column('free_ram_mb'))
+
+    def test_missing_values(self):
+        hosts = _make_hosts(3)
+        hosts[1].vcpus_total = None
+        view = vectorized.HostStateColumns(hosts).view(hosts)
+        self.assertEqual([False, True, False],
+                         view.missing('vcpus_total').tolist())
+
+    def test_normalize(self):
+        self.assertEqual([0.0, 0.5, 1.0], vectorized.normalize(
+            vectorized.numpy.array([1.0, 2.0, 3.0])).tolist())
+        self.assertEqual([0.0, 0.0], vectorized.normalize(
+            vectorized.numpy.array([2.0, 2.0])).tolist())
+        self.assertEqual([0.25, 0.5], vectorized.normalize(
+            vectorized.numpy.array([1.0, 2.0]), minval=0, maxval=4).tolist())
+
+
+class HostManagerVectorizedTestCase(test.NoDBTestCase):
+
+    @mock.patch.object(host_manager.HostManager, '_init_instance_info')
+    @mock.patch.object(host_manager.HostManager, '_init_aggregates')
+    def _get_host_manager(self, mock_init_agg, mock_init_inst):
+        return host_manager.HostManager()
+
+    def test_vectorized_filtering_and_weighing(self):
+        self.flags(vectorized_filtering_and_weighing=True,
+                   enabled_filters=['RamFilter', 'CoreFilter',
+                                    'NumInstancesFilter'],
+                   group='filter_scheduler')
+        host_mgr = self._get_host_manager()
+        spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(memory_mb=1024, vcpus=4),
+            ignore_hosts=[], force_hosts=[], force_nodes=[],
+            requested_destination=None, instance_group=None)
+        self.flags(vectorized_filtering_and_weighing=False,
+                   group='filter_scheduler')
+        ref_mgr = self._get_host_manager()
+
+        hosts = ref_mgr.get_filtered_hosts(_make_hosts(100), spec_obj)
+        expected = [(weighed.obj.nodename, weighed.weight)
+                    for weighed in ref_mgr.get_weighed_hosts(hosts, spec_obj)]
+        hosts = host_mgr.get_filtered_hosts(iter(_make_hosts(100)), spec_obj)
+        result = [(weighed.obj.nodename, weighed.weight)
+                  for weighed in host_mgr.get_weighed_hosts(hosts, spec_obj)]
+
+        self.assertTrue(host_mgr.vectorized)
+        self.assertFalse(ref_mgr.vectorized)
+        self.assertEqual(expected, result)
+
+    @mock.patch.object(vectorized, 'numpy', None)
+    def test_vectorized_without_numpy(self):
+        self.flags(vectorized_filtering_and_weighing=True,
+                   group='filter_scheduler')
+        with mock.patch.object(host_manager.LOG, 'warning') as warning:
+            host_mgr = self._get_host_manager()
+        self.assertFalse(host_mgr.vectorized)
+        self.assertTrue(warning.called)
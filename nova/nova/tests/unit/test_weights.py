@@ -72,3 +72,34 @@ class TestWeigher(test.NoDBTestCase):
         self.assertEqual(1, len(weighed_host))
         self.assertEqual('host1', weighed_host[0].obj.host)
         self.assertFalse(mock_weigh.called)
+
+    def _weigh_hosts(self, free_ram):
+        hostinfo = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                        {'free_ram_mb': ram_mb})
+                    for i, ram_mb in enumerate(free_ram)]
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weighers = [fakes.FakeRAMWeigher()]
+        weighed_hosts = weight_handler.get_weighed_objects(weighers,
+                                                           hostinfo, {})
+        return weight_handler, weighers, weighed_hosts
+
+    def test_weigh_object(self):
+        weight_handler, weighers, weighed_hosts = self._weigh_hosts(
+            [512, 1024, 2048])
+        self.assertEqual(1.0, weighed_hosts[0].weight)
+
+        weighed_hosts[0].obj.free_ram_mb = 1536
+        self.assertTrue(weight_handler.weigh_object(
+            weighers, weighed_hosts[0], {}))
+        self.assertEqual(2048, weighers[0].maxval)
+        self.assertAlmostEqual(2.0 / 3, weighed_hosts[0].weight)
+
+    def test_weigh_object_changes_normalization(self):
+        weight_handler, weighers, weighed_hosts = self._weigh_hosts(
+            [512, 1024, 2048])
+
+        weighed_hosts[0].obj.free_ram_mb = 256
+        self.assertFalse(weight_handler.weigh_object(
+            weighers, weighed_hosts[0], {}))
+        self.assertEqual(256, weighers[0].minval)
+        self.assertEqual(0.0, weighed_hosts[0].weight)
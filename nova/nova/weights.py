@@ -141,3 +141,31 @@ class BaseWeightHandler(loadables.BaseLoader):
                 obj.weight += weigher.weight_multiplier() * weight
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
+    def weigh_object(self, weighers, weighed_obj, weighing_properties):
+        """Weigh again one of the WeighedObjects returned by
+        get_weighed_objects(), after its object changed.
+
+        The weighers must weigh each object on its own, without looking at
+        the other objects. Return False if the minval or maxval of a weigher
+        changed, since the normalized weights of all the objects then changed
+        and they all have to be weighed again.
+        """
+        unchanged = True
+        weighed_obj.weight = 0.0
+        for weigher in weighers:
+            minval, maxval = weigher.minval, weigher.maxval
+            weights = weigher.weigh_objects([weighed_obj],
+                                            weighing_properties)
+            if weigher.minval != minval or weigher.maxval != maxval:
+                unchanged = False
+
+            # Normalize the weights
+            weights = normalize(weights,
+                                minval=weigher.minval,
+                                maxval=weigher.maxval)
+
+            for weight in weights:
+                weighed_obj.weight += weigher.weight_multiplier() * weight
+
+        return unchanged
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the per host and the vectorized scheduler filters and weighers.
+
+Filters and weighs a set of synthetic HostStates with the RamFilter,
+CoreFilter, DiskFilter, NumInstancesFilter, IoOpsFilter and
+AvailabilityZoneFilter filters and the RAMWeigher, DiskWeigher and
+IoOpsWeigher weighers, once one host at a time and once vectorized, and
+prints the time taken by each. NumPy must be installed.
+
+Example::
+
+    python tools/scheduler_filter_benchmark.py --hosts 10000 --requests 20
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from nova import config
+from nova import objects
+from nova.scheduler import filters
+from nova.scheduler.filters import availability_zone_filter
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import num_instances_filter
+from nova.scheduler.filters import ram_filter
+from nova.scheduler import host_manager
+from nova.scheduler import vectorized
+from nova.scheduler import weights
+from nova.scheduler.weights import disk
+from nova.scheduler.weights import io_ops
+from nova.scheduler.weights import ram
+
+
+def make_hosts(count):
+    aggregates = [
+        objects.Aggregate(id=i, metadata={'availability_zone': 'az%d' % i})
+        for i in range(4)]
+    hosts = []
+    for i in range(count):
+        host = host_manager.HostState('host%d' % i, 'node%d' % i)
+        host.total_usable_ram_mb = random.choice([65536, 131072, 262144])
+        host.free_ram_mb = random.randint(0, host.total_usable_ram_mb)
+        host.ram_allocation_ratio = 1.5
+        host.total_usable_disk_gb = random.choice([1024, 2048, 4096])
+        host.free_disk_mb = random.randint(
+            0, host.total_usable_disk_gb * 1024)
+        host.disk_allocation_ratio = 1.0
+        host.vcpus_total = random.choice([16, 32, 64])
+        host.vcpus_used = random.randint(0, host.vcpus_total * 2)
+        host.cpu_allocation_ratio = 16.0
+        host.num_instances = random.randint(0, 60)
+        host.num_io_ops = random.randint(0, 10)
+        host.aggregates = [random.choice(aggregates)]
+        hosts.append(host)
+    return hosts
+
+
+def run(hosts, spec_obj, requests, vectorize):
+    filter_handler = filters.HostFilterHandler()
+    weight_handler = weights.HostWeightHandler()
+    host_filters = [ram_filter.RamFilter(), core_filter.CoreFilter(),
+                    disk_filter.DiskFilter(),
+                    num_instances_filter.NumInstancesFilter(),
+                    io_ops_filter.IoOpsFilter(),
+                    availability_zone_filter.AvailabilityZoneFilter()]
+    weighers = [ram.RAMWeigher(), disk.DiskWeigher(), io_ops.IoOpsWeigher()]
+    filter_time = weigh_time = 0.0
+    for _ in range(requests):
+        kwargs = {}
+        start = time.time()
+        if vectorize:
+            kwargs['columns'] = vectorized.HostStateColumns(hosts)
+        passed = filter_handler.get_filtered_objects(
+            host_filters, hosts, spec_obj, **kwargs)
+        filter_time += time.time() - start
+
+        kwargs = {}
+        start = time.time()
+        if vectorize:
+            kwargs['columns'] = vectorized.HostStateColumns(passed)
+        weight_handler.get_weighed_objects(weighers, passed, spec_obj,
+                                           **kwargs)
+        weigh_time += time.time() - start
+    return len(passed), filter_time / requests, weigh_time / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hosts', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=10)
+    args = parser.parse_args()
+
+    if not vectorized.is_available():
+        parser.error('NumPy is not installed')
+
+    config.parse_args([], default_config_files=[], configure_db=False,
+                      init_rpc=False)
+    objects.register_all()
+    random.seed(0)
+    hosts = make_hosts(args.hosts)
+    spec_obj = objects.RequestSpec(
+        availability_zone='az1',
+        flavor=objects.Flavor(memory_mb=4096, vcpus=4, root_gb=40,
+                              ephemeral_gb=0, swap=0))
+
+    fmt = '%-10s %8s %12s %12s'
+    print(fmt % ('mode', 'passed', 'filter ms', 'weigh ms'))
+    results = {}
+    for vectorize in (False, True):
+        passed, filter_time, weigh_time = run(hosts, spec_obj, args.requests,
+                                              vectorize)
+        results[vectorize] = filter_time + weigh_time
+        print(fmt % ('vectorized' if vectorize else 'per host', passed,
+                     '%.1f' % (filter_time * 1000),
+                     '%.1f' % (weigh_time * 1000)))
+    print('vectorized is %.1fx as fast' % (
+        results[False] / max(results[True], 1e-6)))
+
+
+if __name__ == '__main__':
+    main()
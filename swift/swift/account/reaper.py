@@ -20,16 +20,19 @@ from swift import gettext_ as _
 from logging import DEBUG
 from math import sqrt
 from time import time
+from collections import deque
 from hashlib import md5
 import itertools
 
 from eventlet import GreenPool, sleep, Timeout
 import six
+from six.moves.urllib.parse import quote, unquote
 
 import swift.common.db
 from swift.account.backend import AccountBroker, DATADIR
 from swift.common.direct_client import direct_delete_container, \
-    direct_delete_object, direct_get_container
+    direct_delete_object, direct_get_container, direct_head_container, \
+    direct_post_container
 from swift.common.exceptions import ClientException
 from swift.common.ring import Ring
 from swift.common.ring.utils import is_local_device
@@ -38,6 +41,15 @@ from swift.common.utils import get_logger, whataremyips, ismount, \
 from swift.common.daemon import Daemon
 from swift.common.storage_policy import POLICIES, PolicyError
 
+CHECKPOINT_HEADER = 'X-Container-Sysmeta-Reaper-Checkpoint-%d'
+
+
+def get_shard(name, shard_count):
+    """
+    Returns the shard, out of shard_count, that reaps the given name.
+    """
+    return int(md5(name).hexdigest(), 16) % shard_count
+
 
 class AccountReaper(Daemon):
     """
@@ -78,6 +90,13 @@ class AccountReaper(Daemon):
         self.container_concurrency = self.object_concurrency = \
             sqrt(self.concurrency)
         self.container_pool = GreenPool(size=self.container_concurrency)
+        self.reap_by_page = config_true_value(
+            conf.get('reap_by_page', 'false'))
+        self.page_concurrency = int(conf.get('page_concurrency', 4))
+        self.page_size = int(conf.get('page_size', 10000))
+        if self.page_concurrency < 1 or self.page_size < 1:
+            raise ValueError(
+                'page_concurrency and page_size must be positive')
         swift.common.db.DB_PREALLOCATION = \
             config_true_value(conf.get('db_preallocation', 'f'))
         self.delay_reaping = int(conf.get('delay_reaping') or 0)
@@ -257,7 +276,7 @@ class AccountReaper(Daemon):
         self.logger.info(_('Beginning pass on account %s'), account)
         self.reset_stats()
         container_limit = 1000
-        if container_shard is not None:
+        if container_shard is not None and not self.reap_by_page:
             container_limit *= len(nodes)
         try:
             marker = ''
@@ -269,8 +288,15 @@ class AccountReaper(Daemon):
                     break
                 try:
                     for (container, _junk, _junk, _junk, _junk) in containers:
-                        this_shard = int(md5(container).hexdigest(), 16) % \
-                            len(nodes)
+                        if self.reap_by_page:
+                            # every shard reaps its share of the objects in
+                            # every container
+                            self.container_pool.spawn(
+                                self.reap_container, account, partition,
+                                nodes, container,
+                                container_shard=container_shard)
+                            continue
+                        this_shard = get_shard(container, len(nodes))
                         if container_shard not in (this_shard, None):
                             continue
 
@@ -320,7 +346,7 @@ class AccountReaper(Daemon):
         return True
 
     def reap_container(self, account, account_partition, account_nodes,
-                       container):
+                       container, container_shard=None):
         """
         Deletes the data and the container itself for the given container. This
         will call :func:`reap_object` up to sqrt(self.concurrency) times
@@ -351,61 +377,24 @@ class AccountReaper(Daemon):
                                   ring.
         :param account_nodes: The primary node dicts for the account.
         :param container: The name of the container to delete.
+        :param container_shard: int used to shard the objects reaped when
+                                reap_by_page is set. If None, will reap all
+                                objects.
 
         * See also: :func:`swift.common.ring.Ring.get_nodes` for a description
           of the account node dicts.
         """
         account_nodes = list(account_nodes)
         part, nodes = self.get_container_ring().get_nodes(account, container)
-        node = nodes[-1]
-        pool = GreenPool(size=self.object_concurrency)
-        marker = ''
-        while True:
-            objects = None
-            try:
-                headers, objects = direct_get_container(
-                    node, part, account, container,
-                    marker=marker,
-                    conn_timeout=self.conn_timeout,
-                    response_timeout=self.node_timeout)
-                self.stats_return_codes[2] = \
-                    self.stats_return_codes.get(2, 0) + 1
-                self.logger.increment('return_codes.2')
-            except ClientException as err:
-                if self.logger.getEffectiveLevel() <= DEBUG:
-                    self.logger.exception(
-                        _('Exception with %(ip)s:%(port)s/%(device)s'), node)
-                self.stats_return_codes[err.http_status // 100] = \
-                    self.stats_return_codes.get(err.http_status // 100, 0) + 1
-                self.logger.increment(
-                    'return_codes.%d' % (err.http_status // 100,))
-            except (Timeout, socket.error) as err:
-                self.logger.error(
-                    _('Timeout Exception with %(ip)s:%(port)s/%(device)s'),
-                    node)
-            if not objects:
-                break
-            try:
-                policy_index = headers.get('X-Backend-Storage-Policy-Index', 0)
-                policy = POLICIES.get_by_index(policy_index)
-                if not policy:
-                    self.logger.error('ERROR: invalid storage policy index: %r'
-                                      % policy_index)
-                for obj in objects:
-                    if isinstance(obj['name'], six.text_type):
-                        obj['name'] = obj['name'].encode('utf8')
-                    pool.spawn(self.reap_object, account, container, part,
-                               nodes, obj['name'], policy_index)
-                pool.waitall()
-            except (Exception, Timeout):
-                self.logger.exception(_('Exception with objects for container '
-                                        '%(container)s for account %(account)s'
-                                        ),
-                                      {'container': container,
-                                       'account': account})
-            marker = objects[-1]['name']
-            if marker == '':
-                break
+        if self.reap_by_page:
+            self.reap_container_pages(account, container, part, nodes,
+                                      len(account_nodes), container_shard)
+            if container_shard not in (
+                    get_shard(container, len(account_nodes)), None):
+                # the container itself is deleted by its own shard
+                return
+        else:
+            self.reap_container_objects(account, container, part, nodes)
         successes = 0
         failures = 0
         timestamp = Timestamp(time())
@@ -451,6 +440,221 @@ class AccountReaper(Daemon):
             self.stats_containers_possibly_remaining += 1
             self.logger.increment('containers_possibly_remaining')
 
+    def get_objects(self, node, part, account, container, marker='',
+                    limit=None):
+        """
+        Lists a page of the given container's objects from the given
+        container node, updating the return code stats.
+
+        :returns: a tuple of (response headers, list of objects), or
+                  (None, None) if the listing failed
+        """
+        try:
+            headers, objects = direct_get_container(
+                node, part, account, container,
+                marker=marker, limit=limit,
+                conn_timeout=self.conn_timeout,
+                response_timeout=self.node_timeout)
+            self.stats_return_codes[2] = \
+                self.stats_return_codes.get(2, 0) + 1
+            self.logger.increment('return_codes.2')
+        except ClientException as err:
+            if self.logger.getEffectiveLevel() <= DEBUG:
+                self.logger.exception(
+                    _('Exception with %(ip)s:%(port)s/%(device)s'), node)
+            self.stats_return_codes[err.http_status // 100] = \
+                self.stats_return_codes.get(err.http_status // 100, 0) + 1
+            self.logger.increment(
+                'return_codes.%d' % (err.http_status // 100,))
+            return None, None
+        except (Timeout, socket.error) as err:
+            self.logger.error(
+                _('Timeout Exception with %(ip)s:%(port)s/%(device)s'),
+                node)
+            return None, None
+        return headers, objects
+
+    def get_policy_index(self, headers):
+        """
+        Returns the storage policy index from a container listing's headers,
+        logging an error if it is not a valid one.
+        """
+        policy_index = headers.get('X-Backend-Storage-Policy-Index', 0)
+        policy = POLICIES.get_by_index(policy_index)
+        if not policy:
+            self.logger.error('ERROR: invalid storage policy index: %r'
+                              % policy_index)
+        return policy_index
+
+    def reap_container_objects(self, account, container, part, nodes):
+        """
+        Deletes the objects in the given container a listing page at a time,
+        calling :func:`reap_object` up to sqrt(self.concurrency) times
+        concurrently for the objects in each page.
+
+        :param account: The name of the account for the container.
+        :param container: The name of the container to empty.
+        :param part: The partition for the container on the container ring.
+        :param nodes: The primary node dicts for the container.
+        """
+        node = nodes[-1]
+        pool = GreenPool(size=self.object_concurrency)
+        marker = ''
+        while True:
+            headers, objects = self.get_objects(
+                node, part, account, container, marker)
+            if not objects:
+                break
+            try:
+                policy_index = self.get_policy_index(headers)
+                for obj in objects:
+                    if isinstance(obj['name'], six.text_type):
+                        obj['name'] = obj['name'].encode('utf8')
+                    pool.spawn(self.reap_object, account, container, part,
+                               nodes, obj['name'], policy_index)
+                pool.waitall()
+            except (Exception, Timeout):
+                self.logger.exception(_('Exception with objects for container '
+                                        '%(container)s for account %(account)s'
+                                        ),
+                                      {'container': container,
+                                       'account': account})
+            marker = objects[-1]['name']
+            if marker == '':
+                break
+
+    def reap_container_pages(self, account, container, part, nodes,
+                             shard_count, container_shard=None):
+        """
+        Deletes this shard's objects in the given container when reap_by_page
+        is set. The container is listed a page at a time and each page is
+        queued to a pool of up to page_concurrency pages being reaped at
+        once, each calling :func:`reap_object` up to sqrt(self.concurrency)
+        times concurrently, while the following pages are listed.
+
+        Every primary account node reaps those objects in every container
+        whose names hash to its container_shard, so the nodes work through a
+        large container together without deleting the same objects.
+
+        Once a run of pages from the start of the listing has been reaped,
+        the name of the last object in it is saved as this shard's checkpoint
+        in the container's sysmeta. The next pass on the container resumes
+        listing from the checkpoint, which is cleared once the end of the
+        listing is reached so that any objects that failed to be deleted are
+        retried by the pass after.
+
+        :param account: The name of the account for the container.
+        :param container: The name of the container to empty.
+        :param part: The partition for the container on the container ring.
+        :param nodes: The primary node dicts for the container.
+        :param shard_count: The number of primary account nodes.
+        :param container_shard: int used to shard the objects reaped. If None,
+                                will reap all objects.
+        """
+        node = nodes[-1]
+        checkpoint_header = CHECKPOINT_HEADER % (container_shard or 0)
+        checkpoint = self.get_checkpoint(node, part, account, container,
+                                         checkpoint_header)
+        page_pool = GreenPool(size=self.page_concurrency)
+        # the pages queued but not yet checkpointed, in listing order
+        pages = deque()
+
+        def reap_page(page, headers, objects):
+            pool = GreenPool(size=self.object_concurrency)
+            try:
+                policy_index = self.get_policy_index(headers)
+                for obj in objects:
+                    if isinstance(obj['name'], six.text_type):
+                        obj['name'] = obj['name'].encode('utf8')
+                    if container_shard is not None and container_shard != \
+                            get_shard(obj['name'], shard_count):
+                        continue
+                    pool.spawn(self.reap_object, account, container, part,
+                               nodes, obj['name'], policy_index)
+                pool.waitall()
+                page['reaped'] = True
+            except (Exception, Timeout):
+                self.logger.exception(_('Exception with objects for container '
+                                        '%(container)s for account %(account)s'
+                                        ),
+                                      {'container': container,
+                                       'account': account})
+
+        def reaped_marker(last_checkpoint):
+            # the end of the run of reaped pages at the start of the queue
+            while pages and pages[0]['reaped']:
+                last_checkpoint = pages.popleft()['end']
+            return last_checkpoint
+
+        marker = checkpoint
+        while True:
+            headers, objects = self.get_objects(
+                node, part, account, container, marker, self.page_size)
+            if not objects:
+                break
+            marker = objects[-1]['name']
+            if isinstance(marker, six.text_type):
+                marker = marker.encode('utf8')
+            page = {'end': marker, 'reaped': False}
+            pages.append(page)
+            page_pool.spawn(reap_page, page, headers, objects)
+            new_checkpoint = reaped_marker(checkpoint)
+            if new_checkpoint != checkpoint:
+                checkpoint = new_checkpoint
+                self.set_checkpoint(part, nodes, account, container,
+                                    checkpoint_header, checkpoint)
+        page_pool.waitall()
+        new_checkpoint = reaped_marker(checkpoint)
+        if objects is not None and not pages:
+            # reached the end of the listing, so start the next pass over
+            # from the beginning
+            new_checkpoint = ''
+        if new_checkpoint != checkpoint:
+            self.set_checkpoint(part, nodes, account, container,
+                                checkpoint_header, new_checkpoint)
+
+    def get_checkpoint(self, node, part, account, container,
+                       checkpoint_header):
+        """
+        Returns the listing marker this shard last saved for the given
+        container, or '' if there is none or it could not be read.
+        """
+        try:
+            headers = direct_head_container(
+                node, part, account, container,
+                conn_timeout=self.conn_timeout,
+                response_timeout=self.node_timeout)
+        except (ClientException, Timeout, socket.error):
+            return ''
+        return unquote(headers.get(checkpoint_header, ''))
+
+    def set_checkpoint(self, part, nodes, account, container,
+                       checkpoint_header, checkpoint):
+        """
+        Saves this shard's listing marker for the given container on each of
+        the container's primary nodes. An empty checkpoint clears it.
+        """
+        headers = {checkpoint_header: quote(checkpoint)}
+        for node in nodes:
+            try:
+                direct_post_container(
+                    node, part, account, container, headers,
+                    conn_timeout=self.conn_timeout,
+                    response_timeout=self.node_timeout)
+            except ClientException as err:
+                if err.http_status == 404:
+                    # the container has already been deleted
+                    continue
+                self.logger.increment('checkpoint_failures')
+                self.logger.error(
+                    _('Failed to save reaper checkpoint with '
+                      '%(ip)s:%(port)s/%(device)s'), node)
+            except (Timeout, socket.error):
+                self.logger.increment('checkpoint_failures')
+                self.logger.error(
+                    _('Failed to save reaper checkpoint with '
+                      '%(ip)s:%(port)s/%(device)s'), node)
+
     def reap_object(self, account, container, container_partition,
                     container_nodes, obj, policy_index):
         """
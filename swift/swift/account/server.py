@@ -31,7 +31,8 @@ from swift.common.utils import get_logger, hash_path, public, \
     json, timing_stats, replication, get_log_line
 from swift.common.constraints import check_mount, valid_timestamp, check_utf8
 from swift.common import constraints
-from swift.common.db_replicator import ReplicatorRpc
+from swift.common.db_replicator import ReplicatorRpc, \
+    ROW_BATCH_CONTENT_TYPE, decode_row_batch
 from swift.common.base_storage_server import BaseStorageServer
 from swift.common.swob import HTTPAccepted, HTTPBadRequest, \
     HTTPCreated, HTTPForbidden, HTTPInternalServerError, \
@@ -227,7 +228,10 @@ class AccountController(BaseStorageServer):
         if self.mount_check and not check_mount(self.root, drive):
             return HTTPInsufficientStorage(drive=drive, request=req)
         try:
-            args = json.load(req.environ['wsgi.input'])
+            if req.headers.get('Content-Type') == ROW_BATCH_CONTENT_TYPE:
+                args = decode_row_batch(req.environ['wsgi.input'])
+            else:
+                args = json.load(req.environ['wsgi.input'])
         except ValueError as err:
             return HTTPBadRequest(body=str(err), content_type='text/plain')
         ret = self.replicator_rpc.dispatch(post_args, args)
@@ -406,7 +406,8 @@ class SwiftRecon(object):
         :param hosts: set of hosts to check. in the format of:
             set([('127.0.0.1', 6020), ('127.0.0.2', 6030)])
         """
-        stats = {'object_expiration_pass': [], 'expired_last_pass': []}
+        stats = {'object_expiration_pass': [], 'expired_last_pass': [],
+                 'object_expiration_backlog_age': []}
         recon = Scout("expirer/%s" % self.server_type, self.verbose,
                       self.suppress_errors, self.timeout)
         print("[%s] Checking on expirers" % self._ptime())
@@ -417,6 +418,8 @@ class SwiftRecon(object):
                     response.get('object_expiration_pass'))
                 stats['expired_last_pass'].append(
                     response.get('expired_last_pass'))
+                stats['object_expiration_backlog_age'].append(
+                    response.get('object_expiration_backlog_age'))
         for k in stats:
             if stats[k]:
                 computed = self._gen_stats(stats[k], name=k)
@@ -16,6 +16,7 @@
 from __future__ import print_function
 import logging
 
+from array import array
 from errno import EEXIST
 from itertools import islice
 from operator import itemgetter
@@ -34,6 +35,7 @@ from six.moves import input
 from swift.common import exceptions
 from swift.common.ring import RingBuilder, Ring, RingData
 from swift.common.ring.builder import MAX_BALANCE
+from swift.common.ring.ring import mmap_ring_path
 from swift.common.ring.utils import validate_args, \
     validate_and_normalize_ip, build_dev_from_opts, \
     parse_builder_ring_filename_args, parse_search_value, \
@@ -833,6 +835,11 @@ swift-ring-builder <builder_file> rebalance [options]
         parser.add_option('-s', '--seed', help="seed to use for rebalance")
         parser.add_option('-d', '--debug', action='store_true',
                           help="print debug information")
+        parser.add_option('-i', '--incremental', action='store_true',
+                          help="keep an index of the part assignments in "
+                          "the builder file, so that later incremental "
+                          "rebalances only revisit the parts affected by "
+                          "device and weight changes")
         options, args = parser.parse_args(argv)
 
         def get_seed(index):
@@ -856,7 +863,8 @@ swift-ring-builder <builder_file> rebalance [options]
         min_part_seconds_left = builder.min_part_seconds_left
         try:
             last_balance = builder.get_balance()
-            parts, balance, removed_devs = builder.rebalance(seed=get_seed(3))
+            parts, balance, removed_devs = builder.rebalance(
+                seed=get_seed(3), incremental=options.incremental)
         except exceptions.RingBuilderError as e:
             print('-' * 79)
             print("An error has occurred during ring validation. Common\n"
@@ -926,7 +934,8 @@ swift-ring-builder <builder_file> rebalance [options]
         builder.get_ring().save(
             pathjoin(backup_dir, '%d.' % ts + basename(ring_file)))
         builder.save(pathjoin(backup_dir, '%d.' % ts + basename(builder_file)))
-        builder.get_ring().save(ring_file)
+        builder.get_ring().save(
+            ring_file, write_mmap=exists(mmap_ring_path(ring_file)))
         builder.save(builder_file)
         exit(status)
 
@@ -1042,6 +1051,10 @@ swift-ring-builder <builder_file> write_ring
     a successful rebalance, so really this is only useful after one or more
     'set_info' calls when no rebalance is needed but you want to send out the
     new device information.
+
+    If an uncompressed, memory-mappable copy of the ring (e.g. object.ring
+    next to object.ring.gz) already exists, it is rewritten as well; this
+    also happens after every rebalance.
         """
         ring_data = builder.get_ring()
         if not ring_data._replica2part2dev_id:
@@ -1053,7 +1066,8 @@ swift-ring-builder <builder_file> write_ring
                 print('Warning: Writing an empty ring')
         ring_data.save(
             pathjoin(backup_dir, '%d.' % time() + basename(ring_file)))
-        ring_data.save(ring_file)
+        ring_data.save(ring_file,
+                       write_mmap=exists(mmap_ring_path(ring_file)))
         exit(EXIT_SUCCESS)
 
     @staticmethod
@@ -1091,7 +1105,10 @@ swift-ring-builder <ring_file> write_builder [min_part_hours]
             'devs': ring.devs,
             'devs_changed': False,
             'version': 0,
-            '_replica2part2dev': ring._replica2part2dev_id,
+            # the tables of a memory-mapped ring are views of the ring file
+            '_replica2part2dev': [
+                array('H', part2dev_id)
+                for part2dev_id in ring._replica2part2dev_id],
             '_last_part_moves_epoch': None,
             '_last_part_moves': None,
             '_last_part_gather_start': 0,
@@ -28,13 +28,15 @@ BufferedHTTPResponse.
 
 from swift import gettext_ as _
 from swift.common import constraints
+from collections import defaultdict, deque
+import errno
 import logging
 import time
 import socket
 
 import eventlet
-from eventlet.green.httplib import CONTINUE, HTTPConnection, HTTPMessage, \
-    HTTPResponse, HTTPSConnection, _UNKNOWN
+from eventlet.green.httplib import CONTINUE, HTTPConnection, \
+    HTTPException, HTTPMessage, HTTPResponse, HTTPSConnection, _UNKNOWN
 from six.moves.urllib.parse import quote
 import six
 
@@ -72,6 +74,8 @@ class BufferedHTTPResponse(HTTPResponse):
         self.length = _UNKNOWN          # number of bytes left in response
         self.will_close = _UNKNOWN      # conn will close at end of response
         self._readline_buffer = ''
+        # set to the connection when it may go back to a ConnectionPool
+        self._pooled_conn = None
 
     def expect_response(self):
         if self.fp:
@@ -144,17 +148,48 @@ class BufferedHTTPResponse(HTTPResponse):
             # the Python source for details.
             self._real_socket.close()
         self._real_socket = None
+        self._pooled_conn = None
         self.close()
 
+    def _reusable(self):
+        # the connection can only be reused once all of the response has
+        # been read from it
+        return self._pooled_conn is not None and not self.will_close and \
+            not self.chunked and self.length == 0 and \
+            not self._readline_buffer
+
+    def release_conn(self):
+        """
+        Closes the response, putting its connection back in its
+        ConnectionPool if all of the response has been read.
+
+        :returns: True if the connection went back to the pool, False if it
+                  was left alone
+        """
+        if not self._reusable():
+            return False
+        self.close()
+        return True
+
     def close(self):
+        reusable = self._reusable()
+        conn, self._pooled_conn = self._pooled_conn, None
         HTTPResponse.close(self)
         self.sock = None
         self._real_socket = None
+        if reusable:
+            conn.connection_pool.put(conn)
 
 
 class BufferedHTTPConnection(HTTPConnection):
     """HTTPConnection class that uses BufferedHTTPResponse"""
     response_class = BufferedHTTPResponse
+    # the ConnectionPool the connection is returned to once its response
+    # has been read, if any
+    connection_pool = None
+    # set once the connection has been taken from a ConnectionPool, in which
+    # case the server may have closed it while it sat idle
+    reused = False
 
     def connect(self):
         self._connected_time = time.time()
@@ -176,6 +211,8 @@ class BufferedHTTPConnection(HTTPConnection):
 
     def getresponse(self):
         response = HTTPConnection.getresponse(self)
+        if self.connection_pool is not None and not response.will_close:
+            response._pooled_conn = self
         logging.debug("HTTP PERF: %(time).5f seconds to %(method)s "
                       "%(host)s:%(port)s %(path)s)",
                       {'time': time.time() - self._connected_time,
@@ -184,8 +221,87 @@ class BufferedHTTPConnection(HTTPConnection):
         return response
 
 
+class ConnectionPool(object):
+    """
+    Keeps idle keep-alive connections to backend servers so that later
+    requests to the same server can reuse them rather than opening a new TCP
+    connection for every request.
+
+    A connection made by :func:`http_connect` with a connection_pool is put
+    back in the pool once its response has been read in full. Connections
+    that have been idle for longer than idle_timeout, or that the server has
+    closed, are dropped rather than reused.
+
+    :param max_idle: the most idle connections kept for each server
+    :param idle_timeout: seconds an idle connection is kept before it is
+                         closed
+    """
+
+    def __init__(self, max_idle=4, idle_timeout=30):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        # (host, port) -> deque of (time put, connection), oldest first
+        self.idle = defaultdict(deque)
+
+    def get(self, host, port):
+        """
+        Returns an idle connection to the given server, or None if there
+        isn't one.
+        """
+        idle = self.idle.get((host, int(port)))
+        now = time.time()
+        while idle and now - idle[0][0] >= self.idle_timeout:
+            idle.popleft()[1].close()
+        if not idle:
+            return None
+        conn = idle.pop()[1]
+        if not is_dropped(conn):
+            return conn
+        conn.close()
+        # the server has probably restarted, so the rest of its idle
+        # connections are no good either
+        self.clear(host, port)
+        return None
+
+    def put(self, conn):
+        """
+        Keeps an idle connection whose response has been read in full.
+        """
+        if conn.sock is None:
+            return
+        idle = self.idle[conn.pool_key]
+        idle.append((time.time(), conn))
+        while len(idle) > self.max_idle:
+            idle.popleft()[1].close()
+
+    def clear(self, host, port):
+        """
+        Closes all of the idle connections to the given server, for instance
+        because an error occurred talking to it.
+        """
+        for _junk, conn in self.idle.pop((host, int(port)), ()):
+            conn.close()
+
+
+def is_dropped(conn):
+    """
+    Returns True if an idle connection can no longer be used, because it
+    has been closed or the server has closed its end.
+    """
+    if conn.sock is None:
+        return True
+    try:
+        # nothing should be waiting to be read on an idle connection; the
+        # server closing its end shows up as an empty read
+        conn.sock.fd.recv(1, socket.MSG_PEEK)
+    except socket.error as err:
+        return err.errno not in (errno.EAGAIN, errno.EWOULDBLOCK)
+    return True
+
+
 def http_connect(ipaddr, port, device, partition, method, path,
-                 headers=None, query_string=None, ssl=False):
+                 headers=None, query_string=None, ssl=False,
+                 connection_pool=None):
     """
     Helper function to create an HTTPConnection object. If ssl is set True,
     HTTPSConnection will be used. However, if ssl=False, BufferedHTTPConnection
@@ -200,6 +316,10 @@ def http_connect(ipaddr, port, device, partition, method, path,
     :param headers: dictionary of headers
     :param query_string: request query string
     :param ssl: set True if SSL should be used (default: False)
+    :param connection_pool: a :class:`ConnectionPool` to reuse an idle
+                            connection from, and to return this connection
+                            to once its response has been read; not used
+                            with SSL
     :returns: HTTPConnection object
     """
     if isinstance(path, six.text_type):
@@ -214,11 +334,12 @@ def http_connect(ipaddr, port, device, partition, method, path,
             logging.exception(_('Error encoding to UTF-8: %s'), str(e))
     path = quote('/' + device + '/' + str(partition) + path)
     return http_connect_raw(
-        ipaddr, port, method, path, headers, query_string, ssl)
+        ipaddr, port, method, path, headers, query_string, ssl,
+        connection_pool=connection_pool)
 
 
 def http_connect_raw(ipaddr, port, method, path, headers=None,
-                     query_string=None, ssl=False):
+                     query_string=None, ssl=False, connection_pool=None):
     """
     Helper function to create an HTTPConnection object. If ssl is set True,
     HTTPSConnection will be used. However, if ssl=False, BufferedHTTPConnection
@@ -231,20 +352,45 @@ def http_connect_raw(ipaddr, port, method, path, headers=None,
     :param headers: dictionary of headers
     :param query_string: request query string
     :param ssl: set True if SSL should be used (default: False)
+    :param connection_pool: a :class:`ConnectionPool` to reuse an idle
+                            connection from, and to return this connection
+                            to once its response has been read; not used
+                            with SSL
     :returns: HTTPConnection object
     """
     if not port:
         port = 443 if ssl else 80
+    if query_string:
+        path += '?' + query_string
     if ssl:
         conn = HTTPSConnection('%s:%s' % (ipaddr, port))
     else:
+        conn = None
+        if connection_pool is not None:
+            conn = connection_pool.get(ipaddr, port)
+        if conn is not None:
+            conn._connected_time = time.time()
+            conn.reused = True
+            try:
+                _send_request(conn, method, path, headers)
+                return conn
+            except (socket.error, HTTPException):
+                # the server closed the idle connection just as the request
+                # was sent; send it again on a new connection
+                conn.close()
+                connection_pool.clear(ipaddr, port)
         conn = BufferedHTTPConnection('%s:%s' % (ipaddr, port))
-    if query_string:
-        path += '?' + query_string
+        if connection_pool is not None:
+            conn.connection_pool = connection_pool
+            conn.pool_key = (ipaddr, int(port))
+    _send_request(conn, method, path, headers)
+    return conn
+
+
+def _send_request(conn, method, path, headers):
     conn.path = path
     conn.putrequest(method, path, skip_host=(headers and 'Host' in headers))
     if headers:
         for header, value in headers.items():
             conn.putheader(header, str(value))
     conn.endheaders()
-    return conn
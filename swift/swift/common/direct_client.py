@@ -36,6 +36,16 @@ from swift.common.http import HTTP_NO_CONTENT, HTTP_INSUFFICIENT_STORAGE, \
 from swift.common.header_key_dict import HeaderKeyDict
 from swift.common.utils import quote
 
+# a swift.common.bufferedhttp.ConnectionPool that direct requests reuse idle
+# connections from, if set by a long running caller
+CONNECTION_POOL = None
+
+
+def _http_connect(*args, **kwargs):
+    if CONNECTION_POOL is not None:
+        kwargs['connection_pool'] = CONNECTION_POOL
+    return http_connect(*args, **kwargs)
+
 
 class DirectClientException(ClientException):
 
@@ -67,8 +77,8 @@ def _make_req(node, part, method, path, _headers, stype,
     :returns: an HTTPResponse object
     """
     with Timeout(conn_timeout):
-        conn = http_connect(node['ip'], node['port'], node['device'], part,
-                            method, path, headers=_headers)
+        conn = _http_connect(node['ip'], node['port'], node['device'], part,
+                             method, path, headers=_headers)
     with Timeout(response_timeout):
         resp = conn.getresponse()
         resp.read()
@@ -101,9 +111,9 @@ def _get_direct_account_container(path, stype, node, part,
     if reverse:
         qs += '&reverse=%s' % quote(reverse)
     with Timeout(conn_timeout):
-        conn = http_connect(node['ip'], node['port'], node['device'], part,
-                            'GET', path, query_string=qs,
-                            headers=gen_headers())
+        conn = _http_connect(node['ip'], node['port'], node['device'], part,
+                             'GET', path, query_string=qs,
+                             headers=gen_headers())
     with Timeout(response_timeout):
         resp = conn.getresponse()
     if not is_success(resp.status):
@@ -225,6 +235,26 @@ def direct_get_container(node, part, account, container, marker=None,
                                          response_timeout=response_timeout)
 
 
+def direct_post_container(node, part, account, container, headers,
+                          conn_timeout=5, response_timeout=15):
+    """
+    Direct update to container metadata on container server.
+
+    :param node: node dictionary from the ring
+    :param part: partition the container is on
+    :param account: account name
+    :param container: container name
+    :param headers: headers to store as metadata
+    :param conn_timeout: timeout in seconds for establishing the connection
+    :param response_timeout: timeout in seconds for getting the response
+    :raises ClientException: HTTP POST request failed
+    """
+    path = '/%s/%s' % (account, container)
+    add_timestamp = 'x-timestamp' not in (k.lower() for k in headers)
+    _make_req(node, part, 'POST', path, gen_headers(headers, add_timestamp),
+              'Container', conn_timeout, response_timeout)
+
+
 def direct_delete_container(node, part, account, container, conn_timeout=5,
                             response_timeout=15, headers=None):
     """
@@ -276,6 +306,48 @@ def direct_delete_container_object(node, part, account, container, obj,
               'Container', conn_timeout, response_timeout)
 
 
+def direct_update_container(node, part, account, container, updates,
+                            conn_timeout=5, response_timeout=15,
+                            headers=None):
+    """
+    Merge a batch of object updates into a container with a single UPDATE
+    request directly to the container server.
+
+    :param node: node dictionary from the ring
+    :param part: partition the container is on
+    :param account: account name
+    :param container: container name
+    :param updates: list of dicts with keys ``op`` (``PUT`` or ``DELETE``),
+                    ``obj`` and ``headers``, the latter being the headers
+                    that would be sent with the equivalent container object
+                    PUT or DELETE
+    :param conn_timeout: timeout in seconds for establishing the connection
+    :param response_timeout: timeout in seconds for getting the response
+    :param headers: dict to be passed into HTTPConnection headers
+    :raises ClientException: HTTP UPDATE request failed
+    """
+    if headers is None:
+        headers = {}
+
+    body = json.dumps(updates)
+    headers = gen_headers(headers, add_ts='x-timestamp' not in (
+        k.lower() for k in headers))
+    headers['Content-Type'] = 'application/json'
+    headers['Content-Length'] = str(len(body))
+
+    path = '/%s/%s' % (account, container)
+    with Timeout(conn_timeout):
+        conn = http_connect(node['ip'], node['port'], node['device'], part,
+                            'UPDATE', path, headers=headers)
+    with Timeout(response_timeout):
+        conn.send(body)
+        resp = conn.getresponse()
+        resp.read()
+    if not is_success(resp.status):
+        raise DirectClientException('Container', 'UPDATE', node, part, path,
+                                    resp)
+
+
 def direct_head_object(node, part, account, container, obj, conn_timeout=5,
                        response_timeout=15, headers=None):
     """
@@ -330,8 +402,8 @@ def direct_get_object(node, part, account, container, obj, conn_timeout=5,
 
     path = '/%s/%s/%s' % (account, container, obj)
     with Timeout(conn_timeout):
-        conn = http_connect(node['ip'], node['port'], node['device'], part,
-                            'GET', path, headers=gen_headers(headers))
+        conn = _http_connect(node['ip'], node['port'], node['device'], part,
+                             'GET', path, headers=gen_headers(headers))
     with Timeout(response_timeout):
         resp = conn.getresponse()
     if not is_success(resp.status):
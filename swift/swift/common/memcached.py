@@ -47,14 +47,16 @@ http://github.com/memcached/memcached/blob/1.4.2/doc/protocol.txt
 import six.moves.cPickle as pickle
 import json
 import logging
+import re
 import time
 from bisect import bisect
+from collections import defaultdict
 from swift import gettext_ as _
 from hashlib import md5
 
 from eventlet.green import socket
 from eventlet.pools import Pool
-from eventlet import Timeout
+from eventlet import GreenPile, Timeout
 from six.moves import range
 from swift.common import utils
 
@@ -80,6 +82,14 @@ def md5hash(key):
     return md5(key).hexdigest()
 
 
+def server_metric_name(server):
+    """
+    Returns the statsd-safe form of a memcache server name, e.g.
+    ``10_0_0_1_11211`` for ``10.0.0.1:11211``.
+    """
+    return re.sub(r'[^A-Za-z0-9-]+', '_', server).strip('_')
+
+
 def sanitize_timeout(timeout):
     """
     Sanitize a timeout value to use an absolute expiration time if the delta
@@ -136,12 +146,16 @@ class MemcacheConnPool(Pool):
 class MemcacheRing(object):
     """
     Simple, consistent-hashed memcache client.
+
+    If a *logger* with statsd support is given, per-server error counts
+    (``memcached.<server>.errors``) and the latency of batched requests
+    (``memcached.<server>.<op>.timing``) are emitted through it.
     """
 
     def __init__(self, servers, connect_timeout=CONN_TIMEOUT,
                  io_timeout=IO_TIMEOUT, pool_timeout=POOL_TIMEOUT,
                  tries=TRY_COUNT, allow_pickle=False, allow_unpickle=False,
-                 max_conns=2):
+                 max_conns=2, logger=None):
         self._ring = {}
         self._errors = dict(((serv, []) for serv in servers))
         self._error_limited = dict(((serv, 0) for serv in servers))
@@ -159,6 +173,19 @@ class MemcacheRing(object):
         self._pool_timeout = pool_timeout
         self._allow_pickle = allow_pickle
         self._allow_unpickle = allow_unpickle or allow_pickle
+        self.logger = logger
+        self._metric_names = dict((server, server_metric_name(server))
+                                  for server in servers)
+
+    def _increment_metric(self, server, metric):
+        if self.logger:
+            self.logger.increment('memcached.%s.%s' % (
+                self._metric_names[server], metric))
+
+    def _timing_since(self, server, metric, start):
+        if self.logger:
+            self.logger.timing_since('memcached.%s.%s.timing' % (
+                self._metric_names[server], metric), start)
 
     def _exception_occurred(self, server, e, action='talking',
                             sock=None, fp=None, got_connection=True):
@@ -184,6 +211,7 @@ class MemcacheRing(object):
             # We need to return something to the pool
             # A new connection will be created the next time it is retrieved
             self._return_conn(server, None, None)
+        self._increment_metric(server, 'errors')
         now = time.time()
         self._errors[server].append(time.time())
         if len(self._errors[server]) > ERROR_LIMIT_COUNT:
@@ -193,10 +221,10 @@ class MemcacheRing(object):
                 self._error_limited[server] = now + ERROR_LIMIT_DURATION
                 logging.error(_('Error limiting server %s'), server)
 
-    def _get_conns(self, key):
+    def _iter_servers(self, key):
         """
-        Retrieves a server conn from the pool, or connects a new one.
-        Chooses the server based on a consistent hash of "key".
+        Yields up to ``tries`` distinct servers for the hashed *key*, in the
+        order they should be tried.
         """
         pos = bisect(self._sorted, key)
         served = []
@@ -206,28 +234,87 @@ class MemcacheRing(object):
             if server in served:
                 continue
             served.append(server)
+            yield server
+
+    def _get_conn(self, server):
+        """
+        Retrieves a conn to *server* from the pool, or connects a new one.
+
+        :returns: a tuple of (fp, sock), or (None, None) if no connection
+                  could be made
+        """
+        sock = None
+        try:
+            with MemcachePoolTimeout(self._pool_timeout):
+                fp, sock = self._client_cache[server].get()
+            return fp, sock
+        except MemcachePoolTimeout as e:
+            self._exception_occurred(
+                server, e, action='getting a connection',
+                got_connection=False)
+        except (Exception, Timeout) as e:
+            # Typically a Timeout exception caught here is the one raised
+            # by the create() method of this server's MemcacheConnPool
+            # object.
+            self._exception_occurred(
+                server, e, action='connecting', sock=sock)
+        return None, None
+
+    def _get_conns(self, key):
+        """
+        Retrieves a server conn from the pool, or connects a new one.
+        Chooses the server based on a consistent hash of "key".
+        """
+        for server in self._iter_servers(key):
             if self._error_limited[server] > time.time():
                 continue
-            sock = None
-            try:
-                with MemcachePoolTimeout(self._pool_timeout):
-                    fp, sock = self._client_cache[server].get()
+            fp, sock = self._get_conn(server)
+            if fp is not None:
                 yield server, fp, sock
-            except MemcachePoolTimeout as e:
-                self._exception_occurred(
-                    server, e, action='getting a connection',
-                    got_connection=False)
-            except (Exception, Timeout) as e:
-                # Typically a Timeout exception caught here is the one raised
-                # by the create() method of this server's MemcacheConnPool
-                # object.
-                self._exception_occurred(
-                    server, e, action='connecting', sock=sock)
 
     def _return_conn(self, server, fp, sock):
         """Returns a server connection to the pool."""
         self._client_cache[server].put((fp, sock))
 
+    def _encode_value(self, value, serialize):
+        """
+        Serializes *value* for storage in memcache.
+
+        :returns: a tuple of (flags, encoded value)
+        """
+        flags = 0
+        if serialize and self._allow_pickle:
+            value = pickle.dumps(value, PICKLE_PROTOCOL)
+            flags |= PICKLE_FLAG
+        elif serialize:
+            value = json.dumps(value)
+            flags |= JSON_FLAG
+        return flags, value
+
+    def _read_values(self, fp):
+        """
+        Reads the VALUE lines of a get response, up to and including END.
+
+        :returns: dict mapping the (hashed) keys found to their values
+        """
+        responses = {}
+        line = fp.readline().strip().split()
+        while line[0].upper() != 'END':
+            if line[0].upper() == 'VALUE':
+                size = int(line[3])
+                value = fp.read(size)
+                if int(line[2]) & PICKLE_FLAG:
+                    if self._allow_unpickle:
+                        value = pickle.loads(value)
+                    else:
+                        value = None
+                elif int(line[2]) & JSON_FLAG:
+                    value = json.loads(value)
+                responses[line[1]] = value
+                fp.readline()
+            line = fp.readline().strip().split()
+        return responses
+
     def set(self, key, value, serialize=True, time=0,
             min_compress_len=0):
         """
@@ -246,13 +333,7 @@ class MemcacheRing(object):
         """
         key = md5hash(key)
         timeout = sanitize_timeout(time)
-        flags = 0
-        if serialize and self._allow_pickle:
-            value = pickle.dumps(value, PICKLE_PROTOCOL)
-            flags |= PICKLE_FLAG
-        elif serialize:
-            value = json.dumps(value)
-            flags |= JSON_FLAG
+        flags, value = self._encode_value(value, serialize)
         for (server, fp, sock) in self._get_conns(key):
             try:
                 with Timeout(self._io_timeout):
@@ -275,25 +356,11 @@ class MemcacheRing(object):
         :returns: value of the key in memcache
         """
         key = md5hash(key)
-        value = None
         for (server, fp, sock) in self._get_conns(key):
             try:
                 with Timeout(self._io_timeout):
                     sock.sendall('get %s\r\n' % key)
-                    line = fp.readline().strip().split()
-                    while line[0].upper() != 'END':
-                        if line[0].upper() == 'VALUE' and line[1] == key:
-                            size = int(line[3])
-                            value = fp.read(size)
-                            if int(line[2]) & PICKLE_FLAG:
-                                if self._allow_unpickle:
-                                    value = pickle.loads(value)
-                                else:
-                                    value = None
-                            elif int(line[2]) & JSON_FLAG:
-                                value = json.loads(value)
-                            fp.readline()
-                        line = fp.readline().strip().split()
+                    value = self._read_values(fp).get(key)
                     self._return_conn(server, fp, sock)
                     return value
             except (Exception, Timeout) as e:
@@ -404,13 +471,7 @@ class MemcacheRing(object):
         msg = ''
         for key, value in mapping.items():
             key = md5hash(key)
-            flags = 0
-            if serialize and self._allow_pickle:
-                value = pickle.dumps(value, PICKLE_PROTOCOL)
-                flags |= PICKLE_FLAG
-            elif serialize:
-                value = json.dumps(value)
-                flags |= JSON_FLAG
+            flags, value = self._encode_value(value, serialize)
             msg += ('set %s %d %d %s\r\n%s\r\n' %
                     (key, flags, timeout, len(value), value))
         for (server, fp, sock) in self._get_conns(server_key):
@@ -440,22 +501,7 @@ class MemcacheRing(object):
             try:
                 with Timeout(self._io_timeout):
                     sock.sendall('get %s\r\n' % ' '.join(keys))
-                    line = fp.readline().strip().split()
-                    responses = {}
-                    while line[0].upper() != 'END':
-                        if line[0].upper() == 'VALUE':
-                            size = int(line[3])
-                            value = fp.read(size)
-                            if int(line[2]) & PICKLE_FLAG:
-                                if self._allow_unpickle:
-                                    value = pickle.loads(value)
-                                else:
-                                    value = None
-                            elif int(line[2]) & JSON_FLAG:
-                                value = json.loads(value)
-                            responses[line[1]] = value
-                            fp.readline()
-                        line = fp.readline().strip().split()
+                    responses = self._read_values(fp)
                     values = []
                     for key in keys:
                         if key in responses:
@@ -466,3 +512,125 @@ class MemcacheRing(object):
                     return values
             except (Exception, Timeout) as e:
                 self._exception_occurred(server, e, sock=sock, fp=fp)
+
+    def _batch_to_server(self, server, op, keys, func):
+        """
+        Runs ``func(fp, sock, keys)`` against *server* over a single
+        connection.
+
+        :returns: a tuple of (server, keys, result), where result is None if
+                  the server could not be used
+        """
+        fp, sock = self._get_conn(server)
+        if fp is None:
+            return server, keys, None
+        start = time.time()
+        try:
+            with Timeout(self._io_timeout):
+                result = func(fp, sock, keys)
+            self._return_conn(server, fp, sock)
+        except (Exception, Timeout) as e:
+            self._exception_occurred(server, e, sock=sock, fp=fp)
+            return server, keys, None
+        self._timing_since(server, op, start)
+        return server, keys, result
+
+    def _batch(self, keys, op, func):
+        """
+        Groups the (hashed) *keys* by the server each one would be sent to by
+        :meth:`_get_conns` and runs one request per server, concurrently.
+        Keys whose server fails are regrouped onto their next server, so each
+        key is tried against the same servers, in the same order, as it
+        would be on its own.
+
+        :param keys: hashed keys
+        :param op: name of the operation, used for the timing metric
+        :param func: callable taking (fp, sock, server_keys) which does the
+                     request for one server and returns a dict of results
+        :returns: dict merging the results of every successful request
+        """
+        results = {}
+        tried = dict((key, set()) for key in keys)
+        pending = list(tried)
+        while pending:
+            now = time.time()
+            groups = defaultdict(list)
+            for key in pending:
+                for server in self._iter_servers(key):
+                    if server not in tried[key] and \
+                            self._error_limited[server] <= now:
+                        groups[server].append(key)
+                        break
+            if not groups:
+                # every remaining key has run out of servers to try
+                break
+            if len(groups) == 1:
+                replies = [self._batch_to_server(server, op, server_keys, func)
+                           for server, server_keys in groups.items()]
+            else:
+                replies = GreenPile(len(groups))
+                for server, server_keys in groups.items():
+                    replies.spawn(self._batch_to_server, server, op,
+                                  server_keys, func)
+            pending = []
+            for server, server_keys, result in replies:
+                if result is None:
+                    for key in server_keys:
+                        tried[key].add(server)
+                    pending.extend(server_keys)
+                else:
+                    results.update(result)
+        return results
+
+    def get_many(self, keys):
+        """
+        Gets multiple values from memcache for the given keys, which may be
+        spread over any number of servers. Keys are grouped by server and a
+        single pipelined get is sent to each server, all concurrently.
+
+        :param keys: keys for values to be retrieved from memcache
+        :returns: list of values, in the same order as *keys*; None for any
+                  key that was not found
+        """
+        hashed_keys = [md5hash(key) for key in keys]
+
+        def do_get(fp, sock, server_keys):
+            sock.sendall('get %s\r\n' % ' '.join(server_keys))
+            return self._read_values(fp)
+
+        responses = self._batch(hashed_keys, 'get', do_get)
+        return [responses.get(key) for key in hashed_keys]
+
+    def set_many(self, mapping, serialize=True, time=0, noreply=False):
+        """
+        Sets multiple key/value pairs in memcache, which may be spread over
+        any number of servers. The sets for each server are pipelined over a
+        single connection, and all servers are written to concurrently.
+
+        :param mapping: dictionary of keys and values to be set in memcache
+        :param serialize: if True, value is serialized with JSON before sending
+                          to memcache, or with pickle if configured to use
+                          pickle instead of JSON (to avoid cache poisoning)
+        :param time: the time to live
+        :param noreply: if True, the sets are sent with memcache's
+                        ``noreply`` option and the responses are not waited
+                        for; only connection errors will be noticed
+        """
+        timeout = sanitize_timeout(time)
+        commands = {}
+        for key, value in mapping.items():
+            key = md5hash(key)
+            flags, value = self._encode_value(value, serialize)
+            commands[key] = 'set %s %d %d %s%s\r\n%s\r\n' % (
+                key, flags, timeout, len(value),
+                ' noreply' if noreply else '', value)
+
+        def do_set(fp, sock, server_keys):
+            sock.sendall(''.join(commands[key] for key in server_keys))
+            if not noreply:
+                # Wait for the sets to complete
+                for key in server_keys:
+                    fp.readline()
+            return {}
+
+        self._batch(list(commands), 'set', do_set)
@@ -182,6 +182,10 @@ The return body will be formatted in the way specified in the request's
 ``Accept`` header. Acceptable formats are ``text/plain``, ``application/json``,
 ``application/xml``, and ``text/xml``.
 
+Objects are deleted before any containers are deleted. The first object
+of each container is deleted first, and the account and container info that
+those deletes look up is then shared by the rest of the deletes.
+
 There are proxy logs created for each object or container (which becomes a
 subrequest) that is deleted. The subrequest's proxy log will have a
 swift.source set to "BD" the log's content length of 0. If double
@@ -357,6 +361,33 @@ class Bulk(object):
                 raise HTTPBadRequest('Invalid File Name')
         return objs_to_delete
 
+    def first_per_container(self, names_to_delete):
+        """
+        Yields two lists of the (obj_name, delete_path) tuples from
+        names_to_delete; the second is to be deleted once the deletes of the
+        first have finished.
+
+        The first list holds the first delete of each container. Those
+        deletes look up the account and container info, which is then
+        shared with the rest of the deletes through the infocache. The
+        second list holds the rest of the deletes, in the order they were
+        requested, so that they are still spread over delete_concurrency
+        across all of the containers.
+        """
+        first, rest = [], []
+        containers = set()
+        for obj_name, delete_path in names_to_delete:
+            container = obj_name.lstrip('/').split('/', 1)[0]
+            if container in containers:
+                rest.append((obj_name, delete_path))
+            else:
+                containers.add(container)
+                first.append((obj_name, delete_path))
+        if first:
+            yield first
+        if rest:
+            yield rest
+
     def handle_delete_iter(self, req, objs_to_delete=None,
                            user_agent='BulkDelete', swift_source='BD',
                            out_content_type='text/plain'):
@@ -400,6 +431,9 @@ class Bulk(object):
                 objs_to_delete = self.get_objs_to_delete(req)
             failed_file_response = {'type': HTTPBadRequest}
             req.environ['eventlet.minimum_write_chunk_size'] = 0
+            # shared by every subrequest so that account and container info
+            # is only looked up once per container
+            req.environ.setdefault('swift.infocache', {})
 
             def delete_filter(predicate, objs_to_delete):
                 for obj_to_delete in objs_to_delete:
@@ -426,8 +460,10 @@ class Bulk(object):
 
             def objs_then_containers(objs_to_delete):
                 # process all objects first
-                yield delete_filter(lambda name: '/' in name.strip('/'),
-                                    objs_to_delete)
+                for names_to_delete in self.first_per_container(
+                        delete_filter(lambda name: '/' in name.strip('/'),
+                                      objs_to_delete)):
+                    yield names_to_delete
                 # followed by containers
                 yield delete_filter(lambda name: '/' not in name.strip('/'),
                                     objs_to_delete)
@@ -32,6 +32,33 @@ from swift.common.utils import get_logger, config_true_value, \
 DECRYPT_CHUNK_SIZE = 65536
 
 
+def coalesce_chunks(chunks, min_size):
+    """
+    Join consecutive chunks so that each chunk yielded is at least min_size
+    bytes long, apart from the last one. Feeding the cipher fewer, larger
+    chunks saves the per-call overhead of decrypting lots of small ones.
+
+    :param chunks: an iterable of byte strings
+    :param min_size: the minimum size of chunk to yield; if this is not
+                     greater than 0 the chunks are yielded unchanged
+    """
+    if min_size <= 0:
+        for chunk in chunks:
+            yield chunk
+        return
+    buf = []
+    buf_len = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        buf_len += len(chunk)
+        if buf_len >= min_size:
+            yield ''.join(buf)
+            buf = []
+            buf_len = 0
+    if buf:
+        yield ''.join(buf)
+
+
 def purge_crypto_sysmeta_headers(headers):
     return [h for h in headers if not
             h[0].lower().startswith(
@@ -146,6 +173,7 @@ class BaseDecrypterContext(CryptoWSGIContext):
 class DecrypterObjContext(BaseDecrypterContext):
     def __init__(self, decrypter, logger):
         super(DecrypterObjContext, self).__init__(decrypter, 'object', logger)
+        self.buffer_size = decrypter.buffer_size
 
     def _decrypt_header(self, header, value, key, required=False):
         """
@@ -250,7 +278,8 @@ class DecrypterObjContext(BaseDecrypterContext):
 
                 decrypt_ctxt = self.crypto.create_decryption_ctxt(
                     body_key, crypto_meta['iv'], first_byte)
-                for chunk in iter(lambda: body.read(DECRYPT_CHUNK_SIZE), ''):
+                chunks = iter(lambda: body.read(DECRYPT_CHUNK_SIZE), '')
+                for chunk in coalesce_chunks(chunks, self.buffer_size):
                     yield decrypt_ctxt.update(chunk)
 
                 yield "\r\n"
@@ -270,7 +299,7 @@ class DecrypterObjContext(BaseDecrypterContext):
         decrypt_ctxt = self.crypto.create_decryption_ctxt(
             body_key, crypto_meta['iv'], offset)
         with closing_if_possible(resp):
-            for chunk in resp:
+            for chunk in coalesce_chunks(resp, self.buffer_size):
                 yield decrypt_ctxt.update(chunk)
 
     def handle_get(self, req, start_response):
@@ -430,6 +459,7 @@ class Decrypter(object):
         self.app = app
         self.logger = get_logger(conf, log_route="decrypter")
         self.crypto = Crypto(conf)
+        self.buffer_size = int(conf.get('decrypt_buffer_size', 0))
 
     def __call__(self, env, start_response):
         req = Request(env)
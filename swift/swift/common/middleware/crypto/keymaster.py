@@ -22,7 +22,7 @@ import six
 
 from swift.common.middleware.crypto.crypto_utils import CRYPTO_KEY_CALLBACK
 from swift.common.swob import Request, HTTPException
-from swift.common.utils import readconf
+from swift.common.utils import readconf, LRUCache
 from swift.common.wsgi import WSGIContext
 
 
@@ -109,10 +109,21 @@ class KeyMaster(object):
     value may be obtained by base-64 encoding a 32 byte (or longer) value
     generated by a cryptographically secure random number generator. Changing
     the root secret is likely to result in data loss.
+
+    Keys derived for the most recently used ``key_cache_size`` paths are kept
+    in memory so that they don't have to be derived again for every request.
     """
 
     def __init__(self, app, conf):
         self.app = app
+        key_cache_size = int(conf.get('key_cache_size', 1000))
+        if key_cache_size > 0:
+            # LRUCache is a little awkward to use this way, but it keeps the
+            # cache per-instance since each instance has its own root secret
+            self._create_key = LRUCache(maxsize=key_cache_size)(
+                self._derive_key)
+        else:
+            self._create_key = self._derive_key
 
         keymaster_config_path = conf.get('keymaster_config_path')
         if keymaster_config_path:
@@ -158,6 +169,9 @@ class KeyMaster(object):
         return self.app(env, start_response)
 
     def create_key(self, key_id):
+        return self._create_key(key_id)
+
+    def _derive_key(self, key_id):
         return hmac.new(self.root_secret, key_id,
                         digestmod=hashlib.sha256).digest()
 
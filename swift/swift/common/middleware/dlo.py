@@ -325,7 +325,9 @@ class GetContext(WSGIContext):
                 req, self.dlo.app, listing_iter, ua_suffix="DLO MultipartGET",
                 swift_source="DLO", name=req.path, logger=self.logger,
                 max_get_time=self.dlo.max_get_time,
-                response_body_length=actual_content_length)
+                response_body_length=actual_content_length,
+                read_ahead=self.dlo.segment_read_ahead,
+                read_ahead_bytes=self.dlo.segment_read_ahead_bytes)
 
             try:
                 app_iter.validate_first_segment()
@@ -375,6 +377,10 @@ class DynamicLargeObject(object):
             'rate_limit_after_segment', '10'))
         self.rate_limit_segments_per_sec = int(conf.get(
             'rate_limit_segments_per_sec', '1'))
+        self.segment_read_ahead = max(0, int(conf.get(
+            'segment_read_ahead', '0')))
+        self.segment_read_ahead_bytes = int(conf.get(
+            'segment_read_ahead_bytes', '8388608'))
 
     def _populate_config_from_old_location(self, conf):
         if ('rate_limit_after_segment' in conf or
@@ -0,0 +1,325 @@
+# Copyright (c) 2010-2017 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The ``object_cache`` middleware keeps the bodies and headers of small, hot
+objects in the proxy so that repeated GETs of them don't have to go to the
+object servers every time.
+
+Responses to plain object GETs whose body is no larger than
+``max_object_size`` bytes are kept in a per-process LRU of at most
+``max_cached_objects`` entries, and optionally in memcache as well so that
+other proxy processes can share them. Manifests of large objects and
+symlinks are never cached.
+
+A cached entry is served without contacting the object servers for
+``revalidate_interval`` seconds after it was fetched. After that the next GET
+first HEADs the object; if its ETag and X-Timestamp are unchanged the entry is
+served and is good for another interval, otherwise it is dropped and the GET
+is passed on as usual. Object PUT, POST and DELETE requests that go through
+this proxy drop any cached copy of the object; COPY requests are turned into a
+GET and a PUT by the ``copy`` middleware before they get here. Writes through
+other proxies are picked up when the entry is next revalidated, so clients of
+this proxy may see an object's previous version for up to
+``revalidate_interval`` seconds.
+
+Hits are still authorized against the container's read ACL just as the proxy
+would authorize them, and Range and conditional requests are answered from the
+cached body.
+
+The middleware emits ``object_cache.hit``, ``object_cache.miss``,
+``object_cache.revalidated``, ``object_cache.stale``,
+``object_cache.eviction`` and ``object_cache.invalidation`` counters to
+statsd when statsd logging is configured. ``object_cache.invalidation``
+counts the writes that dropped an object from this proxy's local cache.
+
+The ``object_cache`` middleware should be added to the pipeline in your
+``/etc/swift/proxy-server.conf`` file just before the final proxy-logging
+middleware, so that it is to the right of auth and sees the subrequests made
+by other middleware such as ``copy`` and ``versioned_writes``. If encryption
+is in use it must also be to the right of the encryption middleware so that
+only ciphertext is cached. For example::
+
+    [pipeline:main]
+    pipeline = catch_errors cache tempauth slo dlo object_cache proxy-logging
+        proxy-server
+
+    [filter:object_cache]
+    use = egg:swift#object_cache
+    max_object_size = 65536
+    max_cached_objects = 1000
+    revalidate_interval = 10
+    use_memcache = false
+"""
+
+import base64
+import time
+from collections import OrderedDict
+
+from swift.common.header_key_dict import HeaderKeyDict
+from swift.common.http import is_success
+from swift.common.request_helpers import resolve_etag_is_at_header
+from swift.common.swob import Request, Response
+from swift.common.utils import cache_from_env, config_true_value, \
+    get_logger, split_path
+from swift.common.wsgi import make_pre_authed_request
+from swift.proxy.controllers.base import get_container_info
+
+
+# Headers that describe one particular response rather than the object.
+UNCACHED_HEADERS = ('date', 'x-trans-id', 'x-openstack-request-id',
+                    'connection', 'transfer-encoding')
+# Responses with any of these headers are never cached.
+UNCACHEABLE_HEADERS = ('x-object-manifest', 'x-static-large-object',
+                       'x-symlink-target')
+MEMCACHE_KEY_PREFIX = 'object_cache'
+
+
+class CachedObject(object):
+    """
+    The headers and body of a cached object GET response.
+
+    :param headers: a dict of the response's headers
+    :param body: the response body
+    :param fetched_at: the time the object was fetched or last revalidated
+    """
+
+    def __init__(self, headers, body, fetched_at):
+        self.headers = HeaderKeyDict(headers)
+        self.body = body
+        self.fetched_at = fetched_at
+
+    @property
+    def etag(self):
+        return self.headers.get('etag')
+
+    @property
+    def timestamp(self):
+        return self.headers.get('x-timestamp')
+
+    def matches(self, headers):
+        """
+        Check whether a fresh response's headers describe the same version of
+        the object as this entry.
+
+        :param headers: headers of a HEAD or GET response for the object
+        """
+        headers = HeaderKeyDict(headers)
+        return (self.etag is not None and self.timestamp is not None and
+                headers.get('etag') == self.etag and
+                headers.get('x-timestamp') == self.timestamp)
+
+    def to_memcache(self):
+        return {'headers': self.headers.items(),
+                'body': base64.b64encode(self.body),
+                'fetched_at': self.fetched_at}
+
+    @classmethod
+    def from_memcache(cls, value):
+        try:
+            return cls(dict(value['headers']),
+                       base64.b64decode(value['body']),
+                       float(value['fetched_at']))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+
+class ObjectCacheMiddleware(object):
+    """
+    Middleware that serves GETs of small objects from a local LRU cache and,
+    optionally, memcache.
+
+    :param app: the next WSGI application in the pipeline
+    :param conf: the filter's configuration dict
+    """
+
+    def __init__(self, app, conf, logger=None):
+        self.app = app
+        self.logger = logger or get_logger(conf, log_route='object_cache')
+        self.logger.set_statsd_prefix('object_cache')
+        self.max_object_size = int(conf.get('max_object_size', 65536))
+        self.max_cached_objects = int(conf.get('max_cached_objects', 1000))
+        self.revalidate_interval = float(
+            conf.get('revalidate_interval', 10))
+        self.use_memcache = config_true_value(
+            conf.get('use_memcache', 'false'))
+        self.memcache_time = int(conf.get('memcache_time', 300))
+        self._cache = OrderedDict()
+
+    def _memcache_key(self, path):
+        return '%s/%s' % (MEMCACHE_KEY_PREFIX, path)
+
+    def _get_memcache(self, env):
+        if self.use_memcache:
+            return cache_from_env(env, True)
+        return None
+
+    def _local_set(self, path, entry):
+        self._cache.pop(path, None)
+        self._cache[path] = entry
+        while len(self._cache) > self.max_cached_objects:
+            self._cache.popitem(last=False)
+            self.logger.increment('eviction')
+
+    def get_cached(self, env, path):
+        """
+        Look up the cached entry for an object path, first locally and then
+        in memcache.
+
+        :returns: a :class:`CachedObject` or None
+        """
+        entry = self._cache.pop(path, None)
+        if entry is not None:
+            # move to the most recently used end
+            self._cache[path] = entry
+            return entry
+        memcache = self._get_memcache(env)
+        if memcache:
+            value = memcache.get(self._memcache_key(path))
+            if value:
+                entry = CachedObject.from_memcache(value)
+                if entry is not None:
+                    self._local_set(path, entry)
+        return entry
+
+    def set_cached(self, env, path, entry):
+        self._local_set(path, entry)
+        memcache = self._get_memcache(env)
+        if memcache:
+            memcache.set(self._memcache_key(path), entry.to_memcache(),
+                         time=self.memcache_time)
+
+    def forget(self, env, path):
+        """
+        Drop the cached entry for an object path, locally and in memcache.
+
+        :returns: True if the object was in the local cache
+        """
+        dropped = self._cache.pop(path, None) is not None
+        memcache = self._get_memcache(env)
+        if memcache:
+            memcache.delete(self._memcache_key(path))
+        return dropped
+
+    def _revalidate(self, req, path, entry):
+        head_req = make_pre_authed_request(
+            req.environ, 'HEAD', path, swift_source='OC')
+        resp = head_req.get_response(self.app)
+        if is_success(resp.status_int) and entry.matches(resp.headers):
+            entry.fetched_at = time.time()
+            self.set_cached(req.environ, path, entry)
+            self.logger.increment('revalidated')
+            return True
+        self.logger.increment('stale')
+        return False
+
+    def _authorize(self, req):
+        """
+        Authorize a cache hit the way the proxy's object controller would
+        authorize the GET.
+
+        :returns: None if the request may be served, a response to return
+                  to the client if it may not, or False if the container is
+                  not known and the request should go to the proxy as usual
+        """
+        container_info = get_container_info(
+            req.environ, self.app, swift_source='OC')
+        if not is_success(container_info.get('status')):
+            return False
+        req.acl = container_info['read_acl']
+        if 'swift.authorize' in req.environ:
+            aresp = req.environ['swift.authorize'](req)
+            if aresp:
+                return aresp
+        return None
+
+    def _is_cacheable(self, resp):
+        if resp.status_int != 200:
+            return False
+        if resp.content_length is None or \
+                resp.content_length > self.max_object_size:
+            return False
+        if any(h in resp.headers for h in UNCACHEABLE_HEADERS):
+            return False
+        return 'etag' in resp.headers and 'x-timestamp' in resp.headers
+
+    def _fetch(self, req, path):
+        resp = req.get_response(self.app)
+        if not self._is_cacheable(resp):
+            return resp
+        body = resp.body
+        if len(body) != resp.content_length:
+            return resp
+        headers = dict((k, v) for k, v in resp.headers.items()
+                       if k.lower() not in UNCACHED_HEADERS)
+        self.set_cached(req.environ, path,
+                        CachedObject(headers, body, time.time()))
+        return resp
+
+    def _serve(self, req, entry):
+        return Response(
+            request=req, status=200, headers=dict(entry.headers),
+            body=entry.body, conditional_response=True,
+            conditional_etag=resolve_etag_is_at_header(req, entry.headers))
+
+    def handle_get(self, req, path):
+        entry = self.get_cached(req.environ, path)
+        if entry is not None:
+            auth_result = self._authorize(req)
+            if auth_result:
+                return auth_result
+            if auth_result is None:
+                if time.time() - entry.fetched_at < \
+                        self.revalidate_interval or \
+                        self._revalidate(req, path, entry):
+                    self.logger.increment('hit')
+                    return self._serve(req, entry)
+            self.forget(req.environ, path)
+        self.logger.increment('miss')
+        return self._fetch(req, path)
+
+    def __call__(self, env, start_response):
+        req = Request(env)
+        try:
+            split_path(req.path, 4, 4, True)
+        except ValueError:
+            return self.app(env, start_response)
+        path = req.path
+
+        if req.method == 'GET':
+            if req.query_string or \
+                    config_true_value(req.headers.get('x-newest')):
+                return self.app(env, start_response)
+            return self.handle_get(req, path)(env, start_response)
+
+        if req.method in ('PUT', 'POST', 'DELETE'):
+            dropped = self.forget(env, path)
+            resp = req.get_response(self.app)
+            # A GET that raced with the write may have cached the old
+            # version in the meantime.
+            if self.forget(env, path) or dropped:
+                self.logger.increment('invalidation')
+            return resp(env, start_response)
+
+        return self.app(env, start_response)
+
+
+def filter_factory(global_conf, **local_conf):
+    conf = global_conf.copy()
+    conf.update(local_conf)
+
+    def object_cache_filter(app):
+        return ObjectCacheMiddleware(app, conf)
+    return object_cache_filter
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import time
+from collections import OrderedDict
 from swift import gettext_ as _
 
 import eventlet
@@ -84,12 +85,76 @@ class MaxSleepTimeHitError(Exception):
     pass
 
 
+def get_key_type(key):
+    """
+    Returns the kind of limit a ratelimit key is for, for use in metric
+    names.
+    """
+    if key.startswith('ratelimit_listing/'):
+        return 'container_listing'
+    if key.startswith('ratelimit/global-write/'):
+        return 'global_write'
+    if key.count('/') == 1:
+        return 'account'
+    return 'container'
+
+
+class TokenBucket(object):
+    """
+    Local state of the token bucket rate limiter for one ratelimit key.
+
+    The bucket is drained at this process's share of the key's rate. The
+    share is worked out at each reconciliation from this process's demand
+    (requests seen, whether or not they were delayed) and the demand across
+    all processes, as counted in memcache over a sliding window.
+    """
+
+    def __init__(self):
+        # the time at which the next request's token will be available
+        self.running_time = 0
+        self.share = 1.0
+        self.next_sync = 0
+        # demand not yet added to the count in memcache
+        self.pending = 0
+        # the demand this process added to the counts in memcache for the
+        # current and previous windows
+        self.window = None
+        self.window_count = 0
+        self.prev_window_count = 0
+        # decisions made since the last reconciliation
+        self.allowed = 0
+        self.delayed = 0
+        self.rejected = 0
+
+    def add_to_window(self, window, count):
+        if window != self.window:
+            if self.window is not None and window == self.window + 1:
+                self.prev_window_count = self.window_count
+            else:
+                self.prev_window_count = 0
+            self.window = window
+            self.window_count = 0
+        self.window_count += count
+
+    def pop_decision_counts(self):
+        counts = {'allowed': self.allowed, 'delayed': self.delayed,
+                  'rejected': self.rejected}
+        self.allowed = self.delayed = self.rejected = 0
+        return counts
+
+
 class RateLimitMiddleware(object):
     """
     Rate limiting middleware
 
     Rate limits requests on both an Account and Container level.  Limits are
     configurable.
+
+    With the default ``memcache`` rate limiter every rate limited request
+    increments a counter in memcache. The ``token_bucket`` rate limiter
+    instead keeps a :class:`TokenBucket` for each key in the proxy process
+    and only talks to memcache when it reconciles the bucket with the other
+    processes, at most every ``token_bucket_sync_interval`` seconds per key.
     """
 
     BLACK_LIST_SLEEP = 1
@@ -97,7 +162,11 @@ class RateLimitMiddleware(object):
     def __init__(self, app, conf, logger=None):
 
         self.app = app
-        self.logger = logger or get_logger(conf, log_route='ratelimit')
+        if logger:
+            self.logger = logger
+        else:
+            self.logger = get_logger(conf, log_route='ratelimit')
+            self.logger.set_statsd_prefix('ratelimit')
         self.memcache_client = None
         self.account_ratelimit = float(conf.get('account_ratelimit', 0))
         self.max_sleep_time_seconds = \
@@ -116,6 +185,20 @@ class RateLimitMiddleware(object):
             conf, 'container_ratelimit_')
         self.container_listing_ratelimits = interpret_conf_limits(
             conf, 'container_listing_ratelimit_')
+        self.rate_limiter = conf.get('rate_limiter', 'memcache')
+        if self.rate_limiter == 'memcache':
+            self.get_sleep_time = self._get_sleep_time
+        elif self.rate_limiter == 'token_bucket':
+            self.get_sleep_time = self._get_token_bucket_sleep_time
+        else:
+            raise ValueError(
+                'Unknown rate_limiter %r, must be memcache or token_bucket'
+                % self.rate_limiter)
+        self.token_bucket_sync_interval = float(
+            conf.get('token_bucket_sync_interval', 1))
+        self.token_bucket_window = float(conf.get('token_bucket_window', 10))
+        self.max_token_buckets = int(conf.get('max_token_buckets', 10000))
+        self.token_buckets = OrderedDict()
 
     def get_container_size(self, env):
         rv = 0
@@ -218,6 +301,92 @@ class RateLimitMiddleware(object):
         except MemcacheConnectionError:
             return 0
 
+    def _get_token_bucket(self, key):
+        bucket = self.token_buckets.pop(key, None)
+        if bucket is None:
+            bucket = TokenBucket()
+            while len(self.token_buckets) >= self.max_token_buckets:
+                self.token_buckets.popitem(last=False)
+        # keep the most recently used buckets at the end
+        self.token_buckets[key] = bucket
+        return bucket
+
+    def _reconcile_token_bucket(self, key, bucket, now):
+        """
+        Adds the bucket's pending demand to the key's count in memcache and
+        recalculates this process's share of the key's rate from the demand
+        over the last ``token_bucket_window`` seconds. The bucket's decisions
+        since the last reconciliation are logged at debug level.
+        """
+        window = int(now // self.token_bucket_window)
+        window_elapsed = now / self.token_bucket_window - window
+        pending, bucket.pending = bucket.pending, 0
+        try:
+            total = self.memcache_client.incr(
+                '%s/%d' % (key, window), delta=pending,
+                time=int(self.token_bucket_window * 2) + 1)
+            prev_total = self.memcache_client.get(
+                '%s/%d' % (key, window - 1))
+        except MemcacheConnectionError:
+            # carry on with the share we have
+            bucket.pending += pending
+            return
+        bucket.add_to_window(window, pending)
+        try:
+            prev_total = int(prev_total or 0)
+        except ValueError:
+            prev_total = 0
+        # estimate the demand in the last window's length of time
+        weight = 1 - window_elapsed
+        local_demand = bucket.prev_window_count * weight + \
+            bucket.window_count
+        total_demand = prev_total * weight + total
+        if total_demand > local_demand:
+            bucket.share = local_demand / total_demand
+        else:
+            bucket.share = 1.0
+        self.logger.debug(
+            'Token bucket %(key)s: share %(share).3f, %(allowed)d allowed, '
+            '%(delayed)d delayed, %(rejected)d rejected since last sync',
+            dict(bucket.pop_decision_counts(), key=key, share=bucket.share))
+
+    def _get_token_bucket_sleep_time(self, key, max_rate):
+        '''
+        Returns the amount of time (a float in seconds) that the app
+        should sleep, according to the local token bucket for the key.
+
+        :param key: a ratelimit key
+        :param max_rate: maximum rate allowed in requests per second, across
+                         all proxy processes
+        :raises: MaxSleepTimeHitError if max sleep time is exceeded.
+        '''
+        now = time.time()
+        bucket = self._get_token_bucket(key)
+        bucket.pending += 1
+        if now >= bucket.next_sync:
+            bucket.next_sync = now + self.token_bucket_sync_interval
+            self._reconcile_token_bucket(key, bucket, now)
+
+        time_per_request = 1.0 / (max_rate * bucket.share)
+        need_to_sleep = 0
+        if now - bucket.running_time > self.rate_buffer_seconds:
+            bucket.running_time = now + time_per_request
+        else:
+            bucket.running_time += time_per_request
+            need_to_sleep = max(
+                bucket.running_time - now - time_per_request, 0)
+
+        if self.max_sleep_time_seconds - need_to_sleep <= 0.01:
+            bucket.running_time -= time_per_request
+            bucket.rejected += 1
+            raise MaxSleepTimeHitError(
+                "Max Sleep Time Exceeded: %.2f" % need_to_sleep)
+        if need_to_sleep > 0:
+            bucket.delayed += 1
+        else:
+            bucket.allowed += 1
+        return need_to_sleep
+
     def handle_ratelimit(self, req, account_name, container_name, obj_name):
         '''
         Performs rate limiting and account white/black listing.  Sleeps
@@ -255,8 +424,9 @@ class RateLimitMiddleware(object):
         for key, max_rate in self.get_ratelimitable_key_tuples(
                 req, account_name, container_name=container_name,
                 obj_name=obj_name, global_ratelimit=account_global_ratelimit):
+            key_type = get_key_type(key)
             try:
-                need_to_sleep = self._get_sleep_time(key, max_rate)
+                need_to_sleep = self.get_sleep_time(key, max_rate)
                 if self.log_sleep_time_seconds and \
                         need_to_sleep > self.log_sleep_time_seconds:
                     self.logger.warning(
@@ -265,8 +435,12 @@ class RateLimitMiddleware(object):
                         {'sleep': need_to_sleep, 'account': account_name,
                          'container': container_name, 'object': obj_name})
                 if need_to_sleep > 0:
+                    self.logger.increment('%s.delayed' % key_type)
                     eventlet.sleep(need_to_sleep)
+                else:
+                    self.logger.increment('%s.allowed' % key_type)
             except MaxSleepTimeHitError as e:
+                self.logger.increment('%s.rejected' % key_type)
                 self.logger.error(
                     _('Returning 498 for %(meth)s to %(acc)s/%(cont)s/%(obj)s '
                       '. Ratelimit (Max Sleep) %(e)s'),
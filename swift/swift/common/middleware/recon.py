@@ -177,7 +177,8 @@ class ReconMiddleware(object):
         """get expirer info"""
         if recon_type == 'object':
             return self._from_recon_cache(['object_expiration_pass',
-                                           'expired_last_pass'],
+                                           'expired_last_pass',
+                                           'object_expiration_backlog_age'],
                                           self.object_recon_cache)
 
     def get_auditor_info(self, recon_type):
@@ -253,12 +253,14 @@ the manifest and the segments it's referring to) in the container and account
 metadata which can be used for stats purposes.
 """
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from datetime import datetime
 import json
+import math
 import mimetypes
 import re
 import six
+import time
 from hashlib import md5
 from swift.common.exceptions import ListingIterError, SegmentError
 from swift.common.swob import Request, HTTPBadRequest, HTTPServerError, \
@@ -276,6 +278,7 @@ from swift.common.http import HTTP_NOT_FOUND, HTTP_UNAUTHORIZED, is_success
 from swift.common.wsgi import WSGIContext, make_subrequest
 from swift.common.middleware.bulk import get_response_body, \
     ACCEPTABLE_FORMATS, Bulk
+from swift.proxy.controllers.base import get_container_info
 
 
 DEFAULT_RATE_LIMIT_UNDER_SIZE = 1024 * 1024  # 1 MiB
@@ -835,7 +838,9 @@ class SloGetContext(WSGIContext):
             name=req.path, logger=self.slo.logger,
             ua_suffix="SLO MultipartGET",
             swift_source="SLO",
-            max_get_time=self.slo.max_get_time)
+            max_get_time=self.slo.max_get_time,
+            read_ahead=self.slo.segment_read_ahead,
+            read_ahead_bytes=self.slo.segment_read_ahead_bytes)
 
         try:
             segmented_iter.validate_first_segment()
@@ -875,6 +880,7 @@ class StaticLargeObject(object):
         self.conf = conf
         self.app = app
         self.logger = get_logger(conf, log_route='slo')
+        self.logger.set_statsd_prefix('slo')
         self.max_manifest_segments = max_manifest_segments
         self.max_manifest_size = max_manifest_size
         self.max_get_time = int(self.conf.get('max_get_time', 86400))
@@ -884,6 +890,10 @@ class StaticLargeObject(object):
             'rate_limit_after_segment', '10'))
         self.rate_limit_segments_per_sec = int(self.conf.get(
             'rate_limit_segments_per_sec', '1'))
+        self.segment_read_ahead = max(0, int(self.conf.get(
+            'segment_read_ahead', '0')))
+        self.segment_read_ahead_bytes = int(self.conf.get(
+            'segment_read_ahead_bytes', '8388608'))
         self.concurrency = min(1000, max(0, int(self.conf.get(
             'concurrency', '2'))))
         delete_concurrency = int(self.conf.get(
@@ -940,22 +950,48 @@ class StaticLargeObject(object):
         if not out_content_type:
             out_content_type = 'text/plain'
         data_for_storage = []
+        # Each segment is only HEADed once however many times it (or
+        # "/<container>/<object>" vs "<container>/<object>") is listed, and
+        # the paths are grouped by container.
         path2indices = defaultdict(list)
+        container2paths = OrderedDict()
         for index, seg_dict in enumerate(parsed_data):
-            path2indices[seg_dict['path']].append(index)
+            path = '/' + seg_dict['path'].lstrip('/')
+            if path not in path2indices:
+                container2paths.setdefault(
+                    path.split('/')[1], []).append(path)
+            path2indices[path].append(index)
 
-        def do_head(obj_name):
+        def make_segment_request(obj_name):
             obj_path = '/'.join(['', vrs, account,
                                  get_valid_utf8_str(obj_name).lstrip('/')])
 
-            sub_req = make_subrequest(
+            return make_subrequest(
                 req.environ, path=obj_path + '?',  # kill the query string
                 method='HEAD',
                 headers={'x-auth-token': req.headers.get('x-auth-token')},
                 agent='%(orig)s SLO MultipartPUT', swift_source='SLO')
-            return obj_name, sub_req.get_response(self)
+
+        def do_head(obj_name):
+            return obj_name, make_segment_request(obj_name).get_response(self)
+
+        # the segments' HEAD responses, by path, for the rest of the request
+        head_resps = {}
+
+        def head_segments(paths):
+            with StreamingPile(self.concurrency) as pile:
+                for obj_name, resp in pile.asyncstarmap(do_head, (
+                        (path, ) for path in paths)):
+                    head_resps[obj_name] = resp
+
+        def container_is_missing(obj_name):
+            seg_req = make_segment_request(obj_name)
+            container_info = get_container_info(
+                seg_req.environ, self.app, swift_source='SLO')
+            return container_info['status'] == HTTP_NOT_FOUND
 
         def validate_seg_dict(seg_dict, head_seg_resp):
+            obj_name = seg_dict['path']
             if not head_seg_resp.is_success:
                 problem_segments.append([quote(obj_name),
                                          head_seg_resp.status])
@@ -1013,15 +1049,40 @@ class StaticLargeObject(object):
                 seg_data['sub_slo'] = True
             return segment_length, seg_data
 
-        data_for_storage = [None] * len(parsed_data)
-        with StreamingPile(self.concurrency) as pile:
-            for obj_name, resp in pile.asyncstarmap(do_head, (
-                    (path, ) for path in path2indices)):
-                for i in path2indices[obj_name]:
-                    segment_length, seg_data = validate_seg_dict(
-                        parsed_data[i], resp)
-                    data_for_storage[i] = seg_data
-                    total_size += segment_length
+        validation_start = time.time()
+        # HEAD one segment in each container first. That gets the
+        # container's info cached for the rest of its segments' HEADs, rather
+        # than every one of the first concurrent HEADs fetching it, and
+        # means that when the container doesn't exist we can skip HEADing
+        # the rest of its segments.
+        head_segments(paths[0] for paths in container2paths.values())
+        remaining_paths = []
+        for paths in container2paths.values():
+            if len(paths) > 1 and \
+                    head_resps[paths[0]].status_int == HTTP_NOT_FOUND and \
+                    container_is_missing(paths[0]):
+                for path in paths[1:]:
+                    head_resps[path] = HTTPNotFound()
+            else:
+                remaining_paths.extend(paths[1:])
+        head_segments(remaining_paths)
+
+        data_for_storage = []
+        for seg_dict in parsed_data:
+            segment_length, seg_data = validate_seg_dict(
+                seg_dict, head_resps['/' + seg_dict['path'].lstrip('/')])
+            data_for_storage.append(seg_data)
+            total_size += segment_length
+
+        # Segment counts are bucketed by order of magnitude so that the cost
+        # of validating different sizes of manifest can be compared.
+        size_bucket = 10 ** int(math.log10(max(1, len(parsed_data))))
+        self.logger.timing_since('put.validation.timing', validation_start)
+        self.logger.timing_since(
+            'put.validation.%d.timing' % size_bucket, validation_start)
+        self.logger.update_stats('put.segments', len(parsed_data))
+        self.logger.update_stats(
+            'put.segment_heads', len(container2paths) + len(remaining_paths))
 
         if problem_segments:
             resp_body = get_response_body(
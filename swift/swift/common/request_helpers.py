@@ -20,11 +20,13 @@ Why not swift.common.utils, you ask? Because this way we can import things
 from swob in here without creating circular imports.
 """
 
+import collections
 import hashlib
 import itertools
 import sys
 import time
 
+from eventlet import spawn
 import six
 from six.moves.urllib.parse import unquote
 from swift.common.header_key_dict import HeaderKeyDict
@@ -324,11 +326,20 @@ class SegmentedIterable(object):
     :param name: name of manifest (used in logging only)
     :param response_body_length: optional response body length for
                                  the response being sent to the client.
+    :param read_ahead: how many segment GETs to have open beyond the one
+                       currently being sent, so that the first-byte latency
+                       of each is hidden behind sending the one before it.
+                       0 fetches each segment only when it is needed.
+    :param read_ahead_bytes: the most segment data to buffer in memory at
+                             once while reading ahead; the bodies of segments
+                             that don't fit are not read until they are
+                             needed.
     """
 
     def __init__(self, req, app, listing_iter, max_get_time,
                  logger, ua_suffix, swift_source,
-                 name='<not specified>', response_body_length=None):
+                 name='<not specified>', response_body_length=None,
+                 read_ahead=0, read_ahead_bytes=0):
         self.req = req
         self.app = app
         self.listing_iter = listing_iter
@@ -338,6 +349,8 @@ class SegmentedIterable(object):
         self.swift_source = swift_source
         self.name = name
         self.response_body_length = response_body_length
+        self.read_ahead = read_ahead
+        self.read_ahead_bytes = read_ahead_bytes
         self.peeked_chunk = None
         self.app_iter = self._internal_iter()
         self.validated_first_segment = False
@@ -428,12 +441,89 @@ class SegmentedIterable(object):
         if pending_req:
             yield pending_req, pending_etag, pending_size
 
+    def _expected_length(self, seg_req, seg_size):
+        if seg_size is None:
+            return None
+        if not seg_req.range:
+            return seg_size
+        ranges = seg_req.range.ranges_for_length(seg_size)
+        if not ranges:
+            return None
+        return sum(end - start for start, end in ranges)
+
+    def _open_segment(self, seg_req, buffer_body):
+        seg_resp = seg_req.get_response(self.app)
+        if buffer_body and is_success(seg_resp.status_int):
+            app_iter = seg_resp.app_iter
+            try:
+                seg_resp.app_iter = list(app_iter)
+            finally:
+                close_if_possible(app_iter)
+        return seg_resp
+
+    def _fetch_segments(self):
+        """
+        Yields the segment GET responses, in the form of a 4-tuple
+        (segment-request, segment-etag, segment-size, segment-response).
+
+        With read-ahead the next ``read_ahead`` segment GETs are made
+        concurrently with the current segment's, and the bodies of as many of
+        them as fit in ``read_ahead_bytes`` are read into memory.
+        """
+        requests = self._coalesce_requests()
+        if not self.read_ahead:
+            for seg_req, seg_etag, seg_size in requests:
+                yield (seg_req, seg_etag, seg_size,
+                       seg_req.get_response(self.app))
+            return
+
+        pending = collections.deque()
+        buffered_bytes = 0
+        listing_error = None
+        try:
+            while True:
+                while listing_error is None and \
+                        len(pending) <= self.read_ahead:
+                    try:
+                        seg_req, seg_etag, seg_size = next(requests)
+                    except StopIteration:
+                        break
+                    except (ListingIterError, SegmentError):
+                        # the segments before the error still get sent
+                        listing_error = sys.exc_info()
+                        break
+                    length = self._expected_length(seg_req, seg_size)
+                    if length is not None and \
+                            buffered_bytes + length <= self.read_ahead_bytes:
+                        buffered_bytes += length
+                    else:
+                        length = 0
+                    pending.append((seg_req, seg_etag, seg_size, length, spawn(
+                        self._open_segment, seg_req, bool(length))))
+                if not pending:
+                    break
+                seg_req, seg_etag, seg_size, length, fetcher = \
+                    pending.popleft()
+                yield seg_req, seg_etag, seg_size, fetcher.wait()
+                buffered_bytes -= length
+            if listing_error:
+                six.reraise(*listing_error)
+        finally:
+            for _req, _etag, _size, _length, fetcher in pending:
+                if not fetcher.dead:
+                    fetcher.kill()
+                    continue
+                try:
+                    close_if_possible(fetcher.wait().app_iter)
+                except Exception:
+                    pass
+
     def _internal_iter(self):
         bytes_left = self.response_body_length
+        segments = self._fetch_segments()
 
         try:
-            for seg_req, seg_etag, seg_size in self._coalesce_requests():
-                seg_resp = seg_req.get_response(self.app)
+            for seg_req, seg_etag, seg_size, seg_resp in segments:
                 if not is_success(seg_resp.status_int):
                     close_if_possible(seg_resp.app_iter)
                     raise SegmentError(
@@ -509,6 +599,7 @@ class SegmentedIterable(object):
         finally:
             if self.current_resp:
                 close_if_possible(self.current_resp.app_iter)
+            segments.close()
 
     def app_iter_range(self, *a, **kw):
         """
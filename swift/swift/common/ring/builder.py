@@ -15,6 +15,7 @@
 
 import copy
 import errno
+import hashlib
 import itertools
 import logging
 import math
@@ -46,6 +47,108 @@ class RingValidationWarning(Warning):
     pass
 
 
+def _parts_array(parts):
+    return None if parts is None else array('I', parts)
+
+
+def _parts_set(parts):
+    return None if parts is None else set(parts)
+
+
+class _RebalanceIndex(object):
+    """
+    Bookkeeping kept between incremental rebalances of a RingBuilder, so
+    that a rebalance only has to look at the parts affected by what changed
+    since the last one. It is saved in the builder file, so that it carries
+    over between swift-ring-builder runs.
+
+    :param replica2part2dev: the builder's current assignment tables
+    """
+
+    def __init__(self, replica2part2dev):
+        # dev_id -> set of parts with at least one replica on that device
+        self.dev2parts = defaultdict(set)
+        for part2dev in replica2part2dev:
+            for part, dev_id in enumerate(part2dev):
+                if dev_id != NONE_DEV:
+                    self.dev2parts[dev_id].add(part)
+        # parts whose assignments changed during the current rebalance
+        self.touched_parts = set()
+        # parts with more replicas in some tier than the replica plan
+        # allows, valid for the replica plan identified by plan_key
+        self.plan_key = None
+        self.undispersed_parts = None
+        # parts found undispersed while gathering in the current rebalance
+        self.found_undispersed = set()
+        # what the last dispersion graph was built from, and which parts
+        # it considered at risk
+        self.graph_key = None
+        self.graph_dev_tiers = None
+        self.parts_at_risk = None
+        # digest of the assignment tables the index was last updated for
+        self.snapshot = None
+
+    def to_dict(self):
+        """
+        Returns a dict that can be pickled with the builder and later
+        restored with from_dict. Sets of parts are stored as arrays, which
+        pickle far more compactly.
+        """
+        return {'dev2parts': dict((dev_id, _parts_array(parts))
+                                  for dev_id, parts in self.dev2parts.items()
+                                  if parts),
+                'plan_key': self.plan_key,
+                'undispersed_parts': _parts_array(self.undispersed_parts),
+                'graph_key': self.graph_key,
+                'graph_dev_tiers': self.graph_dev_tiers,
+                'parts_at_risk': _parts_array(self.parts_at_risk),
+                'snapshot': self.snapshot}
+
+    @classmethod
+    def from_dict(cls, index_data):
+        index = cls([])
+        for dev_id, parts in index_data['dev2parts'].items():
+            index.dev2parts[dev_id] = set(parts)
+        index.plan_key = index_data['plan_key']
+        index.undispersed_parts = _parts_set(index_data['undispersed_parts'])
+        index.graph_key = index_data['graph_key']
+        index.graph_dev_tiers = index_data['graph_dev_tiers']
+        index.parts_at_risk = _parts_set(index_data['parts_at_risk'])
+        index.snapshot = index_data['snapshot']
+        return index
+
+    def add(self, part, dev_id):
+        self.dev2parts[dev_id].add(part)
+        self.touched_parts.add(part)
+
+    def discard(self, part, dev_id, replica2part2dev):
+        # a device may (in rings built by older code) hold more than one
+        # replica of a part; only forget the part once none are left
+        if not any(part < len(part2dev) and part2dev[part] == dev_id
+                   for part2dev in replica2part2dev):
+            self.dev2parts[dev_id].discard(part)
+        self.touched_parts.add(part)
+
+    @staticmethod
+    def _digest(replica2part2dev):
+        digest = hashlib.md5()
+        for part2dev in replica2part2dev:
+            digest.update(str(len(part2dev)))
+            digest.update(part2dev.tostring())
+        return digest.hexdigest()
+
+    def take_snapshot(self, replica2part2dev):
+        self.snapshot = self._digest(replica2part2dev)
+
+    def matches(self, replica2part2dev):
+        """
+        Check that the builder's assignments have not been changed behind
+        the index's back since the last snapshot.
+        """
+        return self.snapshot is not None and \
+            self.snapshot == self._digest(replica2part2dev)
+
+
 try:
     # python 2.7+
     from logging import NullHandler
@@ -121,6 +224,9 @@ class RingBuilder(object):
         self._remove_devs = []
         self._ring = None
 
+        # for rebalance(incremental=True)
+        self._rebalance_index = None
+
         self.logger = logging.getLogger("swift.ring.builder")
         if not self.logger.handlers:
             self.logger.disabled = True
@@ -190,6 +296,7 @@ class RingBuilder(object):
         This is to restore a RingBuilder that has had its b.to_dict()
         previously saved.
         """
+        index = None
         if hasattr(builder, 'devs'):
             self.part_power = builder.part_power
             self.replicas = builder.replicas
@@ -220,7 +327,11 @@ class RingBuilder(object):
             self._dispersion_graph = builder.get('_dispersion_graph', {})
             self.dispersion = builder.get('dispersion')
             self._remove_devs = builder['_remove_devs']
+            index_data = builder.get('_rebalance_index')
+            if index_data:
+                index = _RebalanceIndex.from_dict(index_data)
         self._ring = None
+        self._rebalance_index = index
 
         # Old builders may not have a region defined for their devices, in
         # which case we default it to 1.
@@ -254,7 +365,9 @@ class RingBuilder(object):
                 '_last_part_gather_start': self._last_part_gather_start,
                 '_dispersion_graph': self._dispersion_graph,
                 'dispersion': self.dispersion,
-                '_remove_devs': self._remove_devs}
+                '_remove_devs': self._remove_devs,
+                '_rebalance_index': (self._rebalance_index.to_dict()
+                                     if self._rebalance_index else None)}
 
     def change_min_part_hours(self, min_part_hours):
         """
@@ -410,7 +523,7 @@ class RingBuilder(object):
         self.devs_changed = True
         self.version += 1
 
-    def rebalance(self, seed=None):
+    def rebalance(self, seed=None, incremental=False):
         """
         Rebalance the ring.
 
@@ -425,6 +538,16 @@ class RingBuilder(object):
         below 1% or doesn't change by more than 1% (only happens with a ring
         that can't be balanced no matter what).
 
+        In incremental mode the builder keeps an index of which parts each
+        device holds and which parts are not yet dispersed, and uses it (and
+        keeps it up to date) across calls so that gathering parts and
+        rebuilding the dispersion graph only visit the parts that are
+        affected by weight or device changes. The index is saved with the
+        builder. The resulting assignments are identical to a
+        non-incremental rebalance with the same seed.
+
+        :param seed: seed for the random number generator
+        :param incremental: if True, use and maintain the rebalance index
         :returns: (number_of_partitions_altered, resulting_balance,
                    number_of_removed_devices)
         """
@@ -448,6 +571,18 @@ class RingBuilder(object):
         self._ring = None
 
         old_replica2part2dev = copy.deepcopy(self._replica2part2dev)
+        if not incremental:
+            self._rebalance_index = None
+        elif self._replica2part2dev is None:
+            self._rebalance_index = _RebalanceIndex([])
+        elif not (self._rebalance_index and
+                  self._rebalance_index.matches(self._replica2part2dev)):
+            self.logger.debug("Building rebalance index")
+            self._rebalance_index = _RebalanceIndex(self._replica2part2dev)
+        index = self._rebalance_index
+        if index:
+            index.touched_parts = set()
+            index.found_undispersed = set()
 
         if self._last_part_moves is None:
             self.logger.debug("New builder; performing initial balance")
@@ -456,11 +591,25 @@ class RingBuilder(object):
         self._update_last_part_moves()
 
         replica_plan = self._build_replica_plan()
+        if index:
+            plan_key = self._replica_plan_key(replica_plan)
+            if plan_key != index.plan_key:
+                index.plan_key = plan_key
+                index.undispersed_parts = None
         self._set_parts_wanted(replica_plan)
 
         assign_parts = defaultdict(list)
         # gather parts from replica count adjustment
+        old_lengths = [len(p2d) for p2d in self._replica2part2dev or []]
         self._adjust_replica2part2dev_size(assign_parts)
+        if index and old_lengths != [len(p2d) for p2d in
+                                     self._replica2part2dev]:
+            # replica count changed; start the index over
+            self.logger.debug("Rebuilding rebalance index")
+            index = self._rebalance_index = _RebalanceIndex(
+                self._replica2part2dev)
+            index.plan_key = plan_key
+            index.touched_parts.update(assign_parts)
         # gather parts from failed devices
         removed_devs = self._gather_parts_from_failed_devices(assign_parts)
         # gather parts for dispersion (N.B. this only picks up parts that
@@ -497,7 +646,13 @@ class RingBuilder(object):
 
         self.devs_changed = False
         self.version += 1
-        changed_parts = self._build_dispersion_graph(old_replica2part2dev)
+        if index:
+            changed_parts = self._update_dispersion_graph(
+                old_replica2part2dev)
+            self._update_undispersed_parts(replica_plan)
+            index.take_snapshot(self._replica2part2dev)
+        else:
+            changed_parts = self._build_dispersion_graph(old_replica2part2dev)
 
         # clean up the cache
         for dev in self._iter_devs():
@@ -505,7 +660,8 @@ class RingBuilder(object):
 
         return changed_parts, self.get_balance(), removed_devs
 
-    def _build_dispersion_graph(self, old_replica2part2dev=None):
+    def _build_dispersion_graph(self, old_replica2part2dev=None,
+                                at_risk_parts=None):
         """
         Build a dict of all tiers in the cluster to a list of the number of
         parts with a replica count at each index.  The values of the dict will
@@ -526,6 +682,8 @@ class RingBuilder(object):
 
         :param old_replica2part2dev: if called from rebalance, the
             old_replica2part2dev can be used to count moved parts.
+        :param at_risk_parts: if given, a set to which every part found at
+            risk is added
 
         :returns: number of parts with different assignments than
             old_replica2part2dev if provided
@@ -578,10 +736,176 @@ class RingBuilder(object):
             # as at_risk once
             if part_at_risk:
                 parts_at_risk += 1
+                if at_risk_parts is not None:
+                    at_risk_parts.add(part_id)
         self._dispersion_graph = dispersion_graph
         self.dispersion = 100.0 * parts_at_risk / self.parts
         return changed_parts
 
+    def _dispersion_graph_key(self):
+        return (self.parts, int(math.ceil(self.replicas)),
+                tuple(len(p2d) for p2d in self._replica2part2dev),
+                sorted(self._build_max_replicas_by_tier().items()))
+
+    def _update_dispersion_graph(self, old_replica2part2dev):
+        """
+        Incremental counterpart of _build_dispersion_graph for use by
+        incremental rebalances: only the parts touched by this rebalance
+        have their contribution to the dispersion graph replaced.
+
+        Falls back to a full rebuild whenever the previous graph was built
+        against a different shape of ring, tier tree or device tiers.
+
+        :param old_replica2part2dev: the assignments before the rebalance
+        :returns: number of parts with different assignments than
+            old_replica2part2dev
+        """
+        index = self._rebalance_index
+        graph_key = self._dispersion_graph_key()
+        dev_tiers = dict((dev['id'], dev['tiers'])
+                         for dev in self._iter_devs())
+        if (graph_key != index.graph_key or index.parts_at_risk is None or
+                any(index.graph_dev_tiers.get(dev_id, tiers) != tiers
+                    for dev_id, tiers in dev_tiers.items())):
+            self.logger.debug("Building dispersion graph")
+            index.parts_at_risk = set()
+            changed_parts = self._build_dispersion_graph(
+                old_replica2part2dev, index.parts_at_risk)
+            index.graph_key = graph_key
+            index.graph_dev_tiers = dev_tiers
+            return changed_parts
+
+        int_replicas = int(math.ceil(self.replicas))
+        max_allowed_replicas = self._build_max_replicas_by_tier()
+        # just like _build_dispersion_graph, only whole stripes of replicas
+        # are considered
+        min_len = min(len(p2d) for p2d in self._replica2part2dev)
+        dispersion_graph = self._dispersion_graph
+        changed_parts = 0
+
+        def count_replicas_at_tier(replica2part2dev, tiers_by_dev_id, part):
+            replicas_at_tier = defaultdict(int)
+            for part2dev in replica2part2dev:
+                for tier in tiers_by_dev_id[part2dev[part]]:
+                    replicas_at_tier[tier] += 1
+            return replicas_at_tier
+
+        for part in index.touched_parts:
+            if part >= min_len:
+                continue
+            for replica, part2dev in enumerate(self._replica2part2dev):
+                if old_replica2part2dev[replica][part] != part2dev[part]:
+                    changed_parts += 1
+            old_counts = count_replicas_at_tier(
+                old_replica2part2dev, index.graph_dev_tiers, part)
+            for tier, replicas in old_counts.items():
+                dispersion_graph[tier][0] += 1
+                dispersion_graph[tier][replicas] -= 1
+                if dispersion_graph[tier][0] == self.parts:
+                    del dispersion_graph[tier]
+            new_counts = count_replicas_at_tier(
+                self._replica2part2dev, dev_tiers, part)
+            part_at_risk = False
+            for tier, replicas in new_counts.items():
+                if tier not in dispersion_graph:
+                    dispersion_graph[tier] = [self.parts] + [0] * int_replicas
+                dispersion_graph[tier][0] -= 1
+                dispersion_graph[tier][replicas] += 1
+                if replicas > max_allowed_replicas[tier]:
+                    part_at_risk = True
+            if part_at_risk:
+                index.parts_at_risk.add(part)
+            else:
+                index.parts_at_risk.discard(part)
+
+        self.dispersion = 100.0 * len(index.parts_at_risk) / self.parts
+        index.graph_dev_tiers = dev_tiers
+        return changed_parts
+
+    def _replica_plan_key(self, replica_plan):
+        """
+        Summarize everything the dispersion of a part depends on besides its
+        own assignments: the replica plan's max for each tier and the tiers
+        of each device.
+        """
+        return (sorted((tier, plan['max'])
+                       for tier, plan in replica_plan.items()),
+                sorted((dev['id'], dev['tiers']) for dev in self._iter_devs()))
+
+    def _is_part_undispersed(self, part, replica_plan):
+        replicas_at_tier = defaultdict(int)
+        for dev in self._devs_for_part(part):
+            for tier in dev['tiers']:
+                replicas_at_tier[tier] += 1
+        return any(replicas > replica_plan[tier]['max']
+                   for tier, replicas in replicas_at_tier.items())
+
+    def _update_undispersed_parts(self, replica_plan):
+        """
+        Record which parts are left undispersed after an incremental
+        rebalance; the next incremental rebalance with the same replica plan
+        only has to consider these for dispersion.
+        """
+        index = self._rebalance_index
+        index.undispersed_parts = set(
+            part for part in index.found_undispersed | index.touched_parts
+            if part < self.parts and
+            self._is_part_undispersed(part, replica_plan))
+
+    def _iter_parts_to_gather(self, start=0, overweight_only=False):
+        """
+        Yield the parts to consider while gathering, starting at `start` and
+        wrapping around the ring.
+
+        Without a rebalance index that's every part; with one, parts that
+        cannot possibly be gathered are skipped.
+
+        :param start: offset into self.parts to begin at
+        :param overweight_only: if True, only parts with a replica on an
+            overweight device can be gathered; otherwise only parts that
+            are not dispersed according to the replica plan
+        """
+        index = self._rebalance_index
+        candidates = None
+        if index is not None:
+            if overweight_only:
+                candidates = set()
+                for dev in self._iter_devs():
+                    if dev['parts_wanted'] < 0:
+                        candidates.update(index.dev2parts.get(dev['id'], ()))
+            elif index.undispersed_parts is not None:
+                candidates = index.undispersed_parts
+        if candidates is None:
+            for offset in range(self.parts):
+                yield (start + offset) % self.parts
+            return
+        for part in sorted(candidates,
+                           key=lambda p: (p - start) % self.parts):
+            yield part
+
+    def _dev_usage_from_index(self, dev_len, parts_in_map):
+        """
+        Count the partitions assigned to each device from the rebalance
+        index, if there is one for the current assignments.
+
+        :returns: an array of the number of partitions on each device, or
+                  None if they have to be counted from the assignments
+        """
+        index = self._rebalance_index
+        if not (index and index.matches(self._replica2part2dev)):
+            return None
+        dev_usage = array('I', (0 for _junk in range(dev_len)))
+        for dev_id, parts in index.dev2parts.items():
+            if dev_id >= dev_len:
+                return None
+            dev_usage[dev_id] = len(parts)
+        # the index holds each part once per device, so a device with more
+        # than one replica of a part has to be counted the slow way (and
+        # then fails validation below)
+        if sum(dev_usage) != parts_in_map:
+            return None
+        return dev_usage
+
     def validate(self, stats=False):
         """
         Validate the ring.
@@ -617,10 +941,12 @@ class RingBuilder(object):
         if stats:
             # dev_usage[dev_id] will equal the number of partitions assigned to
             # that device.
-            dev_usage = array('I', (0 for _junk in range(dev_len)))
-            for part2dev in self._replica2part2dev:
-                for dev_id in part2dev:
-                    dev_usage[dev_id] += 1
+            dev_usage = self._dev_usage_from_index(dev_len, parts_in_map)
+            if dev_usage is None:
+                dev_usage = array('I', (0 for _junk in range(dev_len)))
+                for part2dev in self._replica2part2dev:
+                    for dev_id in part2dev:
+                        dev_usage[dev_id] += 1
 
         for dev in self._iter_devs():
             if not isinstance(dev['port'], int):
@@ -890,10 +1216,13 @@ class RingBuilder(object):
         if self._remove_devs:
             dev_ids = [d['id'] for d in self._remove_devs if d['parts']]
             if dev_ids:
-                for part, replica in self._each_part_replica():
+                for part, replica in self._each_part_replica(dev_ids):
                     dev_id = self._replica2part2dev[replica][part]
                     if dev_id in dev_ids:
                         self._replica2part2dev[replica][part] = NONE_DEV
+                        if self._rebalance_index:
+                            self._rebalance_index.discard(
+                                part, dev_id, self._replica2part2dev)
                         self._set_part_moved(part)
                         assign_parts[part].append(replica)
                         self.logger.debug(
@@ -981,8 +1310,11 @@ class RingBuilder(object):
         """
         # Now we gather partitions that are "at risk" because they aren't
         # currently sufficient spread out across the cluster.
-        for part in range(self.parts):
+        index = self._rebalance_index
+        for part in self._iter_parts_to_gather():
             if (not self._can_part_move(part)):
+                if index and self._is_part_undispersed(part, replica_plan):
+                    index.found_undispersed.add(part)
                 continue
             # First, add up the count of replicas at each tier for each
             # partition.
@@ -1006,6 +1338,8 @@ class RingBuilder(object):
 
             if not undispersed_dev_replicas:
                 continue
+            if index:
+                index.found_undispersed.add(part)
 
             undispersed_dev_replicas.sort(
                 key=lambda dr: dr[0]['parts_wanted'])
@@ -1024,6 +1358,8 @@ class RingBuilder(object):
                     "Gathered %d/%d from dev %d [dispersion]",
                     part, replica, dev['id'])
                 self._replica2part2dev[replica][part] = NONE_DEV
+                if index:
+                    index.discard(part, dev['id'], self._replica2part2dev)
                 for tier in dev['tiers']:
                     replicas_at_tier[tier] -= 1
                 self._set_part_moved(part)
@@ -1041,8 +1377,8 @@ class RingBuilder(object):
         """
         # Last, we gather partitions from devices that are "overweight" because
         # they have more partitions than their parts_wanted.
-        for offset in range(self.parts):
-            part = (start + offset) % self.parts
+        index = self._rebalance_index
+        for part in self._iter_parts_to_gather(start, overweight_only=True):
             if (not self._can_part_move(part)):
                 continue
             # For each part we'll look at the devices holding those parts and
@@ -1081,6 +1417,8 @@ class RingBuilder(object):
                     "Gathered %d/%d from dev %d [weight disperse]",
                     part, replica, dev['id'])
                 self._replica2part2dev[replica][part] = NONE_DEV
+                if index:
+                    index.discard(part, dev['id'], self._replica2part2dev)
                 for tier in dev['tiers']:
                     replicas_at_tier[tier] -= 1
                 self._set_part_moved(part)
@@ -1123,8 +1461,8 @@ class RingBuilder(object):
         :param assign_parts: the map of partition => [replica] to update
         :param start: offset into self.parts to begin search
         """
-        for offset in range(self.parts):
-            part = (start + offset) % self.parts
+        index = self._rebalance_index
+        for part in self._iter_parts_to_gather(start, overweight_only=True):
             if (not self._can_part_move(part)):
                 continue
             overweight_dev_replica = []
@@ -1153,6 +1491,8 @@ class RingBuilder(object):
                 "Gathered %d/%d from dev %d [weight forced]",
                 part, replica, dev['id'])
             self._replica2part2dev[replica][part] = NONE_DEV
+            if index:
+                index.discard(part, dev['id'], self._replica2part2dev)
             self._set_part_moved(part)
 
     def _reassign_parts(self, reassign_parts, replica_plan):
@@ -1271,6 +1611,8 @@ class RingBuilder(object):
                     replicas_at_tier[tier] += 1
 
                 self._replica2part2dev[replica][part] = dev['id']
+                if self._rebalance_index:
+                    self._rebalance_index.add(part, dev['id'])
                 self.logger.debug(
                     "Placed %d/%d onto dev %d", part, replica, dev['id'])
 
@@ -1610,10 +1952,23 @@ class RingBuilder(object):
                 in enumerate(self._replica2part2dev)
                 if part < len(part2dev)]
 
-    def _each_part_replica(self):
+    def _each_part_replica(self, dev_ids=None):
         """
         Generator yielding every (partition, replica) pair in the ring.
-        """
+
+        :param dev_ids: if given and the builder has a rebalance index, only
+            pairs assigned to one of these devices are guaranteed to be
+            yielded; the order is the same either way
+        """
+        if dev_ids is not None and self._rebalance_index:
+            parts = set()
+            for dev_id in dev_ids:
+                parts.update(self._rebalance_index.dev2parts.get(dev_id, ()))
+            for replica, part2dev in enumerate(self._replica2part2dev):
+                for part in sorted(parts):
+                    if part < len(part2dev):
+                        yield (part, replica)
+            return
         for replica, part2dev in enumerate(self._replica2part2dev):
             for part in range(len(part2dev)):
                 yield (part, replica)
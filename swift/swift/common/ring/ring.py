@@ -14,9 +14,11 @@
 # limitations under the License.
 
 import array
+import ctypes
 import six.moves.cPickle as pickle
 import json
-from collections import defaultdict
+import mmap
+from collections import defaultdict, OrderedDict
 from gzip import GzipFile
 from os.path import getmtime
 import struct
@@ -35,13 +37,82 @@ from swift.common.utils import hash_path, validate_configuration
 from swift.common.ring.utils import tiers_for_dev
 
 
+DEFAULT_HANDOFF_CACHE_SIZE = 1024
+
+# v2 rings are laid out so that the partition tables can be mmap'ed in
+# place; every table starts on a boundary of this many bytes.
+V2_ALIGNMENT = 8
+
+
+def mmap_ring_path(ring_path):
+    """
+    Get the path of the uncompressed v2 ring that accompanies a v1 ring.
+
+    :param ring_path: path to a (gzipped) v1 ring file, e.g.
+                      /etc/swift/object.ring.gz
+    :returns: the path of the matching v2 ring, e.g. /etc/swift/object.ring
+    """
+    if ring_path.endswith('.gz'):
+        return ring_path[:-len('.gz')]
+    return ring_path + '.v2'
+
+
+class MappedPart2DevId(object):
+    """
+    Read-only, array-like view of one replica's part2dev_id table inside a
+    memory-mapped v2 ring file.
+
+    The table is a ctypes array laid over the mapped pages, which are shared
+    between every process that maps the same ring file, so no per-process
+    copy of the table is made. Lookups that need to be fast should index
+    :attr:`table` directly, which is what :class:`Ring` does.
+
+    :param mapped: an mmap of the whole v2 ring file, or a string holding it
+                   (which is copied)
+    :param offset: byte offset of the table within `mapped`
+    :param length: number of partitions in the table
+    """
+
+    typecode = 'H'
+    itemsize = 2
+
+    def __init__(self, mapped, offset, length):
+        table_type = ctypes.c_uint16 * length
+        try:
+            self.table = table_type.from_buffer(mapped, offset)
+        except TypeError:
+            # read-only buffers such as strings can't be shared
+            self.table = table_type.from_buffer_copy(mapped, offset)
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        return self.table[index]
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def tostring(self):
+        return ctypes.string_at(ctypes.addressof(self.table),
+                                ctypes.sizeof(self.table))
+
+
 class RingData(object):
     """Partitioned consistent hashing ring data (used for serialization)."""
 
-    def __init__(self, replica2part2dev_id, devs, part_shift):
+    def __init__(self, replica2part2dev_id, devs, part_shift,
+                 dev_ids_with_parts=None):
         self.devs = devs
         self._replica2part2dev_id = replica2part2dev_id
         self._part_shift = part_shift
+        self._dev_ids_with_parts = dev_ids_with_parts
 
         for dev in self.devs:
             if dev is not None:
@@ -82,15 +153,79 @@ class RingData(object):
 
         return ring_dict
 
+    @classmethod
+    def deserialize_v2(cls, mapped, metadata_only=False):
+        """
+        Deserialize a memory-mapped v2 ring file into a dictionary with
+        `devs`, `part_shift`, `dev_ids_with_parts` and `replica2part2dev_id`
+        keys.
+
+        Unless the ring was written on a machine of the other byte order,
+        the `replica2part2dev_id` tables are :class:`MappedPart2DevId` views
+        into `mapped` rather than copies.
+
+        :param mapped: An mmap (or string) of the whole v2 ring file.
+        :param bool metadata_only: If True, only load `devs` and `part_shift`
+        :returns: A dict containing `devs`, `part_shift`,
+                  `dev_ids_with_parts` and `replica2part2dev_id`
+        """
+        json_len, = struct.unpack_from('!I', mapped, 6)
+        ring_dict = json.loads(mapped[10:10 + json_len])
+        ring_dict['replica2part2dev_id'] = []
+
+        if metadata_only:
+            return ring_dict
+
+        byteswap = (ring_dict['byteorder'] != sys.byteorder)
+
+        offset = ring_dict['data_offset']
+        for part_count in ring_dict['replica_part_counts']:
+            part2dev = MappedPart2DevId(mapped, offset, part_count)
+            if byteswap:
+                part2dev = array.array('H', part2dev.tostring())
+                part2dev.byteswap()
+            ring_dict['replica2part2dev_id'].append(part2dev)
+            offset += _v2_aligned(2 * part_count)
+
+        return ring_dict
+
+    @classmethod
+    def _load_v2(cls, filename, metadata_only=False):
+        with open(filename, 'rb') as fp:
+            if metadata_only:
+                header = fp.read(10)
+                json_len, = struct.unpack_from('!I', header, 6)
+                return cls.deserialize_v2(header + fp.read(json_len),
+                                          metadata_only=True)
+            # The mapping outlives the file descriptor; it is released once
+            # the last table referencing it is garbage collected, which is
+            # how a reloaded Ring swaps to the new file. The tables are never
+            # written to, but ctypes can only lay them over a writable buffer;
+            # a copy-on-write mapping still shares the pages.
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_COPY)
+        return cls.deserialize_v2(mapped)
+
     @classmethod
     def load(cls, filename, metadata_only=False):
         """
         Load ring data from a file.
 
+        Both gzipped v1 rings and uncompressed, memory-mapped v2 rings are
+        understood; the format is detected from the file contents.
+
         :param filename: Path to a file serialized by the save() method.
         :param bool metadata_only: If True, only load `devs` and `part_shift`.
         :returns: A RingData instance containing the loaded data.
         """
+        with open(filename, 'rb') as fp:
+            magic = fp.read(6)
+        if magic == struct.pack('!4sH', 'R1NG', 2):
+            ring_data = cls._load_v2(filename, metadata_only=metadata_only)
+            return RingData(ring_data['replica2part2dev_id'],
+                            ring_data['devs'], ring_data['part_shift'],
+                            dev_ids_with_parts=ring_data.get(
+                                'dev_ids_with_parts'))
+
         gz_file = GzipFile(filename, 'rb')
         # Python 2.6 GzipFile doesn't support BufferedIO
         if hasattr(gz_file, '_checkReadable'):
@@ -131,13 +266,64 @@ class RingData(object):
         for part2dev_id in ring['replica2part2dev_id']:
             file_obj.write(part2dev_id.tostring())
 
-    def save(self, filename, mtime=1300507380.0):
+    def serialize_v2(self, file_obj):
+        """
+        Write this ring out uncompressed, with every part2dev_id table in
+        native byte order and aligned so it can be mmap'ed in place.
+
+        :param file_obj: A file-like object opened for binary writing.
+        """
+        ring = self.to_dict()
+        metadata = {
+            'devs': ring['devs'], 'part_shift': ring['part_shift'],
+            'replica_count': len(ring['replica2part2dev_id']),
+            'replica_part_counts': [
+                len(p2d) for p2d in ring['replica2part2dev_id']],
+            'dev_ids_with_parts': sorted(self.get_dev_ids_with_parts()),
+            'byteorder': sys.byteorder}
+        json_encoder = json.JSONEncoder(sort_keys=True)
+        # The data offset is recorded in the JSON, whose length in turn
+        # decides the data offset; iterate until the two agree.
+        metadata['data_offset'] = 0
+        while True:
+            json_text = json_encoder.encode(metadata)
+            data_offset = _v2_aligned(10 + len(json_text))
+            if data_offset == metadata['data_offset']:
+                break
+            metadata['data_offset'] = data_offset
+
+        file_obj.write(struct.pack('!4sH', 'R1NG', 2))
+        file_obj.write(struct.pack('!I', len(json_text)))
+        file_obj.write(json_text)
+        file_obj.write('\x00' * (data_offset - 10 - len(json_text)))
+        for part2dev_id in ring['replica2part2dev_id']:
+            data = part2dev_id.tostring()
+            file_obj.write(data)
+            file_obj.write('\x00' * (_v2_aligned(len(data)) - len(data)))
+
+    def get_dev_ids_with_parts(self):
+        """
+        Get the ids of all devices that have at least one partition
+        assigned.
+
+        :returns: a set of device ids
+        """
+        if self._dev_ids_with_parts is None:
+            dev_ids_with_parts = set()
+            for part2dev_id in self._replica2part2dev_id:
+                dev_ids_with_parts.update(part2dev_id)
+            self._dev_ids_with_parts = dev_ids_with_parts
+        return set(self._dev_ids_with_parts)
+
+    def save(self, filename, mtime=1300507380.0, write_mmap=False):
         """
         Serialize this RingData instance to disk.
 
         :param filename: File into which this instance should be serialized.
         :param mtime: time used to override mtime for gzip, default or None
                       if the caller wants to include time
+        :param write_mmap: if True, also write an uncompressed v2 copy of the
+                           ring to :func:`mmap_ring_path` of `filename`
         """
         # Override the timestamp so that the same ring data creates
         # the same bytes on disk. This makes a checksum comparison a
@@ -151,6 +337,27 @@ class RingData(object):
         tempf.close()
         os.chmod(tempf.name, 0o644)
         os.rename(tempf.name, filename)
+        if write_mmap:
+            self.save_v2(mmap_ring_path(filename))
+
+    def save_v2(self, filename):
+        """
+        Serialize this RingData instance to disk in the uncompressed v2
+        format.
+
+        The file is written aside and renamed into place, so processes that
+        still have the previous version mapped keep a consistent view until
+        they reload.
+
+        :param filename: File into which this instance should be serialized.
+        """
+        tempf = NamedTemporaryFile(dir=".", prefix=filename, delete=False)
+        self.serialize_v2(tempf)
+        tempf.flush()
+        os.fsync(tempf.fileno())
+        tempf.close()
+        os.chmod(tempf.name, 0o644)
+        os.rename(tempf.name, filename)
 
     def to_dict(self):
         return {'devs': self.devs,
@@ -158,20 +365,33 @@ class RingData(object):
                 'part_shift': self._part_shift}
 
 
+def _v2_aligned(length):
+    return -(-length // V2_ALIGNMENT) * V2_ALIGNMENT
+
+
 class Ring(object):
     """
     Partitioned consistent hashing ring.
 
+    If an uncompressed v2 copy of the ring (see :func:`mmap_ring_path`) sits
+    next to the gzipped ring and is at least as new, it is memory-mapped
+    instead of unpacking the gzipped ring, so that all processes on a node
+    share one copy of the partition tables and reloads are cheap.
+
     :param serialized_path: path to serialized RingData instance
     :param reload_time: time interval in seconds to check for a ring change
     :param ring_name: ring name string (basically specified from policy)
     :param validation_hook: hook point to validate ring configuration ontime
+    :param handoff_cache_size: number of partitions whose handoff order is
+                               remembered between calls to get_more_nodes();
+                               0 disables the cache
 
     :raises: RingLoadError if the loaded ring data violates its constraint
     """
 
     def __init__(self, serialized_path, reload_time=15, ring_name=None,
-                 validation_hook=lambda ring_data: None):
+                 validation_hook=lambda ring_data: None,
+                 handoff_cache_size=DEFAULT_HANDOFF_CACHE_SIZE):
         # can't use the ring unless HASH_PATH_SUFFIX is set
         validate_configuration()
         if ring_name:
@@ -179,14 +399,23 @@ class Ring(object):
                                                 ring_name + '.ring.gz')
         else:
             self.serialized_path = os.path.join(serialized_path)
+        self.mmap_path = mmap_ring_path(self.serialized_path)
         self.reload_time = reload_time
         self._validation_hook = validation_hook
+        self.handoff_cache_size = handoff_cache_size
+        self._handoff_cache = OrderedDict()
         self._reload(force=True)
 
     def _reload(self, force=False):
         self._rtime = time() + self.reload_time
         if force or self.has_changed():
-            ring_data = RingData.load(self.serialized_path)
+            mtime = self._get_mtime(self.serialized_path)
+            mmap_mtime = self._get_mmap_mtime()
+            if None not in (mtime, mmap_mtime) and mmap_mtime >= mtime:
+                ring_data = RingData.load(self.mmap_path)
+            else:
+                # a missing gz ring raises IOError from here, as it always has
+                ring_data = RingData.load(self.serialized_path)
 
             try:
                 self._validation_hook(ring_data)
@@ -199,6 +428,7 @@ class Ring(object):
                     return
 
             self._mtime = getmtime(self.serialized_path)
+            self._mmap_mtime = mmap_mtime
             self._devs = ring_data.devs
             # NOTE(akscram): Replication parameters like replication_ip
             #                and replication_port are required for
@@ -214,7 +444,12 @@ class Ring(object):
                     if 'port' in dev:
                         dev.setdefault('replication_port', dev['port'])
 
-            self._replica2part2dev_id = ring_data._replica2part2dev_id
+            # Index the ctypes tables of a mapped ring directly, rather than
+            # through their MappedPart2DevId wrappers, so that looking up
+            # the devices of a partition doesn't call back into Python.
+            self._replica2part2dev_id = [
+                getattr(part2dev_id, 'table', part2dev_id)
+                for part2dev_id in ring_data._replica2part2dev_id]
             self._part_shift = ring_data._part_shift
             self._rebuild_tier_data()
 
@@ -226,10 +461,7 @@ class Ring(object):
             # way, a region, zone, or server with no partitions assigned
             # does not count toward our totals, thereby keeping the early
             # bailouts in get_more_nodes() working.
-            dev_ids_with_parts = set()
-            for part2dev_id in self._replica2part2dev_id:
-                for dev_id in part2dev_id:
-                    dev_ids_with_parts.add(dev_id)
+            dev_ids_with_parts = ring_data.get_dev_ids_with_parts()
 
             regions = set()
             zones = set()
@@ -253,6 +485,26 @@ class Ring(object):
             for tier in tiers_for_dev(dev):
                 self.tier2devs[tier].append(dev)
 
+        # Compact per-device table of tier indexes, so that walking the ring
+        # for handoffs compares small ints instead of digging through dicts.
+        # Tier indexes are only unique within a table, never persisted.
+        tier_index = {}
+        self._dev_region = array.array('i', [-1] * len(self._devs))
+        self._dev_zone = array.array('i', [-1] * len(self._devs))
+        self._dev_ip = array.array('i', [-1] * len(self._devs))
+        for dev_id, dev in enumerate(self._devs):
+            if not dev:
+                continue
+            region_tier = (dev['region'],)
+            zone_tier = region_tier + (dev['zone'],)
+            ip_tier = zone_tier + (dev['ip'],)
+            for table, tier in ((self._dev_region, region_tier),
+                                (self._dev_zone, zone_tier),
+                                (self._dev_ip, ip_tier)):
+                table[dev_id] = tier_index.setdefault(
+                    tier, len(tier_index))
+        self._handoff_cache.clear()
+
         tiers_by_length = defaultdict(list)
         for tier in self.tier2devs:
             tiers_by_length[len(tier)].append(tier)
@@ -285,18 +537,32 @@ class Ring(object):
 
         :returns: True if the ring on disk has changed, False otherwise
         """
-        return getmtime(self.serialized_path) != self._mtime
+        return (getmtime(self.serialized_path) != self._mtime or
+                self._get_mmap_mtime() != self._mmap_mtime)
 
-    def _get_part_nodes(self, part):
-        part_nodes = []
-        seen_ids = set()
+    def _get_mmap_mtime(self):
+        return self._get_mtime(self.mmap_path)
+
+    @staticmethod
+    def _get_mtime(path):
+        try:
+            return getmtime(path)
+        except OSError:
+            return None
+
+    def _get_part_dev_ids(self, part):
+        dev_ids = array.array('H')
         for r2p2d in self._replica2part2dev_id:
             if part < len(r2p2d):
                 dev_id = r2p2d[part]
-                if dev_id not in seen_ids:
-                    part_nodes.append(self.devs[dev_id])
-                    seen_ids.add(dev_id)
-        return [dict(node, index=i) for i, node in enumerate(part_nodes)]
+                if dev_id not in dev_ids:
+                    dev_ids.append(dev_id)
+        return dev_ids
+
+    def _get_part_nodes(self, part):
+        devs = self.devs
+        return [dict(devs[dev_id], index=i)
+                for i, dev_id in enumerate(self._get_part_dev_ids(part))]
 
     def get_part(self, account, container=None, obj=None):
         """
@@ -361,6 +627,56 @@ class Ring(object):
         part = self.get_part(account, container, obj)
         return part, self._get_part_nodes(part)
 
+    def get_parts(self, paths):
+        """
+        Get the partitions for many account/container/object paths at once.
+
+        :param paths: iterable of (account, container, obj) tuples; trailing
+                      elements may be omitted for account or container paths
+        :returns: an array.array('I') of partition numbers, in the same order
+                  as `paths`
+        """
+        if time() > self._rtime:
+            self._reload()
+        part_shift = self._part_shift
+        parts = array.array('I')
+        for path in paths:
+            key = hash_path(*path, raw_digest=True)
+            parts.append(struct.unpack_from('>I', key)[0] >> part_shift)
+        return parts
+
+    def get_nodes_batch(self, paths):
+        """
+        Get the partitions and primary device ids for many paths at once.
+
+        This is the bulk counterpart of :func:`get_nodes`; rather than
+        building a list of node dicts per path it returns compact arrays of
+        device ids which index into :attr:`devs`.
+
+        :param paths: iterable of (account, container, obj) tuples
+        :returns: a tuple of (array.array('I') of partitions, list of
+                  array.array('H') of primary device ids, one per path)
+        """
+        parts = self.get_parts(paths)
+        part2dev_ids = {}
+        node_ids = []
+        for part in parts:
+            dev_ids = part2dev_ids.get(part)
+            if dev_ids is None:
+                dev_ids = part2dev_ids[part] = self._get_part_dev_ids(part)
+            node_ids.append(dev_ids)
+        return parts, node_ids
+
+    def _get_handoffs(self, part):
+        handoffs = self._handoff_cache.pop(part, None)
+        if handoffs is None:
+            handoffs = _HandoffList(self._iter_handoff_dev_ids(part))
+            while len(self._handoff_cache) >= self.handoff_cache_size > 0:
+                self._handoff_cache.popitem(last=False)
+        if self.handoff_cache_size > 0:
+            self._handoff_cache[part] = handoffs
+        return handoffs
+
     def get_more_nodes(self, part):
         """
         Generator to get extra nodes for a partition for hinted handoff.
@@ -370,6 +686,10 @@ class Ring(object):
         will usually keep the same sequences of handoffs even with
         ring changes.
 
+        The handoff order for recently used partitions is cached until the
+        ring is reloaded, so repeated calls for a hot partition do not
+        re-walk the ring.
+
         :param part: partition to get handoff nodes for
         :returns: generator of node dicts
 
@@ -377,13 +697,19 @@ class Ring(object):
         """
         if time() > self._rtime:
             self._reload()
-        primary_nodes = self._get_part_nodes(part)
+        for dev_id in self._get_handoffs(part):
+            yield self._devs[dev_id]
+
+    def _iter_handoff_dev_ids(self, part):
+        primary_ids = self._get_part_dev_ids(part)
+        dev_region = self._dev_region
+        dev_zone = self._dev_zone
+        dev_ip = self._dev_ip
 
-        used = set(d['id'] for d in primary_nodes)
-        same_regions = set(d['region'] for d in primary_nodes)
-        same_zones = set((d['region'], d['zone']) for d in primary_nodes)
-        same_ips = set(
-            (d['region'], d['zone'], d['ip']) for d in primary_nodes)
+        used = set(primary_ids)
+        same_regions = set(dev_region[d] for d in primary_ids)
+        same_zones = set(dev_zone[d] for d in primary_ids)
+        same_ips = set(dev_ip[d] for d in primary_ids)
 
         parts = len(self._replica2part2dev_id[0])
         start = struct.unpack_from(
@@ -402,16 +728,13 @@ class Ring(object):
             for part2dev_id in self._replica2part2dev_id:
                 if handoff_part < len(part2dev_id):
                     dev_id = part2dev_id[handoff_part]
-                    dev = self._devs[dev_id]
-                    region = dev['region']
+                    region = dev_region[dev_id]
                     if dev_id not in used and region not in same_regions:
-                        yield dev
+                        yield dev_id
                         used.add(dev_id)
                         same_regions.add(region)
-                        zone = dev['zone']
-                        ip = (region, zone, dev['ip'])
-                        same_zones.add((region, zone))
-                        same_ips.add(ip)
+                        same_zones.add(dev_zone[dev_id])
+                        same_ips.add(dev_ip[dev_id])
                         if len(same_regions) == self._num_regions:
                             hit_all_regions = True
                             break
@@ -427,14 +750,12 @@ class Ring(object):
             for part2dev_id in self._replica2part2dev_id:
                 if handoff_part < len(part2dev_id):
                     dev_id = part2dev_id[handoff_part]
-                    dev = self._devs[dev_id]
-                    zone = (dev['region'], dev['zone'])
+                    zone = dev_zone[dev_id]
                     if dev_id not in used and zone not in same_zones:
-                        yield dev
+                        yield dev_id
                         used.add(dev_id)
                         same_zones.add(zone)
-                        ip = zone + (dev['ip'],)
-                        same_ips.add(ip)
+                        same_ips.add(dev_ip[dev_id])
                         if len(same_zones) == self._num_zones:
                             hit_all_zones = True
                             break
@@ -450,10 +771,9 @@ class Ring(object):
             for part2dev_id in self._replica2part2dev_id:
                 if handoff_part < len(part2dev_id):
                     dev_id = part2dev_id[handoff_part]
-                    dev = self._devs[dev_id]
-                    ip = (dev['region'], dev['zone'], dev['ip'])
+                    ip = dev_ip[dev_id]
                     if dev_id not in used and ip not in same_ips:
-                        yield dev
+                        yield dev_id
                         used.add(dev_id)
                         same_ips.add(ip)
                         if len(same_ips) == self._num_ips:
@@ -472,8 +792,36 @@ class Ring(object):
                 if handoff_part < len(part2dev_id):
                     dev_id = part2dev_id[handoff_part]
                     if dev_id not in used:
-                        yield self._devs[dev_id]
+                        yield dev_id
                         used.add(dev_id)
                         if len(used) == self._num_devs:
                             hit_all_devs = True
                             break
+
+
+class _HandoffList(object):
+    """
+    Lazily materialized sequence of handoff device ids for one partition.
+
+    Handoffs are pulled from the underlying generator only as far as some
+    caller has iterated, and are remembered so that later iterations over
+    the same partition read the cached ids instead of walking the ring.
+    """
+
+    def __init__(self, dev_id_iter):
+        self._dev_id_iter = dev_id_iter
+        self.dev_ids = array.array('H')
+
+    def __iter__(self):
+        index = 0
+        while True:
+            if index < len(self.dev_ids):
+                yield self.dev_ids[index]
+                index += 1
+            elif self._dev_id_iter is None:
+                return
+            else:
+                try:
+                    self.dev_ids.append(next(self._dev_id_iter))
+                except StopIteration:
+                    self._dev_id_iter = None
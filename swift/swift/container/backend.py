@@ -17,6 +17,7 @@ Pluggable Back-ends for Container Server
 """
 
 import os
+from collections import OrderedDict
 from uuid import uuid4
 import time
 
@@ -27,7 +28,7 @@ import sqlite3
 
 from swift.common.utils import Timestamp, encode_timestamps, decode_timestamps, \
     extract_swift_bytes
-from swift.common.db import DatabaseBroker, utf8encode
+from swift.common.db import DatabaseBroker, utf8encode, BROKER_TIMEOUT
 
 
 SQLITE_ARG_LIMIT = 999
@@ -97,6 +98,18 @@ CONTAINER_INFO_TABLE_SCRIPT = '''
     );
 '''
 
+# covers the listing query, so its range scans never touch the object table.
+# Only added when the container-replicator's listing_index option is set: in
+# a 1M row container (tools/container_listing_benchmark.py) it made a 10000
+# row listing page read from disk about 3.5x faster, but made the DB 85%
+# bigger and merging the rows 6x slower, and delimiter listings gained
+# nothing.
+OBJECT_LISTING_INDEX_SCRIPT = '''
+    CREATE INDEX IF NOT EXISTS ix_object_listing ON object (
+        deleted, storage_policy_index, name, created_at, size,
+        content_type, etag);
+'''
+
 CONTAINER_STAT_VIEW_SCRIPT = '''
     CREATE VIEW container_stat
     AS SELECT ci.account, ci.container, ci.created_at,
@@ -222,12 +235,82 @@ def update_new_item_from_existing(new_item, existing):
     return any(newer_than_existing)
 
 
+class ContainerListingCache(object):
+    """
+    LRU cache of container listing pages, shared by the brokers a container
+    server creates for its requests.
+
+    Each page is stored with the state of the DB it was read from (see
+    :meth:`ContainerBroker._get_listing_state`) and is only returned while
+    the DB is still in that state, so pages are never stale, even when the
+    DB was changed by another process. The pages of a DB are also dropped
+    as soon as this process merges items into it.
+
+    :param max_pages: maximum number of listing pages to keep
+    """
+
+    def __init__(self, max_pages=1000):
+        self.max_pages = max_pages
+        self._pages = OrderedDict()
+        self._keys_by_db = {}
+
+    def get(self, db_file, key, state):
+        """
+        Returns the cached page for key, or None if there is no page for
+        key read from the DB in the given state.
+        """
+        cached = self._pages.pop((db_file, key), None)
+        if cached is None:
+            return None
+        if cached[0] != state:
+            self._discard_key(db_file, key)
+            return None
+        self._pages[(db_file, key)] = cached
+        return cached[1]
+
+    def set(self, db_file, key, state, page):
+        if self.max_pages <= 0:
+            return
+        self._pages.pop((db_file, key), None)
+        while len(self._pages) >= self.max_pages:
+            (old_db_file, old_key), _junk = self._pages.popitem(last=False)
+            self._discard_key(old_db_file, old_key)
+        self._pages[(db_file, key)] = (state, page)
+        self._keys_by_db.setdefault(db_file, set()).add(key)
+
+    def invalidate(self, db_file):
+        """
+        Drops all the cached pages of a DB.
+        """
+        for key in self._keys_by_db.pop(db_file, ()):
+            self._pages.pop((db_file, key), None)
+
+    def _discard_key(self, db_file, key):
+        keys = self._keys_by_db.get(db_file)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_db[db_file]
+
+    def __len__(self):
+        return len(self._pages)
+
+
 class ContainerBroker(DatabaseBroker):
     """Encapsulates working with a container database."""
     db_type = 'container'
     db_contains_type = 'object'
     db_reclaim_timestamp = 'created_at'
 
+    def __init__(self, db_file, timeout=BROKER_TIMEOUT, logger=None,
+                 account=None, container=None, pending_timeout=None,
+                 stale_reads_ok=False, listing_cache=None):
+        super(ContainerBroker, self).__init__(
+            db_file, timeout=timeout, logger=logger, account=account,
+            container=container, pending_timeout=pending_timeout,
+            stale_reads_ok=stale_reads_ok)
+        self.listing_cache = listing_cache
+
     @property
     def storage_policy_index(self):
         if not hasattr(self, '_storage_policy_index'):
@@ -664,6 +747,9 @@ class ContainerBroker(DatabaseBroker):
         to limit entries.  Entries will begin with the prefix and will not
         have the delimiter after the prefix.
 
+        If the broker has a listing_cache, the page is returned from it when
+        the same page was listed since the DB last changed.
+
         :param limit: maximum number of entries to get
         :param marker: marker query
         :param end_marker: end marker query
@@ -677,10 +763,48 @@ class ContainerBroker(DatabaseBroker):
         :returns: list of tuples of (name, created_at, size, content_type,
                   etag)
         """
-        delim_force_gte = False
         (marker, end_marker, prefix, delimiter, path) = utf8encode(
             marker, end_marker, prefix, delimiter, path)
         self._commit_puts_stale_ok()
+        with self.get() as conn:
+            if self.listing_cache is None:
+                return self._list_objects(
+                    conn, limit, marker, end_marker, prefix, delimiter, path,
+                    storage_policy_index, reverse)
+            key = (limit, marker, end_marker, prefix, delimiter, path,
+                   storage_policy_index, reverse)
+            state = self._get_listing_state(conn)
+            results = self.listing_cache.get(self.db_file, key, state)
+            if results is None:
+                results = self._list_objects(
+                    conn, limit, marker, end_marker, prefix, delimiter, path,
+                    storage_policy_index, reverse)
+                self.listing_cache.set(self.db_file, key, state, results)
+            return list(results)
+
+    def _get_listing_state(self, conn):
+        """
+        Returns a value that changes whenever rows are added to or removed
+        from the object table: the DB id, which changes if the DB is
+        replaced, the hash of the object names and timestamps, and the last
+        ROWID, which grows with every insert.
+        """
+        return tuple(conn.execute('''
+            SELECT id, hash, (SELECT MAX(ROWID) FROM object)
+            FROM container_stat
+        ''').fetchone())
+
+    def _list_objects(self, conn, limit, marker, end_marker, prefix,
+                      delimiter, path, storage_policy_index, reverse):
+        """
+        Does the work of :meth:`list_objects_iter`, with the arguments
+        already utf8 encoded.
+
+        Each delimiter skip is a new range query with the same shape, so the
+        parts of the query that do not depend on the markers are worked out
+        once.
+        """
+        delim_force_gte = False
         if reverse:
             # Reverse the markers if we are reversing the listing.
             marker, end_marker = end_marker, marker
@@ -694,104 +818,105 @@ class ContainerBroker(DatabaseBroker):
         if prefix:
             end_prefix = prefix[:-1] + chr(ord(prefix[-1]) + 1)
         orig_marker = marker
-        with self.get() as conn:
-            results = []
-            while len(results) < limit:
-                query = '''SELECT name, created_at, size, content_type, etag
-                           FROM object WHERE'''
-                query_args = []
-                if end_marker and (not prefix or end_marker < end_prefix):
-                    query += ' name < ? AND'
-                    query_args.append(end_marker)
-                elif prefix:
-                    query += ' name < ? AND'
-                    query_args.append(end_prefix)
-
-                if delim_force_gte:
-                    query += ' name >= ? AND'
-                    query_args.append(marker)
-                    # Always set back to False
-                    delim_force_gte = False
-                elif marker and marker >= prefix:
-                    query += ' name > ? AND'
-                    query_args.append(marker)
-                elif prefix:
-                    query += ' name >= ? AND'
-                    query_args.append(prefix)
-                if self.get_db_version(conn) < 1:
-                    query += ' +deleted = 0'
+        if self.get_db_version(conn) < 1:
+            deleted_query = ' +deleted = 0'
+        else:
+            deleted_query = ' deleted = 0'
+        orig_tail_query = '''
+            ORDER BY name %s LIMIT ?
+        ''' % ('DESC' if reverse else '')
+        # storage policy filter
+        policy_tail_query = '''
+            AND storage_policy_index = ?
+        ''' + orig_tail_query
+        tail_query = policy_tail_query
+        results = []
+        while len(results) < limit:
+            query = '''SELECT name, created_at, size, content_type, etag
+                       FROM object WHERE'''
+            query_args = []
+            if end_marker and (not prefix or end_marker < end_prefix):
+                query += ' name < ? AND'
+                query_args.append(end_marker)
+            elif prefix:
+                query += ' name < ? AND'
+                query_args.append(end_prefix)
+
+            if delim_force_gte:
+                query += ' name >= ? AND'
+                query_args.append(marker)
+                # Always set back to False
+                delim_force_gte = False
+            elif marker and marker >= prefix:
+                query += ' name > ? AND'
+                query_args.append(marker)
+            elif prefix:
+                query += ' name >= ? AND'
+                query_args.append(prefix)
+            query += deleted_query
+            tail_args = [limit - len(results)]
+            if tail_query is policy_tail_query:
+                tail_args.insert(0, storage_policy_index)
+            try:
+                curs = conn.execute(query + tail_query,
+                                    tuple(query_args + tail_args))
+            except sqlite3.OperationalError as err:
+                if 'no such column: storage_policy_index' not in str(err):
+                    raise
+                # a DB from before storage policies; don't try again
+                tail_query = orig_tail_query
+                tail_args = tail_args[1:]
+                curs = conn.execute(query + tail_query,
+                                    tuple(query_args + tail_args))
+            curs.row_factory = None
+
+            # Delimiters without a prefix is ignored, further if there
+            # is no delimiter then we can simply return the result as
+            # prefixes are now handled in the SQL statement.
+            if prefix is None or not delimiter:
+                return [self._transform_record(r) for r in curs]
+
+            # We have a delimiter and a prefix (possibly empty string) to
+            # handle
+            rowcount = 0
+            for row in curs:
+                rowcount += 1
+                name = row[0]
+                if reverse:
+                    end_marker = name
                 else:
-                    query += ' deleted = 0'
-                orig_tail_query = '''
-                    ORDER BY name %s LIMIT ?
-                ''' % ('DESC' if reverse else '')
-                orig_tail_args = [limit - len(results)]
-                # storage policy filter
-                policy_tail_query = '''
-                    AND storage_policy_index = ?
-                ''' + orig_tail_query
-                policy_tail_args = [storage_policy_index] + orig_tail_args
-                tail_query, tail_args = \
-                    policy_tail_query, policy_tail_args
-                try:
-                    curs = conn.execute(query + tail_query,
-                                        tuple(query_args + tail_args))
-                except sqlite3.OperationalError as err:
-                    if 'no such column: storage_policy_index' not in str(err):
-                        raise
-                    tail_query, tail_args = \
-                        orig_tail_query, orig_tail_args
-                    curs = conn.execute(query + tail_query,
-                                        tuple(query_args + tail_args))
-                curs.row_factory = None
-
-                # Delimiters without a prefix is ignored, further if there
-                # is no delimiter then we can simply return the result as
-                # prefixes are now handled in the SQL statement.
-                if prefix is None or not delimiter:
-                    return [self._transform_record(r) for r in curs]
-
-                # We have a delimiter and a prefix (possibly empty string) to
-                # handle
-                rowcount = 0
-                for row in curs:
-                    rowcount += 1
-                    name = row[0]
-                    if reverse:
-                        end_marker = name
-                    else:
-                        marker = name
-
-                    if len(results) >= limit:
-                        curs.close()
-                        return results
-                    end = name.find(delimiter, len(prefix))
-                    if path is not None:
-                        if name == path:
-                            continue
-                        if end >= 0 and len(name) > end + len(delimiter):
-                            if reverse:
-                                end_marker = name[:end + 1]
-                            else:
-                                marker = name[:end] + chr(ord(delimiter) + 1)
-                            curs.close()
-                            break
-                    elif end >= 0:
+                    marker = name
+
+                if len(results) >= limit:
+                    curs.close()
+                    return results
+                end = name.find(delimiter, len(prefix))
+                if path is not None:
+                    if name == path:
+                        continue
+                    if end >= 0 and len(name) > end + len(delimiter):
                         if reverse:
                             end_marker = name[:end + 1]
                         else:
                             marker = name[:end] + chr(ord(delimiter) + 1)
-                            # we want result to be inclusive of delim+1
-                            delim_force_gte = True
-                        dir_name = name[:end + 1]
-                        if dir_name != orig_marker:
-                            results.append([dir_name, '0', 0, None, ''])
                         curs.close()
                         break
-                    results.append(self._transform_record(row))
-                if not rowcount:
+                elif end >= 0:
+                    if reverse:
+                        end_marker = name[:end + 1]
+                    else:
+                        marker = name[:end] + chr(ord(delimiter) + 1)
+                        # we want result to be inclusive of delim+1
+                        delim_force_gte = True
+                    dir_name = name[:end + 1]
+                    if dir_name != orig_marker:
+                        results.append([dir_name, '0', 0, None, ''])
+                    curs.close()
                     break
-            return results
+                results.append(self._transform_record(row))
+            if not rowcount:
+                break
+        return results
 
     def _transform_record(self, record):
         """
@@ -888,12 +1013,14 @@ class ContainerBroker(DatabaseBroker):
 
         with self.get() as conn:
             try:
-                return _really_merge_items(conn)
+                _really_merge_items(conn)
             except sqlite3.OperationalError as err:
                 if 'no such column: storage_policy_index' not in str(err):
                     raise
                 self._migrate_add_storage_policy(conn)
-                return _really_merge_items(conn)
+                _really_merge_items(conn)
+        if self.listing_cache is not None:
+            self.listing_cache.invalidate(self.db_file)
 
     def get_reconciler_sync(self):
         with self.get() as conn:
@@ -951,6 +1078,31 @@ class ContainerBroker(DatabaseBroker):
                 return []
             return list(dict(row) for row in cur.fetchall())
 
+    def add_listing_index(self):
+        """
+        Add the ix_object_listing covering index to the 'object' table, if it
+        is not there yet. Building the index holds the DB's write lock for as
+        long as it takes to read every row, so this is meant to be called by
+        the replicator rather than while serving a request.
+
+        :returns: True if the index was added, False if it was already there
+                  or the DB still needs its storage policy migration (which
+                  happens on the next write)
+        """
+        with self.get() as conn:
+            if conn.execute('''
+                    SELECT name FROM sqlite_master
+                    WHERE name = 'ix_object_listing' ''').fetchone():
+                return False
+            try:
+                conn.executescript(OBJECT_LISTING_INDEX_SCRIPT)
+            except sqlite3.OperationalError as err:
+                if 'no such column: storage_policy_index' not in str(err):
+                    raise
+                return False
+            conn.commit()
+        return True
+
     def _migrate_add_container_sync_points(self, conn):
         """
         Add the x_container_sync_point columns to the 'container_stat' table.
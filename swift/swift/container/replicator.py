@@ -30,7 +30,7 @@ from swift.common.storage_policy import POLICIES
 from swift.common.exceptions import DeviceUnavailable
 from swift.common.http import is_success
 from swift.common.db import DatabaseAlreadyExists
-from swift.common.utils import (Timestamp, hash_path,
+from swift.common.utils import (Timestamp, hash_path, config_true_value,
                                 storage_directory, majority_size)
 
 
@@ -40,6 +40,11 @@ class ContainerReplicator(db_replicator.Replicator):
     datadir = DATADIR
     default_port = 6201
 
+    def __init__(self, conf, logger=None):
+        super(ContainerReplicator, self).__init__(conf, logger=logger)
+        self.listing_index = config_true_value(
+            conf.get('listing_index', 'false'))
+
     def report_up_to_date(self, full_info):
         reported_key_map = {
             'reported_put_timestamp': 'put_timestamp',
@@ -191,6 +196,9 @@ class ContainerReplicator(db_replicator.Replicator):
         if info['account'] == MISPLACED_OBJECTS_ACCOUNT:
             return
 
+        if self.listing_index and broker.add_listing_index():
+            self.logger.increment('listing_index_added')
+
         try:
             self.sync_store.update_sync_store(broker)
         except Exception:
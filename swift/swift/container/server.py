@@ -25,8 +25,11 @@ from eventlet import Timeout
 
 import swift.common.db
 from swift.container.sync_store import ContainerSyncStore
-from swift.container.backend import ContainerBroker, DATADIR
+from swift.container.backend import ContainerBroker, DATADIR, \
+    ContainerListingCache
 from swift.container.replicator import ContainerReplicatorRpc
+from swift.common.db_replicator import ROW_BATCH_CONTENT_TYPE, \
+    decode_row_batch
 from swift.common.db import DatabaseAlreadyExists
 from swift.common.container_sync_realms import ContainerSyncRealms
 from swift.common.request_helpers import get_param, get_listing_content_type, \
@@ -116,6 +119,9 @@ class ContainerController(BaseStorageServer):
         self.sync_store = ContainerSyncStore(self.root,
                                              self.logger,
                                              self.mount_check)
+        listing_cache_size = int(conf.get('listing_cache_size', 0))
+        self.listing_cache = ContainerListingCache(listing_cache_size) \
+            if listing_cache_size > 0 else None
 
     def _get_container_broker(self, drive, part, account, container, **kwargs):
         """
@@ -133,6 +139,7 @@ class ContainerController(BaseStorageServer):
         kwargs.setdefault('account', account)
         kwargs.setdefault('container', container)
         kwargs.setdefault('logger', self.logger)
+        kwargs.setdefault('listing_cache', self.listing_cache)
         return ContainerBroker(db_path, **kwargs)
 
     def get_and_validate_policy_index(self, req):
@@ -548,13 +555,79 @@ class ContainerController(BaseStorageServer):
         if self.mount_check and not check_mount(self.root, drive):
             return HTTPInsufficientStorage(drive=drive, request=req)
         try:
-            args = json.load(req.environ['wsgi.input'])
+            if req.headers.get('Content-Type') == ROW_BATCH_CONTENT_TYPE:
+                args = decode_row_batch(req.environ['wsgi.input'])
+            else:
+                args = json.load(req.environ['wsgi.input'])
         except ValueError as err:
             return HTTPBadRequest(body=str(err), content_type='text/plain')
         ret = self.replicator_rpc.dispatch(post_args, args)
         ret.request = req
         return ret
 
+    @public
+    @timing_stats()
+    def UPDATE(self, req):
+        """
+        Handle HTTP UPDATE request (a batch of object updates, coalesced by
+        an object server, merged into the container DB in one transaction).
+
+        The body is a json-encoded list of dicts with keys ``op`` (``PUT`` or
+        ``DELETE``), ``obj`` and ``headers``, the latter being the headers the
+        object server would have sent with the equivalent object PUT or DELETE
+        to the container server.
+        """
+        drive, part, account, container = split_and_validate_path(req, 4)
+        req_timestamp = valid_timestamp(req)
+        if self.mount_check and not check_mount(self.root, drive):
+            return HTTPInsufficientStorage(drive=drive, request=req)
+        obj_policy_index = self.get_and_validate_policy_index(req) or 0
+        try:
+            updates = json.load(req.environ['wsgi.input'])
+            records = [self._object_update_record(update, obj_policy_index)
+                       for update in updates]
+        except (ValueError, TypeError, KeyError, AttributeError) as err:
+            return HTTPBadRequest(body='Invalid update batch: %s' % err,
+                                  content_type='text/plain', request=req)
+        broker = self._get_container_broker(drive, part, account, container)
+        if account.startswith(self.auto_create_account_prefix) and \
+                not os.path.exists(broker.db_file):
+            try:
+                broker.initialize(req_timestamp.internal, obj_policy_index)
+            except DatabaseAlreadyExists:
+                pass
+        if not os.path.exists(broker.db_file):
+            return HTTPNotFound()
+        if records:
+            broker.merge_items(records)
+        return HTTPAccepted(request=req)
+
+    def _object_update_record(self, update, obj_policy_index):
+        """
+        Convert one update of an UPDATE batch into an object row, as the
+        object PUT and DELETE handlers would.
+        """
+        name = update['obj']
+        headers = HeaderKeyDict(update['headers'])
+        if not check_utf8(name):
+            raise ValueError('invalid object name')
+        timestamp = Timestamp(headers['x-timestamp']).internal
+        if update['op'] == 'PUT':
+            return {'name': name, 'created_at': timestamp,
+                    'size': int(headers['x-size']),
+                    'content_type': headers['x-content-type'],
+                    'etag': headers['x-etag'], 'deleted': 0,
+                    'storage_policy_index': obj_policy_index,
+                    'ctype_timestamp': headers.get('x-content-type-timestamp'),
+                    'meta_timestamp': headers.get('x-meta-timestamp')}
+        elif update['op'] == 'DELETE':
+            return {'name': name, 'created_at': timestamp, 'size': 0,
+                    'content_type': 'application/deleted',
+                    'etag': 'noetag', 'deleted': 1,
+                    'storage_policy_index': obj_policy_index,
+                    'ctype_timestamp': None, 'meta_timestamp': None}
+        raise ValueError('invalid op %r' % update['op'])
+
     @public
     @timing_stats()
     def POST(self, req):
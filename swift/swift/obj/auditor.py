@@ -14,7 +14,9 @@
 # limitations under the License.
 
 import json
+import mmap
 import os
+import struct
 import sys
 import time
 import signal
@@ -27,23 +29,195 @@ from eventlet import Timeout
 from swift.obj import diskfile, replicator
 from swift.common.utils import (
     get_logger, ratelimit_sleep, dump_recon_cache, list_from_csv, listdir,
-    unlink_paths_older_than, readconf, config_auto_int_value)
+    unlink_paths_older_than, readconf, config_auto_int_value,
+    config_true_value)
 from swift.common.exceptions import DiskFileQuarantined, DiskFileNotExist,\
     DiskFileDeleted, DiskFileExpired
 from swift.common.daemon import Daemon
 from swift.common.storage_policy import POLICIES
 
+# weight of each new latency sample in a device's smoothed read latency
+LATENCY_SMOOTHING = 0.1
+# while a device is slower than io_latency_target its audit rate is multiplied
+# by IO_BUDGET_BACKOFF for each read, down to MIN_IO_BUDGET_SCALE of the
+# configured rate; while it is faster the rate recovers by IO_BUDGET_RECOVERY
+# of the configured rate per read
+IO_BUDGET_BACKOFF = 0.9
+IO_BUDGET_RECOVERY = 0.01
+MIN_IO_BUDGET_SCALE = 0.05
+# each slot of a SharedIOBudget holds a worker's scale as a double
+SHARED_IO_BUDGET_SLOT = struct.Struct('d')
+
+
+class SharedIOBudget(object):
+    """
+    The files and bytes per second budget of the whole node, shared between
+    the parallel auditor workers when shared_io_budget is true.
+
+    Each worker publishes the scale of its device's budget in its own slot of
+    a table in anonymous shared memory, which is created before the workers
+    are forked. The budget is divided max-min fairly: a worker never gets
+    more than its scale of the node's budget, and whatever is left unused by
+    workers that have backed off from a slow device, or that have finished or
+    not yet started, is split evenly between the others.
+
+    :param slots: the number of workers that may share the budget
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._table = mmap.mmap(-1, SHARED_IO_BUDGET_SLOT.size * max(slots, 1))
+        self._format = struct.Struct('%dd' % slots)
+
+    def set_scale(self, slot, scale):
+        """
+        Publishes the scale of a worker; 0 once the worker is done.
+        """
+        SHARED_IO_BUDGET_SLOT.pack_into(
+            self._table, slot * SHARED_IO_BUDGET_SLOT.size, scale)
+
+    def get_share(self, slot):
+        """
+        Returns the fraction of the node's budget a worker may use.
+        """
+        scales = self._format.unpack_from(self._table)
+        available = 1.0
+        active = sorted(scale for scale in scales if scale > 0)
+        for i, scale in enumerate(active):
+            fair_share = available / (len(active) - i)
+            if scale >= fair_share:
+                return min(scales[slot], fair_share)
+            available -= scale
+        return scales[slot]
+
+
+class DeviceIOBudget(object):
+    """
+    Rate limits the auditing of a single device and keeps track of its
+    throughput.
+
+    The device's read latency is smoothed over every read made by the
+    auditor. If io_latency_target is set, the files and bytes per second
+    limits are scaled down while the smoothed latency is above the target,
+    so that a device busy serving clients is audited more slowly, and are
+    scaled back up once it is below the target.
+
+    :param files_per_second: maximum files per second
+    :param bytes_per_second: maximum bytes per second
+    :param latency_target: smoothed read latency, in seconds, above which
+                           the limits are scaled down; 0 to disable
+    :param shared: optional :class:`SharedIOBudget`, in which case the limits
+                   are for the whole node and this device gets its share
+    :param slot: the slot of this device's worker in the shared budget
+    """
+
+    def __init__(self, files_per_second, bytes_per_second, latency_target=0,
+                 shared=None, slot=0):
+        self.max_files_per_second = files_per_second
+        self.max_bytes_per_second = bytes_per_second
+        self.latency_target = latency_target
+        self.shared = shared
+        self.slot = slot
+        self.scale = 1.0
+        self.share = 1.0
+        self.latency = None
+        self.files_running_time = 0
+        self.bytes_running_time = 0
+        self.update_share()
+        self.reset_stats()
+
+    @property
+    def files_per_second(self):
+        return self.max_files_per_second * self.share
+
+    @property
+    def bytes_per_second(self):
+        return self.max_bytes_per_second * self.share
+
+    def update_share(self):
+        """
+        Updates the fraction of the configured rates this device may use.
+        Without a shared budget that is simply its scale.
+        """
+        if self.shared is None:
+            self.share = self.scale
+        else:
+            self.shared.set_scale(self.slot, self.scale)
+            self.share = self.shared.get_share(self.slot)
+
+    def record_latency(self, latency):
+        """
+        Records the time taken by a read from the device.
+        """
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+        if not self.latency_target:
+            return
+        if self.latency > self.latency_target:
+            self.scale = max(MIN_IO_BUDGET_SCALE,
+                             self.scale * IO_BUDGET_BACKOFF)
+        else:
+            self.scale = min(1.0, self.scale + IO_BUDGET_RECOVERY)
+        if self.shared is None:
+            self.share = self.scale
+
+    def files_sleep(self):
+        """
+        Sleeps as needed before auditing the next file.
+        """
+        if self.shared is not None:
+            # the other workers' scales change as they go, so the share is
+            # refreshed once per file rather than once per read
+            self.update_share()
+        self.files += 1
+        self.files_running_time = ratelimit_sleep(
+            self.files_running_time, self.files_per_second)
+
+    def bytes_sleep(self, num_bytes):
+        """
+        Sleeps as needed after reading num_bytes.
+        """
+        self.bytes += num_bytes
+        self.bytes_running_time = ratelimit_sleep(
+            self.bytes_running_time, self.bytes_per_second,
+            incr_by=num_bytes)
+
+    def reset_stats(self):
+        self.files = 0
+        self.bytes = 0
+        self.stats_start = time.time()
+
+    def get_stats(self):
+        """
+        Returns the throughput of the device since the stats were last reset,
+        for the recon cache.
+        """
+        # Avoid divide by zero during very short runs
+        elapsed = (time.time() - self.stats_start) or 0.000001
+        return {'files_per_second': self.files / elapsed,
+                'bytes_per_second': self.bytes / elapsed,
+                'read_latency': self.latency,
+                'io_budget_scale': self.scale,
+                'io_budget_share': self.share}
+
 
 class AuditorWorker(object):
     """Walk through file system to audit objects"""
 
-    def __init__(self, conf, logger, rcache, devices, zero_byte_only_at_fps=0):
+    def __init__(self, conf, logger, rcache, devices, zero_byte_only_at_fps=0,
+                 shared_io_budget=None, io_budget_slot=0):
         self.conf = conf
         self.logger = logger
         self.devices = devices
         self.max_files_per_second = float(conf.get('files_per_second', 20))
         self.max_bytes_per_second = float(conf.get('bytes_per_second',
                                                    10000000))
+        self.io_latency_target = float(conf.get('io_latency_target', 0))
+        self.shared_io_budget = shared_io_budget
+        self.io_budget_slot = io_budget_slot
+        self.device_budgets = {}
         try:
             # ideally unless ops overrides the rsync_tempfile_timeout in the
             # auditor section we can base our behavior on whatever they
@@ -81,8 +255,6 @@ class AuditorWorker(object):
             self.auditor_type = 'ZBF'
         self.log_time = int(conf.get('log_time', 3600))
         self.last_logged = 0
-        self.files_running_time = 0
-        self.bytes_running_time = 0
         self.bytes_processed = 0
         self.total_bytes_processed = 0
         self.total_files_processed = 0
@@ -95,6 +267,24 @@ class AuditorWorker(object):
         self.stats_buckets = dict(
             [(s, 0) for s in self.stats_sizes + ['OVER']])
 
+    def get_io_budget(self, device):
+        """
+        Returns the :class:`DeviceIOBudget` for a device. A ZBF worker gets
+        the whole of its rate; otherwise, when the devices are being audited
+        by parallel workers sharing the budget, each gets its share of the
+        configured rates.
+        """
+        budget = self.device_budgets.get(device)
+        if budget is None:
+            shared = None if self.zero_byte_only_at_fps else \
+                self.shared_io_budget
+            budget = self.device_budgets[device] = DeviceIOBudget(
+                self.max_files_per_second,
+                self.max_bytes_per_second,
+                latency_target=self.io_latency_target,
+                shared=shared, slot=self.io_budget_slot)
+        return budget
+
     def create_recon_nested_dict(self, top_level_key, device_list, item):
         if device_list:
             device_key = ''.join(sorted(device_list))
@@ -136,8 +326,7 @@ class AuditorWorker(object):
             loop_time = time.time()
             self.failsafe_object_audit(location)
             self.logger.timing_since('timing', loop_time)
-            self.files_running_time = ratelimit_sleep(
-                self.files_running_time, self.max_files_per_second)
+            self.get_io_budget(location.device).files_sleep()
             self.total_files_processed += 1
             now = time.time()
             if now - self.last_logged >= self.log_time:
@@ -162,7 +351,8 @@ class AuditorWorker(object):
                     {'errors': self.errors, 'passes': self.passes,
                      'quarantined': self.quarantines,
                      'bytes_processed': self.bytes_processed,
-                     'start_time': reported, 'audit_time': time_auditing})
+                     'start_time': reported, 'audit_time': time_auditing,
+                     'devices': self.get_device_stats()})
                 dump_recon_cache(cache_entry, self.rcache, self.logger)
                 reported = now
                 total_quarantines += self.quarantines
@@ -192,8 +382,21 @@ class AuditorWorker(object):
             self.logger.info(
                 _('Object audit stats: %s') % json.dumps(self.stats_buckets))
 
-        # Unset remaining partitions to not skip them in the next run
-        diskfile.clear_auditor_status(self.devices, self.auditor_type)
+        # Unset remaining partitions to not skip them in the next run; only
+        # for the devices this worker audited, as parallel workers auditing
+        # other devices may still be relying on theirs
+        diskfile.clear_auditor_status(self.devices, self.auditor_type,
+                                      device_dirs=device_dirs)
+
+    def get_device_stats(self):
+        """
+        Returns the throughput of each device audited since the last call.
+        """
+        device_stats = {}
+        for device, budget in self.device_budgets.items():
+            device_stats[device] = budget.get_stats()
+            budget.reset_stats()
+        return device_stats
 
     def record_stats(self, obj_size):
         """
@@ -238,9 +441,12 @@ class AuditorWorker(object):
         # location does not exist; if this raises an unexpected error it
         # will get logged in failsafe
         df = diskfile_mgr.get_diskfile_from_audit_location(location)
+        budget = self.get_io_budget(location.device)
         reader = None
         try:
+            read_start = time.time()
             with df.open():
+                budget.record_latency(time.time() - read_start)
                 metadata = df.get_metadata()
                 obj_size = int(metadata['Content-Length'])
                 if self.stats_sizes:
@@ -249,12 +455,12 @@ class AuditorWorker(object):
                     reader = df.reader(_quarantine_hook=raise_dfq)
             if reader:
                 with closing(reader):
+                    read_start = time.time()
                     for chunk in reader:
+                        budget.record_latency(time.time() - read_start)
                         chunk_len = len(chunk)
-                        self.bytes_running_time = ratelimit_sleep(
-                            self.bytes_running_time,
-                            self.max_bytes_per_second,
-                            incr_by=chunk_len)
+                        budget.bytes_sleep(chunk_len)
+                        read_start = time.time()
                         self.bytes_processed += chunk_len
                         self.total_bytes_processed += chunk_len
         except DiskFileQuarantined as err:
@@ -293,13 +499,17 @@ class ObjectAuditor(Daemon):
         self.conf = conf
         self.logger = get_logger(conf, log_route='object-auditor')
         self.devices = conf.get('devices', '/srv/node')
-        self.concurrency = int(conf.get('concurrency', 1))
+        # 0, from concurrency = auto, audits every device in its own process
+        self.concurrency = config_auto_int_value(
+            conf.get('concurrency', 1), 0)
         self.conf_zero_byte_fps = int(
             conf.get('zero_byte_files_per_second', 50))
         self.recon_cache_path = conf.get('recon_cache_path',
                                          '/var/cache/swift')
         self.rcache = join(self.recon_cache_path, "object.recon")
         self.interval = int(conf.get('interval', 30))
+        self.shared_io_budget = config_true_value(
+            conf.get('shared_io_budget', 'false'))
 
     def _sleep(self):
         time.sleep(self.interval)
@@ -314,10 +524,19 @@ class ObjectAuditor(Daemon):
         mode = kwargs.get('mode')
         zero_byte_only_at_fps = kwargs.get('zero_byte_fps', 0)
         device_dirs = kwargs.get('device_dirs')
+        shared_io_budget = kwargs.get('shared_io_budget')
+        io_budget_slot = kwargs.get('io_budget_slot', 0)
         worker = AuditorWorker(self.conf, self.logger, self.rcache,
                                self.devices,
-                               zero_byte_only_at_fps=zero_byte_only_at_fps)
-        worker.audit_all_objects(mode=mode, device_dirs=device_dirs)
+                               zero_byte_only_at_fps=zero_byte_only_at_fps,
+                               shared_io_budget=shared_io_budget,
+                               io_budget_slot=io_budget_slot)
+        try:
+            worker.audit_all_objects(mode=mode, device_dirs=device_dirs)
+        finally:
+            if shared_io_budget and not zero_byte_only_at_fps:
+                # hand this worker's share back to the others
+                shared_io_budget.set_scale(io_budget_slot, 0)
 
     def fork_child(self, zero_byte_fps=False, **kwargs):
         """Child execution"""
@@ -355,13 +574,20 @@ class ObjectAuditor(Daemon):
                 pids.add(self.fork_child(**kwargs))
             else:
                 # Divide devices amongst parallel processes set by
-                # self.concurrency.  Total number of parallel processes
-                # is self.concurrency + 1 if zero_byte_fps.
-                parallel_proc = self.concurrency + 1 if \
-                    self.conf_zero_byte_fps else self.concurrency
+                # self.concurrency, or one per device if it is auto.  Total
+                # number of parallel processes is concurrency + 1 if
+                # zero_byte_fps.
                 device_list = list(override_devices) if override_devices else \
                     listdir(self.devices)
                 shuffle(device_list)
+                concurrency = self.concurrency or len(device_list)
+                parallel_proc = concurrency + 1 if \
+                    self.conf_zero_byte_fps else concurrency
+                if self.shared_io_budget and device_list:
+                    # files_per_second and bytes_per_second are for the whole
+                    # node, so share them between the device workers
+                    kwargs['shared_io_budget'] = SharedIOBudget(
+                        len(device_list))
                 while device_list:
                     pid = None
                     if len(pids) == parallel_proc:
@@ -382,6 +608,8 @@ class ObjectAuditor(Daemon):
                         pids.add(zbf_pid)
                     else:
                         kwargs['device_dirs'] = [device_list.pop()]
+                        # each device has its own slot in the shared budget
+                        kwargs['io_budget_slot'] = len(device_list)
                         pids.add(self.fork_child(**kwargs))
             while pids:
                 pid = os.wait()[0]
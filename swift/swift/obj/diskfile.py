@@ -37,6 +37,7 @@ import fcntl
 import json
 import os
 import re
+import sqlite3
 import time
 import uuid
 import hashlib
@@ -70,11 +71,14 @@ from swift.common.splice import splice, tee
 from swift.common.exceptions import DiskFileQuarantined, DiskFileNotExist, \
     DiskFileCollision, DiskFileNoSpace, DiskFileDeviceUnavailable, \
     DiskFileDeleted, DiskFileError, DiskFileNotOpen, PathNotDir, \
-    ReplicationLockTimeout, DiskFileExpired, DiskFileXattrNotSupported
+    ReplicationLockTimeout, DiskFileExpired, DiskFileXattrNotSupported, \
+    ChunkReadError, ChunkReadTimeout
 from swift.common.swob import multi_range_iterator
 from swift.common.storage_policy import (
     get_policy_string, split_policy_string, PolicyError, POLICIES,
     REPL_POLICY, EC_POLICY)
+from swift.obj.suffix_index import SuffixHashIndex, split_partition_path, \
+    read_index_token, write_index_token
 from functools import partial
 
 
@@ -492,8 +496,17 @@ def update_auditor_status(datadir_path, logger, partitions, auditor_type):
                            {'auditor_status': auditor_status, 'err': e})
 
 
-def clear_auditor_status(devices, auditor_type="ALL"):
-    for device in os.listdir(devices):
+def clear_auditor_status(devices, auditor_type="ALL", device_dirs=None):
+    """
+    Removes the auditor status files, so the next audit pass starts from the
+    beginning.
+
+    :param devices: parent directory of the devices
+    :param auditor_type: the auditor type, e.g. "ALL" or "ZBF"
+    :param device_dirs: optional list of devices to clear the status of;
+                        by default all devices are cleared
+    """
+    for device in device_dirs or os.listdir(devices):
         for dir_ in os.listdir(os.path.join(devices, device)):
             if not dir_.startswith("objects"):
                 continue
@@ -567,7 +580,6 @@ class BaseDiskFileManager(object):
 
     diskfile_cls = None  # must be set by subclasses
 
-    invalidate_hash = strip_self(invalidate_hash)
     consolidate_hashes = strip_self(consolidate_hashes)
     quarantine_renamer = strip_self(quarantine_renamer)
 
@@ -583,6 +595,11 @@ class BaseDiskFileManager(object):
             conf.get('replication_one_per_device', 'true'))
         self.replication_lock_timeout = int(conf.get(
             'replication_lock_timeout', 15))
+        self.suffix_hash_index = config_true_value(
+            conf.get('suffix_hash_index', 'false'))
+        self.suffix_hash_index_timeout = float(conf.get(
+            'suffix_hash_index_timeout', 1.0))
+        self._suffix_indexes = {}
 
         self.use_splice = False
         self.pipe_size = None
@@ -612,6 +629,17 @@ class BaseDiskFileManager(object):
                 with open('/proc/sys/fs/pipe-max-size') as f:
                     max_pipe_size = int(f.read())
                 self.pipe_size = min(max_pipe_size, self.disk_chunk_size)
+
+        # Zero-copy PUTs reuse the splice() and MD5 socket machinery that
+        # zero-copy GETs need, so they are only possible when that works.
+        conf_wants_splice_put = config_true_value(
+            conf.get('splice_put', 'no'))
+        if conf_wants_splice_put and not self.use_splice:
+            self.logger.warning(
+                "Zero-copy PUTs requested (config says \"splice_put = %s\"), "
+                "but splice() is not in use. splice() will not be used for "
+                "PUTs." % conf.get('splice_put'))
+        self.use_splice_put = conf_wants_splice_put and self.use_splice
         self.use_linkat = o_tmpfile_supported()
 
     def make_on_disk_filename(self, timestamp, ext=None,
@@ -1035,8 +1063,18 @@ class BaseDiskFileManager(object):
         """
         raise NotImplementedError
 
-    def _get_hashes(self, *args, **kwargs):
-        hashed, hashes = self.__get_hashes(*args, **kwargs)
+    def _get_hashes(self, partition_path, *args, **kwargs):
+        if self.suffix_hash_index:
+            try:
+                return self._get_indexed_hashes(
+                    partition_path, *args, **kwargs)
+            except sqlite3.Error as err:
+                # the hashes.pkl written instead makes the next read rebuild
+                # the partition's index
+                self.logger.warning(
+                    'Unable to read suffix hash index for %s: %s',
+                    partition_path, err)
+        hashed, hashes = self.__get_hashes(partition_path, *args, **kwargs)
         hashes.pop('updated', None)
         hashes.pop('valid', None)
         return hashed, hashes
@@ -1119,6 +1157,142 @@ class BaseDiskFileManager(object):
         else:
             return hashed, hashes
 
+    def _get_suffix_index(self, partition_path):
+        """
+        Returns a tuple of (index, datadir, partition) for the suffix hash
+        index of the device a partition is on.
+        """
+        db_file, datadir, partition = split_partition_path(partition_path)
+        index = self._suffix_indexes.get(db_file)
+        if index is None:
+            index = self._suffix_indexes[db_file] = SuffixHashIndex(
+                db_file, timeout=self.suffix_hash_index_timeout)
+        return index, datadir, partition
+
+    def invalidate_hash(self, suffix_dir):
+        """
+        Invalidates the hash for a suffix_dir in the device's suffix hash
+        index if it is enabled, or else in the partition's hashes.invalid.
+
+        :param suffix_dir: absolute path to suffix dir whose hash needs
+                           invalidating
+        """
+        if self.suffix_hash_index:
+            index, datadir, partition = self._get_suffix_index(
+                dirname(suffix_dir))
+            try:
+                index.invalidate(datadir, partition, [basename(suffix_dir)])
+                return
+            except sqlite3.Error as err:
+                # hashes.invalid is folded into the index on the next read
+                self.logger.warning(
+                    'Unable to invalidate %s in suffix hash index %s: %s',
+                    suffix_dir, index.db_file, err)
+        invalidate_hash(suffix_dir)
+
+    def forget_partition(self, partition_path):
+        """
+        Removes a partition from the device's suffix hash index, if it is
+        enabled. Called once the partition directory has been removed.
+
+        :param partition_path: absolute path of the removed partition
+        """
+        if not self.suffix_hash_index:
+            return
+        index, datadir, partition = self._get_suffix_index(partition_path)
+        try:
+            index.remove(datadir, partition)
+        except sqlite3.Error as err:
+            # the rows are harmless; a recreated partition has no token file
+            # and so is rebuilt anyway
+            self.logger.warning(
+                'Unable to remove %s from suffix hash index %s: %s',
+                partition_path, index.db_file, err)
+
+    def _read_suffix_index(self, partition_path, recalculate=None):
+        """
+        Reads the suffix hash index of a partition, first folding in any
+        suffixes left in hashes.invalid by callers of the module level
+        :func:`invalidate_hash`.
+
+        :returns: a tuple of (index, datadir, partition, rows) where rows is
+                  as returned by :meth:`SuffixHashIndex.get`, or None if the
+                  partition's index needs to be rebuilt
+        """
+        index, datadir, partition = self._get_suffix_index(partition_path)
+        invalidations_file = join(partition_path, HASH_INVALIDATIONS_FILE)
+        if os.path.exists(invalidations_file):
+            with lock_path(partition_path):
+                with open(invalidations_file, 'rb') as inv_fh:
+                    suffixes = set(line.strip() for line in inv_fh)
+                suffixes.discard('')
+                if suffixes:
+                    index.invalidate(datadir, partition, suffixes)
+                    with open(invalidations_file, 'wb'):
+                        pass
+        rows = index.get(datadir, partition,
+                         read_index_token(partition_path),
+                         invalidate=recalculate)
+        if os.path.exists(join(partition_path, HASH_FILE)):
+            # hashes have been written without the index since it was built
+            rows = None
+        return index, datadir, partition, rows
+
+    def _get_indexed_hashes(self, partition_path, recalculate=None,
+                            do_listdir=False):
+        """
+        Get hashes for each suffix dir in a partition from the device's
+        suffix hash index, rehashing only the suffixes marked as dirty.
+
+        :param partition_path: absolute path of partition to get hashes for
+        :param recalculate: list of suffixes which should be recalculated when
+                            got
+        :param do_listdir: force existence check for all hashes in the
+                           partition
+
+        :returns: tuple of (number of suffix dirs hashed, dictionary of hashes)
+        """
+        hashed = 0
+        index, datadir, partition, rows = self._read_suffix_index(
+            partition_path, recalculate)
+        token = None
+        if rows is None:
+            token = index.reset(datadir, partition)
+            remove_file(join(partition_path, HASH_FILE))
+            do_listdir = True
+        if do_listdir:
+            index.add_suffixes(datadir, partition, [
+                suff for suff in os.listdir(partition_path)
+                if len(suff) == 3])
+            self.logger.debug('Run listdir on %s', partition_path)
+            if token:
+                write_index_token(partition_path, token)
+            else:
+                token = read_index_token(partition_path)
+            rows = index.get(datadir, partition, token)
+            if rows is None:
+                # the index was reset again underneath us
+                return self._get_indexed_hashes(partition_path, recalculate)
+        hashes = {}
+        updates = []
+        for suffix, (hash_, version) in rows.items():
+            if not hash_:
+                try:
+                    hash_ = self._hash_suffix(join(partition_path, suffix))
+                    hashed += 1
+                except PathNotDir:
+                    updates.append((suffix, version, None))
+                    continue
+                except OSError:
+                    logging.exception(_('Error hashing suffix'))
+                else:
+                    updates.append((suffix, version, hash_))
+            hashes[suffix] = hash_
+        if updates and index.update(datadir, partition, updates):
+            # some suffixes were invalidated again while we hashed them
+            return self._get_indexed_hashes(partition_path)
+        return hashed, hashes
+
     def construct_dev_path(self, device):
         """
         Construct the path to a device without checking if it is mounted.
@@ -1328,7 +1502,9 @@ class BaseDiskFileManager(object):
     def yield_suffixes(self, device, partition, policy):
         """
         Yields tuples of (full_path, suffix_only) for suffixes stored
-        on the given device and partition.
+        on the given device and partition. If the suffix hash index is
+        enabled and valid for the partition the suffixes are read from it
+        rather than listed.
 
         :param device: name of target device
         :param partition: partition name
@@ -1339,7 +1515,21 @@ class BaseDiskFileManager(object):
             raise DiskFileDeviceUnavailable()
         partition_path = os.path.join(dev_path, get_data_dir(policy),
                                       partition)
-        for suffix in self._listdir(partition_path):
+        suffixes = None
+        if self.suffix_hash_index:
+            try:
+                rows = tpool_reraise(
+                    self._read_suffix_index, partition_path)[-1]
+            except sqlite3.Error as err:
+                self.logger.warning(
+                    'Unable to read suffix hash index for %s: %s',
+                    partition_path, err)
+                rows = None
+            if rows is not None:
+                suffixes = sorted(rows)
+        if suffixes is None:
+            suffixes = self._listdir(partition_path)
+        for suffix in suffixes:
             if len(suffix) != 3:
                 continue
             try:
@@ -1467,6 +1657,10 @@ class BaseDiskFileWriter(object):
     def put_succeeded(self):
         return self._put_succeeded
 
+    @property
+    def upload_size(self):
+        return self._upload_size
+
     def write(self, chunk):
         """
         Write a chunk of data to disk. All invocations of this method must
@@ -1484,6 +1678,10 @@ class BaseDiskFileWriter(object):
             self._upload_size += written
             chunk = chunk[written:]
 
+        self._sync_if_needed()
+        return self._upload_size
+
+    def _sync_if_needed(self):
         # For large files sync every 512MB (by default) written
         diff = self._upload_size - self._last_sync
         if diff >= self._bytes_per_sync:
@@ -1491,7 +1689,110 @@ class BaseDiskFileWriter(object):
             drop_buffer_cache(self._fd, self._last_sync, diff)
             self._last_sync = self._upload_size
 
-        return self._upload_size
+    def can_zero_copy_receive(self):
+        """
+        Returns True if :meth:`zero_copy_receive` may be used to write the
+        object. Writers that can't splice should return False.
+        """
+        return self.manager.use_splice_put
+
+    def zero_copy_receive(self, rsockfd, length, buffered='', timeout=None,
+                          deadline=None):
+        """
+        Does some magic with splice() and tee() to move stuff from network
+        to disk without ever touching userspace. This is the counterpart of
+        :func:`BaseDiskFileReader.zero_copy_send`; it must be called instead
+        of, not in addition to, :func:`write`.
+
+        :param rsockfd: file descriptor (integer) of the socket from which to
+                        receive data
+        :param length: number of bytes of object data to receive, including
+                       any already buffered bytes
+        :param buffered: object data already read off the socket by the
+                         caller
+        :param timeout: seconds to wait for the socket to become readable
+        :param deadline: absolute time after which the upload is abandoned
+        :returns: a tuple of (upload size, hex MD5 of the received data)
+        :raises ChunkReadTimeout: if the socket does not become readable in
+                                  time or the deadline passes
+        :raises ChunkReadError: if the client disconnects before sending
+                                ``length`` bytes
+        """
+        client_rpipe, client_wpipe = os.pipe()
+        hash_rpipe, hash_wpipe = os.pipe()
+        md5_sockfd = get_md5_socket()
+
+        # Note: this will raise IOError on failure, so we don't bother
+        # checking the return value.
+        pipe_size = fcntl.fcntl(client_rpipe, F_SETPIPE_SZ,
+                                self._diskfile._pipe_size)
+        fcntl.fcntl(hash_rpipe, F_SETPIPE_SZ, pipe_size)
+
+        def drain_pipe(bytes_in_pipe):
+            # Hash and write out bytes_in_pipe bytes sitting in the client
+            # pipe; see zero_copy_send() for why tee() and the MD5 socket
+            # neither block nor come up short here.
+            bytes_copied = tee(client_rpipe, hash_wpipe, bytes_in_pipe, 0)
+            if bytes_copied != bytes_in_pipe:
+                raise Exception("tee() failed: tried to move %d bytes, "
+                                "but only moved %d" %
+                                (bytes_in_pipe, bytes_copied))
+            (hashed, _1, _2) = splice(hash_rpipe, None, md5_sockfd, None,
+                                      bytes_in_pipe, splice.SPLICE_F_MORE)
+            if hashed != bytes_in_pipe:
+                raise Exception("md5 socket didn't take all the data? "
+                                "(tried to write %d, but wrote %d)" %
+                                (bytes_in_pipe, hashed))
+            while bytes_in_pipe > 0:
+                (written, _1, _2) = splice(client_rpipe, None, self._fd,
+                                           None, bytes_in_pipe, 0)
+                bytes_in_pipe -= written
+                self._upload_size += written
+            self._sync_if_needed()
+
+        try:
+            # Whatever the WSGI server already pulled off the socket goes
+            # through the pipe too, so it gets hashed with the rest.
+            while buffered:
+                bytes_in_pipe = os.write(client_wpipe, buffered[:pipe_size])
+                buffered = buffered[bytes_in_pipe:]
+                drain_pipe(bytes_in_pipe)
+
+            while self._upload_size < length:
+                if deadline is not None and time.time() > deadline:
+                    raise ChunkReadTimeout()
+                try:
+                    (bytes_in_pipe, _1, _2) = splice(
+                        rsockfd, None, client_wpipe, None,
+                        min(pipe_size, length - self._upload_size), 0)
+                except IOError as exc:
+                    if exc.errno == errno.EWOULDBLOCK:
+                        trampoline(rsockfd, read=True, timeout=timeout,
+                                   timeout_exc=ChunkReadTimeout)
+                        continue
+                    raise
+                if bytes_in_pipe == 0:
+                    raise ChunkReadError(
+                        'client disconnected after %d of %d bytes' %
+                        (self._upload_size, length))
+                drain_pipe(bytes_in_pipe)
+
+            # Linux MD5 sockets return '00000000000000000000000000000000' for
+            # the checksum if you didn't write any bytes to them, instead of
+            # returning the correct value.
+            if self._upload_size > 0:
+                bin_checksum = os.read(md5_sockfd, 16)
+                hex_checksum = ''.join("%02x" % ord(c) for c in bin_checksum)
+            else:
+                hex_checksum = MD5_OF_EMPTY_STRING
+        finally:
+            os.close(client_rpipe)
+            os.close(client_wpipe)
+            os.close(hash_rpipe)
+            os.close(hash_wpipe)
+            os.close(md5_sockfd)
+
+        return self._upload_size, hex_checksum
 
     def _finalize_put(self, metadata, target_path, cleanup):
         # Write the metadata before calling fsync() so that both data and
@@ -15,9 +15,13 @@
 
 from six.moves import urllib
 
+from collections import deque
 from random import random
 from time import time
+from os import getpid
 from os.path import join
+from socket import gethostname
+from uuid import uuid4
 from swift import gettext_ as _
 import hashlib
 
@@ -25,14 +29,70 @@ from eventlet import sleep, Timeout
 from eventlet.greenpool import GreenPool
 
 from swift.common.daemon import Daemon
+from swift.common.direct_client import direct_delete_container_object, \
+    direct_update_container
+from swift.common.exceptions import ClientException
 from swift.common.internal_client import InternalClient, UnexpectedResponse
-from swift.common.utils import get_logger, dump_recon_cache, split_path
+from swift.common.utils import get_logger, dump_recon_cache, split_path, \
+    config_true_value, Timestamp
 from swift.common.http import HTTP_NOT_FOUND, HTTP_CONFLICT, \
-    HTTP_PRECONDITION_FAILED
+    HTTP_PRECONDITION_FAILED, HTTP_METHOD_NOT_ALLOWED
 
 from swift.container.reconciler import direct_delete_container_entry
 
 MAX_OBJECTS_TO_CACHE = 100000
+TASK_SYSMETA_PREFIX = 'x-container-sysmeta-expirer-'
+
+
+def format_task_lease(owner, expires):
+    return '%s %s' % (Timestamp(expires).internal, owner)
+
+
+def parse_task_lease(value):
+    """
+    Parse the value of a task container's lease sysmeta.
+
+    :returns: a tuple of (owner, expires), or (None, 0) if there is no lease
+    """
+    try:
+        expires, owner = value.split(' ', 1)
+        return owner, float(expires)
+    except (AttributeError, ValueError):
+        return None, 0
+
+
+class TaskContainerLease(object):
+    """
+    An expirer's lease on a task container, and its progress through the
+    container's listing.
+
+    The listing cursor only moves past a queue entry once it and all the
+    entries before it have either been popped or have failed; failed entries
+    are retried once the listing has been worked through to the end.
+
+    :param container: the task container's name
+    :param expires: the time at which the lease expires
+    :param cursor: the name of the last queue entry dealt with
+    """
+
+    def __init__(self, container, expires, cursor=''):
+        self.container = container
+        self.expires = expires
+        self.cursor = cursor
+        self.lost = False
+        self.in_flight = deque()
+        # entries whose objects have been deleted, waiting to be popped
+        self.pops = []
+
+    def start(self, obj):
+        entry = [obj, False]
+        self.in_flight.append(entry)
+        return entry
+
+    def finish(self, entry):
+        entry[1] = True
+        while self.in_flight and self.in_flight[0][1]:
+            self.cursor = self.in_flight.popleft()[0]
 
 
 class ObjectExpirer(Daemon):
@@ -69,6 +129,17 @@ class ObjectExpirer(Daemon):
         # marker will be retried before it is abandoned.  It is not coupled
         # with the tombstone reclaim age in the consistency engine.
         self.reclaim_age = int(conf.get('reclaim_age', 604800))
+        # In task lease mode expirers share out the work by taking leases on
+        # whole task containers rather than by hashing queue entry names.
+        self.task_container_leases = config_true_value(
+            conf.get('task_container_leases', 'false'))
+        self.task_lease_time = int(conf.get('task_lease_time', 300))
+        self.pop_queue_batch_size = int(conf.get('pop_queue_batch_size', 100))
+        if self.pop_queue_batch_size < 1:
+            raise ValueError("pop_queue_batch_size must be set to at least 1")
+        self.lease_owner = '%s-%d-%s' % (gethostname(), getpid(),
+                                         uuid4().hex[:8])
+        self.backlog_age = 0
 
     def report(self, final=False):
         """
@@ -84,7 +155,9 @@ class ObjectExpirer(Daemon):
                                '%(objects)d objects expired') % {
                              'time': elapsed, 'objects': self.report_objects})
             dump_recon_cache({'object_expiration_pass': elapsed,
-                              'expired_last_pass': self.report_objects},
+                              'expired_last_pass': self.report_objects,
+                              'object_expiration_backlog_age':
+                              self.backlog_age},
                              self.rcache, self.logger)
         elif time() - self.report_last_time >= self.report_interval:
             elapsed = time() - self.report_first_time
@@ -165,18 +238,12 @@ class ObjectExpirer(Daemon):
                        provided.
         """
         self.get_process_values(kwargs)
+        if self.task_container_leases:
+            return self.run_leased_pass()
         pool = GreenPool(self.concurrency)
         containers_to_delete = set([])
-        self.report_first_time = self.report_last_time = time()
-        self.report_objects = 0
         try:
-            self.logger.debug('Run begin')
-            containers, objects = \
-                self.swift.get_account_info(self.expiring_objects_account)
-            self.logger.info(_('Pass beginning; '
-                               '%(containers)s possible containers; '
-                               '%(objects)s possible objects') % {
-                             'containers': containers, 'objects': objects})
+            self.begin_pass()
 
             for container, obj in self.iter_cont_objs_to_expire():
                 containers_to_delete.add(container)
@@ -188,6 +255,7 @@ class ObjectExpirer(Daemon):
                 timestamp = int(timestamp)
                 if timestamp > int(time()):
                     break
+                self.backlog_age = max(self.backlog_age, time() - timestamp)
                 pool.spawn_n(
                     self.delete_object, actual_obj, timestamp,
                     container, obj)
@@ -209,6 +277,153 @@ class ObjectExpirer(Daemon):
         except (Exception, Timeout):
             self.logger.exception(_('Unhandled exception'))
 
+    def begin_pass(self):
+        """
+        Resets the progress counters and logs the start of a pass.
+        """
+        self.report_first_time = self.report_last_time = time()
+        self.report_objects = 0
+        self.backlog_age = 0
+        self.logger.debug('Run begin')
+        containers, objects = \
+            self.swift.get_account_info(self.expiring_objects_account)
+        self.logger.info(_('Pass beginning; '
+                           '%(containers)s possible containers; '
+                           '%(objects)s possible objects') % {
+                         'containers': containers, 'objects': objects})
+
+    def run_leased_pass(self):
+        """
+        Executes a single pass in task lease mode. Each task container that
+        is due is worked on by whichever expirer holds its lease, starting
+        from the listing cursor saved by the last expirer to work on it.
+        """
+        try:
+            self.begin_pass()
+            for container in self.iter_task_containers():
+                try:
+                    lease = self.claim_task_container(container)
+                    if lease is None:
+                        self.logger.increment('task_lease_conflicts')
+                        continue
+                    self.expire_task_container(lease)
+                except (Exception, Timeout) as err:
+                    self.logger.exception(
+                        _('Exception while expiring task container '
+                          '%(container)s %(err)s') % {
+                            'container': container, 'err': str(err)})
+            self.logger.debug('Run end')
+            self.report(final=True)
+        except (Exception, Timeout):
+            self.logger.exception(_('Unhandled exception'))
+
+    def iter_task_containers(self):
+        """
+        Yields the names of the task containers that are due.
+        """
+        for c in self.swift.iter_containers(self.expiring_objects_account):
+            container = str(c['name'])
+            if int(container) > int(time()):
+                break
+            yield container
+
+    def _get_task_metadata(self, container):
+        return self.swift.get_container_metadata(
+            self.expiring_objects_account, container,
+            metadata_prefix=TASK_SYSMETA_PREFIX)
+
+    def _set_task_metadata(self, container, lease, cursor=None):
+        metadata = {'lease': lease}
+        if cursor is not None:
+            metadata['cursor'] = urllib.parse.quote(cursor)
+        self.swift.set_container_metadata(
+            self.expiring_objects_account, container, metadata,
+            metadata_prefix=TASK_SYSMETA_PREFIX)
+
+    def claim_task_container(self, container):
+        """
+        Try to take the lease on a task container.
+
+        :param container: the task container's name
+        :returns: a :class:`TaskContainerLease`, or None if another expirer
+                  holds the lease
+        """
+        owner, expires = parse_task_lease(
+            self._get_task_metadata(container).get('lease'))
+        if owner not in (None, self.lease_owner) and expires > time():
+            return None
+        expires = time() + self.task_lease_time
+        self._set_task_metadata(
+            container, format_task_lease(self.lease_owner, expires))
+        # There is no compare-and-swap for container metadata; when two
+        # expirers race for a lease the later write wins once the replicas
+        # agree. Until then both may go ahead, which only costs some
+        # DELETEs that fail their X-If-Delete-At check.
+        metadata = self._get_task_metadata(container)
+        owner, _junk = parse_task_lease(metadata.get('lease'))
+        if owner != self.lease_owner:
+            return None
+        return TaskContainerLease(
+            container, expires,
+            urllib.parse.unquote(metadata.get('cursor', '')))
+
+    def renew_task_lease(self, lease):
+        """
+        Extend a task container lease and save its listing cursor, unless
+        another expirer has taken the lease over in the meantime.
+
+        :param lease: a :class:`TaskContainerLease`
+        """
+        owner, _junk = parse_task_lease(
+            self._get_task_metadata(lease.container).get('lease'))
+        if owner != self.lease_owner:
+            lease.lost = True
+            self.logger.increment('task_leases_lost')
+            return
+        lease.expires = time() + self.task_lease_time
+        self._set_task_metadata(
+            lease.container,
+            format_task_lease(self.lease_owner, lease.expires), lease.cursor)
+
+    def expire_task_container(self, lease):
+        """
+        Expire the due objects queued in a leased task container, popping
+        their queue entries in batches, then release the lease. The task
+        container is deleted once it has been worked through to the end.
+
+        :param lease: a :class:`TaskContainerLease`
+        """
+        pool = GreenPool(self.concurrency)
+        finished = True
+        try:
+            for o in self.swift.iter_objects(self.expiring_objects_account,
+                                             lease.container,
+                                             marker=lease.cursor):
+                obj = o['name'].encode('utf8')
+                timestamp, actual_obj = obj.split('-', 1)
+                timestamp = int(timestamp)
+                if timestamp > int(time()):
+                    finished = False
+                    break
+                if time() >= lease.expires - self.task_lease_time / 2.0:
+                    self.renew_task_lease(lease)
+                if lease.lost:
+                    return
+                self.backlog_age = max(self.backlog_age, time() - timestamp)
+                pool.spawn_n(self.delete_leased_object, lease,
+                             lease.start(obj), actual_obj, timestamp)
+        finally:
+            pool.waitall()
+            self.pop_queue_batch(lease)
+        if finished:
+            # start from the top next time, to retry any failed entries
+            lease.cursor = ''
+        self._set_task_metadata(lease.container, '', lease.cursor)
+        if finished:
+            self.swift.delete_container(
+                self.expiring_objects_account, lease.container,
+                acceptable_statuses=(2, HTTP_NOT_FOUND, HTTP_CONFLICT))
+
     def run_forever(self, *args, **kwargs):
         """
         Executes passes forever, looking for objects to expire.
@@ -257,18 +472,27 @@ class ObjectExpirer(Daemon):
             raise ValueError(
                 'process must be less than processes')
 
+    def expire_actual_object(self, actual_obj, timestamp):
+        """
+        Deletes the end-user object for a queue entry.
+
+        :raises: an exception if the queue entry should be kept so that the
+                 DELETE is retried later
+        """
+        try:
+            self.delete_actual_object(actual_obj, timestamp)
+        except UnexpectedResponse as err:
+            if err.resp.status_int not in {HTTP_NOT_FOUND,
+                                           HTTP_PRECONDITION_FAILED}:
+                raise
+            if float(timestamp) > time() - self.reclaim_age:
+                # we'll have to retry the DELETE later
+                raise
+
     def delete_object(self, actual_obj, timestamp, container, obj):
         start_time = time()
         try:
-            try:
-                self.delete_actual_object(actual_obj, timestamp)
-            except UnexpectedResponse as err:
-                if err.resp.status_int not in {HTTP_NOT_FOUND,
-                                               HTTP_PRECONDITION_FAILED}:
-                    raise
-                if float(timestamp) > time() - self.reclaim_age:
-                    # we'll have to retry the DELETE later
-                    raise
+            self.expire_actual_object(actual_obj, timestamp)
             self.pop_queue(container, obj)
             self.report_objects += 1
             self.logger.increment('objects')
@@ -281,6 +505,81 @@ class ObjectExpirer(Daemon):
         self.logger.timing_since('timing', start_time)
         self.report()
 
+    def delete_leased_object(self, lease, entry, actual_obj, timestamp):
+        """
+        Like :meth:`delete_object`, but leaves the queue entry to be popped
+        along with others from the same leased task container.
+        """
+        start_time = time()
+        try:
+            self.expire_actual_object(actual_obj, timestamp)
+            lease.pops.append(entry)
+        except (Exception, Timeout) as err:
+            lease.finish(entry)
+            self.logger.increment('errors')
+            self.logger.exception(
+                _('Exception while deleting object %(container)s %(obj)s'
+                  ' %(err)s') % {'container': lease.container,
+                                 'obj': entry[0], 'err': str(err)})
+        self.logger.timing_since('timing', start_time)
+        if len(lease.pops) >= self.pop_queue_batch_size:
+            self.pop_queue_batch(lease)
+
+    def pop_queue_batch(self, lease):
+        """
+        Pop the queue entries of a leased task container whose objects have
+        been deleted.
+        """
+        entries, lease.pops = lease.pops, []
+        if not entries:
+            return
+        self.pop_queue_entries(lease.container,
+                               [entry[0] for entry in entries])
+        for entry in entries:
+            lease.finish(entry)
+        self.report_objects += len(entries)
+        self.logger.update_stats('objects', len(entries))
+        self.report()
+
+    def pop_queue_entries(self, container, objs):
+        """
+        Issue a single UPDATE request to each of the task container's
+        servers deleting a batch of expiring object queue entries. Container
+        servers that don't support UPDATE are sent a DELETE for each entry.
+        """
+        part, nodes = self.swift.container_ring.get_nodes(
+            self.expiring_objects_account, container)
+        pool = GreenPool(len(nodes))
+        for node in nodes:
+            pool.spawn_n(self._pop_queue_entries_from_node, node, part,
+                         container, objs)
+        pool.waitall()
+
+    def _pop_queue_entries_from_node(self, node, part, container, objs):
+        headers = {'X-Timestamp': Timestamp(time()).internal}
+        updates = [{'op': 'DELETE', 'obj': obj, 'headers': headers}
+                   for obj in objs]
+        try:
+            direct_update_container(node, part, self.expiring_objects_account,
+                                    container, updates, headers=headers)
+            return
+        except ClientException as err:
+            if err.http_status != HTTP_METHOD_NOT_ALLOWED:
+                self.logger.error(_('Failed to pop queue entries: %s'), err)
+                return
+        except (Exception, Timeout) as err:
+            self.logger.error(_('Failed to pop queue entries: %s'), err)
+            return
+        # Like pop_queue, this either works or it doesn't; entries that
+        # are left are seen again on a later pass.
+        for obj in objs:
+            try:
+                direct_delete_container_object(
+                    node, part, self.expiring_objects_account, container, obj,
+                    headers=headers)
+            except (Exception, Timeout) as err:
+                self.logger.error(_('Failed to pop queue entry: %s'), err)
+
     def pop_queue(self, container, obj):
         """
         Issue a delete object request to the container for the expiring object
@@ -115,6 +115,13 @@ class DiskFileWriter(object):
         self._upload_size += len(chunk)
         return self._upload_size
 
+    def can_zero_copy_receive(self):
+        """
+        There is no file descriptor to splice to, so the object is always
+        written with :meth:`write`.
+        """
+        return False
+
     def put(self, metadata):
         """
         Make the final association in the in-memory file system for this name
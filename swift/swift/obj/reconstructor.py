@@ -145,6 +145,15 @@ class ObjectReconstructor(Daemon):
         self.conn_timeout = float(conf.get('conn_timeout', 0.5))
         self.node_timeout = float(conf.get('node_timeout', 10))
         self.network_chunk_size = int(conf.get('network_chunk_size', 65536))
+        self.ssync_pipeline_depth = int(conf.get('ssync_pipeline_depth', 0))
+        self.reconstruct_batch_size = int(
+            conf.get('reconstruct_batch_size', 0))
+        self.reconstruct_batch_max_size = int(
+            conf.get('reconstruct_batch_max_size', 1048576))
+        if self.reconstruct_batch_size < 0:
+            raise ValueError('reconstruct_batch_size must be >= 0')
+        self.rebuilt_object_count = 0
+        self.rebuilt_byte_count = 0
         self.disk_chunk_size = int(conf.get('disk_chunk_size', 65536))
         self.headers = {
             'Content-Length': '0',
@@ -373,6 +382,47 @@ class ObjectReconstructor(Daemon):
         return RebuildingECDiskFileStream(datafile_metadata, fi_to_rebuild,
                                           rebuilt_fragment_iter)
 
+    def _reconstruct_fa_in_memory(self, job, node, datafile_metadata):
+        if int(datafile_metadata['Content-Length']) > \
+                self.reconstruct_batch_max_size:
+            return None
+        try:
+            df = self.reconstruct_fa(job, node, datafile_metadata)
+            body = ''.join(df.reader())
+        except DiskFileError as err:
+            return err
+        if len(body) != df.content_length:
+            # make_rebuilt_fragment_iter has already logged the failure
+            return DiskFileError('Unable to reconstruct EC archive')
+        df.rebuilt_fragment_iter = [body]
+        return df
+
+    def reconstruct_fa_batch(self, job, node, datafile_metadatas):
+        """
+        Reconstructs a batch of fragment archives - this method is called
+        from ssync with the metadata of several objects that a remote node is
+        missing.  The fragments for all the small objects in the batch are
+        fetched from the other primaries concurrently and each fragment
+        archive is fully rebuilt in memory before it is handed back, so the
+        connections are released before ssync starts sending.
+
+        :param job: job from ssync_sender
+        :param node: node that we're rebuilding to
+        :param datafile_metadatas: a list of datafile metadata, one for each
+                                   fragment archive to rebuild
+        :returns: a list with an entry for each item in datafile_metadatas;
+                  either a DiskFile like class for use by ssync, a
+                  DiskFileError if the fragment archive cannot be
+                  reconstructed, or None if the fragment archive is larger
+                  than ``reconstruct_batch_max_size`` and should be rebuilt
+                  with :meth:`reconstruct_fa` instead
+        """
+        pile = GreenPile(len(datafile_metadatas))
+        for datafile_metadata in datafile_metadatas:
+            pile.spawn(self._reconstruct_fa_in_memory, job, node,
+                       datafile_metadata)
+        return list(pile)
+
     def _reconstruct(self, policy, fragment_payload, frag_index):
         return policy.pyeclib_driver.reconstruct(fragment_payload,
                                                  [frag_index])[0]
@@ -412,12 +462,14 @@ class ObjectReconstructor(Daemon):
                          'policy': policy,
                          'frag_index': frag_index,
                          })
-                    break
+                    return
                 if not all(fragment_payload):
                     break
                 rebuilt_fragment = self._reconstruct(
                     policy, fragment_payload, frag_index)
+                self.rebuilt_byte_count += len(rebuilt_fragment)
                 yield rebuilt_fragment
+            self.rebuilt_object_count += 1
 
         return fragment_payload_iter()
 
@@ -457,6 +509,15 @@ class ObjectReconstructor(Daemon):
                      'min': self.partition_times[0],
                      'med': self.partition_times[
                          len(self.partition_times) // 2]})
+            if self.rebuilt_object_count:
+                self.logger.info(
+                    _("%(objects)d fragment archives (%(bytes)d bytes) "
+                      "rebuilt - %(object_rate).2f objects/s, "
+                      "%(byte_rate).2f bytes/s"),
+                    {'objects': self.rebuilt_object_count,
+                     'bytes': self.rebuilt_byte_count,
+                     'object_rate': self.rebuilt_object_count / elapsed,
+                     'byte_rate': self.rebuilt_byte_count / elapsed})
         else:
             self.logger.info(
                 _("Nothing reconstructed for %s seconds."),
@@ -817,6 +878,11 @@ class ObjectReconstructor(Daemon):
                 )
                 # ssync callback to rebuild missing fragment_archives
                 sync_job['sync_diskfile_builder'] = self.reconstruct_fa
+                if self.reconstruct_batch_size:
+                    sync_job['sync_diskfile_batch_builder'] = \
+                        self.reconstruct_fa_batch
+                    sync_job['sync_diskfile_batch_size'] = \
+                        self.reconstruct_batch_size
                 jobs.append(sync_job)
                 break
 
@@ -975,14 +1041,18 @@ class ObjectReconstructor(Daemon):
         self.reconstruction_part_count = 0
         self.last_reconstruction_count = -1
         self.handoffs_remaining = 0
+        self.rebuilt_object_count = 0
+        self.rebuilt_byte_count = 0
 
-    def delete_partition(self, path):
+    def delete_partition(self, path, policy=None):
         def kill_it(path):
             shutil.rmtree(path, ignore_errors=True)
             remove_file(path)
 
         self.logger.info(_("Removing partition: %s"), path)
         tpool.execute(kill_it, path)
+        if policy is not None:
+            self._df_router[policy].forget_partition(path)
 
     def reconstruct(self, **kwargs):
         """Run a reconstruction pass"""
@@ -1011,7 +1081,8 @@ class ObjectReconstructor(Daemon):
                     # Therefore we know this part a) doesn't belong on
                     # this node and b) doesn't have any suffixes in it.
                     self.run_pool.spawn(self.delete_partition,
-                                        part_info['part_path'])
+                                        part_info['part_path'],
+                                        part_info['policy'])
                 for job in jobs:
                     if (self.handoffs_only and job['job_type'] != REVERT):
                         self.logger.debug('Skipping %s job for %s '
@@ -105,6 +105,14 @@ class ObjectReplicator(Daemon):
         self.conn_timeout = float(conf.get('conn_timeout', 0.5))
         self.node_timeout = float(conf.get('node_timeout', 10))
         self.sync_method = getattr(self, conf.get('sync_method') or 'rsync')
+        self.ssync_connections = max(
+            1, int(conf.get('ssync_connections', 1)))
+        self.ssync_pipeline_depth = int(conf.get('ssync_pipeline_depth', 0))
+        # When ssync_connections > 1 the SSYNC requests made by update and
+        # update_deleted jobs alike are run in this one pool, which bounds
+        # how many are in progress at once.
+        self.sync_pool = GreenPool(size=self.concurrency *
+                                   self.ssync_connections)
         self.network_chunk_size = int(conf.get('network_chunk_size', 65536))
         self.default_headers = {
             'Content-Length': '0',
@@ -252,6 +260,10 @@ class ObjectReplicator(Daemon):
         return self._rsync(args) == 0, {}
 
     def ssync(self, node, job, suffixes, remote_check_objs=None):
+        if self.ssync_connections > 1:
+            return ssync_sender.sync_in_parallel(
+                self, node, job, suffixes, self.ssync_connections,
+                remote_check_objs, pool=self.sync_pool)
         return ssync_sender.Sender(
             self, node, job, suffixes, remote_check_objs)()
 
@@ -351,10 +363,10 @@ class ObjectReplicator(Daemon):
                               failure_dev['device'])
                              for failure_dev in job['nodes']])
                 else:
-                    self.delete_partition(job['path'])
+                    self.delete_partition(job['path'], job['policy'])
                     handoff_partition_deleted = True
             elif not suffixes:
-                self.delete_partition(job['path'])
+                self.delete_partition(job['path'], job['policy'])
                 handoff_partition_deleted = True
         except (Exception, Timeout):
             self.logger.exception(_("Error syncing handoff partition"))
@@ -369,9 +381,11 @@ class ObjectReplicator(Daemon):
             self.partition_times.append(time.time() - begin)
             self.logger.timing_since('partition.delete.timing', begin)
 
-    def delete_partition(self, path):
+    def delete_partition(self, path, policy=None):
         self.logger.info(_("Removing partition: %s"), path)
         tpool.execute(shutil.rmtree, path)
+        if policy is not None:
+            self._df_router[policy].forget_partition(path)
 
     def delete_handoff_objs(self, job, delete_objs):
         success_paths = []
@@ -542,7 +556,8 @@ class ObjectReplicator(Daemon):
 
     def kill_coros(self):
         """Utility function that kills all coroutines currently running."""
-        for coro in list(self.run_pool.coroutines_running):
+        for coro in list(self.run_pool.coroutines_running) + \
+                list(self.sync_pool.coroutines_running):
             try:
                 coro.kill(GreenletExit)
             except GreenletExit:
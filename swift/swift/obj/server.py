@@ -26,8 +26,9 @@ import math
 from swift import gettext_ as _
 from hashlib import md5
 
-from eventlet import sleep, wsgi, Timeout
-from eventlet.greenthread import spawn
+from eventlet import sleep, wsgi, Timeout, GreenPool
+from eventlet.event import Event
+from eventlet.greenthread import spawn, spawn_after
 
 from swift.common.utils import public, get_logger, \
     config_true_value, timing_stats, replication, \
@@ -42,7 +43,7 @@ from swift.common.exceptions import ConnectionTimeout, DiskFileQuarantined, \
     DiskFileDeviceUnavailable, DiskFileExpired, ChunkReadTimeout, \
     ChunkReadError, DiskFileXattrNotSupported
 from swift.obj import ssync_receiver
-from swift.common.http import is_success
+from swift.common.http import is_success, HTTP_METHOD_NOT_ALLOWED
 from swift.common.base_storage_server import BaseStorageServer
 from swift.common.header_key_dict import HeaderKeyDict
 from swift.common.request_helpers import get_name_and_placement, \
@@ -84,6 +85,48 @@ def drain(file_like, read_size, timeout):
                 break
 
 
+def get_zero_copy_input(wsgi_input, length):
+    """
+    Take over the socket behind an Eventlet WSGI input so that a request body
+    of known length can be spliced straight off it.
+
+    Eventlet doesn't provide a clean way of doing this, so we have to reach
+    into its socket file object for whatever it buffered while reading the
+    request headers. If anything looks unfamiliar we leave the input alone and
+    the caller should fall back to reading it normally. Otherwise the caller
+    must advance ``wsgi_input.position`` past whatever it reads so that
+    Eventlet doesn't try to discard it after responding.
+
+    :param wsgi_input: the request's wsgi.input
+    :param length: the request's content length
+    :returns: a tuple of (socket file descriptor, already buffered body
+              bytes), or None if the input can't be taken over
+    """
+    if not isinstance(wsgi_input, wsgi.Input) or \
+            wsgi_input.chunked_input or \
+            wsgi_input.content_length != length or wsgi_input.position:
+        return None
+    sock = wsgi_input.get_socket()
+    # Splicing an SSL socket would hand us ciphertext.
+    if sock is None or hasattr(sock, 'getpeercert'):
+        return None
+    rbuf = getattr(wsgi_input.rfile, '_rbuf', None)
+    if rbuf is None or not hasattr(rbuf, 'getvalue'):
+        return None
+    if wsgi_input.wfile is not None and \
+            not wsgi_input.is_hundred_continue_response_sent:
+        wsgi_input.send_hundred_continue_response()
+        wsgi_input.is_hundred_continue_response_sent = True
+    buffered = rbuf.getvalue()
+    if len(buffered) > length:
+        # More than one request's worth of data; the rest belongs to a
+        # pipelined request, so let Eventlet sort it out.
+        return None
+    rbuf.seek(0)
+    rbuf.truncate()
+    return sock.fileno(), buffered
+
+
 def _make_backend_fragments_header(fragments):
     if fragments:
         result = {}
@@ -106,6 +149,152 @@ class EventletPlungerString(str):
         return wsgi.MINIMUM_CHUNK_SIZE + 1
 
 
+class ContainerUpdateBatch(object):
+    """
+    Container updates for one container replica that will be sent together.
+    """
+
+    def __init__(self):
+        self.updates = []
+        self.sent = False
+        self.done = Event()
+        self.timer = None
+
+    def __len__(self):
+        return len(self.updates)
+
+
+class ContainerUpdateBatcher(object):
+    """
+    Coalesces the container updates made by an object server over a short
+    window into one UPDATE request per container replica, so that a burst of
+    small object writes to a container doesn't turn into a burst of one-row
+    requests to its container servers.
+
+    Callers block in :meth:`update` until the batch their update joined has
+    been sent, so that the object server's existing
+    ``container_update_timeout`` handling still applies. If a batch can't be
+    delivered each of its updates is saved for the object updater just as a
+    failed single update would be; container servers that don't know the
+    UPDATE method are sent the updates one at a time.
+
+    :param app: the :class:`ObjectController` making the updates
+    :param window: seconds to wait for more updates before sending a batch
+    :param max_batch_size: send a batch as soon as it has this many updates
+    """
+
+    def __init__(self, app, window, max_batch_size):
+        self.app = app
+        self.logger = app.logger
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.batches = {}
+
+    def update(self, op, account, container, obj, host, partition,
+               contdevice, headers_out, objdevice, policy,
+               logger_thread_locals=None):
+        """
+        Queue a container update and wait for it to be sent; takes the same
+        arguments as :meth:`ObjectController.async_update`.
+        """
+        if not all([host, partition, contdevice]):
+            return self.app.async_update(
+                op, account, container, obj, host, partition, contdevice,
+                headers_out, objdevice, policy,
+                logger_thread_locals=logger_thread_locals)
+        key = (host, contdevice, partition, account, container, int(policy))
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = ContainerUpdateBatch()
+            batch.timer = spawn_after(self.window, self._flush, key, batch,
+                                      policy)
+        # headers_out is shared between the updates to each replica
+        batch.updates.append(
+            (op, obj, HeaderKeyDict(headers_out), objdevice))
+        if len(batch) >= self.max_batch_size:
+            self._flush(key, batch, policy)
+        batch.done.wait()
+
+    def _flush(self, key, batch, policy):
+        if self.batches.get(key) is batch:
+            del self.batches[key]
+        if batch.sent:
+            return
+        batch.sent = True
+        # no-op if this is the timer firing
+        batch.timer.cancel()
+        try:
+            status = self._send(key, batch)
+            if status == HTTP_METHOD_NOT_ALLOWED:
+                self._send_one_at_a_time(key, batch, policy)
+            elif not is_success(status):
+                self._save(key, batch, policy)
+        finally:
+            batch.done.send()
+
+    def _send(self, key, batch):
+        """
+        Send a batch as one UPDATE request.
+
+        :returns: the response status, or None if there was no response
+        """
+        host, contdevice, partition, account, container, policy_index = key
+        body = json.dumps([
+            {'op': op, 'obj': obj, 'headers': headers}
+            for op, obj, headers, objdevice in batch.updates])
+        # the container server initializes auto-created containers with the
+        # batch's timestamp, which is the earliest one that it makes sense to
+        # give it
+        timestamp = min(Timestamp(headers['x-timestamp'])
+                        for _op, _obj, headers, _dev in batch.updates)
+        headers_out = {'X-Timestamp': timestamp.internal,
+                       'X-Backend-Storage-Policy-Index': str(policy_index),
+                       'Content-Type': 'application/json',
+                       'Content-Length': str(len(body)),
+                       'user-agent': 'object-server %s' % os.getpid()}
+        ip, port = host.rsplit(':', 1)
+        try:
+            with ConnectionTimeout(self.app.conn_timeout):
+                conn = http_connect(ip, port, contdevice, partition, 'UPDATE',
+                                    '/%s/%s' % (account, container),
+                                    headers_out)
+            with Timeout(self.app.node_timeout):
+                conn.send(body)
+                response = conn.getresponse()
+                response.read()
+        except (Exception, Timeout):
+            self.logger.exception(_(
+                'ERROR container update batch failed with '
+                '%(ip)s:%(port)s/%(dev)s (saving for async update later)'),
+                {'ip': ip, 'port': port, 'dev': contdevice})
+            return None
+        if is_success(response.status):
+            self.logger.increment('container_update_batches')
+        elif response.status != HTTP_METHOD_NOT_ALLOWED:
+            self.logger.error(_(
+                'ERROR Container update batch failed '
+                '(saving for async update later): %(status)d '
+                'response from %(ip)s:%(port)s/%(dev)s'),
+                {'status': response.status, 'ip': ip, 'port': port,
+                 'dev': contdevice})
+        return response.status
+
+    def _send_one_at_a_time(self, key, batch, policy):
+        host, contdevice, partition, account, container, _index = key
+        pool = GreenPool(len(batch))
+        for op, obj, headers, objdevice in batch.updates:
+            pool.spawn(self.app.async_update, op, account, container, obj,
+                       host, partition, contdevice, headers, objdevice,
+                       policy)
+        pool.waitall()
+
+    def _save(self, key, batch, policy):
+        account, container = key[3:5]
+        for op, obj, headers, objdevice in batch.updates:
+            self.app.save_async_update(op, account, container, obj, headers,
+                                       objdevice, policy)
+
+
 class ObjectController(BaseStorageServer):
     """Implements the WSGI application for the Swift Object Server."""
 
@@ -123,8 +312,19 @@ class ObjectController(BaseStorageServer):
         self.node_timeout = float(conf.get('node_timeout', 3))
         self.container_update_timeout = float(
             conf.get('container_update_timeout', 1))
+        container_update_batch_window = float(
+            conf.get('container_update_batch_window', 0))
+        if container_update_batch_window > 0:
+            self.container_update_batcher = ContainerUpdateBatcher(
+                self, container_update_batch_window,
+                int(conf.get('container_update_batch_size', 100)))
+        else:
+            self.container_update_batcher = None
         self.conn_timeout = float(conf.get('conn_timeout', 0.5))
         self.client_timeout = int(conf.get('client_timeout', 60))
+        # the diskfile's writer still has to support it, see
+        # can_zero_copy_receive()
+        self.splice_put = config_true_value(conf.get('splice_put', 'no'))
         self.disk_chunk_size = int(conf.get('disk_chunk_size', 65536))
         self.network_chunk_size = int(conf.get('network_chunk_size', 65536))
         self.log_requests = config_true_value(conf.get('log_requests', 'true'))
@@ -259,6 +459,23 @@ class ObjectController(BaseStorageServer):
                     'ERROR container update failed with '
                     '%(ip)s:%(port)s/%(dev)s (saving for async update later)'),
                     {'ip': ip, 'port': port, 'dev': contdevice})
+        self.save_async_update(op, account, container, obj, headers_out,
+                               objdevice, policy)
+
+    def save_async_update(self, op, account, container, obj, headers_out,
+                          objdevice, policy):
+        """
+        Save a container update for the object updater to send later.
+
+        :param op: operation performed (ex: 'PUT', or 'DELETE')
+        :param account: account name for the object
+        :param container: container name for the object
+        :param obj: object name
+        :param headers_out: dictionary of headers to send in the container
+                            request
+        :param objdevice: device name that the object is in
+        :param policy: the associated BaseStoragePolicy instance
+        """
         data = {'op': op, 'account': account, 'container': container,
                 'obj': obj, 'headers': headers_out}
         timestamp = headers_out.get('x-meta-timestamp',
@@ -308,8 +525,12 @@ class ObjectController(BaseStorageServer):
         headers_out['referer'] = request.as_referer()
         headers_out['X-Backend-Storage-Policy-Index'] = int(policy)
         update_greenthreads = []
+        if self.container_update_batcher:
+            update_func = self.container_update_batcher.update
+        else:
+            update_func = self.async_update
         for conthost, contdevice in updates:
-            gt = spawn(self.async_update, op, account, container, obj,
+            gt = spawn(update_func, op, account, container, obj,
                        conthost, contpartition, contdevice, headers_out,
                        objdevice, policy,
                        logger_thread_locals=self.logger.thread_locals)
@@ -760,16 +981,44 @@ class ObjectController(BaseStorageServer):
                     except ChunkReadTimeout:
                         return HTTPRequestTimeout(request=request)
 
-                timeout_reader = self._make_timeout_reader(obj_input)
+                # Plain PUTs of known length may be spliced straight from
+                # the socket to disk; anything wrapped in MIME documents has
+                # to be parsed in userspace.
+                zero_copy_input = None
+                checker = getattr(writer, 'can_zero_copy_receive', None) \
+                    if self.splice_put else None
+                if fsize is not None and not (
+                        have_metadata_footer or use_multiphase_commit) and \
+                        checker and checker():
+                    zero_copy_input = get_zero_copy_input(obj_input, fsize)
+
                 try:
-                    for chunk in iter(timeout_reader, ''):
+                    if zero_copy_input:
+                        rsockfd, buffered = zero_copy_input
                         start_time = time.time()
-                        if start_time > upload_expiration:
-                            self.logger.increment('PUT.timeouts')
-                            return HTTPRequestTimeout(request=request)
-                        etag.update(chunk)
-                        upload_size = writer.write(chunk)
-                        elapsed_time += time.time() - start_time
+                        try:
+                            upload_size, etag = writer.zero_copy_receive(
+                                rsockfd, fsize, buffered,
+                                timeout=self.client_timeout,
+                                deadline=upload_expiration)
+                        except ChunkReadTimeout:
+                            if time.time() > upload_expiration:
+                                self.logger.increment('PUT.timeouts')
+                            raise
+                        finally:
+                            obj_input.position = writer.upload_size
+                        elapsed_time = time.time() - start_time
+                    else:
+                        timeout_reader = self._make_timeout_reader(obj_input)
+                        for chunk in iter(timeout_reader, ''):
+                            start_time = time.time()
+                            if start_time > upload_expiration:
+                                self.logger.increment('PUT.timeouts')
+                                return HTTPRequestTimeout(request=request)
+                            etag.update(chunk)
+                            upload_size = writer.write(chunk)
+                            elapsed_time += time.time() - start_time
+                        etag = etag.hexdigest()
                 except ChunkReadError:
                     return HTTPClientDisconnect(request=request)
                 except ChunkReadTimeout:
@@ -788,7 +1037,6 @@ class ObjectController(BaseStorageServer):
 
                 request_etag = (footer_meta.get('etag') or
                                 request.headers.get('etag', '')).lower()
-                etag = etag.hexdigest()
                 if request_etag and request_etag != etag:
                     return HTTPUnprocessableEntity(request=request)
                 metadata = {
@@ -13,6 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from contextlib import contextmanager
+
+import eventlet
+from eventlet.queue import LightQueue
 import six
 from six.moves import urllib
 
@@ -69,6 +73,119 @@ def decode_wanted(parts):
     return wanted
 
 
+class SendPipeline(object):
+    """
+    Sends data on a connection from its own greenthread, so that whoever is
+    sending can carry on reading the next chunks from disk while earlier
+    ones are still on their way over the network.
+
+    Any error sending is raised by the next call to :meth:`send` or
+    :meth:`flush`; everything queued after an error is discarded.
+
+    :param connection: the connection to send on
+    :param depth: the number of sends that may be queued before
+                  :meth:`send` blocks
+    :param timeout: the timeout for each send on the connection
+    """
+
+    def __init__(self, connection, depth, timeout):
+        self.connection = connection
+        self.timeout = timeout
+        self.queue = LightQueue(depth)
+        self.error = None
+        self.writer = eventlet.spawn(self._run)
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                with exceptions.MessageTimeout(self.timeout, 'send'):
+                    self.connection.send(data)
+            except (Exception, exceptions.Timeout) as err:
+                self.error = err
+
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+
+    def send(self, data):
+        self._check()
+        self.queue.put(data)
+
+    def flush(self):
+        """
+        Wait for everything queued so far to be sent, and stop the writer.
+        """
+        self.queue.put(None)
+        self.writer.wait()
+        self._check()
+
+    def close(self):
+        self.writer.kill()
+
+
+def sync_in_parallel(daemon, node, job, suffixes, connections,
+                     remote_check_objs=None, pool=None):
+    """
+    Sync a job's suffixes with a node over several SSYNC requests at once,
+    each one handling an equal share of the suffixes.
+
+    The receiving object server must be allowed to handle that many SSYNC
+    requests for a device at once; see its ``replication_concurrency`` and
+    ``replication_one_per_device`` options. The suffixes of any request it
+    refuses (see :attr:`Sender.refused`) are synced again over a single
+    request once the others are done, and a warning is logged.
+
+    :param daemon: the daemon doing the sync, as for :class:`Sender`
+    :param node: the node to sync with
+    :param job: the job being synced
+    :param suffixes: the suffixes to sync
+    :param connections: the most SSYNC requests to make at once
+    :param remote_check_objs: as for :class:`Sender`
+    :param pool: an optional GreenPool to run the requests in, which limits
+                 how many run at once across all the callers sharing it
+    :returns: a 2-tuple, in the same form as :meth:`Sender.__call__`, which
+              only indicates success if every request succeeded
+    """
+    groups = [suffixes[i::connections] for i in range(connections)]
+    groups = [group for group in groups if group]
+    if len(groups) < 2:
+        return Sender(daemon, node, job, suffixes, remote_check_objs)()
+    senders = [Sender(daemon, node, job, group, remote_check_objs)
+               for group in groups]
+    pile = eventlet.GreenPile(pool or len(groups))
+    for sender in senders:
+        pile.spawn(sender)
+    results = [result for sender, result in zip(senders, pile)
+               if not sender.refused]
+    refused = [sender for sender in senders if sender.refused]
+    if refused:
+        daemon.logger.warning(
+            '%s:%s/%s/%s refused %d of %d concurrent SSYNC requests; syncing '
+            'their suffixes over one request. The receiver must allow '
+            'ssync_connections SSYNC requests per device (see its '
+            'replication_one_per_device and replication_concurrency).',
+            node.get('replication_ip'), node.get('replication_port'),
+            node.get('device'), job.get('partition'), len(refused),
+            len(senders))
+        results.append(Sender(
+            daemon, node, job,
+            [suffix for sender in refused for suffix in sender.suffixes],
+            remote_check_objs)())
+    success = True
+    can_delete_objs = {}
+    for group_success, group_can_delete_objs in results:
+        success = success and group_success
+        can_delete_objs.update(group_can_delete_objs)
+    if not success:
+        return False, {}
+    return True, can_delete_objs
+
+
 class Sender(object):
     """
     Sends SSYNC requests to the object server.
@@ -99,6 +216,13 @@ class Sender(object):
         # be sync'ed; each entry maps an object hash => dict of wanted parts
         self.send_map = {}
         self.failures = 0
+        # Set if the receiver answered with an error before starting the
+        # MISSING_CHECK step, which is how it turns down an SSYNC request
+        # when it is already handling as many as it allows for the device.
+        self.refused = False
+        # How many chunks may be read ahead of what has been sent to the
+        # receiver; 0 sends each one before reading the next.
+        self.pipeline_depth = self.daemon.ssync_pipeline_depth
 
     def __call__(self):
         """
@@ -252,15 +376,34 @@ class Sender(object):
             data += '\n'
         return data
 
-    def missing_check(self):
+    @contextmanager
+    def pipelined(self):
         """
-        Handles the sender-side of the MISSING_CHECK step of a
-        SSYNC request.
+        Context manager within which the chunks sent on the connection are
+        queued and sent by a :class:`SendPipeline`, if the daemon has an
+        ``ssync_pipeline_depth``. Everything has been sent by the time it
+        exits normally.
 
-        Full documentation of this can be found at
-        :py:meth:`.Receiver.missing_check`.
+        This only overlaps the reading and sending within each step. The
+        UPDATES step still starts once the receiver has answered the whole
+        MISSING_CHECK, because it only answers after reading the sender's
+        last line; see :meth:`.Receiver.missing_check`.
         """
-        # First, send our list.
+        if not self.pipeline_depth:
+            yield
+            return
+        connection = self.connection
+        pipeline = SendPipeline(
+            connection, self.pipeline_depth, self.daemon.node_timeout)
+        self.connection = pipeline
+        try:
+            yield
+            pipeline.flush()
+        finally:
+            pipeline.close()
+            self.connection = connection
+
+    def _send_missing_check(self):
         with exceptions.MessageTimeout(
                 self.daemon.node_timeout, 'missing_check start'):
             msg = ':MISSING_CHECK: START\r\n'
@@ -285,6 +428,18 @@ class Sender(object):
                 self.daemon.node_timeout, 'missing_check end'):
             msg = ':MISSING_CHECK: END\r\n'
             self.connection.send('%x\r\n%s\r\n' % (len(msg), msg))
+
+    def missing_check(self):
+        """
+        Handles the sender-side of the MISSING_CHECK step of a
+        SSYNC request.
+
+        Full documentation of this can be found at
+        :py:meth:`.Receiver.missing_check`.
+        """
+        # First, send our list.
+        with self.pipelined():
+            self._send_missing_check()
         # Now, retrieve the list of what they want.
         while True:
             with exceptions.MessageTimeout(
@@ -296,6 +451,8 @@ class Sender(object):
             if line == ':MISSING_CHECK: START':
                 break
             elif line:
+                if line.startswith(':ERROR:'):
+                    self.refused = True
                 raise exceptions.ReplicationException(
                     'Unexpected response: %r' % line[:1024])
         while True:
@@ -311,19 +468,13 @@ class Sender(object):
             if parts:
                 self.send_map[parts[0]] = decode_wanted(parts[1:])
 
-    def updates(self):
-        """
-        Handles the sender-side of the UPDATES step of an SSYNC
-        request.
-
-        Full documentation of this can be found at
-        :py:meth:`.Receiver.updates`.
-        """
-        # First, send all our subrequests based on the send_map.
+    def _send_updates(self):
         with exceptions.MessageTimeout(
                 self.daemon.node_timeout, 'updates start'):
             msg = ':UPDATES: START\r\n'
             self.connection.send('%x\r\n%s\r\n' % (len(msg), msg))
+        batch_size = self.job.get('sync_diskfile_batch_size') or 1
+        batch = []
         for object_hash, want in self.send_map.items():
             object_hash = urllib.parse.unquote(object_hash)
             try:
@@ -336,30 +487,87 @@ class Sender(object):
                 '/%s/%s/%s' % (df.account, df.container, df.obj))
             try:
                 df.open()
-                if want.get('data'):
-                    # EC reconstructor may have passed a callback to build an
-                    # alternative diskfile - construct it using the metadata
-                    # from the data file only.
-                    df_alt = self.job.get(
-                        'sync_diskfile_builder', lambda *args: df)(
-                            self.job, self.node, df.get_datafile_metadata())
-                    self.send_put(url_path, df_alt)
-                if want.get('meta') and df.data_timestamp != df.timestamp:
-                    self.send_post(url_path, df)
             except exceptions.DiskFileDeleted as err:
                 if want.get('data'):
                     self.send_delete(url_path, err.timestamp)
+                continue
             except exceptions.DiskFileError:
                 # DiskFileErrors are expected while opening the diskfile,
                 # before any data is read and sent. Since there is no partial
                 # state on the receiver it's ok to ignore this diskfile and
                 # continue. The diskfile may however be deleted after a
                 # successful ssync since it remains in the send_map.
-                pass
+                continue
+            batch.append((url_path, df, want))
+            if len(batch) >= batch_size:
+                self._send_batch(batch)
+                batch = []
+        if batch:
+            self._send_batch(batch)
         with exceptions.MessageTimeout(
                 self.daemon.node_timeout, 'updates end'):
             msg = ':UPDATES: END\r\n'
             self.connection.send('%x\r\n%s\r\n' % (len(msg), msg))
+
+    def _build_batch(self, batch):
+        """
+        If the job has a ``sync_diskfile_batch_builder`` callback, use it to
+        build the alternative diskfiles for all the objects in the batch
+        whose data is wanted in one go.
+
+        :returns: a list with an entry for each item in the batch; either an
+                  alternative diskfile, an exception to raise in its place,
+                  or None to use the ``sync_diskfile_builder`` callback
+        """
+        built = [None] * len(batch)
+        batch_builder = self.job.get('sync_diskfile_batch_builder')
+        wanted = [i for i, (_, _, want) in enumerate(batch)
+                  if want.get('data')]
+        if batch_builder and wanted:
+            results = batch_builder(
+                self.job, self.node,
+                [batch[i][1].get_datafile_metadata() for i in wanted])
+            for i, result in zip(wanted, results):
+                built[i] = result
+        return built
+
+    def _send_batch(self, batch):
+        for (url_path, df, want), df_alt in zip(
+                batch, self._build_batch(batch)):
+            try:
+                if want.get('data'):
+                    if isinstance(df_alt, Exception):
+                        raise df_alt
+                    if df_alt is None:
+                        # EC reconstructor may have passed a callback to
+                        # build an alternative diskfile - construct it using
+                        # the metadata from the data file only.
+                        df_alt = self.job.get(
+                            'sync_diskfile_builder', lambda *args: df)(
+                                self.job, self.node,
+                                df.get_datafile_metadata())
+                    self.send_put(url_path, df_alt)
+                if want.get('meta') and df.data_timestamp != df.timestamp:
+                    self.send_post(url_path, df)
+            except exceptions.DiskFileDeleted as err:
+                if want.get('data'):
+                    self.send_delete(url_path, err.timestamp)
+            except exceptions.DiskFileError:
+                # the alternative diskfile could not be built, so there is
+                # nothing on the receiver to clean up; skip this diskfile
+                pass
+
+    def updates(self):
+        """
+        Handles the sender-side of the UPDATES step of an SSYNC
+        request.
+
+        Full documentation of this can be found at
+        :py:meth:`.Receiver.updates`.
+        """
+        # First, send all our subrequests based on the send_map.
+        with self.pipelined():
+            self._send_updates()
         # Now, read their response for any issues.
         while True:
             with exceptions.MessageTimeout(
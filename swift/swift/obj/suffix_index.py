@@ -0,0 +1,313 @@
+# Copyright (c) 2010-2017 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per-device index of partition suffix hashes.
+
+By default the suffix hashes of a partition are kept in a pickled
+``hashes.pkl`` in the partition directory, with suffixes that need rehashing
+appended to ``hashes.invalid``. Every call to get the hashes has to lock the
+partition, fold ``hashes.invalid`` into ``hashes.pkl`` and write the whole
+pickle back out.
+
+When ``suffix_hash_index`` is enabled the suffix hashes of every partition on
+a device are instead kept in a single SQLite database at the root of the
+device. Invalidating a suffix is a single row update and reading the hashes
+of a partition is a single indexed query, so only the suffixes that are
+actually dirty are ever touched.
+
+Each row carries a random ``version`` that is changed whenever the suffix is
+invalidated; a newly calculated hash is only stored if the version has not
+changed since it was read, so concurrent invalidations are never lost.
+
+Because partitions may be removed wholesale (e.g. once a handoff partition has
+been replicated), the index for a partition is only trusted while the token
+stored in the partition's ``hashes.idx`` file matches the one in the
+database. A partition directory that has been removed and recreated has no
+token file, and so its index is rebuilt from a listdir. The rows of a
+partition are removed from the index when the replicator or reconstructor
+removes the partition itself.
+"""
+
+import errno
+import six.moves.cPickle as pickle
+import sqlite3
+import uuid
+from os.path import basename, dirname, join
+
+from swift.common.utils import renamer, stdlib_threading, tpool_reraise
+
+PICKLE_PROTOCOL = 2
+
+#: Name of the index database at the root of each device
+SUFFIX_INDEX_FILE = 'suffix_hashes.db'
+#: Name of the file holding the index token in each partition directory
+SUFFIX_INDEX_TOKEN_FILE = 'hashes.idx'
+#: Default seconds to wait for the index database to be unlocked
+DEFAULT_TIMEOUT = 1.0
+
+
+def split_partition_path(partition_path):
+    """
+    Split a partition path into the path of its index database and the
+    (datadir, partition) pair that identifies it within that index.
+
+    :param partition_path: path of the form
+                           <devices>/<device>/<datadir>/<partition>
+    :returns: a tuple of (index db path, datadir, partition)
+    """
+    datadir_path = dirname(partition_path)
+    return (join(dirname(datadir_path), SUFFIX_INDEX_FILE),
+            basename(datadir_path), basename(partition_path))
+
+
+def read_index_token(partition_path):
+    """
+    Returns the index token of the partition, or None if it has none.
+    """
+    try:
+        with open(join(partition_path, SUFFIX_INDEX_TOKEN_FILE), 'rb') as fp:
+            return fp.read().strip() or None
+    except (IOError, OSError) as e:
+        if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+            raise
+    return None
+
+
+def write_index_token(partition_path, token):
+    """
+    Atomically writes the index token of the partition.
+    """
+    token_file = join(partition_path, SUFFIX_INDEX_TOKEN_FILE)
+    tmp_file = '%s.%s.tmp' % (token_file, uuid.uuid4().hex)
+    with open(tmp_file, 'wb') as fp:
+        fp.write(token)
+    renamer(tmp_file, token_file, fsync=False)
+
+
+class SuffixHashIndex(object):
+    """
+    The suffix hash index of a single device.
+
+    A single connection is kept open per device and shared between the tpool
+    threads every call is run in, so that the hub is never blocked on SQLite.
+    The busy timeout is kept short as object servers invalidate suffixes while
+    handling requests; callers are expected to fall back to
+    ``hashes.invalid`` when the database stays locked, which is folded back
+    into the index the next time the partition is read.
+
+    :param db_file: path to the SQLite database
+    :param timeout: seconds to wait for the database to be unlocked
+    """
+
+    def __init__(self, db_file, timeout=DEFAULT_TIMEOUT):
+        self.db_file = db_file
+        self.timeout = timeout
+        self._conn = None
+        self._lock = stdlib_threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=self.timeout,
+                               check_same_thread=False)
+        conn.text_factory = str
+        # WAL lets the object servers keep invalidating suffixes while a
+        # replicator is reading; a crash may lose the last transactions,
+        # just as a crash may lose unsynced appends to hashes.invalid,
+        # but the database itself is never corrupted.
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS partition_token (
+                datadir TEXT NOT NULL,
+                partition TEXT NOT NULL,
+                token TEXT NOT NULL,
+                PRIMARY KEY (datadir, partition)
+            );
+            CREATE TABLE IF NOT EXISTS suffix_hash (
+                datadir TEXT NOT NULL,
+                partition TEXT NOT NULL,
+                suffix TEXT NOT NULL,
+                hash BLOB,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (datadir, partition, suffix)
+            );
+        ''')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            conn = self._conn
+            try:
+                with conn:
+                    return func(conn, *args)
+            except sqlite3.DatabaseError as err:
+                if not isinstance(err, sqlite3.OperationalError):
+                    # e.g. the database was replaced or corrupted; reconnect
+                    # on the next call rather than keep failing
+                    self._conn = None
+                    conn.close()
+                raise
+
+    def _execute(self, func, *args):
+        """
+        Runs ``func(conn, *args)`` in a single transaction in a tpool thread.
+        """
+        return tpool_reraise(self._transaction, func, *args)
+
+    def close(self):
+        """
+        Closes the connection to the database, if any.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def invalidate(self, datadir, partition, suffixes):
+        """
+        Marks the given suffixes of a partition as needing to be rehashed.
+        """
+        self._execute(self._invalidate, datadir, partition, suffixes)
+
+    def _invalidate(self, conn, datadir, partition, suffixes):
+        for suffix in suffixes:
+            conn.execute('''
+                INSERT OR IGNORE INTO suffix_hash
+                    (datadir, partition, suffix, hash, version)
+                VALUES (?, ?, ?, NULL, random())
+            ''', (datadir, partition, suffix))
+            conn.execute('''
+                UPDATE suffix_hash SET hash = NULL, version = random()
+                WHERE datadir = ? AND partition = ? AND suffix = ?
+            ''', (datadir, partition, suffix))
+
+    def add_suffixes(self, datadir, partition, suffixes):
+        """
+        Adds any of the given suffixes not yet known for a partition, as
+        needing to be hashed. Known suffixes are left alone.
+        """
+        self._execute(self._add_suffixes, datadir, partition, suffixes)
+
+    def _add_suffixes(self, conn, datadir, partition, suffixes):
+        conn.executemany('''
+            INSERT OR IGNORE INTO suffix_hash
+                (datadir, partition, suffix, hash, version)
+            VALUES (?, ?, ?, NULL, random())
+        ''', [(datadir, partition, suffix) for suffix in suffixes])
+
+    def reset(self, datadir, partition):
+        """
+        Starts rebuilding the index of a partition: every known suffix is
+        marked as needing to be rehashed and a new token is issued. The
+        caller is expected to add the suffixes found on disk and then store
+        the token in the partition directory.
+
+        :returns: the new token
+        """
+        token = uuid.uuid4().hex
+        self._execute(self._reset, datadir, partition, token)
+        return token
+
+    def _reset(self, conn, datadir, partition, token):
+        conn.execute('''
+            UPDATE suffix_hash SET hash = NULL, version = random()
+            WHERE datadir = ? AND partition = ?
+        ''', (datadir, partition))
+        conn.execute('''
+            INSERT OR REPLACE INTO partition_token
+                (datadir, partition, token)
+            VALUES (?, ?, ?)
+        ''', (datadir, partition, token))
+
+    def remove(self, datadir, partition):
+        """
+        Forgets everything about a partition, e.g. once it has been removed
+        from the device.
+        """
+        self._execute(self._remove, datadir, partition)
+
+    def _remove(self, conn, datadir, partition):
+        conn.execute('''
+            DELETE FROM suffix_hash WHERE datadir = ? AND partition = ?
+        ''', (datadir, partition))
+        conn.execute('''
+            DELETE FROM partition_token WHERE datadir = ? AND partition = ?
+        ''', (datadir, partition))
+
+    def get(self, datadir, partition, token, invalidate=None):
+        """
+        Reads the suffix hashes of a partition.
+
+        :param token: the token read from the partition directory
+        :param invalidate: optional list of suffixes to mark as needing to
+                           be rehashed first
+        :returns: a dict mapping suffix to a tuple of (hash, version), where
+                  hash is None for suffixes needing to be rehashed; or None
+                  if the index of the partition is not valid for the token
+        """
+        return self._execute(self._get, datadir, partition, token, invalidate)
+
+    def _get(self, conn, datadir, partition, token, invalidate):
+        if invalidate:
+            self._invalidate(conn, datadir, partition, invalidate)
+        row = conn.execute('''
+            SELECT token FROM partition_token
+            WHERE datadir = ? AND partition = ?
+        ''', (datadir, partition)).fetchone()
+        if not token or not row or row[0] != token:
+            return None
+        # hashes are pickled as, for EC policies, they are dicts of hashes
+        # per fragment index
+        return dict(
+            (suffix, (pickle.loads(bytes(hash_))
+                      if hash_ is not None else None, version))
+            for suffix, hash_, version in conn.execute('''
+                SELECT suffix, hash, version FROM suffix_hash
+                WHERE datadir = ? AND partition = ?
+            ''', (datadir, partition)))
+
+    def update(self, datadir, partition, hashed):
+        """
+        Stores newly calculated suffix hashes, unless the suffix was
+        invalidated again since it was read.
+
+        :param hashed: a list of (suffix, version, hash) tuples; a hash of None
+                       means the suffix no longer exists
+        :returns: the set of suffixes that were invalidated again and so
+                  were not updated
+        """
+        return self._execute(self._update, datadir, partition, hashed)
+
+    def _update(self, conn, datadir, partition, hashed):
+        raced = set()
+        for suffix, version, hash_ in hashed:
+            if hash_ is None:
+                cur = conn.execute('''
+                    DELETE FROM suffix_hash
+                    WHERE datadir = ? AND partition = ?
+                        AND suffix = ? AND version = ?
+                ''', (datadir, partition, suffix, version))
+            else:
+                cur = conn.execute('''
+                    UPDATE suffix_hash SET hash = ?
+                    WHERE datadir = ? AND partition = ?
+                        AND suffix = ? AND version = ?
+                ''', (sqlite3.Binary(pickle.dumps(hash_, PICKLE_PROTOCOL)),
+                      datadir, partition, suffix, version))
+            if cur.rowcount != 1:
+                raced.add(suffix)
+        return raced
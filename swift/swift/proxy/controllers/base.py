@@ -32,6 +32,7 @@ import functools
 import inspect
 import itertools
 import operator
+from collections import OrderedDict
 from copy import deepcopy
 from sys import exc_info
 from swift import gettext_ as _
@@ -67,6 +68,72 @@ DEFAULT_RECHECK_ACCOUNT_EXISTENCE = 60  # seconds
 DEFAULT_RECHECK_CONTAINER_EXISTENCE = 60  # seconds
 
 
+class InfoCache(object):
+    """
+    A size and time bound LRU of account and container info that is shared
+    by every request to a proxy application (as its ``info_cache``). It sits
+    in front of memcache so that hot accounts and containers don't cost a
+    memcache round trip on every request.
+
+    Entries are replaced or dropped whenever this process caches new info or
+    clears the info (see :func:`set_info_cache` and :func:`clear_info_cache`).
+    Changes made through other processes are only seen once an entry
+    expires, so entries are never kept for longer than ``ttl`` seconds.
+
+    :param max_entries: the maximum number of entries to keep
+    :param ttl: the maximum number of seconds to keep an entry
+    :param logger: a logger to emit ``info_cache.*`` counters to
+    """
+
+    def __init__(self, max_entries=10000, ttl=10, logger=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.logger = logger
+        self.entries = OrderedDict()
+        self.stats = dict.fromkeys(
+            ('hit', 'miss', 'expired', 'eviction', 'invalidation'), 0)
+
+    def _increment(self, stat):
+        self.stats[stat] += 1
+        if self.logger:
+            self.logger.increment('info_cache.%s' % stat)
+
+    def get(self, cache_key):
+        """
+        :returns: a copy of the cached info, or None if it is not cached or
+                  has expired
+        """
+        entry = self.entries.pop(cache_key, None)
+        if entry is not None:
+            expires_at, info = entry
+            if expires_at > time.time():
+                # re-insert to mark it as the most recently used
+                self.entries[cache_key] = entry
+                self._increment('hit')
+                return deepcopy(info)
+            self._increment('expired')
+        self._increment('miss')
+        return None
+
+    def set(self, cache_key, info, cache_time=None):
+        """
+        Cache a copy of info for the lesser of ``cache_time`` and ``ttl``
+        seconds.
+        """
+        ttl = self.ttl if cache_time is None else min(self.ttl, cache_time)
+        self.entries.pop(cache_key, None)
+        if ttl <= 0:
+            return
+        self.entries[cache_key] = (time.time() + ttl, deepcopy(info))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self._increment('eviction')
+
+    def invalidate(self, cache_key):
+        if self.entries.pop(cache_key, None) is not None:
+            self._increment('invalidation')
+
+
 def update_headers(response, headers):
     """
     Helper function to update headers in the response.
@@ -446,6 +513,36 @@ def get_cache_key(account, container=None, obj=None):
     return cache_key
 
 
+def _get_info_cache(app, env):
+    """
+    Get the proxy application's InfoCache, or None if it is disabled.
+
+    The proxy application puts its InfoCache in ``env['swift.info_cache']``,
+    which is copied into subrequests' environments. Middlewares in front of
+    the proxy see requests before it does and are handed the next app in the
+    pipeline rather than the proxy application, so if the request has not
+    reached the proxy yet the InfoCache is looked for by following the
+    ``app`` attributes down the pipeline (as
+    :func:`~swift.common.wsgi.pipeline_property` does), and kept in the
+    environment for the rest of the request.
+
+    :param  app: the application object
+    :param  env: the environment used by the current request
+    """
+    if 'swift.info_cache' not in env:
+        info_cache = None
+        while app is not None:
+            # only look at instance attributes, so that mock apps don't
+            # produce an InfoCache or an endless pipeline
+            attrs = getattr(app, '__dict__', {})
+            if 'info_cache' in attrs:
+                info_cache = attrs['info_cache']
+                break
+            app = attrs.get('app')
+        env['swift.info_cache'] = info_cache
+    return env['swift.info_cache']
+
+
 def set_info_cache(app, env, account, container, resp):
     """
     Cache info in both memcache and env.
@@ -479,8 +576,11 @@ def set_info_cache(app, env, account, container, resp):
 
     # Next actually set both memcache and the env cache
     memcache = getattr(app, 'memcache', None) or env.get('swift.cache')
+    info_cache = _get_info_cache(app, env)
     if cache_time is None:
         infocache.pop(cache_key, None)
+        if info_cache is not None:
+            info_cache.invalidate(cache_key)
         if memcache:
             memcache.delete(cache_key)
         return
@@ -491,6 +591,8 @@ def set_info_cache(app, env, account, container, resp):
         info = headers_to_account_info(resp.headers, resp.status_int)
     if memcache:
         memcache.set(cache_key, info, time=cache_time)
+    if info_cache is not None:
+        info_cache.set(cache_key, info, cache_time)
     infocache[cache_key] = info
     return info
 
@@ -524,7 +626,7 @@ def set_object_info_cache(app, env, account, container, obj, resp):
 
 def clear_info_cache(app, env, account, container=None):
     """
-    Clear the cached info in both memcache and env
+    Clear the cached info in memcache, env and the app's InfoCache
 
     :param  app: the application object
     :param  env: the WSGI environment
@@ -551,10 +653,61 @@ def _get_info_from_infocache(env, account, container=None):
     return None
 
 
+def _get_info_from_process_cache(app, env, account, container=None):
+    """
+    Get cached account or container information from the app's InfoCache,
+    if it is enabled.
+
+    :param  app: the application object
+    :param  env: the environment used by the current request
+    :param  account: the account name
+    :param  container: the container name
+
+    :returns: a dictionary of cached info on cache hit, None on miss. Also
+      returns None if the InfoCache is disabled.
+    """
+    info_cache = _get_info_cache(app, env)
+    if info_cache is None:
+        return None
+    cache_key = get_cache_key(account, container)
+    info = info_cache.get(cache_key)
+    if info is not None:
+        env.setdefault('swift.infocache', {})[cache_key] = info
+    return info
+
+
+def _cache_info_from_memcache(app, env, cache_key, info):
+    """
+    Put info fetched from memcache into the request-environment cache and
+    the app's InfoCache, converting its strings back to utf-8.
+    """
+    for key in info:
+        if isinstance(info[key], six.text_type):
+            info[key] = info[key].encode("utf-8")
+        elif isinstance(info[key], dict):
+            for subkey, value in info[key].items():
+                if isinstance(value, six.text_type):
+                    info[key][subkey] = value.encode("utf-8")
+    env.setdefault('swift.infocache', {})[cache_key] = info
+    info_cache = _get_info_cache(app, env)
+    if info_cache is not None:
+        info_cache.set(cache_key, info)
+
+
 def _get_info_from_memcache(app, env, account, container=None):
     """
     Get cached account or container information from memcache
 
+    When looking up a container, the account's info is fetched in the same
+    round trip (if the memcache client supports ``get_many`` and it is not
+    already in the request-environment cache or the app's InfoCache) and put
+    into ``swift.infocache``, since it is needed whenever the container's info
+    has to be fetched from the backend, and by anything else in the request
+    that wants the account info. If memcache did not have the account's
+    info either, that is remembered (in ``swift.memcache_misses``) so the
+    account lookup that follows a container miss goes straight to the
+    backend.
+
     :param  app: the application object
     :param  env: the environment used by the current request
     :param  account: the account name
@@ -566,24 +719,30 @@ def _get_info_from_memcache(app, env, account, container=None):
     cache_key = get_cache_key(account, container)
     memcache = getattr(app, 'memcache', None) or env.get('swift.cache')
     if memcache:
-        info = memcache.get(cache_key)
+        if cache_key in env.get('swift.memcache_misses', ()):
+            return None
+        account_key = get_cache_key(account)
+        if container and hasattr(memcache, 'get_many') and \
+                _get_info_from_infocache(env, account) is None and \
+                _get_info_from_process_cache(app, env, account) is None:
+            info, account_info = memcache.get_many([cache_key, account_key])
+            if account_info:
+                _cache_info_from_memcache(app, env, account_key, account_info)
+            else:
+                env.setdefault('swift.memcache_misses', set()).add(
+                    account_key)
+        else:
+            info = memcache.get(cache_key)
         if info:
-            for key in info:
-                if isinstance(info[key], six.text_type):
-                    info[key] = info[key].encode("utf-8")
-                elif isinstance(info[key], dict):
-                    for subkey, value in info[key].items():
-                        if isinstance(value, six.text_type):
-                            info[key][subkey] = value.encode("utf-8")
-            env.setdefault('swift.infocache', {})[cache_key] = info
+            _cache_info_from_memcache(app, env, cache_key, info)
         return info
     return None
 
 
 def _get_info_from_caches(app, env, account, container=None):
     """
-    Get the cached info from env or memcache (if used) in that order.
-    Used for both account and container info.
+    Get the cached info from env, the app's InfoCache or memcache (if
+    used) in that order. Used for both account and container info.
 
     :param  app: the application object
     :param  env: the environment used by the current request
@@ -591,6 +750,8 @@ def _get_info_from_caches(app, env, account, container=None):
     """
 
     info = _get_info_from_infocache(env, account, container)
+    if info is None:
+        info = _get_info_from_process_cache(app, env, account, container)
     if info is None:
         info = _get_info_from_memcache(app, env, account, container)
     return info
@@ -684,13 +845,68 @@ def _get_object_info(app, env, account, container, obj, swift_source=None):
     return info
 
 
+def backend_http_connect(app, *args, **kwargs):
+    """
+    Calls :func:`~swift.common.bufferedhttp.http_connect`, reusing an idle
+    connection to the backend server from the proxy's connection pool when
+    backend_keep_alive is set.
+
+    :param app: the proxy server application
+    """
+    if app.connection_pool is not None:
+        kwargs['connection_pool'] = app.connection_pool
+        # backend requests otherwise ask for "Connection: close"
+        headers = HeaderKeyDict(kwargs.get('headers') or {})
+        headers['Connection'] = 'keep-alive'
+        kwargs['headers'] = headers
+    return http_connect(*args, **kwargs)
+
+
+def backend_getresponse(app, node, part, method, path, headers=None,
+                        query_string=None, node_timeout=None):
+    """
+    Sends a request to a backend node and gets its response.
+
+    An idle connection reused from the proxy's connection pool may have been
+    closed by the backend server before it saw the request. Rather than
+    counting that against the node, the request is sent once more on a new
+    connection.
+
+    :param app: the proxy server application
+    :param node: the node to send the request to
+    :param node_timeout: seconds to wait for the response
+    :returns: a tuple of (connection, response)
+    """
+    retry = app.connection_pool is not None
+    while True:
+        start_node_timing = time.time()
+        with ConnectionTimeout(app.conn_timeout):
+            conn = backend_http_connect(
+                app, node['ip'], node['port'], node['device'], part, method,
+                path, headers=headers, query_string=query_string)
+        app.set_node_timing(node, time.time() - start_node_timing)
+        try:
+            with Timeout(node_timeout):
+                return conn, conn.getresponse()
+        except Exception:
+            if not (retry and getattr(conn, 'reused', False)):
+                raise
+            retry = False
+            conn.close()
+            app.connection_pool.clear(node['ip'], node['port'])
+
+
 def close_swift_conn(src):
     """
-    Force close the http connection to the backend.
+    Close the http connection to the backend. A response that has been read
+    in full releases its connection to the proxy's connection pool;
+    otherwise the connection is forcibly closed.
 
     :param src: the response from the backend
     """
     try:
+        if getattr(src, 'release_conn', None) and src.release_conn():
+            return
         # Since the backends set "Connection: close" in their response
         # headers, the response object (src) is solely responsible for the
         # socket. The connection object (src.swift_conn) has no references
@@ -1106,20 +1322,13 @@ class ResumingGetter(object):
         # a request may be specialised with specific backend headers
         if self.header_provider:
             req_headers.update(self.header_provider())
-        start_node_timing = time.time()
         try:
-            with ConnectionTimeout(self.app.conn_timeout):
-                conn = http_connect(
-                    node['ip'], node['port'], node['device'],
-                    self.partition, self.req_method, self.path,
-                    headers=req_headers,
-                    query_string=self.req_query_string)
-            self.app.set_node_timing(node, time.time() - start_node_timing)
-
-            with Timeout(node_timeout):
-                possible_source = conn.getresponse()
-                # See NOTE: swift_conn at top of file about this.
-                possible_source.swift_conn = conn
+            conn, possible_source = backend_getresponse(
+                self.app, node, self.partition, self.req_method, self.path,
+                headers=req_headers, query_string=self.req_query_string,
+                node_timeout=node_timeout)
+            # See NOTE: swift_conn at top of file about this.
+            possible_source.swift_conn = conn
         except (Exception, Timeout):
             self.app.exception_occurred(
                 node, self.server_type,
@@ -1147,6 +1356,7 @@ class ResumingGetter(object):
                         self.reasons.append('')
                         self.bodies.append('')
                         self.source_headers.append([])
+                        close_swift_conn(possible_source)
                         return False
 
                 self.statuses.append(possible_source.status)
@@ -1271,6 +1481,10 @@ class GetOrHeadHandler(ResumingGetter):
                 res.app_iter = self._make_app_iter(req, node, source)
                 # See NOTE: swift_conn at top of file about this.
                 res.swift_conn = source.swift_conn
+            else:
+                # nothing more will be read from the source (a HEAD has no
+                # body to read)
+                close_swift_conn(source)
             if not res.environ:
                 res.environ = {}
             res.environ['swift_x_timestamp'] = \
@@ -1557,15 +1771,11 @@ class Controller(object):
         self.app.logger.thread_locals = logger_thread_locals
         for node in nodes:
             try:
-                start_node_timing = time.time()
-                with ConnectionTimeout(self.app.conn_timeout):
-                    conn = http_connect(node['ip'], node['port'],
-                                        node['device'], part, method, path,
-                                        headers=headers, query_string=query)
-                    conn.node = node
-                self.app.set_node_timing(node, time.time() - start_node_timing)
+                conn, resp = backend_getresponse(
+                    self.app, node, part, method, path, headers=headers,
+                    query_string=query, node_timeout=self.app.node_timeout)
+                conn.node = node
                 with Timeout(self.app.node_timeout):
-                    resp = conn.getresponse()
                     if not is_informational(resp.status) and \
                             not is_server_error(resp.status):
                         return resp.status, resp.reason, resp.getheaders(), \
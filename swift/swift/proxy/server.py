@@ -34,10 +34,12 @@ from swift.common.utils import cache_from_env, get_logger, \
     affinity_key_function, affinity_locality_predicate, list_from_csv, \
     register_swift_info
 from swift.common.constraints import check_utf8, valid_api_version
+from swift.common.bufferedhttp import ConnectionPool
 from swift.proxy.controllers import AccountController, ContainerController, \
     ObjectControllerRouter, InfoController
 from swift.proxy.controllers.base import get_container_info, NodeIter, \
-    DEFAULT_RECHECK_CONTAINER_EXISTENCE, DEFAULT_RECHECK_ACCOUNT_EXISTENCE
+    InfoCache, DEFAULT_RECHECK_CONTAINER_EXISTENCE, \
+    DEFAULT_RECHECK_ACCOUNT_EXISTENCE
 from swift.common.swob import HTTPBadRequest, HTTPForbidden, \
     HTTPMethodNotAllowed, HTTPNotFound, HTTPPreconditionFailed, \
     HTTPServerError, HTTPException, Request, HTTPServiceUnavailable
@@ -97,6 +99,12 @@ class Application(object):
             conf.get('recoverable_node_timeout', self.node_timeout))
         self.conn_timeout = float(conf.get('conn_timeout', 0.5))
         self.client_timeout = int(conf.get('client_timeout', 60))
+        if config_true_value(conf.get('backend_keep_alive', 'false')):
+            self.connection_pool = ConnectionPool(
+                max_idle=int(conf.get('backend_max_idle_connections', 4)),
+                idle_timeout=float(conf.get('backend_idle_timeout', 30)))
+        else:
+            self.connection_pool = None
         self.put_queue_depth = int(conf.get('put_queue_depth', 10))
         self.object_chunk_size = int(conf.get('object_chunk_size', 65536))
         self.client_chunk_size = int(conf.get('client_chunk_size', 65536))
@@ -112,6 +120,14 @@ class Application(object):
         self.recheck_account_existence = \
             int(conf.get('recheck_account_existence',
                          DEFAULT_RECHECK_ACCOUNT_EXISTENCE))
+        info_cache_size = int(conf.get('info_cache_size', 0))
+        if info_cache_size > 0:
+            self.info_cache = InfoCache(
+                max_entries=info_cache_size,
+                ttl=float(conf.get('info_cache_ttl', 10)),
+                logger=self.logger)
+        else:
+            self.info_cache = None
         self.allow_account_management = \
             config_true_value(conf.get('allow_account_management', 'no'))
         self.container_ring = container_ring or Ring(swift_dir,
@@ -308,6 +324,7 @@ class Application(object):
         try:
             if self.memcache is None:
                 self.memcache = cache_from_env(env, True)
+            env['swift.info_cache'] = self.info_cache
             req = self.update_request(Request(env))
             return self.handle_request(req)(env, start_response)
         except UnicodeError:
@@ -490,6 +507,7 @@ class Application(object):
         error_stats = self._error_limiting.setdefault(node_key, {})
         error_stats['errors'] = self.error_suppression_limit + 1
         error_stats['last_error'] = time()
+        self._clear_idle_connections(node)
         self.logger.error(_('%(msg)s %(ip)s:%(port)s/%(device)s'),
                           {'msg': msg, 'ip': node['ip'],
                           'port': node['port'], 'device': node['device']})
@@ -499,6 +517,13 @@ class Application(object):
         error_stats = self._error_limiting.setdefault(node_key, {})
         error_stats['errors'] = error_stats.get('errors', 0) + 1
         error_stats['last_error'] = time()
+        self._clear_idle_connections(node)
+
+    def _clear_idle_connections(self, node):
+        # idle connections to a node that is having trouble are unlikely to
+        # be any good either
+        if self.connection_pool is not None:
+            self.connection_pool.clear(node['ip'], node['port'])
 
     def error_occurred(self, node, msg):
         """
@@ -342,6 +342,9 @@ class FakeMemcache(object):
     def get(self, key):
         return self.store.get(key)
 
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
     def keys(self):
         return self.store.keys()
 
@@ -1053,7 +1056,8 @@ def fake_http_connect(*code_iter, **kwargs):
 def mocked_http_conn(*args, **kwargs):
     requests = []
 
-    def capture_requests(ip, port, method, path, headers, qs, ssl):
+    def capture_requests(ip, port, method, path, headers, qs, ssl,
+                         connection_pool=None):
         req = {
             'ip': ip,
             'port': port,
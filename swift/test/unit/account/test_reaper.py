@@ -576,6 +576,126 @@ class TestReaper(unittest.TestCase):
         self.assertEqual(r.logger.get_lines_for_level('error'), [
             'ERROR: invalid storage policy index: 2'])
 
+    def _reap_container_pages(self, r, checkpoint='', fail_marker=None,
+                              container_shard=None, account_nodes=None):
+        names = ['o1', 'o2', 'o3', 'o4', 'o5']
+        listing_markers = []
+
+        def fake_get_container(node, part, account, container, marker='',
+                               limit=None, **kwargs):
+            listing_markers.append(marker)
+            if marker == fail_marker:
+                raise ClientException('listing failed', http_status=500)
+            objs = [{'name': name} for name in names if name > marker]
+            return {'X-Backend-Storage-Policy-Index': 0}, objs[:limit]
+
+        header = 'X-Container-Sysmeta-Reaper-Checkpoint-%d' % (
+            container_shard or 0)
+        with patch.multiple('swift.account.reaper',
+                            direct_get_container=DEFAULT,
+                            direct_head_container=DEFAULT,
+                            direct_post_container=DEFAULT,
+                            direct_delete_object=DEFAULT,
+                            direct_delete_container=DEFAULT) as mocks:
+            mocks['direct_get_container'].side_effect = fake_get_container
+            mocks['direct_head_container'].return_value = {
+                header: checkpoint}
+            r.reap_container('a', 'partition', account_nodes or acc_nodes,
+                             'c', container_shard=container_shard)
+        deleted = [call_args[0][4] for call_args in
+                   mocks['direct_delete_object'].call_args_list]
+        checkpoints = [call_args[0][4] for call_args in
+                       mocks['direct_post_container'].call_args_list]
+        for posted in checkpoints:
+            self.assertEqual([header], list(posted))
+        return (listing_markers, deleted,
+                [posted[header] for posted in checkpoints], mocks)
+
+    @patch('swift.account.reaper.Ring',
+           lambda *args, **kwargs: unit.FakeRing())
+    def test_reap_container_pages(self):
+        r = self.init_reaper({'reap_by_page': 'yes', 'page_size': '2',
+                              'page_concurrency': '2'}, fakelogger=True)
+        listing_markers, deleted, checkpoints, mocks = \
+            self._reap_container_pages(r)
+        self.assertEqual(['', 'o2', 'o4', 'o5'], listing_markers)
+        self.assertEqual(['o1', 'o2', 'o3', 'o4', 'o5'],
+                         sorted(set(deleted)))
+        self.assertEqual(5 * 3, len(deleted))
+        # reap_object counts its stats once per object node, just as it does
+        # when reaping without pages
+        self.assertEqual(5 * 3, r.stats_objects_deleted)
+        # checkpoints are saved on each container node as the pages are
+        # reaped, then cleared once the end of the listing is reached
+        self.assertEqual(0, len(checkpoints) % 3)
+        self.assertEqual([''] * 3, checkpoints[-3:])
+        self.assertEqual(3, mocks['direct_delete_container'].call_count)
+
+    @patch('swift.account.reaper.Ring',
+           lambda *args, **kwargs: unit.FakeRing())
+    def test_reap_container_pages_resumes_from_checkpoint(self):
+        r = self.init_reaper({'reap_by_page': 'yes', 'page_size': '2'},
+                             fakelogger=True)
+        listing_markers, deleted, checkpoints, _mocks = \
+            self._reap_container_pages(r, checkpoint='o3')
+        self.assertEqual(['o3', 'o5'], listing_markers)
+        self.assertEqual(['o4', 'o5'], sorted(set(deleted)))
+        self.assertEqual([''] * 3, checkpoints)
+
+    @patch('swift.account.reaper.Ring',
+           lambda *args, **kwargs: unit.FakeRing())
+    def test_reap_container_pages_listing_fails(self):
+        r = self.init_reaper({'reap_by_page': 'yes', 'page_size': '2'},
+                             fakelogger=True)
+        listing_markers, deleted, checkpoints, _mocks = \
+            self._reap_container_pages(r, fail_marker='o4')
+        self.assertEqual(['', 'o2', 'o4'], listing_markers)
+        self.assertEqual(['o1', 'o2', 'o3', 'o4'], sorted(set(deleted)))
+        # the next pass resumes after the pages that were reaped
+        self.assertEqual(['o4'] * 3, checkpoints[-3:])
+        self.assertNotIn('', checkpoints)
+
+    @patch('swift.account.reaper.Ring',
+           lambda *args, **kwargs: unit.FakeRing())
+    def test_reap_container_pages_sharded(self):
+        all_deleted = []
+        container_deletes = 0
+        for container_shard in range(3):
+            r = self.init_reaper({'reap_by_page': 'yes', 'page_size': '2'},
+                                 fakelogger=True)
+            listing_markers, deleted, checkpoints, mocks = \
+                self._reap_container_pages(
+                    r, container_shard=container_shard,
+                    account_nodes=acc_nodes[:3])
+            # every shard lists every page...
+            self.assertEqual(['', 'o2', 'o4', 'o5'], listing_markers)
+            # ...but only deletes its own objects
+            for obj in set(deleted):
+                self.assertEqual(container_shard, reaper.get_shard(obj, 3))
+            all_deleted.extend(set(deleted))
+            # and only the container's own shard deletes it
+            if reaper.get_shard('c', 3) == container_shard:
+                self.assertEqual(
+                    3, mocks['direct_delete_container'].call_count)
+            else:
+                self.assertFalse(mocks['direct_delete_container'].called)
+            container_deletes += mocks['direct_delete_container'].call_count
+        self.assertEqual(['o1', 'o2', 'o3', 'o4', 'o5'], sorted(all_deleted))
+        self.assertEqual(3, container_deletes)
+
+    def test_reap_by_page_conf(self):
+        r = self.init_reaper({})
+        self.assertFalse(r.reap_by_page)
+        self.assertEqual(4, r.page_concurrency)
+        self.assertEqual(10000, r.page_size)
+        r = self.init_reaper({'reap_by_page': 'true',
+                              'page_concurrency': '8', 'page_size': '100'})
+        self.assertTrue(r.reap_by_page)
+        self.assertEqual(8, r.page_concurrency)
+        self.assertEqual(100, r.page_size)
+        for conf in ({'page_concurrency': '0'}, {'page_size': '-1'}):
+            self.assertRaises(ValueError, self.init_reaper, conf)
+
     def fake_reap_container(self, *args, **kwargs):
         self.called_amount += 1
         self.r.stats_containers_deleted = 1
@@ -789,6 +909,30 @@ class TestReaper(unittest.TestCase):
             r.reap_account(fake_broker, 10, fake_ring.nodes, 4)
             self.assertEqual(container_reaped[0], 1)
 
+    def test_reap_account_by_page(self):
+        containers = ('c1', 'c2', 'c3', '')
+        r = self.init_reaper({'reap_by_page': 'yes'}, fakelogger=True)
+        reaped = []
+
+        def fake_reap_container(self, account, account_partition,
+                                account_nodes, container,
+                                container_shard=None):
+            reaped.append((container, container_shard))
+
+        with patch('swift.account.reaper.AccountReaper.reap_container',
+                   fake_reap_container):
+            nodes = FakeRing().get_part_nodes()
+            for container_shard in range(len(nodes)):
+                broker = FakeAccountBroker(containers)
+                self.assertTrue(r.reap_account(
+                    broker, 'partition', nodes,
+                    container_shard=container_shard))
+        # every shard reaps its share of every container
+        self.assertEqual(sorted(
+            (container, container_shard)
+            for container in containers
+            for container_shard in range(len(nodes))), sorted(reaped))
+
     def test_run_once(self):
         def prepare_data_dir():
             devices_path = tempfile.mkdtemp()
@@ -30,7 +30,7 @@ import time
 from swift.cli import ringbuilder
 from swift.cli.ringbuilder import EXIT_SUCCESS, EXIT_WARNING, EXIT_ERROR
 from swift.common import exceptions
-from swift.common.ring import RingBuilder
+from swift.common.ring import RingBuilder, RingData
 
 from test.unit import Timeout
 
@@ -1944,6 +1944,24 @@ class TestCommands(unittest.TestCase, RunSwiftRingBuilderMixin):
         argv = ["", self.tmpfile, "rebalance", "--seed", "2"]
         self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
 
+    def test_rebalance_incremental(self):
+        self.create_sample_ring()
+        argv = ["", self.tmpfile, "rebalance", "--incremental", "3"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        ring = RingBuilder.load(self.tmpfile)
+        self.assertTrue(ring._rebalance_index.matches(ring._replica2part2dev))
+        # other commands keep the index
+        argv = ["", self.tmpfile, "set_weight", "d0", "110"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        ring = RingBuilder.load(self.tmpfile)
+        self.assertTrue(ring._rebalance_index.matches(ring._replica2part2dev))
+        # and a rebalance without --incremental drops it
+        ring.pretend_min_part_hours_passed()
+        ring.save(self.tmpfile)
+        argv = ["", self.tmpfile, "rebalance", "3"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        self.assertIsNone(RingBuilder.load(self.tmpfile)._rebalance_index)
+
     def test_rebalance_removed_devices(self):
         self.create_sample_ring()
         argvs = [
@@ -1986,6 +2004,22 @@ class TestCommands(unittest.TestCase, RunSwiftRingBuilderMixin):
         argv = ["", self.tmpfile, "write_ring"]
         self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
 
+    def test_write_ring_updates_mmap_ring(self):
+        self.create_sample_ring()
+        argv = ["", self.tmpfile, "rebalance"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        ring_file = self.tmpfile + '.ring.gz'
+        mmap_file = self.tmpfile + '.ring'
+        self.assertFalse(os.path.exists(mmap_file))
+
+        RingData([], [], 30).save_v2(mmap_file)
+        argv = ["", self.tmpfile, "write_ring"]
+        self.assertSystemExit(EXIT_SUCCESS, ringbuilder.main, argv)
+        expected = RingData.load(ring_file)
+        self.assertEqual(expected.devs, RingData.load(mmap_file).devs)
+        self.assertEqual(expected._replica2part2dev_id,
+                         RingData.load(mmap_file)._replica2part2dev_id)
+
     def test_write_builder(self):
         # Test builder file already exists
         self.create_sample_ring()
@@ -493,6 +493,36 @@ class TestDecrypterObjectRequests(unittest.TestCase):
         self.assertEqual(plaintext_etag, resp.headers['Etag'])
         self.assertEqual('text/plain', resp.headers['Content-Type'])
 
+    def test_GET_multiseg_coalesced(self):
+        self.decrypter = decrypter.Decrypter(
+            self.app, {'decrypt_buffer_size': '10'})
+        env = {'REQUEST_METHOD': 'GET',
+               CRYPTO_KEY_CALLBACK: fetch_crypto_keys}
+        req = Request.blank('/v1/a/c/o', environ=env)
+        chunks = ['some', 'chunks', 'of data', '!']
+        body = ''.join(chunks)
+        plaintext_etag = md5hex(body)
+        body_key = os.urandom(32)
+        ctxt = Crypto().create_encryption_ctxt(body_key, FAKE_IV)
+        enc_body = [encrypt(chunk, ctxt=ctxt) for chunk in chunks]
+        hdrs = self._make_response_headers(
+            sum(map(len, enc_body)), plaintext_etag, fetch_crypto_keys(),
+            body_key)
+        self.app.register(
+            'GET', '/v1/a/c/o', HTTPOk, body=enc_body, headers=hdrs)
+        resp = req.get_response(self.decrypter)
+        self.assertEqual('200 OK', resp.status)
+        self.assertEqual(['somechunks', 'of data!'], list(resp.app_iter))
+
+    def test_coalesce_chunks(self):
+        chunks = ['a', 'bc', 'def', '', 'ghij', 'k']
+        self.assertEqual(chunks, list(decrypter.coalesce_chunks(chunks, 0)))
+        self.assertEqual(['abc', 'def', 'ghij', 'k'],
+                         list(decrypter.coalesce_chunks(chunks, 3)))
+        self.assertEqual(['abcdefghijk'],
+                         list(decrypter.coalesce_chunks(chunks, 100)))
+        self.assertEqual([], list(decrypter.coalesce_chunks([], 3)))
+
     def test_GET_multiseg_with_range(self):
         env = {'REQUEST_METHOD': 'GET',
                CRYPTO_KEY_CALLBACK: fetch_crypto_keys}
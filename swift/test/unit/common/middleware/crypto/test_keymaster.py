@@ -113,6 +113,34 @@ class TestKeymaster(unittest.TestCase):
                              'Path %s keys:\n%s\npath %s keys\n%s' %
                              (ref_path_parts, ref_keys, path_parts, keys))
 
+    def test_key_cache(self):
+        orig_new = keymaster.hmac.new
+        calls = []
+
+        def count_hmac_new(*args, **kwargs):
+            calls.append(args[1])
+            return orig_new(*args, **kwargs)
+
+        with mock.patch('swift.common.middleware.crypto.keymaster.hmac.new',
+                        count_hmac_new):
+            app = keymaster.KeyMaster(
+                self.swift, dict(TEST_KEYMASTER_CONF, key_cache_size='2'))
+            key = app.create_key('/a/c')
+            self.assertEqual(key, app.create_key('/a/c'))
+            self.assertEqual(['/a/c'], calls)
+            app.create_key('/a/c/o1')
+            app.create_key('/a/c/o2')
+            # '/a/c' was evicted to make room
+            self.assertEqual(key, app.create_key('/a/c'))
+            self.assertEqual(['/a/c', '/a/c/o1', '/a/c/o2', '/a/c'], calls)
+
+            del calls[:]
+            app = keymaster.KeyMaster(
+                self.swift, dict(TEST_KEYMASTER_CONF, key_cache_size='0'))
+            self.assertEqual(key, app.create_key('/a/c'))
+            self.assertEqual(key, app.create_key('/a/c'))
+            self.assertEqual(['/a/c', '/a/c'], calls)
+
     def test_filter(self):
         factory = keymaster.filter_factory(TEST_KEYMASTER_CONF)
         self.assertTrue(callable(factory))
@@ -913,6 +913,65 @@ class TestDelete(unittest.TestCase):
             self.assertIn(['/c/f1', '401 Unauthorized'], resp_data['Errors'])
             self.assertIn(['/c/f2', '401 Unauthorized'], resp_data['Errors'])
 
+    def test_bulk_delete_groups_objects_by_container(self):
+        req = Request.blank('/delete_works/AUTH_Acc',
+                            body='/c1/f1\n/c2/f2\n/c1/f3\n/c2/f4\n/c1',
+                            headers={'Accept': 'application/json'})
+        req.method = 'POST'
+        resp_body = self.handle_delete_and_iter(req)
+        # the first object of each container, then the rest a container
+        # at a time
+        self.assertEqual(self.app.delete_paths, [
+            '/delete_works/AUTH_Acc/c1/f1',
+            '/delete_works/AUTH_Acc/c2/f2',
+            '/delete_works/AUTH_Acc/c1/f3',
+            '/delete_works/AUTH_Acc/c2/f4',
+            '/delete_works/AUTH_Acc/c1'])
+        resp_data = utils.json.loads(resp_body)
+        self.assertEqual(resp_data['Number Deleted'], 5)
+
+    def test_bulk_delete_shares_infocache(self):
+        infocaches = []
+
+        def fake_app(env, start_response):
+            infocaches.append(env['swift.infocache'])
+            return HTTPNoContent()(env, start_response)
+
+        self.bulk.app = fake_app
+        req = Request.blank('/delete_works/AUTH_Acc',
+                            body='/c/f1\n/c/f2\n/c')
+        req.method = 'POST'
+        resp_body = self.handle_delete_and_iter(req)
+        resp_data = utils.json.loads(resp_body)
+        self.assertEqual(resp_data['Number Deleted'], 3)
+        self.assertEqual(3, len(infocaches))
+        for infocache in infocaches:
+            self.assertIs(infocache, req.environ['swift.infocache'])
+
+    def test_bulk_delete_concurrent_across_containers(self):
+        in_flight = []
+        in_flight_containers = []
+
+        def fake_app(env, start_response):
+            in_flight.append(env['PATH_INFO'].split('/')[3])
+            in_flight_containers.append(set(in_flight))
+            sleep(0)
+            in_flight.remove(env['PATH_INFO'].split('/')[3])
+            return HTTPNoContent()(env, start_response)
+
+        self.bulk = bulk.filter_factory({'delete_concurrency': 3})(fake_app)
+        req = Request.blank('/delete_works/AUTH_Acc',
+                            body='/c1/f1\n/c2/f1\n/c1/f2\n/c1/f3\n'
+                                 '/c2/f2\n/c2/f3')
+        req.method = 'POST'
+        resp_body = self.handle_delete_and_iter(req)
+        resp_data = utils.json.loads(resp_body)
+        self.assertEqual(resp_data['Number Deleted'], 6)
+        # the first deletes of both containers go together, and so do the
+        # rest of the deletes of both containers
+        self.assertEqual([{'c1'}, {'c1', 'c2'}], in_flight_containers[:2])
+        self.assertIn({'c1', 'c2'}, in_flight_containers[2:])
+
 
 class TestConcurrentDelete(TestDelete):
     conf = {'delete_concurrency': 3}
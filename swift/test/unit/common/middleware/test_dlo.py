@@ -309,6 +309,30 @@ class TestDloGetManifest(DloTestCase):
         self.assertEqual(self.app.swift_sources,
                          [None, 'DLO', 'DLO', 'DLO', 'DLO', 'DLO', 'DLO'])
 
+    def test_get_manifest_read_ahead(self):
+        self.dlo.segment_read_ahead = 2
+        self.dlo.segment_read_ahead_bytes = 10
+        req = swob.Request.blank('/v1/AUTH_test/mancon/manifest',
+                                 environ={'REQUEST_METHOD': 'GET'})
+        status, headers, body = self.call_dlo(req)
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, 'aaaaabbbbbcccccdddddeeeee')
+        self.assertEqual(
+            [path for method, path in self.app.calls
+             if path.startswith('/v1/AUTH_test/c/seg_')],
+            ['/v1/AUTH_test/c/seg_%02d?multipart-manifest=get' % i
+             for i in range(1, 6)])
+
+    def test_get_manifest_read_ahead_client_disconnect(self):
+        self.dlo.segment_read_ahead = 3
+        self.dlo.segment_read_ahead_bytes = 10
+        req = swob.Request.blank('/v1/AUTH_test/mancon/manifest',
+                                 environ={'REQUEST_METHOD': 'GET'})
+        body_iter = self.dlo(req.environ, lambda *args: None)
+        self.assertEqual('aaaaa', next(iter(body_iter)))
+        # segments that were read ahead don't leak when the client goes away
+        body_iter.close()
+
     def test_get_non_manifest_passthrough(self):
         req = swob.Request.blank('/v1/AUTH_test/c/catpicture.jpg',
                                  environ={'REQUEST_METHOD': 'GET'})
@@ -0,0 +1,252 @@
+# Copyright (c) 2010-2017 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from hashlib import md5
+
+import mock
+
+from swift.common import swob
+from swift.common.middleware import object_cache
+from swift.common.swob import Request
+from test.unit import debug_logger, FakeMemcache
+from test.unit.common.middleware.helpers import FakeSwift
+
+
+def obj_headers(body, timestamp='1490000000.00000', **extra):
+    headers = {'Content-Length': str(len(body)),
+               'Content-Type': 'text/plain',
+               'Etag': md5(body).hexdigest(),
+               'X-Timestamp': timestamp}
+    headers.update(extra)
+    return headers
+
+
+class TestObjectCache(unittest.TestCase):
+
+    def setUp(self):
+        self.app = FakeSwift()
+        self.logger = debug_logger()
+        self.conf = {'max_object_size': '100', 'max_cached_objects': '2',
+                     'revalidate_interval': '10'}
+        self.oc = object_cache.ObjectCacheMiddleware(
+            self.app, self.conf, logger=self.logger)
+        self.app.register('HEAD', '/v1/a', swob.HTTPNoContent, {})
+        self.app.register('HEAD', '/v1/a/c', swob.HTTPNoContent, {})
+        self.body = 'hot object'
+        self.app.register('GET', '/v1/a/c/o', swob.HTTPOk,
+                          obj_headers(self.body), self.body)
+
+    def _get(self, path='/v1/a/c/o', **kwargs):
+        req = Request.blank(path, **kwargs)
+        return req.get_response(self.oc)
+
+    def _object_calls(self, path='/v1/a/c/o'):
+        return [call for call in self.app.calls if call[1] == path]
+
+    def test_miss_then_hit(self):
+        resp = self._get()
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.body, self.body)
+        resp = self._get()
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.body, self.body)
+        self.assertEqual(resp.headers['Etag'], md5(self.body).hexdigest())
+        self.assertEqual(resp.headers['X-Timestamp'], '1490000000.00000')
+        self.assertEqual(self._object_calls(), [('GET', '/v1/a/c/o')])
+        self.assertEqual({'hit': 1, 'miss': 1},
+                         self.logger.get_increment_counts())
+        self.assertEqual(self.logger.log_dict['set_statsd_prefix'],
+                         [(('object_cache',), {})])
+
+    def test_hit_serves_ranges_and_conditionals(self):
+        self._get()
+        resp = self._get(headers={'Range': 'bytes=4-9'})
+        self.assertEqual(resp.status_int, 206)
+        self.assertEqual(resp.body, 'object')
+        resp = self._get(
+            headers={'If-None-Match': md5(self.body).hexdigest()})
+        self.assertEqual(resp.status_int, 304)
+        self.assertEqual(self._object_calls(), [('GET', '/v1/a/c/o')])
+
+    def test_hit_is_authorized(self):
+        self._get()
+
+        def deny(req):
+            self.assertEqual(req.acl, 'r:*')
+            return swob.HTTPForbidden()
+
+        self.app.register('HEAD', '/v1/a/c', swob.HTTPNoContent,
+                          {'X-Container-Read': 'r:*'})
+        resp = self._get(environ={'swift.authorize': deny})
+        self.assertEqual(resp.status_int, 403)
+        self.assertEqual(self._object_calls(), [('GET', '/v1/a/c/o')])
+
+    def test_hit_for_missing_container_goes_to_proxy(self):
+        self._get()
+        self.app.register('HEAD', '/v1/a/c', swob.HTTPNotFound, {})
+        self.app.register('GET', '/v1/a/c/o', swob.HTTPNotFound, {})
+        resp = self._get()
+        self.assertEqual(resp.status_int, 404)
+        self.assertEqual(self._object_calls(),
+                         [('GET', '/v1/a/c/o'), ('GET', '/v1/a/c/o')])
+
+    def test_revalidate(self):
+        now = [1000.0]
+        with mock.patch('swift.common.middleware.object_cache.time.time',
+                        lambda: now[0]):
+            self._get()
+            now[0] += 11
+            resp = self._get()
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual(resp.body, self.body)
+            self.assertEqual(self._object_calls(),
+                             [('GET', '/v1/a/c/o'), ('HEAD', '/v1/a/c/o')])
+            # revalidated entry is good for another interval
+            now[0] += 5
+            self._get()
+            self.assertEqual(len(self._object_calls()), 2)
+        head_index = self.app.calls.index(('HEAD', '/v1/a/c/o'))
+        self.assertEqual(self.app.swift_sources[head_index], 'OC')
+        self.assertEqual({'hit': 2, 'miss': 1, 'revalidated': 1},
+                         self.logger.get_increment_counts())
+
+    def test_revalidate_stale(self):
+        now = [1000.0]
+        new_body = 'new object'
+        with mock.patch('swift.common.middleware.object_cache.time.time',
+                        lambda: now[0]):
+            self._get()
+            self.app.register(
+                'GET', '/v1/a/c/o', swob.HTTPOk,
+                obj_headers(new_body, timestamp='1490000001.00000'),
+                new_body)
+            now[0] += 11
+            resp = self._get()
+            self.assertEqual(resp.body, new_body)
+            self.assertEqual(self._object_calls(),
+                             [('GET', '/v1/a/c/o'), ('HEAD', '/v1/a/c/o'),
+                              ('GET', '/v1/a/c/o')])
+            self.assertEqual({'miss': 2, 'stale': 1},
+                             self.logger.get_increment_counts())
+            # and the new version was cached
+            self.assertEqual(self._get().body, new_body)
+            self.assertEqual(len(self._object_calls()), 3)
+
+    def test_write_invalidates(self):
+        for method in ('PUT', 'POST', 'DELETE'):
+            self._get()
+            self.app.register(method, '/v1/a/c/o', swob.HTTPAccepted, {})
+            resp = self._get(environ={'REQUEST_METHOD': method})
+            self.assertEqual(resp.status_int, 202)
+            self._get()
+            self.assertEqual(self._object_calls()[-3:],
+                             [('GET', '/v1/a/c/o'), (method, '/v1/a/c/o'),
+                              ('GET', '/v1/a/c/o')])
+        self.assertEqual(3, self.logger.get_increment_counts()['invalidation'])
+
+        # writes to objects that aren't cached drop nothing
+        self.app.register('PUT', '/v1/a/c/other', swob.HTTPCreated, {})
+        resp = self._get('/v1/a/c/other', environ={'REQUEST_METHOD': 'PUT'})
+        self.assertEqual(resp.status_int, 201)
+        self.assertEqual(3, self.logger.get_increment_counts()['invalidation'])
+
+    def test_uncacheable(self):
+        big = 'x' * 101
+        self.app.register('GET', '/v1/a/c/big', swob.HTTPOk,
+                          obj_headers(big), big)
+        self.app.register('GET', '/v1/a/c/slo', swob.HTTPOk,
+                          obj_headers('[]', **{'X-Static-Large-Object': 'y'}),
+                          '[]')
+        self.app.register('GET', '/v1/a/c/dlo', swob.HTTPOk,
+                          obj_headers('', **{'X-Object-Manifest': 'c/seg'}),
+                          '')
+        self.app.register('GET', '/v1/a/c/missing', swob.HTTPNotFound, {})
+        for path in ('/v1/a/c/big', '/v1/a/c/slo', '/v1/a/c/dlo',
+                     '/v1/a/c/missing'):
+            self._get(path)
+            self._get(path)
+            self.assertEqual(self._object_calls(path),
+                             [('GET', path), ('GET', path)])
+
+    def test_uncached_requests(self):
+        self._get()
+        for kwargs in ({'path': '/v1/a/c/o?multipart-manifest=get'},
+                       {'headers': {'X-Newest': 'true'}},
+                       {'environ': {'REQUEST_METHOD': 'HEAD'}}):
+            self._get(**kwargs)
+        self.assertEqual(self.app.calls,
+                         [('GET', '/v1/a/c/o'),
+                          ('GET', '/v1/a/c/o?multipart-manifest=get'),
+                          ('GET', '/v1/a/c/o'), ('HEAD', '/v1/a/c/o')])
+
+    def test_lru_eviction(self):
+        for name in ('o1', 'o2', 'o3'):
+            self.app.register('GET', '/v1/a/c/' + name, swob.HTTPOk,
+                              obj_headers(name), name)
+        self._get('/v1/a/c/o1')
+        self._get('/v1/a/c/o2')
+        self._get('/v1/a/c/o1')  # o1 is now the most recently used
+        self._get('/v1/a/c/o3')
+        self.assertEqual(['/v1/a/c/o1', '/v1/a/c/o3'],
+                         list(self.oc._cache))
+        self.assertEqual(1, self.logger.get_increment_counts()['eviction'])
+
+    def test_memcache(self):
+        self.conf['use_memcache'] = 'true'
+        memcache = FakeMemcache()
+        self.oc = object_cache.ObjectCacheMiddleware(
+            self.app, self.conf, logger=self.logger)
+        self._get(environ={'swift.cache': memcache})
+        self.assertIn('object_cache//v1/a/c/o', memcache.store)
+
+        # another proxy process finds it in memcache
+        other = object_cache.ObjectCacheMiddleware(
+            self.app, self.conf, logger=self.logger)
+        req = Request.blank('/v1/a/c/o', environ={'swift.cache': memcache})
+        resp = req.get_response(other)
+        self.assertEqual(resp.body, self.body)
+        self.assertEqual(self._object_calls(), [('GET', '/v1/a/c/o')])
+
+        self.app.register('DELETE', '/v1/a/c/o', swob.HTTPNoContent, {})
+        self._get(environ={'REQUEST_METHOD': 'DELETE',
+                           'swift.cache': memcache})
+        self.assertNotIn('object_cache//v1/a/c/o', memcache.store)
+
+
+class TestCachedObject(unittest.TestCase):
+
+    def test_memcache_round_trip(self):
+        entry = object_cache.CachedObject(
+            obj_headers('\xff\x00'), '\xff\x00', 1000.0)
+        copy = object_cache.CachedObject.from_memcache(entry.to_memcache())
+        self.assertEqual(copy.body, '\xff\x00')
+        self.assertEqual(copy.fetched_at, 1000.0)
+        self.assertTrue(copy.matches(entry.headers))
+        self.assertIsNone(object_cache.CachedObject.from_memcache({}))
+
+    def test_matches(self):
+        entry = object_cache.CachedObject(obj_headers('a'), 'a', 1000.0)
+        self.assertTrue(entry.matches(obj_headers('a')))
+        self.assertFalse(entry.matches(obj_headers('b')))
+        self.assertFalse(entry.matches(
+            obj_headers('a', timestamp='1490000001.00000')))
+        # header names are not case sensitive
+        self.assertTrue(entry.matches(dict(
+            (k.lower(), v) for k, v in obj_headers('a').items())))
+
+
+if __name__ == '__main__':
+    unittest.main()
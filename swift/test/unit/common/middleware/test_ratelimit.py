@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import re
 import unittest
 import time
 import eventlet
@@ -585,6 +586,172 @@ class TestRateLimit(unittest.TestCase):
             time_took = time.time() - begin
             self.assertEqual(round(time_took, 1), 0)  # no memcache, no limit
 
+    def test_get_key_type(self):
+        self.assertEqual('account', ratelimit.get_key_type('ratelimit/a'))
+        self.assertEqual('container',
+                         ratelimit.get_key_type('ratelimit/a/c'))
+        self.assertEqual('container_listing',
+                         ratelimit.get_key_type('ratelimit_listing/a/c'))
+        self.assertEqual('global_write',
+                         ratelimit.get_key_type('ratelimit/global-write/a'))
+
+    def test_decision_counters(self):
+        global time_ticker
+        conf_dict = {'account_ratelimit': 2, 'max_sleep_time_seconds': 1}
+        the_app = ratelimit.filter_factory(conf_dict)(FakeApp())
+        the_app.logger = FakeLogger()
+        the_app.memcache_client = FakeMemcache()
+        req = Request.blank('/v/a/c', environ={'REQUEST_METHOD': 'PUT'})
+        with mock.patch('swift.common.middleware.ratelimit.get_account_info',
+                        lambda *args, **kwargs: {}):
+            for i in range(3):
+                the_app.handle_ratelimit(req, 'a', 'c', None)
+            # a request arriving along with the first ones
+            time_ticker = 0
+            resp = the_app.handle_ratelimit(req, 'a', 'c', None)
+        self.assertEqual(resp.status_int, 498)
+        self.assertEqual({'account.allowed': 1, 'account.delayed': 2,
+                          'account.rejected': 1},
+                         the_app.logger.get_increment_counts())
+
+    def test_statsd_prefix(self):
+        with mock.patch('swift.common.middleware.ratelimit.get_logger') as \
+                mock_get_logger:
+            the_app = ratelimit.RateLimitMiddleware(FakeApp(), {})
+        self.assertIs(mock_get_logger.return_value, the_app.logger)
+        the_app.logger.set_statsd_prefix.assert_called_once_with('ratelimit')
+        # a logger passed in by the caller keeps its own prefix
+        logger = mock.MagicMock()
+        the_app = ratelimit.RateLimitMiddleware(FakeApp(), {}, logger=logger)
+        self.assertIs(logger, the_app.logger)
+        self.assertFalse(logger.set_statsd_prefix.called)
+
+    def test_unknown_rate_limiter(self):
+        with self.assertRaises(ValueError):
+            ratelimit.filter_factory({'rate_limiter': 'nope'})(FakeApp())
+
+
+class TestTokenBucketRateLimit(TestRateLimit):
+    """
+    Runs the rate limit tests again with the token bucket rate limiter. With
+    a single proxy process it limits exactly as the memcache rate limiter
+    does, but keeps limiting when memcache is unavailable.
+    """
+
+    def setUp(self):
+        super(TestTokenBucketRateLimit, self).setUp()
+        patcher = mock.patch.object(
+            ratelimit, 'filter_factory', self._token_bucket_filter_factory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _token_bucket_filter_factory(global_conf, **local_conf):
+        conf = dict(global_conf, **local_conf)
+        conf.setdefault('rate_limiter', 'token_bucket')
+        return lambda app: ratelimit.RateLimitMiddleware(app, conf)
+
+    def _make_app(self, **conf):
+        conf.setdefault('rate_limiter', 'token_bucket')
+        the_app = ratelimit.RateLimitMiddleware(FakeApp(), conf)
+        the_app.logger = FakeLogger()
+        return the_app
+
+    def test_ratelimit_max_rate_multiple_acc(self):
+        raise unittest.SkipTest(
+            'token buckets are shared by the greenthreads of a proxy '
+            'process, not by OS threads')
+
+    def test_restarting_memcache(self):
+        current_rate = 2
+        num_calls = 5
+        the_app = self._make_app(account_ratelimit=current_rate)
+        req = Request.blank('/v/a/c')
+        req.method = 'PUT'
+        req.environ['swift.cache'] = FakeMemcache()
+        req.environ['swift.cache'].error_on_incr = True
+        make_app_call = lambda: the_app(req.environ, start_response)
+        with mock.patch('swift.common.middleware.ratelimit.get_account_info',
+                        lambda *args, **kwargs: {}):
+            # still limited by the local bucket
+            self._run(make_app_call, num_calls, current_rate)
+        self.assertEqual(
+            num_calls, the_app.token_buckets['ratelimit/a'].pending)
+
+    def test_memcache_round_trips(self):
+        current_rate = 5
+        num_calls = 50
+        the_app = self._make_app(account_ratelimit=current_rate)
+        fake_memcache = FakeMemcache()
+        req = Request.blank('/v/a/c')
+        req.method = 'PUT'
+        req.environ['swift.cache'] = fake_memcache
+        make_app_call = lambda: the_app(req.environ, start_response)
+        with mock.patch('swift.common.middleware.ratelimit.get_account_info',
+                        lambda *args, **kwargs: {}), \
+                mock.patch.object(fake_memcache, 'incr',
+                                  wraps=fake_memcache.incr) as mock_incr:
+            self._run(make_app_call, num_calls, current_rate)
+        # at most one reconciliation per token_bucket_sync_interval rather
+        # than one incr per request
+        self.assertLessEqual(mock_incr.call_count, 10)
+        bucket = the_app.token_buckets['ratelimit/a']
+        self.assertEqual(num_calls, bucket.pending + sum(
+            int(v) for k, v in fake_memcache.store.items()
+            if k.startswith('ratelimit/a/')))
+        self.assertEqual(1.0, bucket.share)
+        # each reconciliation logs the decisions made since the last one
+        counts = bucket.pop_decision_counts()
+        log_lines = the_app.logger.get_lines_for_level('debug')
+        self.assertTrue(log_lines)
+        for line in log_lines:
+            match = re.match(
+                r'Token bucket ratelimit/a: share 1.000, (\d+) allowed, '
+                r'(\d+) delayed, (\d+) rejected since last sync$', line)
+            self.assertTrue(match, line)
+            for name, count in zip(('allowed', 'delayed', 'rejected'),
+                                   match.groups()):
+                counts[name] += int(count)
+        self.assertEqual({'allowed': 1, 'delayed': 49, 'rejected': 0},
+                         counts)
+        self.assertEqual({'allowed': 0, 'delayed': 0, 'rejected': 0},
+                         bucket.pop_decision_counts())
+
+    def test_share_of_rate(self):
+        global time_ticker
+        the_app = self._make_app(account_ratelimit=10,
+                                 token_bucket_window=10)
+        the_app.memcache_client = fake_memcache = FakeMemcache()
+        # other proxy processes' demand for the key
+        fake_memcache.store['ratelimit/a/9'] = 30
+        fake_memcache.store['ratelimit/a/10'] = 9
+        time_ticker = 102.5
+        self.assertEqual(0, the_app.get_sleep_time('ratelimit/a', 10))
+        bucket = the_app.token_buckets['ratelimit/a']
+        # 1 of 30 * 0.75 + 10 requests in the last 10 seconds
+        self.assertAlmostEqual(1 / 32.5, bucket.share)
+        self.assertEqual(10, fake_memcache.store['ratelimit/a/10'])
+        # so this process only gets 1 / 32.5 of the rate
+        self.assertAlmostEqual(3.25, the_app.get_sleep_time(
+            'ratelimit/a', 10))
+        # no reconciliation until the sync interval has passed
+        self.assertEqual(1, bucket.pending)
+        time_ticker += 1
+        the_app.get_sleep_time('ratelimit/a', 10)
+        self.assertEqual(0, bucket.pending)
+        self.assertEqual(12, fake_memcache.store['ratelimit/a/10'])
+        self.assertEqual(3, bucket.window_count)
+        self.assertAlmostEqual(3 / (30 * 0.65 + 12), bucket.share)
+
+    def test_bucket_eviction(self):
+        the_app = self._make_app(max_token_buckets=2)
+        the_app.memcache_client = FakeMemcache()
+        for key in ('ratelimit/a', 'ratelimit/b', 'ratelimit/a',
+                    'ratelimit/c'):
+            the_app.get_sleep_time(key, 10)
+        self.assertEqual(['ratelimit/a', 'ratelimit/c'],
+                         list(the_app.token_buckets))
+
 
 class TestSwiftInfo(unittest.TestCase):
     def setUp(self):
@@ -801,12 +801,14 @@ class TestReconSuccess(TestCase):
 
     def test_get_expirer_info_object(self):
         from_cache_response = {'object_expiration_pass': 0.79848217964172363,
-                               'expired_last_pass': 99}
+                               'expired_last_pass': 99,
+                               'object_expiration_backlog_age': 12.5}
         self.fakecache.fakeout_calls = []
         self.fakecache.fakeout = from_cache_response
         rv = self.app.get_expirer_info('object')
         self.assertEqual(self.fakecache.fakeout_calls,
-                         [((['object_expiration_pass', 'expired_last_pass'],
+                         [((['object_expiration_pass', 'expired_last_pass',
+                             'object_expiration_backlog_age'],
                             '/var/cache/swift/object.recon'), {})])
         self.assertEqual(rv, from_cache_response)
 
@@ -610,6 +610,106 @@ class TestSloPutManifest(SloTestCase):
             [u'/checktest/slob', u'Size Mismatch'],
         ], sorted(errors))
 
+    def test_handle_multipart_put_heads_each_segment_once(self):
+        good_data = json.dumps(
+            [{'path': '/checktest/a_1'},
+             {'path': 'checktest/a_1'},
+             {'path': '/checktest/b_2'},
+             {'path': '/checktest/a_1'}])
+        req = Request.blank(
+            '/v1/AUTH_test/checktest/man_3?multipart-manifest=put',
+            environ={'REQUEST_METHOD': 'PUT'}, body=good_data)
+        status, headers, body = self.call_slo(req)
+        self.assertEqual('201 Created', status)
+        self.assertEqual(
+            sorted(self.app.calls),
+            [('HEAD', '/v1/AUTH_test/checktest/a_1'),
+             ('HEAD', '/v1/AUTH_test/checktest/b_2'),
+             ('PUT', '/v1/AUTH_test/checktest/man_3?multipart-manifest=put')])
+
+        req = Request.blank(
+            '/v1/AUTH_test/checktest/man_3?multipart-manifest=put',
+            environ={'REQUEST_METHOD': 'GET'})
+        status, headers, body = self.call_app(req)
+        self.assertEqual(
+            ['/checktest/a_1', '/checktest/a_1', '/checktest/b_2',
+             '/checktest/a_1'],
+            [seg['name'] for seg in json.loads(body)])
+
+    def test_handle_multipart_put_missing_container(self):
+        self.app.register('HEAD', '/v1/AUTH_test', swob.HTTPNoContent,
+                          {}, None)
+        self.app.register('HEAD', '/v1/AUTH_test/nocont', swob.HTTPNotFound,
+                          {}, None)
+        self.app.register('HEAD', '/v1/AUTH_test/nocont/seg_1',
+                          swob.HTTPNotFound, {}, None)
+        bad_data = json.dumps(
+            [{'path': '/nocont/seg_1'},
+             {'path': '/checktest/a_1'},
+             {'path': '/nocont/seg_2'},
+             {'path': '/nocont/seg_3'}])
+        req = Request.blank(
+            '/v1/AUTH_test/checktest/man?multipart-manifest=put',
+            environ={'REQUEST_METHOD': 'PUT'},
+            headers={'Accept': 'application/json'},
+            body=bad_data)
+        status, headers, body = self.call_slo(req)
+        self.assertEqual('400 Bad Request', status)
+        self.assertEqual([
+            [u'/nocont/seg_1', u'404 Not Found'],
+            [u'/nocont/seg_2', u'404 Not Found'],
+            [u'/nocont/seg_3', u'404 Not Found'],
+        ], json.loads(body)['Errors'])
+        # the rest of the missing container's segments weren't HEADed
+        self.assertEqual(
+            sorted(self.app.calls),
+            [('HEAD', '/v1/AUTH_test'),
+             ('HEAD', '/v1/AUTH_test/checktest/a_1'),
+             ('HEAD', '/v1/AUTH_test/nocont'),
+             ('HEAD', '/v1/AUTH_test/nocont/seg_1')])
+
+    def test_handle_multipart_put_missing_first_segment(self):
+        # a missing segment in a container that does exist doesn't stop the
+        # container's other segments being checked
+        self.app.register('HEAD', '/v1/AUTH_test', swob.HTTPNoContent,
+                          {}, None)
+        self.app.register('HEAD', '/v1/AUTH_test/checktest',
+                          swob.HTTPNoContent, {}, None)
+        self.app.register('HEAD', '/v1/AUTH_test/checktest/missing',
+                          swob.HTTPNotFound, {}, None)
+        bad_data = json.dumps(
+            [{'path': '/checktest/missing'},
+             {'path': '/checktest/a_1', 'size_bytes': 2}])
+        req = Request.blank(
+            '/v1/AUTH_test/checktest/man?multipart-manifest=put',
+            environ={'REQUEST_METHOD': 'PUT'},
+            headers={'Accept': 'application/json'},
+            body=bad_data)
+        status, headers, body = self.call_slo(req)
+        self.assertEqual('400 Bad Request', status)
+        self.assertEqual([
+            [u'/checktest/missing', u'404 Not Found'],
+            [u'/checktest/a_1', u'Size Mismatch'],
+        ], json.loads(body)['Errors'])
+        self.assertIn(('HEAD', '/v1/AUTH_test/checktest/a_1'),
+                      self.app.calls)
+
+    def test_handle_multipart_put_validation_metrics(self):
+        good_data = json.dumps(
+            [{'path': '/checktest/a_1'}] * 12 + [{'path': '/checktest/b_2'}])
+        req = Request.blank(
+            '/v1/AUTH_test/checktest/man_3?multipart-manifest=put',
+            environ={'REQUEST_METHOD': 'PUT'}, body=good_data)
+        status, headers, body = self.call_slo(req)
+        self.assertEqual('201 Created', status)
+        self.assertEqual(
+            ['put.validation.timing', 'put.validation.10.timing'],
+            [args[0] for args, kwargs
+             in self.slo.logger.log_dict['timing_since']])
+        self.assertEqual(
+            [(('put.segments', 13), {}), (('put.segment_heads', 2), {})],
+            self.slo.logger.log_dict['update_stats'])
+
     def test_handle_multipart_put_skip_size_check(self):
         good_data = json.dumps([
             # Explicit None will skip it
@@ -2731,6 +2831,75 @@ class TestSloGetManifest(SloTestCase):
         self.assertEqual('200 OK', status)
         self.assertEqual(body, 'aaaaa')
 
+    def test_get_manifest_read_ahead(self):
+        self.slo.segment_read_ahead = 2
+        self.slo.segment_read_ahead_bytes = 30
+        opened = []
+        orig_open_segment = slo.SegmentedIterable._open_segment
+
+        def track_open_segment(segmented_iter, seg_req, buffer_body):
+            opened.append((seg_req.path.rsplit('/', 1)[1], buffer_body))
+            return orig_open_segment(segmented_iter, seg_req, buffer_body)
+
+        req = Request.blank(
+            '/v1/AUTH_test/gettest/manifest-abcdefghijkl',
+            environ={'REQUEST_METHOD': 'GET'})
+        with patch.object(slo.SegmentedIterable, '_open_segment',
+                          track_open_segment):
+            status, headers, body = self.call_slo(req)
+        self.assertEqual('200 OK', status)
+        self.assertEqual(body, ''.join(
+            letter * (5 * (i + 1)) for i, letter in enumerate('abcdefghijkl')))
+        # segments are only buffered while they fit in the memory budget
+        self.assertEqual([('a_5', True), ('b_10', True), ('c_15', True)],
+                         opened[:3])
+        self.assertEqual(('l_60', False), opened[-1])
+        self.assertEqual(12, len(opened))
+        segment_gets = [path for method, path in self.app.calls
+                        if 'multipart-manifest=get' in path]
+        self.assertEqual(12, len(segment_gets))
+        self.assertEqual(12, len(set(segment_gets)))
+
+    def test_range_get_manifest_read_ahead(self):
+        self.slo.segment_read_ahead = 3
+        req = Request.blank(
+            '/v1/AUTH_test/gettest/manifest-abcd',
+            environ={'REQUEST_METHOD': 'GET'},
+            headers={'Range': 'bytes=3-17'})
+        status, headers, body = self.call_slo(req)
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(body, 'aabbbbbbbbbbccc')
+        ranges = dict((c[1], c[2].get('Range'))
+                      for c in self.app.calls_with_headers)
+        self.assertEqual(
+            'bytes=3-', ranges['/v1/AUTH_test/gettest/a_5?'
+                               'multipart-manifest=get'])
+        self.assertEqual(
+            'bytes=0-2', ranges['/v1/AUTH_test/gettest/c_15?'
+                                'multipart-manifest=get'])
+
+    def test_mismatched_etag_read_ahead(self):
+        self.slo.segment_read_ahead = 2
+        self.app.register(
+            'GET', '/v1/AUTH_test/gettest/manifest-a-b-badetag-c',
+            swob.HTTPOk, {'Content-Type': 'application/json',
+                          'X-Static-Large-Object': 'true'},
+            json.dumps([{'name': '/gettest/a_5', 'hash': md5hex('a' * 5),
+                         'content_type': 'text/plain', 'bytes': '5'},
+                        {'name': '/gettest/b_10', 'hash': 'wrong!',
+                         'content_type': 'text/plain', 'bytes': '10'},
+                        {'name': '/gettest/c_15', 'hash': md5hex('c' * 15),
+                         'content_type': 'text/plain', 'bytes': '15'}]))
+
+        req = Request.blank(
+            '/v1/AUTH_test/gettest/manifest-a-b-badetag-c',
+            environ={'REQUEST_METHOD': 'GET'})
+        status, headers, body, exc = self.call_slo(req, expect_exception=True)
+
+        self.assertIsInstance(exc, SegmentError)
+        self.assertEqual('200 OK', status)
+        self.assertEqual(body, 'aaaaa')
+
     def test_first_segment_mismatched_etag(self):
         self.app.register('GET', '/v1/AUTH_test/gettest/manifest-badetag',
                           swob.HTTPOk, {'Content-Type': 'application/json',
@@ -2560,6 +2560,191 @@ class TestRingBuilder(unittest.TestCase):
             self.assertEqual(old_nodes, new_nodes)
 
 
+class TestIncrementalRebalance(unittest.TestCase):
+
+    def _make_builder(self, part_power=8, replicas=3):
+        rb = ring.RingBuilder(part_power, replicas, 1)
+        for zone in range(4):
+            for server in range(3):
+                for device in range(2):
+                    rb.add_dev({'region': zone // 2, 'zone': zone,
+                                'ip': '10.0.%d.%d' % (zone, server),
+                                'port': 6200, 'device': 'sd%d' % device,
+                                'weight': 100})
+        return rb
+
+    def _assert_same_builder(self, full, incremental):
+        self.assertEqual(full._replica2part2dev,
+                         incremental._replica2part2dev)
+        self.assertEqual(full._dispersion_graph,
+                         incremental._dispersion_graph)
+        self.assertEqual(full.dispersion, incremental.dispersion)
+        self.assertEqual([d and d['parts'] for d in full.devs],
+                         [d and d['parts'] for d in incremental.devs])
+
+    def _assert_index_consistent(self, rb):
+        expected = defaultdict(set)
+        for part2dev in rb._replica2part2dev:
+            for part, dev_id in enumerate(part2dev):
+                expected[dev_id].add(part)
+        self.assertEqual(
+            dict(expected),
+            dict((k, v) for k, v in rb._rebalance_index.dev2parts.items()
+                 if v))
+
+    def test_rebalance_matches_full_rebalance(self):
+        full = self._make_builder()
+        incremental = self._make_builder()
+        seed = 1
+
+        def rebalance_both():
+            full.pretend_min_part_hours_passed()
+            incremental.pretend_min_part_hours_passed()
+            self.assertEqual(
+                full.rebalance(seed=seed),
+                incremental.rebalance(seed=seed, incremental=True))
+            self._assert_same_builder(full, incremental)
+            self._assert_index_consistent(incremental)
+            incremental.validate()
+
+        rebalance_both()
+        for rb in (full, incremental):
+            rb.set_dev_weight(3, 150)
+        seed += 1
+        rebalance_both()
+        for rb in (full, incremental):
+            rb.add_dev({'region': 0, 'zone': 1, 'ip': '10.0.1.9',
+                        'port': 6200, 'device': 'sdx', 'weight': 100})
+        seed += 1
+        rebalance_both()
+        for rb in (full, incremental):
+            rb.remove_dev(7)
+        seed += 1
+        rebalance_both()
+        for rb in (full, incremental):
+            rb.set_replicas(3.5)
+        seed += 1
+        rebalance_both()
+        for rb in (full, incremental):
+            rb.set_dev_weight(0, 0)
+        seed += 1
+        rebalance_both()
+        # nothing changed at all
+        seed += 1
+        rebalance_both()
+
+    def test_rebalance_only_visits_affected_parts(self):
+        rb = self._make_builder()
+        rb.rebalance(seed=1, incremental=True)
+        rb.pretend_min_part_hours_passed()
+        rb.rebalance(seed=2, incremental=True)
+        rb.pretend_min_part_hours_passed()
+        rb.set_dev_weight(5, 110)
+
+        visited = []
+        orig_iter_parts = rb._iter_parts_to_gather
+
+        def tracking_iter_parts(*args, **kwargs):
+            for part in orig_iter_parts(*args, **kwargs):
+                visited.append(part)
+                yield part
+
+        with mock.patch.object(rb, '_iter_parts_to_gather',
+                               tracking_iter_parts), \
+                mock.patch.object(rb, '_build_dispersion_graph') as \
+                mock_build_graph:
+            rb.rebalance(seed=3, incremental=True)
+        self.assertFalse(mock_build_graph.called)
+        # every gather pass only looked at a fraction of the ring
+        self.assertTrue(visited)
+        self.assertLess(len(visited), rb.parts * 2)
+        self._assert_index_consistent(rb)
+        rb.validate()
+
+    def test_index_rebuilt_after_external_change(self):
+        rb = self._make_builder()
+        rb.rebalance(seed=1, incremental=True)
+        index = rb._rebalance_index
+        self.assertTrue(index.matches(rb._replica2part2dev))
+
+        # something other than rebalance changes the assignments
+        rb.increase_partition_power()
+        self.assertFalse(index.matches(rb._replica2part2dev))
+        rb.pretend_min_part_hours_passed()
+        rb.rebalance(seed=2, incremental=True)
+        self.assertIsNot(index, rb._rebalance_index)
+        self._assert_index_consistent(rb)
+        rb.validate()
+
+    def test_non_incremental_rebalance_drops_index(self):
+        rb = self._make_builder()
+        rb.rebalance(seed=1, incremental=True)
+        self.assertIsNotNone(rb._rebalance_index)
+        rb.pretend_min_part_hours_passed()
+        rb.rebalance(seed=2)
+        self.assertIsNone(rb._rebalance_index)
+        self.assertIsNone(rb.to_dict()['_rebalance_index'])
+
+    def test_index_saved_with_builder(self):
+        rb = self._make_builder()
+        rb.rebalance(seed=1, incremental=True)
+        tmpdir = mkdtemp()
+        self.addCleanup(rmtree, tmpdir)
+        builder_file = os.path.join(tmpdir, 'test.builder')
+        rb.save(builder_file)
+
+        loaded = ring.RingBuilder.load(builder_file)
+        index = loaded._rebalance_index
+        self.assertTrue(index.matches(loaded._replica2part2dev))
+        self._assert_index_consistent(loaded)
+        self.assertEqual(rb._rebalance_index.parts_at_risk,
+                         index.parts_at_risk)
+        self.assertEqual(rb._rebalance_index.undispersed_parts,
+                         index.undispersed_parts)
+        self.assertIsNot(index, copy.deepcopy(loaded)._rebalance_index)
+
+        # the loaded index is used rather than built again
+        full = copy.deepcopy(rb)
+        for builder in (full, loaded):
+            builder.pretend_min_part_hours_passed()
+            builder.set_dev_weight(5, 110)
+        with mock.patch.object(loaded, '_build_dispersion_graph') as \
+                mock_build_graph, \
+                mock.patch('swift.common.ring.builder._RebalanceIndex.'
+                           '__init__', side_effect=AssertionError):
+            loaded.rebalance(seed=2, incremental=True)
+        self.assertFalse(mock_build_graph.called)
+        full.rebalance(seed=2)
+        self._assert_same_builder(full, loaded)
+        self._assert_index_consistent(loaded)
+
+    def test_old_builder_file_has_no_index(self):
+        rb = self._make_builder()
+        rb.rebalance(seed=1, incremental=True)
+        builder_dict = rb.to_dict()
+        del builder_dict['_rebalance_index']
+        self.assertIsNone(
+            ring.RingBuilder.from_dict(builder_dict)._rebalance_index)
+
+    def test_validate_stats_from_index(self):
+        rb = self._make_builder()
+        rb.rebalance(seed=1, incremental=True)
+        expected = copy.deepcopy(rb)
+        expected._rebalance_index = None
+        self.assertEqual(expected.validate(stats=True),
+                         rb.validate(stats=True))
+        parts_in_map = sum(len(p2d) for p2d in rb._replica2part2dev)
+        self.assertEqual(
+            expected.validate(stats=True)[0],
+            rb._dev_usage_from_index(len(rb.devs), parts_in_map))
+
+        # a device holding two replicas of a part is still caught
+        rb._replica2part2dev[1][0] = rb._replica2part2dev[0][0]
+        rb._rebalance_index.take_snapshot(rb._replica2part2dev)
+        self.assertRaises(exceptions.RingValidationError,
+                          rb.validate, stats=True)
+
+
 class TestGetRequiredOverload(unittest.TestCase):
 
     maxDiff = None
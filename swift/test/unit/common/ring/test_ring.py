@@ -14,6 +14,8 @@
 # limitations under the License.
 
 import array
+import ctypes
+import mmap
 import six.moves.cPickle as pickle
 import os
 import unittest
@@ -134,6 +136,122 @@ class TestRingData(unittest.TestCase):
         rd2 = ring.RingData.load(ring_fname)
         self.assert_ring_data_equal(rd1, rd2)
 
+    def test_roundtrip_serialization_v2(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring')
+        rd = ring.RingData(
+            [array.array('H', [0, 1, 0, 1]), array.array('H', [0, 1, 0, 1]),
+             array.array('H', [2, 3])],
+            [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1},
+             {'id': 2, 'zone': 2}, {'id': 3, 'zone': 3}, None], 30)
+        rd.save_v2(ring_fname)
+        with open(ring_fname, 'rb') as f:
+            self.assertEqual('R1NG\x00\x02', f.read(6))
+        meta_only = ring.RingData.load(ring_fname, metadata_only=True)
+        self.assertEqual([
+            {'id': 0, 'zone': 0, 'region': 1},
+            {'id': 1, 'zone': 1, 'region': 1},
+            {'id': 2, 'zone': 2, 'region': 1},
+            {'id': 3, 'zone': 3, 'region': 1},
+            None,
+        ], meta_only.devs)
+        self.assertEqual([], meta_only._replica2part2dev_id)
+        rd2 = ring.RingData.load(ring_fname)
+        self.assert_ring_data_equal(rd, rd2)
+        for part2dev_id in rd2._replica2part2dev_id:
+            self.assertIsInstance(part2dev_id, ring.ring.MappedPart2DevId)
+        self.assertEqual([4, 4, 2],
+                         [len(p2d) for p2d in rd2._replica2part2dev_id])
+        self.assertEqual({0, 1, 2, 3}, rd2.get_dev_ids_with_parts())
+        # and the mapped ring can be written back out
+        rd2.save(os.path.join(self.testdir, 'bar.ring.gz'))
+        rd3 = ring.RingData.load(os.path.join(self.testdir, 'bar.ring.gz'))
+        self.assert_ring_data_equal(rd, rd3)
+
+    def test_v2_tables_are_aligned(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring')
+        for dev_count in range(1, 10):
+            devs = [{'id': i, 'zone': i, 'device': 'x' * i}
+                    for i in range(dev_count)]
+            rd = ring.RingData(
+                [array.array('H', [0] * 3), array.array('H', [0] * 5)],
+                devs, 30)
+            rd.save_v2(ring_fname)
+            with open(ring_fname, 'rb') as f:
+                data = f.read()
+            ring_dict = ring.RingData.deserialize_v2(data)
+            self.assertEqual(0, ring_dict['data_offset'] % 8)
+            self.assertEqual(ring_dict['data_offset'] + 8 + 16, len(data))
+            self.assertEqual([[0] * 3, [0] * 5], [
+                list(p2d) for p2d in ring_dict['replica2part2dev_id']])
+
+    def test_mapped_part2dev_id(self):
+        table = array.array('H', [5, 6, 7, 8])
+        mapped = ring.ring.MappedPart2DevId(
+            'junk' + table.tostring() + 'junk', 4, 4)
+        self.assertEqual(4, len(mapped))
+        self.assertEqual([5, 6, 7, 8], list(mapped))
+        self.assertEqual(5, mapped[0])
+        self.assertEqual(8, mapped[3])
+        self.assertEqual(8, mapped[-1])
+        self.assertRaises(IndexError, mapped.__getitem__, 4)
+        self.assertRaises(IndexError, mapped.__getitem__, -5)
+        self.assertEqual(table.tostring(), mapped.tostring())
+        self.assertEqual(table, mapped)
+        self.assertNotEqual(array.array('H', [5, 6, 7]), mapped)
+
+    def test_mapped_part2dev_id_shares_mmap(self):
+        table = array.array('H', [5, 6, 7, 8])
+        with open(os.path.join(self.testdir, 'table'), 'w+b') as f:
+            f.write('junkjunk' + table.tostring())
+            f.flush()
+            mapped_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        mapped = ring.ring.MappedPart2DevId(mapped_file, 8, 4)
+        self.assertEqual([5, 6, 7, 8], list(mapped))
+        # the table is laid over the mapping rather than copied from it
+        mapped_file[8:10] = array.array('H', [9]).tostring()
+        self.assertEqual(9, mapped[0])
+        self.assertEqual(9, mapped.table[0])
+
+    def test_byteswapped_serialization_v2(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring')
+        data = [array.array('H', [0, 1, 0, 1]), array.array('H', [0, 1, 0, 1])]
+        swapped_data = copy.deepcopy(data)
+        for x in swapped_data:
+            x.byteswap()
+
+        with mock.patch.object(sys, 'byteorder',
+                               'big' if sys.byteorder == 'little'
+                               else 'little'):
+            rds = ring.RingData(swapped_data,
+                                [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}],
+                                30)
+            rds.save_v2(ring_fname)
+
+        rd1 = ring.RingData(data, [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}],
+                            30)
+        rd2 = ring.RingData.load(ring_fname)
+        self.assert_ring_data_equal(rd1, rd2)
+        for part2dev_id in rd2._replica2part2dev_id:
+            self.assertIsInstance(part2dev_id, array.array)
+
+    def test_save_write_mmap(self):
+        ring_fname = os.path.join(self.testdir, 'foo.ring.gz')
+        rd = ring.RingData(
+            [array.array('H', [0, 1, 0, 1]), array.array('H', [0, 1, 0, 1])],
+            [{'id': 0, 'zone': 0}, {'id': 1, 'zone': 1}], 30)
+        rd.save(ring_fname)
+        self.assertEqual(['foo.ring.gz'], os.listdir(self.testdir))
+        rd.save(ring_fname, write_mmap=True)
+        self.assertEqual(['foo.ring', 'foo.ring.gz'],
+                         sorted(os.listdir(self.testdir)))
+        self.assertEqual(os.path.join(self.testdir, 'foo.ring'),
+                         ring.ring.mmap_ring_path(ring_fname))
+        self.assertEqual(oct(stat.S_IMODE(os.stat(
+            os.path.join(self.testdir, 'foo.ring')).st_mode)), '0644')
+        self.assert_ring_data_equal(rd, ring.RingData.load(
+            os.path.join(self.testdir, 'foo.ring')))
+        self.assertEqual('/a/b.v2', ring.ring.mmap_ring_path('/a/b'))
+
     def test_deterministic_serialization(self):
         """
         Two identical rings should produce identical .gz files on disk.
@@ -294,6 +412,61 @@ class TestRing(TestRingBase):
         self.assertEqual(len(self.ring.devs), 9)
         self.assertNotEqual(self.ring._mtime, orig_mtime)
 
+    def test_reload_mmap_ring(self):
+        testmmap = os.path.join(self.testdir, 'whatever.ring')
+        self.assertEqual(self.ring.mmap_path, testmmap)
+        self.assertIsNone(self.ring._mmap_mtime)
+        # a stale v2 ring is ignored...
+        ring.RingData(
+            self.intended_replica2part2dev_id,
+            self.intended_devs[:2], self.intended_part_shift).save_v2(
+                testmmap)
+        os.utime(testmmap, (time() - 300, time() - 300))
+        r = ring.Ring(self.testdir, reload_time=0.001, ring_name='whatever')
+        self.assertEqual(len(r.devs), 5)
+        for part2dev_id in r._replica2part2dev_id:
+            self.assertIsInstance(part2dev_id, array.array)
+
+        # ... but a fresh one is mapped instead of the gz ring
+        ring.RingData(
+            self.intended_replica2part2dev_id,
+            self.intended_devs, self.intended_part_shift).save(
+                self.testgz, write_mmap=True)
+        sleep(0.1)
+        self.assertTrue(r.has_changed())
+        self.assertEqual(len(r.devs), 5)
+        # the ring indexes the mapped ctypes tables directly
+        for part2dev_id in r._replica2part2dev_id:
+            self.assertIsInstance(part2dev_id, ctypes.Array)
+        self.assertEqual([list(part2dev_id)
+                          for part2dev_id in r._replica2part2dev_id],
+                         [list(part2dev_id) for part2dev_id
+                          in self.intended_replica2part2dev_id])
+        self.assertEqual(r.devs, self.intended_devs)
+        part, nodes = r.get_nodes('a')
+        self.assertEqual(part, 0)
+        self.assertEqual([n['id'] for n in nodes], [0, 3])
+        self.assertFalse(r.has_changed())
+
+        # rewriting just the v2 ring is noticed
+        self.intended_devs.append(
+            {'id': 5, 'region': 0, 'zone': 4, 'weight': 1.0,
+             'ip': '10.5.5.5', 'port': 6200})
+        ring.RingData(
+            self.intended_replica2part2dev_id,
+            self.intended_devs, self.intended_part_shift).save_v2(testmmap)
+        os.utime(testmmap, (time() + 60, time() + 60))
+        sleep(0.1)
+        self.assertTrue(r.has_changed())
+        self.assertEqual(len(r.devs), 6)
+
+        # and removing it falls back to the gz ring
+        os.unlink(testmmap)
+        sleep(0.1)
+        self.assertTrue(r.has_changed())
+        self.assertEqual(len(r.devs), 5)
+        self.assertIsNone(r._mmap_mtime)
+
     def test_reload_without_replication(self):
         replication_less_devs = [{'id': 0, 'region': 0, 'zone': 0,
                                   'weight': 1.0, 'ip': '10.1.1.1',
@@ -473,6 +646,81 @@ class TestRing(TestRingBase):
                          enumerate([self.intended_devs[0],
                                     self.intended_devs[3]])])
 
+    def test_get_parts(self):
+        paths = [('a',), ('a4',), ('a', 'c0'), ('a', 'c3'),
+                 ('a', 'c', 'o1'), ('a', 'c', 'o2')]
+        parts = self.ring.get_parts(paths)
+        self.assertIsInstance(parts, array.array)
+        self.assertEqual(list(parts), [0, 1, 3, 2, 1, 2])
+        self.assertEqual(list(parts),
+                         [self.ring.get_part(*path) for path in paths])
+        self.assertEqual(list(self.ring.get_parts([])), [])
+
+    def test_get_nodes_batch(self):
+        paths = [('a',), ('a4',), ('a', 'c', 'o2'), ('a', 'c', 'o5')]
+        parts, node_ids = self.ring.get_nodes_batch(paths)
+        self.assertEqual(list(parts), [0, 1, 2, 0])
+        self.assertEqual([list(ids) for ids in node_ids],
+                         [[0, 3], [1, 4], [0, 3], [0, 3]])
+        for path, part, dev_ids in zip(paths, parts, node_ids):
+            exp_part, nodes = self.ring.get_nodes(*path)
+            self.assertEqual(exp_part, part)
+            self.assertEqual([n['id'] for n in nodes], list(dev_ids))
+
+    def _make_handoff_ring(self, **kwargs):
+        rb = ring.RingBuilder(8, 3, 1)
+        next_dev_id = 0
+        for zone in range(1, 4):
+            for server in range(1, 3):
+                for device in range(1, 3):
+                    rb.add_dev({'id': next_dev_id,
+                                'ip': '1.2.%d.%d' % (zone, server),
+                                'port': 1234 + device,
+                                'zone': zone, 'region': 0,
+                                'weight': 1.0})
+                    next_dev_id += 1
+        rb.rebalance(seed=2)
+        rb.get_ring().save(self.testgz)
+        return ring.Ring(self.testdir, ring_name='whatever', **kwargs)
+
+    def test_get_more_nodes_cached(self):
+        r = self._make_handoff_ring()
+        uncached = self._make_handoff_ring(handoff_cache_size=0)
+        for part in range(r.partition_count):
+            exp = [d['id'] for d in uncached.get_more_nodes(part)]
+            # partially consume, then re-read the whole thing twice
+            node_iter = r.get_more_nodes(part)
+            self.assertEqual(next(node_iter)['id'], exp[0])
+            self.assertEqual([d['id'] for d in r.get_more_nodes(part)], exp)
+            self.assertEqual([d['id'] for d in r.get_more_nodes(part)], exp)
+            self.assertEqual([d['id'] for d in node_iter], exp[1:])
+        self.assertFalse(uncached._handoff_cache)
+
+    def test_get_more_nodes_cache_does_not_rewalk(self):
+        r = self._make_handoff_ring()
+        exp = [d['id'] for d in r.get_more_nodes(3)]
+        with mock.patch.object(r, '_iter_handoff_dev_ids') as mock_walk:
+            self.assertEqual([d['id'] for d in r.get_more_nodes(3)], exp)
+        self.assertFalse(mock_walk.called)
+
+    def test_get_more_nodes_cache_bounded(self):
+        r = self._make_handoff_ring(handoff_cache_size=4)
+        for part in range(10):
+            list(r.get_more_nodes(part))
+        self.assertEqual(list(r._handoff_cache), [6, 7, 8, 9])
+        # recently used partitions move to the end
+        list(r.get_more_nodes(7))
+        self.assertEqual(list(r._handoff_cache), [6, 8, 9, 7])
+        list(r.get_more_nodes(0))
+        self.assertEqual(list(r._handoff_cache), [8, 9, 7, 0])
+
+    def test_get_more_nodes_cache_cleared_on_reload(self):
+        r = self._make_handoff_ring()
+        list(r.get_more_nodes(1))
+        self.assertEqual(list(r._handoff_cache), [1])
+        r._reload(force=True)
+        self.assertFalse(r._handoff_cache)
+
     def add_dev_to_ring(self, new_dev):
         self.ring.devs.append(new_dev)
         self.ring._rebuild_tier_data()
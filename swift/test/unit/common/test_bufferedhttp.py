@@ -19,7 +19,7 @@ import unittest
 
 import socket
 
-from eventlet import spawn, Timeout, listen
+from eventlet import spawn, Timeout, listen, sleep
 
 from swift.common import bufferedhttp
 
@@ -128,5 +128,195 @@ class TestBufferedHTTP(unittest.TestCase):
                                 % (e, dev, path, header))
 
 
+class FakeConn(object):
+
+    def __init__(self, port):
+        self.sock = object()
+        self.pool_key = ('127.0.0.1', port)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.bindsock = listen(('127.0.0.1', 0))
+        self.port = self.bindsock.getsockname()[1]
+        self.pool = bufferedhttp.ConnectionPool()
+
+    def serve(self, count, close=False):
+        # answers count requests on one connection, returning their paths
+        def accept():
+            try:
+                with Timeout(3):
+                    sock, addr = self.bindsock.accept()
+                    fp = sock.makefile()
+                    paths = []
+                    for _junk in range(count):
+                        method, path = fp.readline().split()[:2]
+                        paths.append(path)
+                        while fp.readline() not in ('\r\n', ''):
+                            pass
+                        fp.write('HTTP/1.1 200 OK\r\n'
+                                 'Content-Length: 8\r\n\r\n')
+                        if method != 'HEAD':
+                            fp.write('RESPONSE')
+                        fp.flush()
+                    if close:
+                        fp.close()
+                        sock.close()
+                    return paths
+            except BaseException as err:
+                return err
+        return spawn(accept)
+
+    def connect(self, path, method='GET'):
+        return bufferedhttp.http_connect(
+            '127.0.0.1', self.port, 'dev', 1, method, path,
+            connection_pool=self.pool)
+
+    def test_connection_reused_once_response_read(self):
+        event = self.serve(2)
+        with Timeout(3):
+            conn = self.connect('/a')
+            resp = conn.getresponse()
+            self.assertEqual([], list(self.pool.idle[conn.pool_key]))
+            self.assertEqual('RESPONSE', resp.read())
+            self.assertEqual(1, len(self.pool.idle[conn.pool_key]))
+            conn2 = self.connect('/b')
+            self.assertIs(conn, conn2)
+            self.assertEqual('RESPONSE', conn2.getresponse().read())
+        self.assertEqual(['/dev/1/a', '/dev/1/b'], event.wait())
+
+    def test_connection_not_reused_if_response_not_read(self):
+        event = self.serve(1)
+        with Timeout(3):
+            conn = self.connect('/a')
+            resp = conn.getresponse()
+            self.assertEqual('RESP', resp.read(4))
+            resp.close()
+            self.assertEqual([], list(self.pool.idle[conn.pool_key]))
+            self.assertIsNone(self.pool.get('127.0.0.1', self.port))
+        self.assertEqual(['/dev/1/a'], event.wait())
+
+    def test_release_conn(self):
+        event = self.serve(2)
+        with Timeout(3):
+            conn = self.connect('/a')
+            resp = conn.getresponse()
+            self.assertFalse(conn.reused)
+            self.assertEqual('RESP', resp.read(4))
+            # a partly read response leaves the connection alone
+            self.assertFalse(resp.release_conn())
+            self.assertIsNotNone(resp.fp)
+            self.assertEqual([], list(self.pool.idle[conn.pool_key]))
+            self.assertEqual('ONSE', resp.read(4))
+            self.assertEqual(1, len(self.pool.idle[conn.pool_key]))
+            conn2 = self.connect('/b')
+            self.assertIs(conn, conn2)
+            self.assertTrue(conn2.reused)
+            resp = conn2.getresponse()
+            self.assertEqual('RESPONSE', resp.read(8))
+            # reading the whole response already released the connection
+            self.assertFalse(resp.release_conn())
+            self.assertEqual(1, len(self.pool.idle[conn.pool_key]))
+        self.assertEqual(['/dev/1/a', '/dev/1/b'], event.wait())
+
+    def test_head_connection_reused(self):
+        event = self.serve(2)
+        with Timeout(3):
+            conn = self.connect('/a', method='HEAD')
+            resp = conn.getresponse()
+            self.assertEqual('8', resp.getheader('Content-Length'))
+            self.assertTrue(resp.release_conn())
+            self.assertEqual(1, len(self.pool.idle[conn.pool_key]))
+            conn2 = self.connect('/b')
+            self.assertIs(conn, conn2)
+            self.assertEqual('RESPONSE', conn2.getresponse().read())
+        self.assertEqual(['/dev/1/a', '/dev/1/b'], event.wait())
+
+    def test_stale_connection_not_sent_again(self):
+        event = self.serve(1)
+        stale = mock.Mock()
+        stale.putrequest.side_effect = socket.error('broken pipe')
+        with Timeout(3), \
+                mock.patch.object(self.pool, 'get', return_value=stale), \
+                mock.patch.object(self.pool, 'clear') as mock_clear:
+            conn = self.connect('/a')
+            self.assertIsNot(stale, conn)
+            self.assertFalse(conn.reused)
+            self.assertEqual('RESPONSE', conn.getresponse().read())
+        stale.close.assert_called_once_with()
+        mock_clear.assert_called_once_with('127.0.0.1', self.port)
+        self.assertEqual(['/dev/1/a'], event.wait())
+
+    def test_connection_not_reused_once_server_closes_it(self):
+        event = self.serve(1, close=True)
+        with Timeout(3):
+            conn = self.connect('/a')
+            self.assertEqual('RESPONSE', conn.getresponse().read())
+            self.assertEqual(['/dev/1/a'], event.wait())
+            sleep(0.01)
+            self.assertIsNone(self.pool.get('127.0.0.1', self.port))
+        self.assertIsNone(conn.sock)
+        self.assertNotIn(conn.pool_key, self.pool.idle)
+
+    def test_no_pool(self):
+        event = self.serve(1)
+        with Timeout(3):
+            conn = bufferedhttp.http_connect(
+                '127.0.0.1', self.port, 'dev', 1, 'GET', '/a')
+            self.assertEqual('RESPONSE', conn.getresponse().read())
+        self.assertEqual(['/dev/1/a'], event.wait())
+        self.assertIsNone(conn.connection_pool)
+        self.assertEqual({}, self.pool.idle)
+
+    def test_max_idle(self):
+        pool = bufferedhttp.ConnectionPool(max_idle=2)
+        conns = [FakeConn(self.port) for _junk in range(3)]
+        for conn in conns:
+            pool.put(conn)
+        self.assertTrue(conns[0].closed)
+        self.assertEqual(conns[1:], [conn for _junk, conn in
+                                     pool.idle[('127.0.0.1', self.port)]])
+        with mock.patch('swift.common.bufferedhttp.is_dropped',
+                        return_value=False):
+            # the most recently used connection is reused first
+            self.assertIs(conns[2], pool.get('127.0.0.1', str(self.port)))
+
+    def test_idle_timeout(self):
+        pool = bufferedhttp.ConnectionPool(idle_timeout=10)
+        conns = [FakeConn(self.port) for _junk in range(2)]
+        with mock.patch('swift.common.bufferedhttp.time.time',
+                        return_value=1000.0):
+            pool.put(conns[0])
+        with mock.patch('swift.common.bufferedhttp.time.time',
+                        return_value=1005.0):
+            pool.put(conns[1])
+        with mock.patch('swift.common.bufferedhttp.time.time',
+                        return_value=1012.0), \
+                mock.patch('swift.common.bufferedhttp.is_dropped',
+                           return_value=False):
+            self.assertIs(conns[1], pool.get('127.0.0.1', self.port))
+            self.assertTrue(conns[0].closed)
+            self.assertFalse(conns[1].closed)
+        with mock.patch('swift.common.bufferedhttp.time.time',
+                        return_value=1030.0):
+            pool.put(conns[1])
+            self.assertIsNone(pool.get('127.0.0.1', self.port + 1))
+
+    def test_clear(self):
+        conns = [FakeConn(self.port) for _junk in range(2)]
+        for conn in conns:
+            self.pool.put(conn)
+        self.pool.clear('127.0.0.1', str(self.port))
+        self.assertTrue(all(conn.closed for conn in conns))
+        self.assertIsNone(self.pool.get('127.0.0.1', self.port))
+        # clearing a server with no idle connections is fine
+        self.pool.clear('127.0.0.1', self.port)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -901,6 +901,25 @@ class TestDatabaseBroker(unittest.TestCase):
         self.assertEqual(broker.get_items_since(3, 2), [])
         self.assertEqual(broker.get_items_since(999, 2), [])
 
+    def test_get_rows_since(self):
+        broker = DatabaseBroker(':memory:')
+        broker.db_type = 'test'
+        broker.db_contains_type = 'test'
+
+        def _initialize(conn, timestamp, **kwargs):
+            conn.execute('CREATE TABLE test (one TEXT, two INTEGER)')
+            conn.execute('INSERT INTO test (one, two) VALUES ("1", 1)')
+            conn.execute('INSERT INTO test (one, two) VALUES ("2", 2)')
+            conn.execute('INSERT INTO test (one, two) VALUES ("3", 3)')
+            conn.commit()
+        broker._initialize = _initialize
+        broker.initialize(normalize_timestamp('1'))
+        self.assertEqual(broker.get_rows_since(-1, 10),
+                         (['one', 'two'], [('1', 1), ('2', 2), ('3', 3)]))
+        self.assertEqual(broker.get_rows_since(1, 1),
+                         (['one', 'two'], [('2', 2)]))
+        self.assertEqual(broker.get_rows_since(999, 2), (['one', 'two'], []))
+
     def test_get_sync(self):
         broker = DatabaseBroker(':memory:')
         broker.db_type = 'test'
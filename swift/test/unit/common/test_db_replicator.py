@@ -27,6 +27,7 @@ import json
 
 import mock
 from mock import patch, call
+from six import StringIO
 from six.moves import reload_module
 
 from swift.container.backend import DATADIR
@@ -173,6 +174,11 @@ class ReplHttp(object):
                 return self.response
         return Response()
 
+    def replicate_row_batch(self, op, columns, rows, *args):
+        self.row_batches = getattr(self, 'row_batches', [])
+        self.row_batches.append((op, columns, list(rows)) + args)
+        return self.replicate(op, *args)
+
 
 class ChangingMtimesOs(object):
     def __init__(self):
@@ -214,6 +220,10 @@ class FakeBroker(object):
             return [{'ROWID': 1}, {'ROWID': 2}]
         return []
 
+    def get_rows_since(self, point, *args):
+        return ['ROWID'], [(item['ROWID'],)
+                           for item in self.get_items_since(point, *args)]
+
     def merge_syncs(self, *args, **kwargs):
         self.args = args
 
@@ -316,6 +326,31 @@ class TestDBReplicator(unittest.TestCase):
         conn.request = other_req
         self.assertEqual(conn.replicate(1, 2, 3), None)
 
+    def test_repl_connection_row_batch(self):
+        node = {'replication_ip': '127.0.0.1', 'replication_port': 80,
+                'device': 'sdb1'}
+        conn = db_replicator.ReplConnection(node, '1234567890', 'abcdefg',
+                                            logging.getLogger())
+        sent = []
+        resp = mock.MagicMock()
+        with mock.patch.object(conn, 'putrequest'), \
+                mock.patch.object(conn, 'putheader') as mock_putheader, \
+                mock.patch.object(conn, 'endheaders'), \
+                mock.patch.object(conn, 'send', sent.append), \
+                mock.patch.object(conn, 'getresponse', return_value=resp):
+            rows = [(i, 'o%d' % i) for i in range(10000)]
+            self.assertEqual(resp, conn.replicate_row_batch(
+                'merge_items', ['ROWID', 'name'], rows, 'source_id'))
+        self.assertIn(mock.call('Content-Type',
+                                db_replicator.ROW_BATCH_CONTENT_TYPE),
+                      mock_putheader.call_args_list)
+        # each chunk holds many rows
+        chunks = list(db_replicator.encode_row_batch(
+            'merge_items', ['ROWID', 'name'], rows, 'source_id'))
+        self.assertEqual(['%x\r\n%s\r\n' % (len(chunk), chunk)
+                          for chunk in chunks] + ['0\r\n\r\n'], sent)
+        self.assertLess(len(sent), 10)
+
     def test_rsync_file(self):
         replicator = TestReplicator({})
         with _mock_process(-1):
@@ -572,6 +607,26 @@ class TestDBReplicator(unittest.TestCase):
         replicator = TestReplicator({})
         replicator._usync_db(0, FakeBroker(), fake_http, '12345', '67890')
 
+    def test_usync_row_batch(self):
+        fake_http = ReplHttp()
+        replicator = TestReplicator({})
+        broker = FakeBroker()
+        broker.merge_syncs = mock.MagicMock()
+        self.assertTrue(replicator._usync_db(
+            -1, broker, fake_http, '12345', '67890', row_batch=True))
+        self.assertEqual(
+            [('merge_items', ['ROWID'], [(1,), (2,)], '67890')],
+            fake_http.row_batches)
+        broker.merge_syncs.assert_called_once_with(
+            [{'remote_id': '12345', 'sync_point': 2}], incoming=False)
+
+    def test_usync_row_batch_http_error(self):
+        fake_http = ReplHttp(set_status=500)
+        replicator = TestReplicator({})
+        self.assertFalse(replicator._usync_db(
+            0, FakeBroker(), fake_http, '12345', '67890', row_batch=True))
+        self.assertEqual(1, len(fake_http.row_batches))
+
     def test_usync_http_error_above_300(self):
         fake_http = ReplHttp(set_status=301)
         replicator = TestReplicator({})
@@ -1016,6 +1071,71 @@ class TestDBReplicator(unittest.TestCase):
         rpc.merge_items(fake_broker, args)
         self.assertEqual(fake_broker.args, args)
 
+    def test_merge_items_row_batch(self):
+        rpc = db_replicator.ReplicatorRpc('/', '/', FakeBroker, False)
+        fake_broker = FakeBroker()
+        fake_broker.merge_items = mock.MagicMock()
+        rows = [(i, 'o%d' % i) for i in range(1, 6)]
+        body = StringIO(''.join(db_replicator.encode_row_batch(
+            'merge_items', ['ROWID', 'name'], rows, 'source_id')))
+        args = db_replicator.decode_row_batch(body)
+        self.assertEqual('merge_items', args.pop(0))
+        with mock.patch('swift.common.db_replicator.ROW_BATCH_MERGE_SIZE', 2):
+            rpc.merge_items(fake_broker, args)
+        self.assertEqual([
+            mock.call([{'ROWID': 1, 'name': 'o1'},
+                       {'ROWID': 2, 'name': 'o2'}], 'source_id'),
+            mock.call([{'ROWID': 3, 'name': 'o3'},
+                       {'ROWID': 4, 'name': 'o4'}], 'source_id'),
+            mock.call([{'ROWID': 5, 'name': 'o5'}], 'source_id'),
+        ], fake_broker.merge_items.call_args_list)
+
+    def test_encode_row_batch(self):
+        rows = [(i, 'o%d' % i) for i in range(1, 6)]
+        with mock.patch('swift.common.db_replicator.ROW_BATCH_LINE_ROWS', 2):
+            body = ''.join(db_replicator.encode_row_batch(
+                'merge_items', ['ROWID', 'name'], rows, 'source_id'))
+        lines = body.splitlines()
+        self.assertEqual({'version': 1, 'op': 'merge_items',
+                          'columns': ['ROWID', 'name'],
+                          'args': ['source_id']}, json.loads(lines[0]))
+        self.assertEqual([[[1, 'o1'], [2, 'o2']], [[3, 'o3'], [4, 'o4']],
+                          [[5, 'o5']]], [json.loads(l) for l in lines[1:]])
+
+        # the body is yielded in big chunks, not a line at a time
+        rows = [(i, 'o%d' % i) for i in range(10000)]
+        chunks = list(db_replicator.encode_row_batch(
+            'merge_items', ['ROWID', 'name'], rows, 'source_id'))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(len(chunk),
+                                    db_replicator.ROW_BATCH_CHUNK_SIZE)
+        args = db_replicator.decode_row_batch(StringIO(''.join(chunks)))
+        self.assertEqual([{'ROWID': i, 'name': name} for i, name in rows],
+                         list(args[1]))
+
+    def test_decode_row_batch(self):
+        body = StringIO(''.join(db_replicator.encode_row_batch(
+            'merge_items', ['ROWID'], [], 'source_id')))
+        args = db_replicator.decode_row_batch(body)
+        self.assertEqual('merge_items', args[0])
+        self.assertEqual([], list(args[1]))
+        self.assertEqual(['source_id'], args[2:])
+
+        for header in ('', 'not json\n', '[]\n',
+                       json.dumps({'version': 99, 'op': 'merge_items',
+                                   'columns': [], 'args': []}) + '\n'):
+            self.assertRaises(ValueError, db_replicator.decode_row_batch,
+                              StringIO(header))
+
+    def test_sync_response_advertises_row_batches(self):
+        rpc = db_replicator.ReplicatorRpc('/', '/', FakeBroker, False)
+        response = rpc.sync(FakeBroker(), (
+            0, 'hash', 'id', 1, 1, 0, None))
+        info = json.loads(response.body)
+        self.assertEqual(list(db_replicator.ROW_BATCH_VERSIONS),
+                         info['row_batch_versions'])
+
     def test_merge_syncs(self):
         rpc = db_replicator.ReplicatorRpc('/', '/', FakeBroker, False)
         fake_broker = FakeBroker()
@@ -1325,7 +1445,33 @@ class TestReplToNode(unittest.TestCase):
             self.fake_node, self.broker, '0', self.fake_info), True)
         self.replicator._usync_db.assert_has_calls([
             mock.call(max(rinfo['point'], local_sync), self.broker,
-                      self.http, rinfo['id'], self.fake_info['id'])
+                      self.http, rinfo['id'], self.fake_info['id'],
+                      row_batch=False)
+        ])
+
+    def test_repl_to_node_usync_row_batch(self):
+        rinfo = {"id": 3, "point": -1, "max_row": 10, "hash": "c",
+                 "row_batch_versions": [1, 99]}
+        self.http = ReplHttp(json.dumps(rinfo))
+        local_sync = self.broker.get_sync()
+        self.assertEqual(self.replicator._repl_to_node(
+            self.fake_node, self.broker, '0', self.fake_info), True)
+        self.replicator._usync_db.assert_has_calls([
+            mock.call(max(rinfo['point'], local_sync), self.broker,
+                      self.http, rinfo['id'], self.fake_info['id'],
+                      row_batch=True)
+        ])
+
+        # a remote that only reads some future version gets JSON
+        rinfo['row_batch_versions'] = [99]
+        self.http = ReplHttp(json.dumps(rinfo))
+        self.replicator._usync_db.reset_mock()
+        self.assertEqual(self.replicator._repl_to_node(
+            self.fake_node, self.broker, '0', self.fake_info), True)
+        self.replicator._usync_db.assert_has_calls([
+            mock.call(max(rinfo['point'], local_sync), self.broker,
+                      self.http, rinfo['id'], self.fake_info['id'],
+                      row_batch=False)
         ])
 
     def test_repl_to_node_rsync_success(self):
@@ -1400,7 +1546,8 @@ class TestReplToNode(unittest.TestCase):
                 self.fake_node, self.broker, '0', self.fake_info), True)
             self.replicator._usync_db.assert_has_calls([
                 mock.call(max(rinfo['point'], local_sync), self.broker,
-                          self.http, rinfo['id'], self.fake_info['id'])
+                          self.http, rinfo['id'], self.fake_info['id'],
+                          row_batch=False)
             ])
 
 
@@ -1438,6 +1585,19 @@ def attach_fake_replication_rpc(rpc, replicate_hook=None):
                 replicate_hook(op, *sync_args)
             return resp
 
+        def replicate_row_batch(self, op, columns, rows, *sync_args):
+            print('REPLICATE row batch: %s, %s, %r' % (
+                self.path, op, sync_args))
+            replicate_args = self.path.lstrip('/').split('/')
+            body = StringIO(''.join(db_replicator.encode_row_batch(
+                op, columns, rows, *sync_args)))
+            swob_response = rpc.dispatch(
+                replicate_args, db_replicator.decode_row_batch(body))
+            resp = FakeHTTPResponse(swob_response)
+            if replicate_hook:
+                replicate_hook(op, *sync_args)
+            return resp
+
     return FakeReplConnection
 
 
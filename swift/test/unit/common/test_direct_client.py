@@ -449,6 +449,35 @@ class TestDirectClient(unittest.TestCase):
         self.assertEqual(err.http_status, 500)
         self.assertTrue('DELETE' in str(err))
 
+    def test_direct_post_container(self):
+        headers = {'x-container-sysmeta-key': 'value'}
+        with mocked_http_conn(204) as conn:
+            direct_client.direct_post_container(
+                self.node, self.part, self.account, self.container, headers)
+            self.assertEqual(conn.host, self.node['ip'])
+            self.assertEqual(conn.port, self.node['port'])
+            self.assertEqual(conn.method, 'POST')
+            self.assertEqual(conn.path, self.container_path)
+            self.assertEqual(conn.req_headers['x-container-sysmeta-key'],
+                             'value')
+            self.assertEqual(conn.req_headers['user-agent'], self.user_agent)
+            self.assertTrue('x-timestamp' in conn.req_headers)
+
+    def test_direct_post_container_error(self):
+        with mocked_http_conn(404) as conn:
+            try:
+                direct_client.direct_post_container(
+                    self.node, self.part, self.account, self.container, {})
+            except ClientException as err:
+                pass
+            else:
+                self.fail('ClientException not raised')
+            self.assertEqual(conn.method, 'POST')
+            self.assertEqual(conn.path, self.container_path)
+
+        self.assertEqual(err.http_status, 404)
+        self.assertTrue('POST' in str(err))
+
     def test_direct_put_container_object(self):
         headers = {'x-foo': 'bar'}
 
@@ -514,6 +543,39 @@ class TestDirectClient(unittest.TestCase):
         self.assertEqual(err.http_status, 500)
         self.assertTrue('DELETE' in str(err))
 
+    def test_direct_update_container(self):
+        updates = [{'op': 'DELETE', 'obj': 'o1',
+                    'headers': {'X-Timestamp': '1490000000.00000'}},
+                   {'op': 'DELETE', 'obj': 'o2',
+                    'headers': {'X-Timestamp': '1490000000.00000'}}]
+        body = json.dumps(updates)
+        with mocked_http_conn(202) as conn:
+            rv = direct_client.direct_update_container(
+                self.node, self.part, self.account, self.container,
+                updates)
+            self.assertEqual(conn.host, self.node['ip'])
+            self.assertEqual(conn.port, self.node['port'])
+            self.assertEqual(conn.method, 'UPDATE')
+            self.assertEqual(conn.path, self.container_path)
+            self.assertIn('X-Timestamp', conn.req_headers)
+            self.assertEqual(conn.req_headers['Content-Type'],
+                             'application/json')
+            self.assertEqual(conn.req_headers['Content-Length'],
+                             str(len(body)))
+            self.assertEqual(conn.etag.hexdigest(), md5(body).hexdigest())
+
+        self.assertEqual(rv, None)
+
+    def test_direct_update_container_error(self):
+        with mocked_http_conn(405) as conn:
+            with self.assertRaises(ClientException) as raised:
+                direct_client.direct_update_container(
+                    self.node, self.part, self.account, self.container, [])
+            self.assertEqual(conn.method, 'UPDATE')
+
+        self.assertEqual(raised.exception.http_status, 405)
+        self.assertIn('UPDATE', str(raised.exception))
+
     def test_direct_head_object(self):
         headers = HeaderKeyDict({'x-foo': 'bar'})
 
@@ -29,7 +29,7 @@ from eventlet.pools import Pool
 
 from swift.common import memcached
 from mock import patch, MagicMock
-from test.unit import NullLoggingHandler
+from test.unit import NullLoggingHandler, debug_logger
 
 
 class MockedMemcachePool(memcached.MemcacheConnPool):
@@ -458,6 +458,106 @@ class TestMemcached(unittest.TestCase):
             ('some_key2', 'some_key1', 'not_exists'), 'multi_key'),
             [[4, 5, 6], [1, 2, 3], None])
 
+    def _make_ring_with_mocks(self, servers, mock_class=MockMemcached,
+                              **kwargs):
+        memcache_client = memcached.MemcacheRing(servers, **kwargs)
+        mocks = {}
+        for server in servers:
+            mock = mocks[server] = mock_class()
+            memcache_client._client_cache[server] = MockedMemcachePool(
+                [(mock, mock)] * 2)
+        return memcache_client, mocks
+
+    def test_get_many_set_many(self):
+        servers = ['1.2.3.4:11211', '1.2.3.5:11211', '1.2.3.6:11211']
+        logger = debug_logger()
+        memcache_client, mocks = self._make_ring_with_mocks(
+            servers, logger=logger)
+        mapping = dict(('key%d' % i, [i]) for i in range(30))
+        memcache_client.set_many(mapping, time=20)
+        # keys are spread over the servers just as single sets would be
+        for key in mapping:
+            server = next(memcache_client._iter_servers(
+                md5(key).hexdigest()))
+            self.assertIn(md5(key).hexdigest(), mocks[server].cache)
+            self.assertEqual('20', mocks[server].cache[
+                md5(key).hexdigest()][1])
+            self.assertEqual(memcache_client.get(key), mapping[key])
+        self.assertTrue(all(mock.cache for mock in mocks.values()))
+
+        sent = defaultdict(list)
+        for server, mock in mocks.items():
+            mock.sendall = (lambda orig, server: lambda data: (
+                sent[server].append(data), orig(data)))(mock.sendall, server)
+        keys = sorted(mapping) + ['not_exists']
+        self.assertEqual(memcache_client.get_many(keys),
+                         [mapping[key] for key in keys[:-1]] + [None])
+        # one pipelined get per server
+        self.assertEqual(sorted(servers), sorted(sent))
+        for server in servers:
+            self.assertEqual(1, len(sent[server]))
+            self.assertTrue(sent[server][0].startswith('get '))
+        self.assertEqual([], memcache_client.get_many([]))
+        timings = [args[0] for args, kwargs in
+                   logger.log_dict['timing_since']]
+        for server in servers:
+            metric = memcached.server_metric_name(server)
+            self.assertIn('memcached.%s.set.timing' % metric, timings)
+            self.assertIn('memcached.%s.get.timing' % metric, timings)
+
+    def test_set_many_noreply(self):
+        servers = ['1.2.3.4:11211', '1.2.3.5:11211']
+        memcache_client, mocks = self._make_ring_with_mocks(servers)
+        mapping = dict(('key%d' % i, [i]) for i in range(10))
+        memcache_client.set_many(mapping, noreply=True)
+        for mock in mocks.values():
+            self.assertTrue(mock.cache)
+            self.assertEqual('', mock.outbuf)
+        self.assertEqual(memcache_client.get_many(sorted(mapping)),
+                         [mapping[key] for key in sorted(mapping)])
+
+    def test_get_many_retry(self):
+        logging.getLogger().addHandler(NullLoggingHandler())
+        servers = ['1.2.3.4:11211', '1.2.3.5:11211', '1.2.3.6:11211']
+        logger = debug_logger()
+        memcache_client, mocks = self._make_ring_with_mocks(
+            servers, logger=logger)
+        mapping = dict(('key%d' % i, [i]) for i in range(30))
+        memcache_client.set_many(mapping)
+        mocks['1.2.3.5:11211'].down = True
+        expected = []
+        for key in sorted(mapping):
+            if next(memcache_client._iter_servers(
+                    md5(key).hexdigest())) == '1.2.3.5:11211':
+                expected.append(None)
+            else:
+                expected.append(mapping[key])
+        self.assertIn(None, expected)
+        # keys of the down server are retried on their next server
+        self.assertEqual(expected, memcache_client.get_many(sorted(mapping)))
+        self.assertEqual({'memcached.1_2_3_5_11211.errors': 1},
+                         logger.get_increment_counts())
+
+        # and so are sets
+        memcache_client.set_many(mapping)
+        self.assertEqual(memcache_client.get_many(sorted(mapping)),
+                         [mapping[key] for key in sorted(mapping)])
+
+        # nothing is found once every server is down
+        for mock in mocks.values():
+            mock.down = True
+        self.assertEqual([None] * 3,
+                         memcache_client.get_many(['key0', 'key1', 'key2']))
+
+    def test_server_metric_name(self):
+        self.assertEqual('10_0_0_1_11211',
+                         memcached.server_metric_name('10.0.0.1:11211'))
+        self.assertEqual('1_11211',
+                         memcached.server_metric_name('[::1]:11211'))
+        self.assertEqual('memcache-host_example_com',
+                         memcached.server_metric_name(
+                             'memcache-host.example.com'))
+
     def test_serialization(self):
         memcache_client = memcached.MemcacheRing(['1.2.3.4:11211'],
                                                  allow_pickle=True)
@@ -15,6 +15,7 @@
 
 """Tests for swift.common.request_helpers"""
 
+import hashlib
 import unittest
 from swift.common.swob import Request, HTTPException, HeaderKeyDict
 from swift.common.storage_policy import POLICIES, EC_POLICY, REPL_POLICY
@@ -22,10 +23,13 @@ from swift.common.request_helpers import is_sys_meta, is_user_meta, \
     is_sys_or_user_meta, strip_sys_meta_prefix, strip_user_meta_prefix, \
     remove_items, copy_header_subset, get_name_and_placement, \
     http_response_to_document_iters, is_object_transient_sysmeta, \
-    update_etag_is_at_header, resolve_etag_is_at_header
+    update_etag_is_at_header, resolve_etag_is_at_header, SegmentedIterable
+from swift.common.exceptions import ListingIterError
+from swift.common import swob
 
-from test.unit import patch_policies
+from test.unit import patch_policies, debug_logger
 from test.unit.common.test_utils import FakeResponse
+from test.unit.common.middleware.helpers import FakeSwift
 
 
 server_types = ['account', 'container', 'object']
@@ -172,6 +176,57 @@ class TestRequestHelpers(unittest.TestCase):
         self.assertEqual(policy.policy_type, REPL_POLICY)
 
 
+class TestSegmentedIterable(unittest.TestCase):
+    def setUp(self):
+        self.app = self._make_app()
+        self.req = Request.blank('/v1/a/c/manifest')
+
+    def _make_app(self):
+        app = FakeSwift()
+        for name in ('a', 'b', 'c'):
+            app.register(
+                'GET', '/v1/a/c/%s?multipart-manifest=get' % name,
+                swob.HTTPOk, {'Content-Length': '3',
+                              'Etag': hashlib.md5(name * 3).hexdigest()},
+                name * 3)
+        return app
+
+    def _segmented_iter(self, listing, **kwargs):
+        return SegmentedIterable(
+            self.req, self.app, listing, 86400, debug_logger(),
+            'test', 'TEST', **kwargs)
+
+    def test_read_ahead(self):
+        listing = [('/v1/a/c/%s' % name,
+                    hashlib.md5(name * 3).hexdigest(), 3, None, None)
+                   for name in 'abc']
+        for read_ahead, read_ahead_bytes in ((0, 0), (1, 0), (2, 3),
+                                             (5, 100)):
+            self.app = self._make_app()
+            si = self._segmented_iter(
+                iter(listing), read_ahead=read_ahead,
+                read_ahead_bytes=read_ahead_bytes)
+            self.assertEqual('aaabbbccc', ''.join(si))
+            self.assertEqual(3, len(self.app.calls))
+            self.assertEqual({}, self.app.unclosed_requests)
+
+    def test_read_ahead_listing_error(self):
+        def listing():
+            yield ('/v1/a/c/a', None, 3, None, None)
+            yield ('/v1/a/c/b', None, 3, None, None)
+            raise ListingIterError('oops')
+
+        si = self._segmented_iter(listing(), read_ahead=4,
+                                  read_ahead_bytes=100)
+        chunks = []
+        with self.assertRaises(ListingIterError):
+            for chunk in si:
+                chunks.append(chunk)
+        # the segments listed before the error were all sent
+        self.assertEqual('aaabbb', ''.join(chunks))
+        self.assertEqual({}, self.app.unclosed_requests)
+
+
 class TestHTTPResponseToDocumentIters(unittest.TestCase):
     def test_200(self):
         fr = FakeResponse(
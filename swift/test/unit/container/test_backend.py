@@ -29,7 +29,7 @@ import pickle
 import json
 
 from swift.container.backend import ContainerBroker, \
-    update_new_item_from_existing
+    ContainerListingCache, update_new_item_from_existing
 from swift.common.utils import Timestamp, encode_timestamps
 from swift.common.storage_policy import POLICIES
 
@@ -1543,6 +1543,74 @@ class TestContainerBroker(unittest.TestCase):
         self.assertEqual([row[0] for row in listing],
                          ['/'])
 
+    def test_list_objects_iter_listing_cache(self):
+        cache = ContainerListingCache()
+        broker = ContainerBroker(':memory:', account='a', container='c',
+                                 listing_cache=cache)
+        broker.initialize(Timestamp('1').internal, 0)
+        for name in ('/pets/dogs/1', '/pets/fish/a', '/pets/fish_info.txt'):
+            broker.put_object(name, Timestamp(0).internal, 0, 'text/plain',
+                              'd41d8cd98f00b204e9800998ecf8427e')
+
+        listing = broker.list_objects_iter(100, None, None, '/pets/', '/')
+        self.assertEqual([row[0] for row in listing],
+                         ['/pets/dogs/', '/pets/fish/', '/pets/fish_info.txt'])
+        self.assertEqual(1, len(cache))
+        with mock.patch.object(broker, '_list_objects') as mock_list:
+            cached = broker.list_objects_iter(100, None, None, '/pets/', '/')
+        self.assertFalse(mock_list.called)
+        self.assertEqual(listing, cached)
+        # callers get their own copy of the page
+        self.assertIsNot(listing, cached)
+
+        # a different page is not the cached one
+        listing = broker.list_objects_iter(100, '/pets/dogs/', None,
+                                           '/pets/', '/')
+        self.assertEqual([row[0] for row in listing],
+                         ['/pets/fish/', '/pets/fish_info.txt'])
+        self.assertEqual(2, len(cache))
+
+        # a merge drops the cached pages
+        broker.put_object('/pets/cats/1', Timestamp(0).internal, 0,
+                          'text/plain', 'd41d8cd98f00b204e9800998ecf8427e')
+        self.assertEqual(0, len(cache))
+        listing = broker.list_objects_iter(100, None, None, '/pets/', '/')
+        self.assertEqual([row[0] for row in listing],
+                         ['/pets/cats/', '/pets/dogs/', '/pets/fish/',
+                          '/pets/fish_info.txt'])
+
+    @with_tempdir
+    def test_list_objects_iter_listing_cache_other_broker(self, tempdir):
+        db_path = os.path.join(tempdir, 'container.db')
+        cache = ContainerListingCache()
+        broker = ContainerBroker(db_path, account='a', container='c',
+                                 listing_cache=cache)
+        broker.initialize(Timestamp('1').internal, 0)
+        broker.put_object('o1', Timestamp(1).internal, 0, 'text/plain',
+                          'd41d8cd98f00b204e9800998ecf8427e')
+        listing = broker.list_objects_iter(100, None, None, None, None)
+        self.assertEqual(['o1'], [row[0] for row in listing])
+        self.assertEqual(1, len(cache))
+
+        # a broker in another process can't invalidate the cache, but the
+        # cached page no longer matches the DB
+        other_broker = ContainerBroker(db_path, account='a', container='c')
+
+        def merge(name, timestamp, deleted=0):
+            other_broker.merge_items([{
+                'name': name, 'created_at': timestamp, 'size': 0,
+                'content_type': 'text/plain', 'deleted': deleted,
+                'etag': 'd41d8cd98f00b204e9800998ecf8427e',
+                'storage_policy_index': 0}])
+
+        merge('o2', Timestamp(1).internal)
+        self.assertEqual(1, len(cache))
+        listing = broker.list_objects_iter(100, None, None, None, None)
+        self.assertEqual(['o1', 'o2'], [row[0] for row in listing])
+        merge('o1', Timestamp(2).internal, deleted=1)
+        listing = broker.list_objects_iter(100, None, None, None, None)
+        self.assertEqual(['o2'], [row[0] for row in listing])
+
     def test_list_objects_iter_order_and_reverse(self):
         # Test ContainerBroker.list_objects_iter
         broker = ContainerBroker(':memory:', account='a', container='c')
@@ -2092,6 +2160,85 @@ class TestContainerBroker(unittest.TestCase):
         broker.get_info()
 
 
+class TestContainerListingCache(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = ContainerListingCache()
+        self.assertIsNone(cache.get('db', 'key', 'state'))
+        cache.set('db', 'key', 'state', ['page'])
+        self.assertEqual(['page'], cache.get('db', 'key', 'state'))
+        self.assertIsNone(cache.get('db', 'other_key', 'state'))
+        self.assertIsNone(cache.get('other_db', 'key', 'state'))
+        # the DB changed, so the page is dropped
+        self.assertIsNone(cache.get('db', 'key', 'new_state'))
+        self.assertIsNone(cache.get('db', 'key', 'state'))
+        self.assertEqual(0, len(cache))
+
+    def test_lru_eviction(self):
+        cache = ContainerListingCache(max_pages=2)
+        cache.set('db', 1, 'state', ['page1'])
+        cache.set('db', 2, 'state', ['page2'])
+        # page 1 is now more recently used than page 2
+        self.assertEqual(['page1'], cache.get('db', 1, 'state'))
+        cache.set('other_db', 3, 'state', ['page3'])
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('db', 2, 'state'))
+        self.assertEqual(['page1'], cache.get('db', 1, 'state'))
+        self.assertEqual(['page3'], cache.get('other_db', 3, 'state'))
+
+    def test_disabled(self):
+        cache = ContainerListingCache(max_pages=0)
+        cache.set('db', 'key', 'state', ['page'])
+        self.assertIsNone(cache.get('db', 'key', 'state'))
+
+    def test_invalidate(self):
+        cache = ContainerListingCache()
+        cache.set('db', 1, 'state', ['page1'])
+        cache.set('db', 2, 'state', ['page2'])
+        cache.set('other_db', 1, 'state', ['page3'])
+        cache.invalidate('db')
+        self.assertIsNone(cache.get('db', 1, 'state'))
+        self.assertIsNone(cache.get('db', 2, 'state'))
+        self.assertEqual(['page3'], cache.get('other_db', 1, 'state'))
+        cache.invalidate('no_such_db')
+        self.assertEqual(1, len(cache))
+
+    def test_listing_uses_covering_index(self):
+        broker = ContainerBroker(':memory:', account='a', container='c')
+        broker.initialize(Timestamp('1').internal, 0)
+        self.assertTrue(broker.add_listing_index())
+        with broker.get() as conn:
+            plan = ' '.join(row['detail'] for row in conn.execute('''
+                EXPLAIN QUERY PLAN
+                SELECT name, created_at, size, content_type, etag
+                FROM object WHERE name < ? AND name >= ? AND deleted = 0
+                AND storage_policy_index = ? ORDER BY name LIMIT ?
+            ''', ('b', 'a', 0, 100)))
+        self.assertIn('COVERING INDEX ix_object_listing', plan)
+
+    def test_add_listing_index(self):
+        broker = ContainerBroker(':memory:', account='a', container='c')
+        broker.initialize(Timestamp('1').internal, 0)
+        broker.put_object('o', Timestamp('2').internal, 0, 'text/plain',
+                          'etag', storage_policy_index=0)
+
+        def has_listing_index():
+            with broker.get() as conn:
+                return bool(conn.execute('''
+                    SELECT name FROM sqlite_master
+                    WHERE name = 'ix_object_listing' ''').fetchone())
+
+        # new DBs don't get the index
+        self.assertFalse(has_listing_index())
+        self.assertTrue(broker.add_listing_index())
+        self.assertTrue(has_listing_index())
+        self.assertEqual(['o'], [row[0] for row in broker.list_objects_iter(
+            10, '', None, None, None)])
+        # which is only done once
+        self.assertFalse(broker.add_listing_index())
+        self.assertTrue(has_listing_index())
+
+
 class TestCommonContainerBroker(test_db.TestExampleBroker):
 
     broker_class = ContainerBroker
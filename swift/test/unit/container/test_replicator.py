@@ -1019,6 +1019,28 @@ class TestReplicatorSync(test_db_replicator.TestReplicatorSync):
             daemon._post_replicate_hook(broker, info, [])
         self.assertEqual(0, len(calls))
 
+    def test_post_replicate_hook_listing_index(self):
+        ts_iter = make_timestamp_iter()
+        broker = self._get_broker('a', 'c', node_index=0)
+        broker.initialize(next(ts_iter).internal, POLICIES.default.idx)
+        info = broker.get_replication_info()
+        daemon = replicator.ContainerReplicator({}, logger=FakeLogger())
+        daemon.sync_store = mock.MagicMock()
+        self.assertFalse(daemon.listing_index)
+        with mock.patch.object(broker, 'add_listing_index') as mock_add:
+            daemon._post_replicate_hook(broker, info, [])
+        self.assertFalse(mock_add.called)
+
+        daemon = replicator.ContainerReplicator({'listing_index': 'yes'},
+                                                logger=FakeLogger())
+        daemon.sync_store = mock.MagicMock()
+        daemon._post_replicate_hook(broker, info, [])
+        daemon._post_replicate_hook(broker, info, [])
+        # the index is only built once
+        self.assertEqual({'listing_index_added': 1},
+                         daemon.logger.get_increment_counts())
+        self.assertFalse(broker.add_listing_index())
+
     def test_update_sync_store_exception(self):
         class FakeContainerSyncStore(object):
             def update_sync_store(self, broker):
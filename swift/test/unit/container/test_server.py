@@ -335,10 +335,11 @@ class TestContainerController(unittest.TestCase):
         req.content_length = 0
         resp = server_handler.OPTIONS(req)
         self.assertEqual(200, resp.status_int)
-        for verb in 'OPTIONS GET POST PUT DELETE HEAD REPLICATE'.split():
+        for verb in ('OPTIONS GET POST PUT DELETE HEAD REPLICATE '
+                     'UPDATE').split():
             self.assertTrue(
                 verb in resp.headers['Allow'].split(', '))
-        self.assertEqual(len(resp.headers['Allow'].split(', ')), 7)
+        self.assertEqual(len(resp.headers['Allow'].split(', ')), 8)
         self.assertEqual(resp.headers['Server'],
                          (self.controller.server_type + '/' + swift_version))
 
@@ -1585,6 +1586,93 @@ class TestContainerController(unittest.TestCase):
         resp = req.get_response(self.controller)
         self.assertEqual(resp.status_int, 404)
 
+    def test_UPDATE(self):
+        ts = (Timestamp(t).internal for t in
+              itertools.count(int(time.time())))
+        req = Request.blank('/sda1/p/a/c', method='PUT', headers={
+            'X-Timestamp': next(ts)})
+        self.assertEqual(req.get_response(self.controller).status_int, 201)
+        put_ts, other_ts, delete_ts, meta_ts = [next(ts) for _ in range(4)]
+        updates = [
+            {'op': 'PUT', 'obj': 'o1',
+             'headers': {'X-Timestamp': put_ts, 'X-Size': '3',
+                         'X-Content-Type': 'text/plain', 'X-Etag': 'e1',
+                         'X-Meta-Timestamp': meta_ts}},
+            {'op': 'PUT', 'obj': u'o2\u2603',
+             'headers': {'x-timestamp': other_ts, 'x-size': '5',
+                         'x-content-type': 'text/html', 'x-etag': 'e2'}},
+            {'op': 'PUT', 'obj': 'o3',
+             'headers': {'X-Timestamp': put_ts, 'X-Size': '7',
+                         'X-Content-Type': 'text/plain', 'X-Etag': 'e3'}},
+            {'op': 'DELETE', 'obj': 'o3',
+             'headers': {'X-Timestamp': delete_ts}},
+        ]
+        req = Request.blank('/sda1/p/a/c', method='UPDATE', headers={
+            'X-Timestamp': next(ts)}, body=json.dumps(updates))
+        self._update_object_put_headers(req)
+        with mock.patch('swift.container.backend.ContainerBroker.'
+                        'merge_items') as mock_merge:
+            resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 202)
+        # all the rows go to the DB in one merge
+        self.assertEqual(1, mock_merge.call_count)
+        self.assertEqual(4, len(mock_merge.call_args[0][0]))
+
+        req.body = json.dumps(updates)
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 202)
+        req = Request.blank('/sda1/p/a/c?format=json', method='GET')
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 200)
+        listing = json.loads(resp.body)
+        self.assertEqual([u'o1', u'o2\u2603'],
+                         [item['name'] for item in listing])
+        self.assertEqual([3, 5], [item['bytes'] for item in listing])
+        self.assertEqual(['e1', 'e2'], [item['hash'] for item in listing])
+
+    def test_UPDATE_container_not_found(self):
+        updates = [{'op': 'DELETE', 'obj': 'o',
+                    'headers': {'X-Timestamp': Timestamp(1).internal}}]
+        req = Request.blank('/sda1/p/a/c', method='UPDATE', headers={
+            'X-Timestamp': Timestamp(1).internal}, body=json.dumps(updates))
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 404)
+
+    def test_UPDATE_auto_create(self):
+        updates = [{'op': 'PUT', 'obj': 'o',
+                    'headers': {'X-Timestamp': Timestamp(1).internal,
+                                'X-Size': '0', 'X-Etag': 'x',
+                                'X-Content-Type': 'text/plain'}}]
+        req = Request.blank('/sda1/p/.a/c', method='UPDATE', headers={
+            'X-Timestamp': Timestamp(1).internal}, body=json.dumps(updates))
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 202)
+        req = Request.blank('/sda1/p/.a/c', method='GET')
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual('o\n', resp.body)
+
+    def test_UPDATE_bad_batch(self):
+        req = Request.blank('/sda1/p/a/c', method='PUT', headers={
+            'X-Timestamp': Timestamp(1).internal})
+        self.assertEqual(req.get_response(self.controller).status_int, 201)
+        good_headers = {'X-Timestamp': Timestamp(2).internal,
+                        'X-Size': '0', 'X-Etag': 'x',
+                        'X-Content-Type': 'text/plain'}
+        for body in ('not json', json.dumps({'op': 'PUT'}),
+                     json.dumps([{'op': 'POST', 'obj': 'o',
+                                  'headers': good_headers}]),
+                     json.dumps([{'op': 'PUT', 'obj': '',
+                                  'headers': good_headers}]),
+                     json.dumps([{'op': 'PUT', 'obj': 'o',
+                                  'headers': {'X-Timestamp': 'bad'}}]),
+                     json.dumps([{'op': 'PUT', 'obj': 'o',
+                                  'headers': {'X-Size': '0'}}])):
+            req = Request.blank('/sda1/p/a/c', method='UPDATE', headers={
+                'X-Timestamp': Timestamp(3).internal}, body=body)
+            resp = req.get_response(self.controller)
+            self.assertEqual(resp.status_int, 400, body)
+
     def test_object_update_with_offset(self):
         ts = (Timestamp(t).internal for t in
               itertools.count(int(time.time())))
@@ -2192,6 +2280,46 @@ class TestContainerController(unittest.TestCase):
         self.assertEqual(resp.content_type, 'text/plain')
         self.assertEqual(resp.body, plain_body)
 
+    def test_GET_json_listing_cache(self):
+        self.assertIsNone(self.controller.listing_cache)
+        controller = container_server.ContainerController(
+            {'devices': self.testdir, 'mount_check': 'false',
+             'listing_cache_size': '10'})
+        self.assertEqual(10, controller.listing_cache.max_pages)
+        req = Request.blank(
+            '/sda1/p/a/jsonc', environ={'REQUEST_METHOD': 'PUT',
+                                        'HTTP_X_TIMESTAMP': '0'})
+        self.assertEqual(req.get_response(controller).status_int, 201)
+
+        def put_object(name):
+            req = Request.blank(
+                '/sda1/p/a/jsonc/%s' % name, environ={
+                    'REQUEST_METHOD': 'PUT',
+                    'HTTP_X_TIMESTAMP': '1',
+                    'HTTP_X_CONTENT_TYPE': 'text/plain',
+                    'HTTP_X_ETAG': 'x',
+                    'HTTP_X_SIZE': 0})
+            self._update_object_put_headers(req)
+            self.assertEqual(req.get_response(controller).status_int, 201)
+
+        def get_listing():
+            req = Request.blank('/sda1/p/a/jsonc?format=json')
+            resp = req.get_response(controller)
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual(resp.content_length, len(resp.body))
+            return [obj['name'] for obj in json.loads(resp.body)]
+
+        put_object('0')
+        put_object('1')
+        self.assertEqual(['0', '1'], get_listing())
+        self.assertEqual(1, len(controller.listing_cache))
+        with mock.patch('swift.container.backend.ContainerBroker.'
+                        '_list_objects') as mock_list:
+            self.assertEqual(['0', '1'], get_listing())
+        self.assertFalse(mock_list.called)
+        put_object('2')
+        self.assertEqual(['0', '1', '2'], get_listing())
+
     def test_GET_json_last_modified(self):
         # make a container
         req = Request.blank(
@@ -2940,7 +3068,7 @@ class TestContainerController(unittest.TestCase):
 
     def test_list_allowed_methods(self):
         # Test list of allowed_methods
-        obj_methods = ['DELETE', 'PUT', 'HEAD', 'GET', 'POST']
+        obj_methods = ['DELETE', 'PUT', 'HEAD', 'GET', 'POST', 'UPDATE']
         repl_methods = ['REPLICATE']
         for method_name in obj_methods:
             method = getattr(self.controller, method_name)
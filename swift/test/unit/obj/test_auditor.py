@@ -1322,6 +1322,218 @@ class TestAuditor(unittest.TestCase):
                          "orphaned children left {0}, expected 0."
                          .format(outstanding_pids))
 
+    def test_run_parallel_audit_once_auto_concurrency(self):
+        my_auditor = auditor.ObjectAuditor(
+            dict(devices=self.devices, mount_check='false',
+                 zero_byte_files_per_second=0, concurrency='auto'))
+        self.assertEqual(my_auditor.concurrency, 0)
+        mkdirs(os.path.join(self.devices, 'sdc'))
+        mkdirs(os.path.join(self.devices, 'sdd'))
+
+        forked = []
+        outstanding_pids = []
+
+        def fake_fork_child(**kwargs):
+            forked.append(kwargs)
+            pid = 1001 + 2 * len(forked)
+            outstanding_pids.append(pid)
+            return pid
+
+        def fake_os_wait():
+            return outstanding_pids.pop(0), 0
+
+        with mock.patch("swift.obj.auditor.os.wait", fake_os_wait), \
+                mock.patch.object(my_auditor, 'fork_child', fake_fork_child):
+            my_auditor.run_once()
+
+        # one worker per device, all of them started before any finished
+        self.assertEqual(sorted(kw['device_dirs'][0] for kw in forked),
+                         ['sda', 'sdb', 'sdc', 'sdd'])
+        self.assertEqual(outstanding_pids, [])
+        for kw in forked:
+            self.assertNotIn('shared_io_budget', kw)
+
+    def test_run_parallel_audit_once_shared_io_budget(self):
+        my_auditor = auditor.ObjectAuditor(
+            dict(devices=self.devices, mount_check='false',
+                 zero_byte_files_per_second=0, concurrency='auto',
+                 shared_io_budget='true'))
+        forked = []
+        outstanding_pids = []
+
+        def fake_fork_child(**kwargs):
+            forked.append(kwargs)
+            outstanding_pids.append(len(forked))
+            return len(forked)
+
+        def fake_os_wait():
+            return outstanding_pids.pop(0), 0
+
+        with mock.patch("swift.obj.auditor.os.wait", fake_os_wait), \
+                mock.patch.object(my_auditor, 'fork_child', fake_fork_child):
+            my_auditor.run_once()
+
+        self.assertEqual(2, len(forked))
+        shared = forked[0]['shared_io_budget']
+        self.assertIsInstance(shared, auditor.SharedIOBudget)
+        self.assertEqual(2, shared.slots)
+        self.assertIs(shared, forked[1]['shared_io_budget'])
+        self.assertEqual([0, 1], sorted(kw['io_budget_slot']
+                                        for kw in forked))
+
+    def test_run_audit_releases_shared_io_budget(self):
+        my_auditor = auditor.ObjectAuditor(
+            dict(self.conf, shared_io_budget='true'))
+        shared = auditor.SharedIOBudget(2)
+        shared.set_scale(0, 1.0)
+        shared.set_scale(1, 1.0)
+        with mock.patch.object(auditor.AuditorWorker,
+                               'audit_all_objects') as mock_audit:
+            my_auditor.run_audit(mode='once', device_dirs=['sda'],
+                                 shared_io_budget=shared, io_budget_slot=1)
+        self.assertEqual(1, mock_audit.call_count)
+        self.assertEqual(1.0, shared.get_share(0))
+
+    def test_shared_io_budget(self):
+        shared = auditor.SharedIOBudget(3)
+        # workers not yet started leave their share to the others
+        shared.set_scale(0, 1.0)
+        self.assertEqual(1.0, shared.get_share(0))
+        shared.set_scale(1, 1.0)
+        self.assertEqual(0.5, shared.get_share(0))
+        shared.set_scale(2, 1.0)
+        self.assertAlmostEqual(1.0 / 3, shared.get_share(0))
+        # a worker backing off from a slow device keeps no more than its
+        # scale, and the rest goes to the others
+        shared.set_scale(2, 0.1)
+        self.assertEqual(0.1, shared.get_share(2))
+        self.assertAlmostEqual(0.45, shared.get_share(0))
+        self.assertAlmostEqual(0.45, shared.get_share(1))
+        # ... which are never given more than their own scale either
+        shared.set_scale(0, 0.2)
+        shared.set_scale(1, 0.3)
+        self.assertEqual([0.2, 0.3, 0.1],
+                         [shared.get_share(i) for i in range(3)])
+        # and a finished worker hands its share back
+        shared.set_scale(0, 1.0)
+        shared.set_scale(1, 0)
+        self.assertAlmostEqual(0.9, shared.get_share(0))
+
+    def test_shared_io_budget_between_processes(self):
+        shared = auditor.SharedIOBudget(2)
+        shared.set_scale(0, 1.0)
+        pid = os.fork()
+        if not pid:
+            shared.set_scale(1, 1.0)
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(0.5, shared.get_share(0))
+
+    def test_io_budget_share(self):
+        conf = dict(self.conf, files_per_second='20',
+                    bytes_per_second='1000', io_latency_target='0.01')
+        shared = auditor.SharedIOBudget(4)
+        for slot in range(1, 4):
+            shared.set_scale(slot, 1.0)
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices,
+                                               shared_io_budget=shared)
+        budget = auditor_worker.get_io_budget('sda')
+        self.assertIs(budget, auditor_worker.get_io_budget('sda'))
+        self.assertIsNot(budget, auditor_worker.get_io_budget('sdb'))
+        self.assertEqual(budget.files_per_second, 5)
+        self.assertEqual(budget.bytes_per_second, 250)
+
+        # as other workers back off this one gets more of the budget
+        for slot in range(1, 4):
+            shared.set_scale(slot, 0.1)
+        with mock.patch('swift.obj.auditor.ratelimit_sleep'):
+            budget.files_sleep()
+        self.assertAlmostEqual(budget.files_per_second, 14)
+        self.assertAlmostEqual(budget.bytes_per_second, 700)
+
+        # but its own device backing off is still respected
+        for i in range(1000):
+            budget.record_latency(1)
+        with mock.patch('swift.obj.auditor.ratelimit_sleep'):
+            budget.files_sleep()
+        self.assertAlmostEqual(
+            budget.files_per_second, 20 * auditor.MIN_IO_BUDGET_SCALE)
+
+        # the ZBF worker is not sharing its rate with the other workers
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices,
+                                               zero_byte_only_at_fps=50,
+                                               shared_io_budget=shared)
+        self.assertEqual(
+            auditor_worker.get_io_budget('sda').files_per_second, 50)
+
+    def test_io_budget_adapts_to_latency(self):
+        budget = auditor.DeviceIOBudget(100, 1000, latency_target=0.01)
+        budget.record_latency(0.005)
+        self.assertEqual(budget.scale, 1.0)
+        for i in range(5):
+            budget.record_latency(1)
+        self.assertLess(budget.scale, 1.0)
+        self.assertEqual(budget.files_per_second, 100 * budget.scale)
+        self.assertEqual(budget.bytes_per_second, 1000 * budget.scale)
+        for i in range(1000):
+            budget.record_latency(1)
+        self.assertEqual(budget.scale, auditor.MIN_IO_BUDGET_SCALE)
+        for i in range(1000):
+            budget.record_latency(0)
+        self.assertEqual(budget.scale, 1.0)
+
+        # without a target the latency is tracked but the rate never changes
+        budget = auditor.DeviceIOBudget(100, 1000)
+        for i in range(10):
+            budget.record_latency(1)
+        self.assertEqual(budget.latency, 1)
+        self.assertEqual(budget.scale, 1.0)
+
+    def test_audit_reports_device_stats(self):
+        self.conf['log_time'] = 0
+        auditor_worker = auditor.AuditorWorker(self.conf, self.logger,
+                                               self.rcache, self.devices)
+        timestamp = normalize_timestamp(time.time())
+        data = b'0' * 1024
+        with self.disk_file.create() as writer:
+            writer.write(data)
+            writer.put({
+                'ETag': md5(data).hexdigest(),
+                'X-Timestamp': timestamp,
+                'Content-Length': str(len(data)),
+            })
+        with mock.patch('swift.obj.auditor.dump_recon_cache') as mock_dump:
+            auditor_worker.audit_all_objects(device_dirs=['sda'])
+        self.assertEqual(['sda'], list(auditor_worker.device_budgets))
+        stats = mock_dump.call_args_list[0][0][0][
+            'object_auditor_stats_ALL']['sda']['devices']
+        self.assertEqual(['sda'], list(stats))
+        self.assertGreater(stats['sda']['files_per_second'], 0)
+        self.assertGreater(stats['sda']['bytes_per_second'], 0)
+        self.assertEqual(stats['sda']['io_budget_scale'], 1.0)
+        self.assertEqual(stats['sda']['io_budget_share'], 1.0)
+        self.assertIsNotNone(stats['sda']['read_latency'])
+        # the stats are reset each time they are reported
+        self.assertEqual(auditor_worker.device_budgets['sda'].bytes, 0)
+
+    def test_audit_only_clears_status_of_its_devices(self):
+        for device in ('sda', 'sdb'):
+            mkdirs(os.path.join(self.devices, device, 'objects'))
+        auditor_worker = auditor.AuditorWorker(self.conf, self.logger,
+                                               self.rcache, self.devices)
+        sdb_status = os.path.join(self.devices, 'sdb', 'objects',
+                                  'auditor_status_ALL.json')
+        with open(sdb_status, 'w') as f:
+            f.write('{"partitions": ["1"]}')
+        auditor_worker.audit_all_objects(device_dirs=['sda'])
+        self.assertFalse(os.path.exists(os.path.join(
+            self.devices, 'sda', 'objects', 'auditor_status_ALL.json')))
+        # sdb's worker can still resume where it left off
+        self.assertTrue(os.path.exists(sdb_status))
+        auditor_worker.audit_all_objects()
+        self.assertFalse(os.path.exists(sdb_status))
 
 if __name__ == '__main__':
     unittest.main()
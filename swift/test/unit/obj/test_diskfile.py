@@ -28,6 +28,8 @@ import uuid
 import xattr
 import re
 import six
+import socket
+import sqlite3
 from collections import defaultdict
 from random import shuffle, randint
 from shutil import rmtree
@@ -45,7 +47,7 @@ from test.unit import (FakeLogger, mock as unit_mock, temptree,
                        make_timestamp_iter, DEFAULT_TEST_EC_TYPE,
                        requires_o_tmpfile_support, encode_frag_archive_bodies)
 from nose import SkipTest
-from swift.obj import diskfile
+from swift.obj import diskfile, suffix_index
 from swift.common import utils
 from swift.common.utils import hash_path, mkdirs, Timestamp, \
     encode_timestamps, O_TMPFILE
@@ -54,7 +56,8 @@ from swift.common.splice import splice
 from swift.common.exceptions import DiskFileNotExist, DiskFileQuarantined, \
     DiskFileDeviceUnavailable, DiskFileDeleted, DiskFileNotOpen, \
     DiskFileError, ReplicationLockTimeout, DiskFileCollision, \
-    DiskFileExpired, SwiftException, DiskFileNoSpace, DiskFileXattrNotSupported
+    DiskFileExpired, SwiftException, DiskFileNoSpace, \
+    DiskFileXattrNotSupported, ChunkReadError, ChunkReadTimeout
 from swift.common.storage_policy import (
     POLICIES, get_policy_string, StoragePolicy, ECStoragePolicy,
     BaseStoragePolicy, REPL_POLICY, EC_POLICY)
@@ -954,6 +957,17 @@ class DiskFileManagerMixin(BaseDiskFileTestMixin):
         self.assertTrue('splice()' in warnings[-1])
         self.assertFalse(mgr.use_splice)
 
+    def test_splice_put_without_splice_warning(self):
+        logger = FakeLogger()
+        with mock.patch('swift.common.splice.splice._c_splice', None):
+            self.conf['splice'] = 'yes'
+            self.conf['splice_put'] = 'yes'
+            mgr = diskfile.DiskFileManager(self.conf, logger)
+
+        warnings = logger.get_lines_for_level('warning')
+        self.assertIn('splice_put = yes', warnings[-1])
+        self.assertFalse(mgr.use_splice_put)
+
     def test_get_diskfile_from_hash_dev_path_fail(self):
         self.df_mgr.get_dev_path = mock.MagicMock(return_value=None)
         with mock.patch(self._manager_mock('diskfile_cls')), \
@@ -4584,6 +4598,75 @@ class DiskFileMixin(BaseDiskFileTestMixin):
                             mock_trampoline:
                         _run_test()
 
+    def _get_zero_copy_put_diskfile(self):
+        self.conf['splice'] = 'on'
+        self.conf['splice_put'] = 'on'
+        self.df_router = diskfile.DiskFileRouter(self.conf, self.logger)
+        return self._simple_get_diskfile()
+
+    def test_zero_copy_receive(self):
+        if not self._system_can_zero_copy():
+            raise SkipTest("zero-copy support is missing")
+
+        df = self._get_zero_copy_put_diskfile()
+        body = ''.join(chr(i % 256) for i in range(10000))
+        rsock, wsock = socket.socketpair()
+        with closing(rsock), closing(wsock):
+            wsock.sendall(body[4000:])
+            with df.create() as writer:
+                self.assertTrue(writer.can_zero_copy_receive())
+                upload_size, etag = writer.zero_copy_receive(
+                    rsock.fileno(), len(body), body[:4000])
+                self.assertEqual(upload_size, len(body))
+                self.assertEqual(writer.upload_size, len(body))
+                self.assertEqual(etag, md5(body).hexdigest())
+                os.lseek(writer._fd, 0, os.SEEK_SET)
+                self.assertEqual(os.read(writer._fd, len(body) + 1), body)
+
+    def test_zero_copy_receive_empty(self):
+        if not self._system_can_zero_copy():
+            raise SkipTest("zero-copy support is missing")
+
+        df = self._get_zero_copy_put_diskfile()
+        rsock, wsock = socket.socketpair()
+        with closing(rsock), closing(wsock):
+            with df.create() as writer:
+                self.assertEqual(
+                    (0, MD5_OF_EMPTY_STRING),
+                    writer.zero_copy_receive(rsock.fileno(), 0))
+
+    def test_zero_copy_receive_client_disconnect(self):
+        if not self._system_can_zero_copy():
+            raise SkipTest("zero-copy support is missing")
+
+        df = self._get_zero_copy_put_diskfile()
+        rsock, wsock = socket.socketpair()
+        with closing(rsock):
+            wsock.sendall('x' * 100)
+            wsock.close()
+            with df.create() as writer:
+                self.assertRaises(ChunkReadError, writer.zero_copy_receive,
+                                  rsock.fileno(), 1000)
+                self.assertEqual(writer.upload_size, 100)
+
+    def test_zero_copy_receive_timeout(self):
+        if not self._system_can_zero_copy():
+            raise SkipTest("zero-copy support is missing")
+
+        df = self._get_zero_copy_put_diskfile()
+        rsock, wsock = socket.socketpair()
+        rsock.setblocking(0)
+        with closing(rsock), closing(wsock):
+            with df.create() as writer:
+                self.assertRaises(ChunkReadTimeout, writer.zero_copy_receive,
+                                  rsock.fileno(), 1000, timeout=0.01)
+                # an expired deadline gives up before touching the socket
+                with mock.patch('swift.obj.diskfile.splice') as mock_splice:
+                    self.assertRaises(
+                        ChunkReadTimeout, writer.zero_copy_receive,
+                        rsock.fileno(), 1000, deadline=time() - 1)
+                self.assertFalse(mock_splice.called)
+
     def test_create_unlink_cleanup_DiskFileNoSpace(self):
         # Test cleanup when DiskFileNoSpace() is raised.
         df = self.df_mgr.get_diskfile(self.existing_device, '0', 'abc', '123',
@@ -7687,6 +7770,241 @@ class TestSuffixHashes(unittest.TestCase):
             ])
 
 
+@patch_policies(with_ec_default=True)
+class TestIndexedSuffixHashes(unittest.TestCase):
+
+    def setUp(self):
+        self.testdir = tempfile.mkdtemp()
+        self.logger = debug_logger('indexed-suffix-hash-test')
+        self.devices = os.path.join(self.testdir, 'node')
+        self.existing_device = 'sda1'
+        os.makedirs(os.path.join(self.devices, self.existing_device))
+        self.conf = {
+            'swift_dir': self.testdir,
+            'devices': self.devices,
+            'mount_check': False,
+            'suffix_hash_index': 'true',
+        }
+        self.df_router = diskfile.DiskFileRouter(self.conf, self.logger)
+        self._ts_iter = (Timestamp(t) for t in
+                         itertools.count(int(time())))
+
+    def tearDown(self):
+        rmtree(self.testdir, ignore_errors=1)
+
+    def ts(self):
+        return next(self._ts_iter)
+
+    def _put_object(self, df_mgr, policy, obj='o', partition='0'):
+        df = df_mgr.get_diskfile(self.existing_device, partition, 'a', 'c',
+                                 obj, policy=policy, frag_index=2)
+        write_diskfile(df, self.ts(), frag_index=2, commit=True)
+        return os.path.basename(os.path.dirname(df._datadir))
+
+    def _part_path(self, policy, partition='0'):
+        return os.path.join(self.devices, self.existing_device,
+                            diskfile.get_data_dir(policy), partition)
+
+    def test_get_hashes_builds_index(self):
+        for policy in POLICIES:
+            df_mgr = self.df_router[policy]
+            suffix = self._put_object(df_mgr, policy)
+            hashes = df_mgr.get_hashes(self.existing_device, '0', [], policy)
+            self.assertEqual([suffix], list(hashes))
+            part_path = self._part_path(policy)
+            self.assertFalse(os.path.exists(
+                os.path.join(part_path, diskfile.HASH_FILE)))
+            self.assertTrue(os.path.exists(
+                os.path.join(part_path, 'hashes.idx')))
+            self.assertTrue(os.path.exists(os.path.join(
+                self.devices, self.existing_device, 'suffix_hashes.db')))
+
+            # the hashes match those calculated without the index
+            conf = dict(self.conf, suffix_hash_index='false')
+            plain_mgr = diskfile.DiskFileRouter(conf, self.logger)[policy]
+            self.assertEqual(hashes, plain_mgr.get_hashes(
+                self.existing_device, '0', [], policy))
+
+            # ... which is noticed when the index is used again
+            with mock.patch('os.listdir', side_effect=os.listdir) as ls:
+                self.assertEqual(hashes, df_mgr.get_hashes(
+                    self.existing_device, '0', [], policy))
+            self.assertIn(mock.call(part_path), ls.mock_calls)
+            self.assertFalse(os.path.exists(
+                os.path.join(part_path, diskfile.HASH_FILE)))
+
+            # but otherwise there's no listdir and no rehashing
+            with mock.patch('os.listdir') as ls, \
+                    mock.patch.object(df_mgr, '_hash_suffix') as hs:
+                self.assertEqual(hashes, df_mgr.get_hashes(
+                    self.existing_device, '0', [], policy))
+            self.assertFalse(ls.called)
+            self.assertFalse(hs.called)
+
+    def test_invalidate_only_rehashes_dirty_suffix(self):
+        for policy in POLICIES:
+            df_mgr = self.df_router[policy]
+            suffix = self._put_object(df_mgr, policy)
+            hashes = df_mgr.get_hashes(self.existing_device, '0', [], policy)
+            other = self._put_object(df_mgr, policy, obj='o2')
+            if other == suffix:
+                continue
+            self.assertFalse(os.path.exists(os.path.join(
+                self._part_path(policy), diskfile.HASH_INVALIDATIONS_FILE)))
+            hashed, new_hashes = df_mgr._get_hashes(self._part_path(policy))
+            self.assertEqual(1, hashed)
+            self.assertEqual(hashes[suffix], new_hashes[suffix])
+            self.assertIn(other, new_hashes)
+
+            # recalculate forces a rehash
+            hashed, new_hashes = df_mgr._get_hashes(
+                self._part_path(policy), recalculate=[suffix])
+            self.assertEqual(1, hashed)
+            self.assertEqual(hashes[suffix], new_hashes[suffix])
+
+            # and removed suffixes are dropped
+            rmtree(os.path.join(self._part_path(policy), other))
+            hashed, new_hashes = df_mgr._get_hashes(
+                self._part_path(policy), recalculate=[other])
+            self.assertEqual(0, hashed)
+            self.assertEqual({suffix: hashes[suffix]}, new_hashes)
+
+    def test_legacy_invalidations_folded_into_index(self):
+        for policy in POLICIES:
+            df_mgr = self.df_router[policy]
+            suffix = self._put_object(df_mgr, policy)
+            df_mgr.get_hashes(self.existing_device, '0', [], policy)
+            suffix_dir = os.path.join(self._part_path(policy), suffix)
+            diskfile.invalidate_hash(suffix_dir)
+            hashed, hashes = df_mgr._get_hashes(self._part_path(policy))
+            self.assertEqual(1, hashed)
+            with open(os.path.join(self._part_path(policy),
+                                   diskfile.HASH_INVALIDATIONS_FILE)) as f:
+                self.assertEqual('', f.read())
+
+    def test_removed_partition_is_rebuilt(self):
+        for policy in POLICIES:
+            df_mgr = self.df_router[policy]
+            self._put_object(df_mgr, policy)
+            self.assertTrue(df_mgr.get_hashes(
+                self.existing_device, '0', [], policy))
+            rmtree(self._part_path(policy))
+            os.mkdir(self._part_path(policy))
+            self.assertEqual({}, df_mgr.get_hashes(
+                self.existing_device, '0', [], policy))
+
+    def test_invalidation_while_hashing_is_not_lost(self):
+        for policy in POLICIES:
+            df_mgr = self.df_router[policy]
+            suffix = self._put_object(df_mgr, policy)
+            df_mgr.get_hashes(self.existing_device, '0', [], policy)
+            suffix_dir = os.path.join(self._part_path(policy), suffix)
+            df_mgr.invalidate_hash(suffix_dir)
+            orig_hash_suffix = df_mgr._hash_suffix
+            calls = []
+
+            def racing_hash_suffix(path):
+                calls.append(path)
+                if len(calls) == 1:
+                    df_mgr.invalidate_hash(path)
+                return orig_hash_suffix(path)
+
+            with mock.patch.object(df_mgr, '_hash_suffix',
+                                   racing_hash_suffix):
+                hashed, hashes = df_mgr._get_hashes(self._part_path(policy))
+            self.assertEqual([suffix_dir, suffix_dir], calls)
+            self.assertEqual(1, hashed)
+            self.assertIn(suffix, hashes)
+
+    def test_yield_suffixes_uses_index(self):
+        for policy in POLICIES:
+            df_mgr = self.df_router[policy]
+            suffix = self._put_object(df_mgr, policy)
+            # no index yet
+            self.assertEqual([suffix], [s for _p, s in df_mgr.yield_suffixes(
+                self.existing_device, '0', policy)])
+            df_mgr.get_hashes(self.existing_device, '0', [], policy)
+            with mock.patch.object(df_mgr, '_listdir',
+                                   side_effect=df_mgr._listdir) as ls:
+                self.assertEqual(
+                    [suffix], [s for _p, s in df_mgr.yield_suffixes(
+                        self.existing_device, '0', policy)])
+                self.assertEqual(1, len(list(df_mgr.yield_hashes(
+                    self.existing_device, '0', policy))))
+            listed = [c[0][0] for c in ls.call_args_list]
+            self.assertNotIn(self._part_path(policy), listed)
+
+            # a locked index falls back to a listdir
+            with mock.patch.object(df_mgr, '_listdir',
+                                   side_effect=df_mgr._listdir) as ls, \
+                    mock.patch('swift.obj.suffix_index.SuffixHashIndex.get',
+                               side_effect=sqlite3.OperationalError(
+                                   'database is locked')):
+                self.assertEqual(
+                    [suffix], [s for _p, s in df_mgr.yield_suffixes(
+                        self.existing_device, '0', policy)])
+            self.assertIn(mock.call(self._part_path(policy)),
+                          ls.call_args_list)
+
+    def test_locked_index_falls_back_to_hashes_invalid(self):
+        for policy in POLICIES:
+            df_mgr = self.df_router[policy]
+            suffix = self._put_object(df_mgr, policy)
+            hashes = df_mgr.get_hashes(self.existing_device, '0', [], policy)
+            suffix_dir = os.path.join(self._part_path(policy), suffix)
+            invalidations_file = os.path.join(
+                self._part_path(policy), diskfile.HASH_INVALIDATIONS_FILE)
+            locked = sqlite3.OperationalError('database is locked')
+            with mock.patch(
+                    'swift.obj.suffix_index.SuffixHashIndex.invalidate',
+                    side_effect=locked):
+                df_mgr.invalidate_hash(suffix_dir)
+            with open(invalidations_file) as f:
+                self.assertEqual(suffix + '\n', f.read())
+            self.assertIn('database is locked',
+                          self.logger.get_lines_for_level('warning')[-1])
+
+            # which the next read of the index picks up
+            hashed, new_hashes = df_mgr._get_hashes(self._part_path(policy))
+            self.assertEqual(1, hashed)
+            self.assertEqual(hashes, new_hashes)
+            with open(invalidations_file) as f:
+                self.assertEqual('', f.read())
+
+            # reads fall back to hashes.pkl, which makes the next read of
+            # the index rebuild the partition
+            with mock.patch('swift.obj.suffix_index.SuffixHashIndex.get',
+                            side_effect=locked):
+                self.assertEqual(hashes, df_mgr.get_hashes(
+                    self.existing_device, '0', [], policy))
+            self.assertTrue(os.path.exists(
+                os.path.join(self._part_path(policy), diskfile.HASH_FILE)))
+            self.assertEqual(hashes, df_mgr.get_hashes(
+                self.existing_device, '0', [], policy))
+            self.assertFalse(os.path.exists(
+                os.path.join(self._part_path(policy), diskfile.HASH_FILE)))
+
+    def test_forget_partition(self):
+        for policy in POLICIES:
+            df_mgr = self.df_router[policy]
+            self._put_object(df_mgr, policy)
+            df_mgr.get_hashes(self.existing_device, '0', [], policy)
+            part_path = self._part_path(policy)
+            index, datadir, partition = df_mgr._get_suffix_index(part_path)
+            token = suffix_index.read_index_token(part_path)
+            self.assertTrue(index.get(datadir, partition, token))
+            rmtree(part_path)
+            df_mgr.forget_partition(part_path)
+            self.assertIsNone(index.get(datadir, partition, token))
+
+        # nothing to do without the index
+        conf = dict(self.conf, suffix_hash_index='false')
+        plain_mgr = diskfile.DiskFileRouter(conf, self.logger)[POLICIES[0]]
+        with mock.patch.object(plain_mgr, '_get_suffix_index') as mock_index:
+            plain_mgr.forget_partition(self._part_path(POLICIES[0]))
+        self.assertFalse(mock_index.called)
+
+
 class TestHashesHelpers(unittest.TestCase):
 
     def setUp(self):
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import os
 from time import time
 from unittest import main, TestCase
 from test.unit import FakeRing, mocked_http_conn, debug_logger
@@ -25,6 +27,7 @@ import six
 from six.moves import urllib
 
 from swift.common import internal_client, utils, swob
+from swift.common.exceptions import ClientException
 from swift.obj import expirer
 
 
@@ -40,6 +43,45 @@ def not_sleep(seconds):
     last_not_sleep = seconds
 
 
+class FakeLeasingInternalClient(object):
+    """
+    Just enough of an InternalClient for a task lease mode pass: containers
+    maps task container names to lists of queue entry names, and
+    metadata holds each task container's expirer sysmeta.
+    """
+
+    container_ring = FakeRing()
+
+    def __init__(self, containers, metadata=None):
+        self.containers = containers
+        self.metadata = metadata or {}
+        self.deleted_containers = []
+
+    def get_account_info(self, *a, **kw):
+        return len(self.containers), \
+            sum(len(objs) for objs in self.containers.values())
+
+    def iter_containers(self, account):
+        return [{'name': six.text_type(c)} for c in sorted(self.containers)]
+
+    def iter_objects(self, account, container, marker=''):
+        return [{'name': six.text_type(o)}
+                for o in sorted(self.containers[container]) if o > marker]
+
+    def get_container_metadata(self, account, container, metadata_prefix=''):
+        assert metadata_prefix == expirer.TASK_SYSMETA_PREFIX
+        return dict((k, v) for k, v in
+                    self.metadata.get(container, {}).items() if v)
+
+    def set_container_metadata(self, account, container, metadata,
+                               metadata_prefix=''):
+        assert metadata_prefix == expirer.TASK_SYSMETA_PREFIX
+        self.metadata.setdefault(container, {}).update(metadata)
+
+    def delete_container(self, account, container, acceptable_statuses):
+        self.deleted_containers.append(container)
+
+
 class TestObjectExpirer(TestCase):
     maxDiff = None
     internal_client = None
@@ -812,5 +854,236 @@ class TestObjectExpirer(TestCase):
             self.assertEqual(obj, 'o')
 
 
+class TestObjectExpirerTaskLeases(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(internal_client, 'loadapp',
+                                    lambda *a, **kw: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rcache = mkdtemp()
+        self.conf = {'recon_cache_path': self.rcache,
+                     'task_container_leases': 'true',
+                     'pop_queue_batch_size': '2'}
+        self.logger = debug_logger('test-expirer')
+        self.now = int(time())
+        self.container = str(self.now - 86400)
+        self.entries = ['%d-a/c/o%d' % (self.now - 100 + i, i)
+                        for i in range(5)]
+
+    def tearDown(self):
+        rmtree(self.rcache)
+
+    def _make_expirer(self, containers, metadata=None, conf=None):
+        swift = FakeLeasingInternalClient(containers, metadata)
+        x = expirer.ObjectExpirer(conf or self.conf, logger=self.logger,
+                                  swift=swift)
+        x.deleted = []
+        x.popped = []
+
+        def delete_actual_object(actual_obj, timestamp):
+            x.deleted.append(actual_obj)
+
+        def pop_queue_entries(container, objs):
+            x.popped.append(objs)
+            for obj in objs:
+                swift.containers[container].remove(obj)
+
+        x.delete_actual_object = delete_actual_object
+        x.pop_queue_entries = pop_queue_entries
+        return x
+
+    def test_init(self):
+        x = expirer.ObjectExpirer({})
+        self.assertFalse(x.task_container_leases)
+        self.assertEqual(300, x.task_lease_time)
+        self.assertEqual(100, x.pop_queue_batch_size)
+        self.assertNotEqual(x.lease_owner,
+                            expirer.ObjectExpirer({}).lease_owner)
+        self.assertRaises(ValueError, expirer.ObjectExpirer,
+                          {'pop_queue_batch_size': '0'})
+
+    def test_parse_task_lease(self):
+        value = expirer.format_task_lease('host-123-abc', 1490000000.5)
+        self.assertEqual(('host-123-abc', 1490000000.5),
+                         expirer.parse_task_lease(value))
+        for value in (None, '', 'junk', 'junk owner'):
+            self.assertEqual((None, 0), expirer.parse_task_lease(value))
+
+    def test_lease_cursor(self):
+        lease = expirer.TaskContainerLease('c', 0)
+        entries = [lease.start(name) for name in 'abc']
+        lease.finish(entries[1])
+        self.assertEqual('', lease.cursor)
+        lease.finish(entries[0])
+        self.assertEqual('b', lease.cursor)
+        lease.finish(entries[2])
+        self.assertEqual('c', lease.cursor)
+        self.assertFalse(lease.in_flight)
+
+    def test_leased_pass(self):
+        x = self._make_expirer({self.container: list(self.entries)})
+        x.run_once()
+        self.assertEqual(['a/c/o%d' % i for i in range(5)], x.deleted)
+        self.assertEqual([2, 2, 1], [len(objs) for objs in x.popped])
+        self.assertEqual(self.entries, sum(x.popped, []))
+        self.assertEqual(5, x.report_objects)
+        self.assertEqual(
+            5, sum(args[1] for args, _kw in
+                   self.logger.log_dict['update_stats']))
+        # lease released, cursor reset and task container deleted
+        self.assertEqual({'lease': '', 'cursor': ''},
+                         x.swift.metadata[self.container])
+        self.assertEqual([self.container], x.swift.deleted_containers)
+        with open(os.path.join(self.rcache, 'object.recon')) as f:
+            recon = json.load(f)
+        self.assertEqual(5, recon['expired_last_pass'])
+        self.assertGreaterEqual(recon['object_expiration_backlog_age'], 100)
+        self.assertLess(recon['object_expiration_backlog_age'], 200)
+
+    def test_leased_pass_ignores_processes(self):
+        x = self._make_expirer({self.container: list(self.entries)})
+        x.run_once(processes=3, process=1)
+        self.assertEqual(5, len(x.deleted))
+
+    def test_container_leased_by_another_expirer(self):
+        lease = expirer.format_task_lease('other', time() + 100)
+        metadata = {self.container: {'lease': lease}}
+        x = self._make_expirer({self.container: list(self.entries)},
+                               metadata)
+        x.run_once()
+        self.assertEqual([], x.deleted)
+        self.assertEqual({'task_lease_conflicts': 1},
+                         self.logger.get_increment_counts())
+        self.assertEqual(lease, x.swift.metadata[self.container]['lease'])
+
+        # an expired lease is taken over
+        lease = expirer.format_task_lease('other', time() - 1)
+        metadata = {self.container: {'lease': lease}}
+        x = self._make_expirer({self.container: list(self.entries)},
+                               metadata)
+        x.run_once()
+        self.assertEqual(5, len(x.deleted))
+
+    def test_lost_race_for_lease(self):
+        x = self._make_expirer({self.container: list(self.entries)})
+        orig_set = x.swift.set_container_metadata
+
+        def racing_set(account, container, metadata, metadata_prefix=''):
+            orig_set(account, container, metadata, metadata_prefix)
+            orig_set(account, container, {
+                'lease': expirer.format_task_lease('other', time() + 100)},
+                metadata_prefix)
+
+        x.swift.set_container_metadata = racing_set
+        x.run_once()
+        self.assertEqual([], x.deleted)
+        self.assertEqual({'task_lease_conflicts': 1},
+                         self.logger.get_increment_counts())
+
+    def test_resumes_from_cursor(self):
+        metadata = {self.container: {
+            'cursor': urllib.parse.quote(self.entries[2])}}
+        x = self._make_expirer({self.container: list(self.entries)},
+                               metadata)
+        x.run_once()
+        self.assertEqual(['a/c/o3', 'a/c/o4'], x.deleted)
+        # the listing was worked through to the end, so next time it will
+        # start from the top
+        self.assertEqual('', x.swift.metadata[self.container]['cursor'])
+
+    def test_stops_at_future_entries(self):
+        entries = self.entries[:3] + ['%d-a/c/later' % (self.now + 1000)]
+        x = self._make_expirer({self.container: entries})
+        x.run_once()
+        self.assertEqual(['a/c/o0', 'a/c/o1', 'a/c/o2'], x.deleted)
+        self.assertEqual(
+            {'lease': '', 'cursor': urllib.parse.quote(self.entries[2])},
+            x.swift.metadata[self.container])
+        self.assertEqual([], x.swift.deleted_containers)
+
+    def test_failed_delete_keeps_entry(self):
+        x = self._make_expirer({self.container: list(self.entries)})
+
+        def delete_actual_object(actual_obj, timestamp):
+            if actual_obj == 'a/c/o1':
+                raise Exception('failed to delete actual object')
+            x.deleted.append(actual_obj)
+
+        x.delete_actual_object = delete_actual_object
+        x.run_once()
+        self.assertEqual(4, len(x.deleted))
+        self.assertEqual([self.entries[1]],
+                         x.swift.containers[self.container])
+        self.assertEqual(1, self.logger.get_increment_counts()['errors'])
+        self.assertEqual(4, x.report_objects)
+        self.assertEqual('', x.swift.metadata[self.container]['cursor'])
+
+    def test_lease_renewed_and_lost(self):
+        conf = dict(self.conf, task_lease_time='0', pop_queue_batch_size='1')
+        x = self._make_expirer({self.container: list(self.entries)},
+                               conf=conf)
+        orig_get = x.swift.get_container_metadata
+        calls = []
+
+        def get_container_metadata(account, container, metadata_prefix=''):
+            calls.append(container)
+            metadata = orig_get(account, container, metadata_prefix)
+            if len(calls) == 5:
+                # another expirer takes the lease over
+                metadata['lease'] = expirer.format_task_lease(
+                    'other', time() + 100)
+            return metadata
+
+        x.swift.get_container_metadata = get_container_metadata
+        x.run_once()
+        # claimed with 2 HEADs, then a HEAD to renew the lease before each
+        # entry until the lease is found lost
+        self.assertEqual(['a/c/o0', 'a/c/o1'], x.deleted)
+        self.assertEqual(5, len(calls))
+        self.assertEqual({'task_leases_lost': 1},
+                         self.logger.get_increment_counts())
+        # a lost lease is left alone rather than released
+        owner, _junk = expirer.parse_task_lease(
+            x.swift.metadata[self.container]['lease'])
+        self.assertEqual(x.lease_owner, owner)
+        self.assertEqual([], x.swift.deleted_containers)
+
+    def test_pop_queue_entries(self):
+        x = expirer.ObjectExpirer(
+            self.conf, logger=self.logger,
+            swift=FakeLeasingInternalClient({}))
+        updates = []
+        deletes = []
+
+        def fake_update(node, part, account, container, updates_out,
+                        headers=None):
+            updates.append((node['device'], account, container,
+                            [u['obj'] for u in updates_out],
+                            set(u['op'] for u in updates_out)))
+            if node['device'] == 'sda':
+                raise ClientException('no UPDATE', http_status=405)
+            if node['device'] == 'sdb':
+                raise ClientException('failed', http_status=507)
+
+        def fake_delete(node, part, account, container, obj, headers=None):
+            deletes.append((node['device'], account, container, obj))
+
+        with mock.patch('swift.obj.expirer.direct_update_container',
+                        fake_update), \
+                mock.patch('swift.obj.expirer.direct_delete_container_object',
+                           fake_delete):
+            x.pop_queue_entries('c', ['o1', 'o2'])
+        self.assertEqual(sorted(updates), [
+            ('sda', '.expiring_objects', 'c', ['o1', 'o2'], {'DELETE'}),
+            ('sdb', '.expiring_objects', 'c', ['o1', 'o2'], {'DELETE'}),
+            ('sdc', '.expiring_objects', 'c', ['o1', 'o2'], {'DELETE'})])
+        # sda didn't know UPDATE, so was sent a DELETE for each entry
+        self.assertEqual(sorted(deletes), [
+            ('sda', '.expiring_objects', 'c', 'o1'),
+            ('sda', '.expiring_objects', 'c', 'o2')])
+        self.assertEqual(1, len(self.logger.get_lines_for_level('error')))
+
+
 if __name__ == '__main__':
     main()
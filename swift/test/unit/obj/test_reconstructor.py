@@ -1769,6 +1769,35 @@ class TestObjectReconstructor(unittest.TestCase):
         self.assertEqual(job['policy'], self.policy)
         self.assertEqual(job['local_dev'], self.local_dev)
         self.assertEqual(job['device'], self.local_dev['device'])
+        self.assertNotIn('sync_diskfile_batch_builder', job)
+
+    def test_build_jobs_primary_batched(self):
+        self._configure_reconstructor(reconstruct_batch_size='16')
+        ring = self.policy.object_ring = self.fabricated_ring
+        for partition in range(2 ** ring.part_power):
+            part_nodes = ring.get_part_nodes(partition)
+            if self.local_dev['id'] in [n['id'] for n in part_nodes]:
+                break
+        else:
+            self.fail("the ring doesn't work: %r" % ring._replica2part2dev_id)
+        part_path = os.path.join(self.devices, self.local_dev['device'],
+                                 diskfile.get_data_dir(self.policy),
+                                 str(partition))
+        part_info = {
+            'local_dev': self.local_dev,
+            'policy': self.policy,
+            'partition': partition,
+            'part_path': part_path,
+        }
+        with mock.patch('swift.obj.diskfile.ECDiskFileManager._get_hashes',
+                        return_value=(None, {})):
+            jobs = self.reconstructor.build_reconstruction_jobs(part_info)
+        self.assertEqual(1, len(jobs))
+        job = jobs[0]
+        self.assertEqual(job['job_type'], object_reconstructor.SYNC)
+        self.assertEqual(job['sync_diskfile_batch_builder'],
+                         self.reconstructor.reconstruct_fa_batch)
+        self.assertEqual(job['sync_diskfile_batch_size'], 16)
 
     def test_build_jobs_handoff(self):
         ring = self.policy.object_ring = self.fabricated_ring
@@ -2693,6 +2722,74 @@ class TestObjectReconstructor(unittest.TestCase):
         self.assertFalse(self.logger.get_lines_for_level('error'))
         self.assertFalse(self.logger.get_lines_for_level('warning'))
 
+    def test_reconstruct_fa_batch(self):
+        job = {
+            'partition': 0,
+            'policy': self.policy,
+        }
+        part_nodes = self.policy.object_ring.get_part_nodes(0)
+        node = part_nodes[1]
+
+        test_data = ('rebuild' * self.policy.ec_segment_size)[:-777]
+        etag = md5(test_data).hexdigest()
+        ec_archive_bodies = make_ec_archive_bodies(self.policy, test_data)
+        broken_body = ec_archive_bodies.pop(1)
+
+        responses = list()
+        for body in ec_archive_bodies:
+            headers = get_header_frag_index(self, body)
+            headers.update({'X-Object-Sysmeta-Ec-Etag': etag})
+            responses.append((200, body, headers))
+
+        small = {
+            'name': '/a/c/small',
+            'Content-Length': str(len(broken_body)),
+            'ETag': 'etag',
+            'X-Timestamp': '1234567890.12345'
+        }
+        large = dict(small, name='/a/c/large')
+        large['Content-Length'] = str(
+            self.reconstructor.reconstruct_batch_max_size + 1)
+
+        codes, body_iter, headers = zip(*responses)
+        with mocked_http_conn(
+                *codes, body_iter=body_iter, headers=headers) as conn:
+            results = self.reconstructor.reconstruct_fa_batch(
+                job, node, [small, large])
+            # the small archive was rebuilt before returning
+            self.assertEqual(len(part_nodes) - 1, len(conn.requests))
+        self.assertEqual(2, len(results))
+        df, not_batched = results
+        self.assertIsNone(not_batched)
+        self.assertEqual(len(broken_body), df.content_length)
+        fixed_body = ''.join(df.reader())
+        self.assertEqual(md5(fixed_body).hexdigest(),
+                         md5(broken_body).hexdigest())
+        self.assertEqual(1, self.reconstructor.rebuilt_object_count)
+        self.assertEqual(len(broken_body),
+                         self.reconstructor.rebuilt_byte_count)
+
+    def test_reconstruct_fa_batch_errors(self):
+        job = {
+            'partition': 0,
+            'policy': self.policy,
+        }
+        part_nodes = self.policy.object_ring.get_part_nodes(0)
+        node = part_nodes[1]
+        metadata = {
+            'name': '/a/c/o',
+            'Content-Length': '1024',
+            'ETag': 'etag',
+            'X-Timestamp': '1234567890.12345'
+        }
+        codes = [404] * (len(part_nodes) - 1)
+        with mocked_http_conn(*codes):
+            results = self.reconstructor.reconstruct_fa_batch(
+                job, node, [metadata])
+        self.assertEqual(1, len(results))
+        self.assertIsInstance(results[0], DiskFileError)
+        self.assertEqual(0, self.reconstructor.rebuilt_object_count)
+
     def test_reconstruct_fa_errors_works(self):
         job = {
             'partition': 0,
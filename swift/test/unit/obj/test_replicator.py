@@ -1716,6 +1716,28 @@ class TestObjectReplicator(unittest.TestCase):
         self.replicator.sync_method.assert_called_once_with(
             'node', 'job', 'suffixes')
 
+    def test_ssync_connections(self):
+        with mock.patch('swift.obj.replicator.ssync_sender') as mock_sender:
+            mock_sender.Sender.return_value.return_value = (True, {})
+            self.assertEqual((True, {}), self.replicator.ssync(
+                'node', 'job', ['abc', 'def']))
+        mock_sender.Sender.assert_called_once_with(
+            self.replicator, 'node', 'job', ['abc', 'def'], None)
+        self.assertFalse(mock_sender.sync_in_parallel.called)
+
+        self.conf['concurrency'] = '2'
+        self.conf['ssync_connections'] = '3'
+        replicator = object_replicator.ObjectReplicator(self.conf)
+        self.assertEqual(6, replicator.sync_pool.size)
+        with mock.patch('swift.obj.replicator.ssync_sender') as mock_sender:
+            mock_sender.sync_in_parallel.return_value = (True, {})
+            self.assertEqual((True, {}), replicator.ssync(
+                'node', 'job', ['abc', 'def'], remote_check_objs=['hash']))
+        mock_sender.sync_in_parallel.assert_called_once_with(
+            replicator, 'node', 'job', ['abc', 'def'], 3, ['hash'],
+            pool=replicator.sync_pool)
+        self.assertFalse(mock_sender.Sender.called)
+
     @mock.patch('swift.obj.replicator.tpool_reraise')
     @mock.patch('swift.obj.replicator.http_connect', autospec=True)
     @mock.patch('swift.obj.replicator._do_listdir')
@@ -37,7 +37,8 @@ from collections import defaultdict
 from contextlib import contextmanager
 from textwrap import dedent
 
-from eventlet import sleep, spawn, wsgi, listen, Timeout, tpool, greenthread
+from eventlet import sleep, spawn, wsgi, listen, Timeout, tpool, greenthread, \
+    GreenPool
 from eventlet.green import httplib
 
 from nose import SkipTest
@@ -1521,6 +1522,33 @@ class TestObjectController(unittest.TestCase):
         resp = req.get_response(self.object_controller)
         self.assertEqual(resp.status_int, 422)
 
+    def test_PUT_zero_copy_needs_splice_put(self):
+        def do_put(obj):
+            req = Request.blank(
+                '/sda1/p/a/c/%s' % obj, environ={'REQUEST_METHOD': 'PUT'},
+                headers={'X-Timestamp': normalize_timestamp(time()),
+                         'Content-Type': 'text/plain'})
+            req.body = 'VERIFY'
+            resp = req.get_response(self.object_controller)
+            self.assertEqual(resp.status_int, 201)
+
+        self.assertFalse(self.object_controller.splice_put)
+        with mock.patch.object(diskfile.BaseDiskFileWriter,
+                               'can_zero_copy_receive') as mock_checker:
+            do_put('o1')
+        self.assertFalse(mock_checker.called)
+
+        # a writer without zero-copy support is written to normally
+        self.object_controller.splice_put = True
+        with mock.patch.object(diskfile.BaseDiskFileWriter,
+                               'can_zero_copy_receive', return_value=False,
+                               create=True) as mock_checker:
+            do_put('o2')
+        self.assertEqual(1, mock_checker.call_count)
+        with mock.patch.object(diskfile.BaseDiskFileWriter,
+                               'can_zero_copy_receive', None):
+            do_put('o3')
+
     def test_PUT_user_metadata(self):
         timestamp = normalize_timestamp(time())
         req = Request.blank(
@@ -5314,6 +5342,113 @@ class TestObjectController(unittest.TestCase):
         self.assertTrue('chost,badhost' in msg)
         self.assertTrue('cdevice' in msg)
 
+    def _batching_controller(self, **conf):
+        conf.setdefault('container_update_batch_window', '0.01')
+        conf.update({'devices': self.testdir, 'mount_check': 'false'})
+        return object_server.ObjectController(conf, logger=debug_logger())
+
+    def _batched_updates(self, controller, objs, policy):
+        pool = GreenPool()
+        for i, obj in enumerate(objs):
+            pool.spawn(controller.container_update_batcher.update,
+                       'PUT', 'a', 'c', obj, 'chost:cport', 'cpartition',
+                       'cdevice', {'x-size': str(i),
+                                   'x-etag': 'etag%d' % i,
+                                   'x-content-type': 'text/plain',
+                                   'x-timestamp': utils.Timestamp(i + 1)
+                                   .internal},
+                       'sda1', policy)
+        pool.waitall()
+
+    def test_container_update_batching_disabled_by_default(self):
+        self.assertIsNone(self.object_controller.container_update_batcher)
+
+    def test_container_update_batching(self):
+        policy = random.choice(list(POLICIES))
+        controller = self._batching_controller()
+        sent = []
+
+        def capture_send(conn, data):
+            sent.append(data)
+
+        with mocked_http_conn(202, give_send=capture_send) as fake_conn:
+            self._batched_updates(controller, ['o1', 'o2', 'o3'], policy)
+        self.assertEqual(1, len(fake_conn.requests))
+        req = fake_conn.requests[0]
+        self.assertEqual('UPDATE', req['method'])
+        self.assertEqual('/cdevice/cpartition/a/c', req['path'])
+        self.assertEqual(str(int(policy)),
+                         req['headers']['X-Backend-Storage-Policy-Index'])
+        self.assertEqual(utils.Timestamp(1).internal,
+                         req['headers']['X-Timestamp'])
+        updates = json.loads(''.join(sent))
+        self.assertEqual(['o1', 'o2', 'o3'], [u['obj'] for u in updates])
+        self.assertEqual(['PUT'] * 3, [u['op'] for u in updates])
+        self.assertEqual('2', HeaderKeyDict(updates[2]['headers'])['x-size'])
+        self.assertEqual({'container_update_batches': 1},
+                         controller.logger.get_increment_counts())
+        self.assertEqual({}, controller.container_update_batcher.batches)
+
+    def test_container_update_batch_max_size(self):
+        policy = random.choice(list(POLICIES))
+        controller = self._batching_controller(
+            container_update_batch_window='10',
+            container_update_batch_size='2')
+        with mocked_http_conn(202, 202) as fake_conn:
+            with Timeout(5):
+                self._batched_updates(controller, ['o1', 'o2', 'o3', 'o4'],
+                                      policy)
+        self.assertEqual(2, len(fake_conn.requests))
+
+    def test_container_update_batch_not_supported(self):
+        policy = random.choice(list(POLICIES))
+        controller = self._batching_controller()
+        with mocked_http_conn(405, 201, 201) as fake_conn:
+            self._batched_updates(controller, ['o1', 'o2'], policy)
+        self.assertEqual(['UPDATE', 'PUT', 'PUT'],
+                         [r['method'] for r in fake_conn.requests])
+        self.assertEqual(['/cdevice/cpartition/a/c',
+                          '/cdevice/cpartition/a/c/o1',
+                          '/cdevice/cpartition/a/c/o2'],
+                         sorted(r['path'] for r in fake_conn.requests))
+
+    def test_container_update_batch_saves_on_failure(self):
+        policy = random.choice(list(POLICIES))
+        controller = self._batching_controller()
+        for status in (500, Exception('boom')):
+            with mocked_http_conn(status), mock.patch.object(
+                    controller, 'save_async_update') as mock_save:
+                self._batched_updates(controller, ['o1', 'o2'], policy)
+            self.assertEqual(
+                ['o1', 'o2'],
+                [call[0][3] for call in mock_save.call_args_list])
+            for call in mock_save.call_args_list:
+                self.assertEqual(('PUT', 'a', 'c'), call[0][:3])
+                self.assertEqual(('sda1', policy), call[0][5:])
+
+    def test_container_update_uses_batcher(self):
+        policy = random.choice(list(POLICIES))
+        controller = self._batching_controller()
+        req = Request.blank(
+            '/sda1/0/a/c/o',
+            environ={'REQUEST_METHOD': 'PUT'},
+            headers={'X-Timestamp': 1,
+                     'X-Container-Host': 'chost1:cport,chost2:cport',
+                     'X-Container-Partition': 'cpartition',
+                     'X-Container-Device': 'cdevice1,cdevice2',
+                     'Content-Type': 'text/plain',
+                     'X-Backend-Storage-Policy-Index': int(policy)}, body='')
+        if policy.policy_type == EC_POLICY:
+            req.headers['X-Object-Sysmeta-Ec-Frag-Index'] = '2'
+        with mocked_http_conn(202, 202) as fake_conn:
+            resp = req.get_response(controller)
+        self.assertEqual(resp.status_int, 201)
+        self.assertEqual(
+            [('chost1', 'UPDATE', '/cdevice1/cpartition/a/c'),
+             ('chost2', 'UPDATE', '/cdevice2/cpartition/a/c')],
+            sorted((r['ip'], r['method'], r['path'])
+                   for r in fake_conn.requests))
+
     def test_delete_at_update_on_put(self):
         # Test how delete_at_update works when issued a delete for old
         # expiration info after a new put with no new expiration info.
@@ -7509,6 +7644,8 @@ class TestObjectServer(unittest.TestCase):
 class TestZeroCopy(unittest.TestCase):
     """Test the object server's zero-copy functionality"""
 
+    extra_conf = {}
+
     def _system_can_zero_copy(self):
         if not splice.available:
             return False
@@ -7531,6 +7668,7 @@ class TestZeroCopy(unittest.TestCase):
                 'mount_check': 'false',
                 'splice': 'yes',
                 'disk_chunk_size': '4096'}
+        conf.update(self.extra_conf)
         self.object_controller = object_server.ObjectController(
             conf, logger=debug_logger())
         self.df_mgr = diskfile.DiskFileManager(
@@ -7641,6 +7779,56 @@ class TestZeroCopy(unittest.TestCase):
         self.assertEqual(contents, '')
 
 
+@patch_policies
+class TestZeroCopyPut(TestZeroCopy):
+    """Run the zero-copy tests with zero-copy PUTs turned on as well"""
+
+    extra_conf = {'splice_put': 'yes'}
+
+    def test_PUT_uses_zero_copy(self):
+        obj_contents = ''.join(chr(i % 256) for i in range(100000))
+        url_path = '/sda1/2100/a/c/o'
+
+        with mock.patch.object(diskfile.BaseDiskFileWriter, 'write') as \
+                mock_write:
+            self.http_conn.request('PUT', url_path, obj_contents,
+                                   {'X-Timestamp': '1402600322.52126',
+                                    'Content-Type': 'application/test',
+                                    'ETag': md5(obj_contents).hexdigest()})
+            response = self.http_conn.getresponse()
+            self.assertEqual(response.status, 201)
+            response.read()
+        self.assertFalse(mock_write.called)
+
+        self.http_conn.request('GET', url_path)
+        response = self.http_conn.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('ETag'),
+                         '"%s"' % md5(obj_contents).hexdigest())
+        self.assertEqual(response.read(), obj_contents)
+
+    def test_PUT_etag_mismatch(self):
+        url_path = '/sda1/2100/a/c/o'
+
+        self.http_conn.request('PUT', url_path, 'obj contents',
+                               {'X-Timestamp': '1402600322.52126',
+                                'Content-Type': 'application/test',
+                                'ETag': md5('other contents').hexdigest()})
+        response = self.http_conn.getresponse()
+        self.assertEqual(response.status, 422)
+        response.read()
+
+        # the connection is still usable afterwards
+        self.http_conn.request('GET', url_path)
+        response = self.http_conn.getresponse()
+        self.assertEqual(response.status, 404)
+        response.read()
+
+    def test_get_zero_copy_input_needs_eventlet_input(self):
+        self.assertIsNone(object_server.get_zero_copy_input(
+            WsgiBytesIO('obj contents'), 12))
+
+
 class TestConfigOptionHandling(unittest.TestCase):
 
     def setUp(self):
@@ -928,6 +928,16 @@ class TestSender(BaseTest):
             '17\r\n:MISSING_CHECK: START\r\n\r\n'
             '33\r\n9d41d8cd98f00b204e9800998ecf0abc 1380144470.00000\r\n\r\n'
             '15\r\n:MISSING_CHECK: END\r\n\r\n')
+        self.assertFalse(self.sender.refused)
+
+        # an error instead of the receiver's MISSING_CHECK means it refused
+        # the request
+        self.sender.connection = FakeConnection()
+        self.sender.response = FakeResponse(
+            chunk_body=":ERROR: 0 '0.01 seconds: /srv/node/dev'\r\n")
+        self.assertRaises(exceptions.ReplicationException,
+                          self.sender.missing_check)
+        self.assertTrue(self.sender.refused)
         self.assertEqual(self.sender.available_map,
                          dict([('9d41d8cd98f00b204e9800998ecf0abc',
                                 {'ts_data': Timestamp(1380144470.00000)})]))
@@ -1015,6 +1025,61 @@ class TestSender(BaseTest):
         self.sender.daemon.node_timeout = 0.01
         self.assertRaises(exceptions.MessageTimeout, self.sender.updates)
 
+    def test_updates_pipelined(self):
+        device = 'dev'
+        part = '9'
+        object_parts = ('a', 'c', 'o')
+        self._make_open_diskfile(device, part, *object_parts,
+                                 body='test body')
+        object_hash = utils.hash_path(*object_parts)
+        self.sender.job = {
+            'device': device,
+            'partition': part,
+            'policy': POLICIES.legacy,
+        }
+        self.sender.node = {}
+        self.sender.send_map = {object_hash: {'data': True}}
+        self.sender.response = FakeResponse(
+            chunk_body=(
+                ':UPDATES: START\r\n'
+                ':UPDATES: END\r\n'))
+        connection = FakeConnection()
+        self.sender.connection = connection
+        self.sender.pipeline_depth = 2
+
+        def send(data):
+            # the sender doesn't wait for each chunk to be sent...
+            self.assertIsNot(connection, self.sender.connection)
+            eventlet.sleep(0.001)
+            connection.sent.append(data)
+
+        connection.send = send
+        self.sender.updates()
+        # ...but everything has been sent, in order, by the time it's done
+        self.assertIs(connection, self.sender.connection)
+        sent = ''.join(connection.sent)
+        self.assertTrue(sent.startswith(
+            '11\r\n:UPDATES: START\r\n\r\n'), sent)
+        self.assertIn('\r\nPUT /a/c/o\r\nContent-Length: 9\r\n', sent)
+        self.assertIn('\r\n\r\n\r\n9\r\ntest body\r\n', sent)
+        self.assertTrue(sent.endswith(
+            'f\r\n:UPDATES: END\r\n\r\n'), sent)
+
+    def test_updates_pipelined_send_error(self):
+        self.sender.send_map = {}
+        connection = FakeConnection()
+        self.sender.connection = connection
+        self.sender.pipeline_depth = 2
+
+        def send(data):
+            raise exceptions.ReplicationException('test send')
+
+        connection.send = send
+        with self.assertRaises(exceptions.ReplicationException) as cm:
+            self.sender.updates()
+        self.assertEqual('test send', str(cm.exception))
+        self.assertIs(connection, self.sender.connection)
+
     def test_updates_empty_send_map(self):
         self.sender.connection = FakeConnection()
         self.sender.send_map = {}
@@ -1180,6 +1245,63 @@ class TestSender(BaseTest):
             '11\r\n:UPDATES: START\r\n\r\n'
             'f\r\n:UPDATES: END\r\n\r\n')
 
+    def test_updates_put_batched(self):
+        ts_iter = make_timestamp_iter()
+        device = 'dev'
+        part = '9'
+        send_map = {}
+        for name in ('o1', 'o2', 'o3'):
+            self._make_open_diskfile(
+                device, part, 'a', 'c', name, timestamp=next(ts_iter))
+            send_map[utils.hash_path('a', 'c', name)] = {'data': True}
+        self.sender.connection = FakeConnection()
+        batches = []
+        built = {'/a/c/o1': 'rebuilt-o1',
+                 '/a/c/o2': exceptions.DiskFileError('unable to rebuild'),
+                 '/a/c/o3': None}
+
+        def batch_builder(job, node, datafile_metadatas):
+            names = [md['name'] for md in datafile_metadatas]
+            batches.append(names)
+            return [built[name] for name in names]
+
+        builder_calls = []
+
+        def builder(job, node, datafile_metadata):
+            builder_calls.append(datafile_metadata['name'])
+            return 'fallback'
+
+        self.sender.job = {
+            'device': device,
+            'partition': part,
+            'policy': POLICIES.legacy,
+            'frag_index': 0,
+            'sync_diskfile_builder': builder,
+            'sync_diskfile_batch_builder': batch_builder,
+            'sync_diskfile_batch_size': 2,
+        }
+        self.sender.node = {}
+        self.sender.send_map = send_map
+        self.sender.send_delete = mock.MagicMock()
+        self.sender.send_put = mock.MagicMock()
+        self.sender.send_post = mock.MagicMock()
+        self.sender.response = FakeResponse(
+            chunk_body=(
+                ':UPDATES: START\r\n'
+                ':UPDATES: END\r\n'))
+        self.sender.updates()
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+        self.assertEqual(['/a/c/o1', '/a/c/o2', '/a/c/o3'],
+                         sorted(sum(batches, [])))
+        # only the object the batch builder declined is built one by one
+        self.assertEqual(['/a/c/o3'], builder_calls)
+        self.assertEqual(self.sender.send_delete.mock_calls, [])
+        self.assertEqual(self.sender.send_post.mock_calls, [])
+        self.assertEqual(
+            [('/a/c/o1', 'rebuilt-o1'), ('/a/c/o3', 'fallback')],
+            sorted(args for args, _kwargs
+                   in self.sender.send_put.call_args_list))
+
     def test_updates_post(self):
         ts_iter = make_timestamp_iter()
         device = 'dev'
@@ -1548,6 +1670,140 @@ class TestSender(BaseTest):
         self.assertTrue(self.sender.connection.closed)
 
 
+class TestSendPipeline(unittest.TestCase):
+
+    def test_send(self):
+        connection = FakeConnection()
+        pipeline = ssync_sender.SendPipeline(connection, 2, 1)
+        for data in ('a', 'b', 'c'):
+            pipeline.send(data)
+        pipeline.flush()
+        self.assertEqual(['a', 'b', 'c'], connection.sent)
+        self.assertTrue(pipeline.writer.dead)
+
+    def test_send_blocks_when_full(self):
+        connection = FakeConnection()
+        connection.send = lambda data: eventlet.sleep(1)
+        pipeline = ssync_sender.SendPipeline(connection, 1, 10)
+        pipeline.send('a')
+        eventlet.sleep(0)  # writer takes 'a'
+        pipeline.send('b')
+        with self.assertRaises(eventlet.Timeout):
+            with eventlet.Timeout(0.01):
+                pipeline.send('c')
+        pipeline.close()
+        self.assertTrue(pipeline.writer.dead)
+
+    def test_send_timeout(self):
+        connection = FakeConnection()
+        connection.send = lambda data: eventlet.sleep(1)
+        pipeline = ssync_sender.SendPipeline(connection, 2, 0.01)
+        pipeline.send('a')
+        pipeline.send('b')
+        with self.assertRaises(exceptions.MessageTimeout) as cm:
+            pipeline.flush()
+        self.assertIn('send', str(cm.exception))
+
+    def test_send_error(self):
+        connection = FakeConnection()
+        sent = []
+
+        def send(data):
+            sent.append(data)
+            raise IOError('boom')
+
+        connection.send = send
+        pipeline = ssync_sender.SendPipeline(connection, 2, 1)
+        pipeline.send('a')
+        eventlet.sleep(0)
+        with self.assertRaises(IOError):
+            pipeline.send('b')
+        with self.assertRaises(IOError):
+            pipeline.flush()
+        # nothing more was sent after the error
+        self.assertEqual(['a'], sent)
+
+
+class TestSyncInParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.daemon = mock.MagicMock()
+        self.suffixes = ['abc', 'def', '123', '456', '789']
+
+    def _sync(self, results, connections=2, **kwargs):
+        calls = []
+
+        class FakeSender(object):
+            def __init__(self, daemon, node, job, suffixes,
+                         remote_check_objs):
+                calls.append(suffixes)
+                self.suffixes = suffixes
+                # bind this sender's result now, as the senders are only
+                # called once they have all been created
+                self.result = results[len(calls) - 1]
+                self.refused = False
+
+            def __call__(self):
+                if self.result == 'refused':
+                    self.refused = True
+                    return False, {}
+                return self.result
+
+        with mock.patch.object(ssync_sender, 'Sender', FakeSender):
+            result = ssync_sender.sync_in_parallel(
+                self.daemon, {}, {}, self.suffixes, connections,
+                **kwargs)
+        return result, calls
+
+    def test_sync_in_parallel(self):
+        result, calls = self._sync([(True, {'h1': 't1'}),
+                                    (True, {'h2': 't2'})])
+        self.assertEqual((True, {'h1': 't1', 'h2': 't2'}), result)
+        self.assertEqual([['abc', '123', '789'], ['def', '456']], calls)
+
+    def test_sync_in_parallel_failure(self):
+        result, calls = self._sync([(True, {'h1': 't1'}), (False, {})])
+        self.assertEqual((False, {}), result)
+        self.assertEqual(2, len(calls))
+
+    def test_sync_in_parallel_more_connections_than_suffixes(self):
+        result, calls = self._sync([(True, {})] * 10, connections=10)
+        self.assertEqual((True, {}), result)
+        self.assertEqual([[suffix] for suffix in self.suffixes], calls)
+
+    def test_sync_in_parallel_one_suffix(self):
+        self.suffixes = ['abc']
+        result, calls = self._sync([(True, {'h1': 't1'})], connections=3)
+        self.assertEqual((True, {'h1': 't1'}), result)
+        self.assertEqual([['abc']], calls)
+
+    def test_sync_in_parallel_refused(self):
+        # the receiver turned down the second request, so its suffixes are
+        # synced again over one request once the first is done
+        result, calls = self._sync([(True, {'h1': 't1'}), 'refused',
+                                    'refused', (True, {'h2': 't2'})],
+                                   connections=3)
+        self.assertEqual((True, {'h1': 't1', 'h2': 't2'}), result)
+        self.assertEqual([['abc', '456'], ['def', '789'], ['123'],
+                          ['def', '789', '123']], calls)
+        warnings = [call[0][0] for call in
+                    self.daemon.logger.warning.call_args_list]
+        self.assertEqual(1, len(warnings))
+        self.assertIn('refused %d of %d concurrent SSYNC requests',
+                      warnings[0])
+
+        result, calls = self._sync([(True, {'h1': 't1'}), 'refused',
+                                    (False, {})])
+        self.assertEqual((False, {}), result)
+        self.assertEqual(3, len(calls))
+
+    def test_sync_in_parallel_shared_pool(self):
+        pool = eventlet.GreenPool(1)
+        result, calls = self._sync([(True, {})] * 2, pool=pool)
+        self.assertEqual((True, {}), result)
+        self.assertEqual(2, len(calls))
+
+
 class TestModuleMethods(unittest.TestCase):
     def test_encode_missing(self):
         object_hash = '9d41d8cd98f00b204e9800998ecf0abc'
@@ -0,0 +1,155 @@
+# Copyright (c) 2010-2017 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from shutil import rmtree
+
+import mock
+
+from swift.obj import suffix_index
+
+
+class TestSuffixHashIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.testdir = tempfile.mkdtemp()
+        self.index = suffix_index.SuffixHashIndex(
+            os.path.join(self.testdir, suffix_index.SUFFIX_INDEX_FILE))
+
+    def tearDown(self):
+        self.index.close()
+        rmtree(self.testdir, ignore_errors=1)
+
+    def test_split_partition_path(self):
+        self.assertEqual(
+            ('/srv/node/sda1/suffix_hashes.db', 'objects-1', '1234'),
+            suffix_index.split_partition_path(
+                '/srv/node/sda1/objects-1/1234'))
+
+    def test_index_token(self):
+        part_path = os.path.join(self.testdir, 'objects', '0')
+        self.assertIsNone(suffix_index.read_index_token(part_path))
+        os.makedirs(part_path)
+        self.assertIsNone(suffix_index.read_index_token(part_path))
+        suffix_index.write_index_token(part_path, 'abc')
+        self.assertEqual('abc', suffix_index.read_index_token(part_path))
+        self.assertEqual([suffix_index.SUFFIX_INDEX_TOKEN_FILE],
+                         os.listdir(part_path))
+
+    def test_get_requires_token(self):
+        self.assertIsNone(self.index.get('objects', '0', None))
+        token = self.index.reset('objects', '0')
+        self.assertIsNone(self.index.get('objects', '0', None))
+        self.assertIsNone(self.index.get('objects', '0', 'other'))
+        self.assertEqual({}, self.index.get('objects', '0', token))
+        # partitions are independent
+        self.assertIsNone(self.index.get('objects', '1', token))
+        self.assertIsNone(self.index.get('objects-1', '0', token))
+
+    def test_update(self):
+        token = self.index.reset('objects', '0')
+        self.index.add_suffixes('objects', '0', ['abc', 'def'])
+        rows = self.index.get('objects', '0', token)
+        self.assertEqual(['abc', 'def'], sorted(rows))
+        self.assertEqual([None, None], [rows[s][0] for s in sorted(rows)])
+        ec_hash = {None: 'd41d8cd98f00b204e9800998ecf8427e', 2: 'fake'}
+        self.assertEqual(set(), self.index.update('objects', '0', [
+            ('abc', rows['abc'][1], ec_hash),
+            ('def', rows['def'][1], None)]))
+        rows = self.index.get('objects', '0', token)
+        self.assertEqual(['abc'], list(rows))
+        self.assertEqual(ec_hash, rows['abc'][0])
+
+        # adding known suffixes leaves them alone
+        self.index.add_suffixes('objects', '0', ['abc'])
+        self.assertEqual(rows, self.index.get('objects', '0', token))
+
+        # reset makes everything dirty again
+        token = self.index.reset('objects', '0')
+        rows = self.index.get('objects', '0', token)
+        self.assertEqual({'abc': (None, rows['abc'][1])}, rows)
+
+    def test_update_after_invalidate(self):
+        token = self.index.reset('objects', '0')
+        self.index.invalidate('objects', '0', ['abc'])
+        rows = self.index.get('objects', '0', token)
+        self.index.invalidate('objects', '0', ['abc'])
+        self.assertEqual({'abc'}, self.index.update('objects', '0', [
+            ('abc', rows['abc'][1], 'fake')]))
+        self.assertEqual(None, self.index.get(
+            'objects', '0', token)['abc'][0])
+
+        # invalidation on get happens before the read
+        rows = self.index.get('objects', '0', token)
+        self.index.update('objects', '0', [('abc', rows['abc'][1], 'fake')])
+        self.assertEqual('fake', self.index.get(
+            'objects', '0', token)['abc'][0])
+        rows = self.index.get('objects', '0', token, invalidate=['abc'])
+        self.assertEqual(None, rows['abc'][0])
+
+    def test_remove(self):
+        token = self.index.reset('objects', '0')
+        self.index.add_suffixes('objects', '0', ['abc'])
+        other_token = self.index.reset('objects', '1')
+        self.index.add_suffixes('objects', '1', ['abc'])
+        self.index.remove('objects', '0')
+        self.assertIsNone(self.index.get('objects', '0', token))
+        self.assertEqual(['abc'], list(
+            self.index.get('objects', '1', other_token)))
+        conn = sqlite3.connect(self.index.db_file)
+        try:
+            self.assertEqual([('1',)], conn.execute(
+                'SELECT DISTINCT partition FROM suffix_hash').fetchall())
+            self.assertEqual([('1',)], conn.execute(
+                'SELECT partition FROM partition_token').fetchall())
+        finally:
+            conn.close()
+
+    def test_connection_is_reused_in_tpool(self):
+        with mock.patch('sqlite3.connect', side_effect=sqlite3.connect) as \
+                mock_connect, mock.patch.object(
+                    suffix_index, 'tpool_reraise',
+                    side_effect=suffix_index.tpool_reraise) as mock_tpool:
+            token = self.index.reset('objects', '0')
+            self.index.invalidate('objects', '0', ['abc'])
+            self.assertEqual(['abc'], list(
+                self.index.get('objects', '0', token)))
+        self.assertEqual([mock.call(self.index.db_file, timeout=1.0,
+                                    check_same_thread=False)],
+                         mock_connect.call_args_list)
+        self.assertEqual(3, mock_tpool.call_count)
+
+    def test_locked_database_times_out(self):
+        self.index.reset('objects', '0')
+        locked = suffix_index.SuffixHashIndex(self.index.db_file,
+                                              timeout=0.01)
+        conn = sqlite3.connect(self.index.db_file)
+        try:
+            conn.execute('BEGIN EXCLUSIVE')
+            with self.assertRaises(sqlite3.OperationalError):
+                locked.invalidate('objects', '0', ['abc'])
+        finally:
+            conn.rollback()
+            conn.close()
+        # the connection survives the timeout
+        locked.invalidate('objects', '0', ['abc'])
+        locked.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
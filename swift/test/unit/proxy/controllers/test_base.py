@@ -13,20 +13,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import errno
 import itertools
 from collections import defaultdict
+import socket
 import unittest
 import mock
 from swift.proxy.controllers.base import headers_to_container_info, \
     headers_to_account_info, headers_to_object_info, get_container_info, \
     get_cache_key, get_account_info, get_info, get_object_info, \
-    Controller, GetOrHeadHandler, bytes_to_skip
+    Controller, GetOrHeadHandler, bytes_to_skip, clear_info_cache, \
+    close_swift_conn, InfoCache
+from swift.proxy.controllers import base
 from swift.common.swob import Request, HTTPException, RESPONSE_REASONS
 from swift.common import exceptions
 from swift.common.utils import split_path
 from swift.common.header_key_dict import HeaderKeyDict
 from swift.common.http import is_success
 from swift.common.storage_policy import StoragePolicy
+from swift.common.wsgi import make_env
 from test.unit import fake_http_connect, FakeRing, FakeMemcache
 from swift.proxy import server as proxy_server
 from swift.common.request_helpers import (
@@ -177,6 +182,7 @@ class TestFuncs(unittest.TestCase):
     def test_get_info_zero_recheck(self):
         mock_cache = mock.Mock()
         mock_cache.get.return_value = None
+        mock_cache.get_many.return_value = [None, None]
         app = FakeApp(ZeroCacheDynamicResponseFactory())
         env = {'swift.cache': mock_cache}
         info_a = get_info(app, env, 'a')
@@ -242,10 +248,10 @@ class TestFuncs(unittest.TestCase):
         # check app calls both account and container
         self.assertEqual(app.responses.stats['account'], 1)
         self.assertEqual(app.responses.stats['container'], 1)
-        # Make sure account info was cached but container was not
+        # Make sure account info was cached but container was not; both
+        # were looked up in memcache in one go
         self.assertEqual(mock_cache.mock_calls, [
-            mock.call.get('container/a/c'),
-            mock.call.get('account/a'),
+            mock.call.get_many(['container/a/c', 'account/a']),
             mock.call.set('account/a', exp_cached_info_a, time=0),
             mock.call.set('container/a/c', exp_cached_info_c, time=0),
         ])
@@ -359,6 +365,164 @@ class TestFuncs(unittest.TestCase):
         self.assertEqual(info['bytes'], 6666)
         self.assertEqual(info['object_count'], 1000)
 
+    def test_info_cache(self):
+        info_cache = InfoCache(max_entries=2, ttl=10)
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=1000.0):
+            info_cache.set('account/a', {'status': 200})
+            info_cache.set('account/b', {'status': 200}, cache_time=2)
+            info_cache.set('account/c', {'status': 200}, cache_time=0)
+            info = info_cache.get('account/a')
+            self.assertEqual({'status': 200}, info)
+            # callers get their own copy
+            info['status'] = 404
+            self.assertEqual({'status': 200}, info_cache.get('account/a'))
+            self.assertIsNone(info_cache.get('account/c'))
+            # account/b is now the least recently used
+            info_cache.set('container/a/c', {'status': 200})
+            self.assertIsNone(info_cache.get('account/b'))
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=1009.0):
+            self.assertEqual({'status': 200}, info_cache.get('account/a'))
+            info_cache.invalidate('account/a')
+            info_cache.invalidate('account/x')
+            self.assertIsNone(info_cache.get('account/a'))
+        with mock.patch('swift.proxy.controllers.base.time.time',
+                        return_value=1010.0):
+            self.assertIsNone(info_cache.get('container/a/c'))
+        self.assertEqual({'hit': 3, 'miss': 4, 'expired': 1,
+                          'eviction': 1, 'invalidation': 1},
+                         info_cache.stats)
+        self.assertFalse(info_cache.entries)
+
+    def test_get_info_process_cache(self):
+        info_cache = InfoCache()
+        mock_cache = mock.Mock()
+        mock_cache.get.return_value = None
+        mock_cache.get_many.return_value = [None, None]
+        app = FakeApp()
+        app.info_cache = info_cache
+        info_c = get_info(app, {'swift.cache': mock_cache}, 'a', 'c')
+        self.assertEqual(info_c['bytes'], 6666)
+        self.assertEqual(app.responses.stats['account'], 1)
+        self.assertEqual(app.responses.stats['container'], 1)
+        self.assertEqual([mock.call(['container/a/c', 'account/a'])],
+                         mock_cache.get_many.mock_calls)
+
+        # a new request is served from the process cache
+        mock_cache.reset_mock()
+        env = {'swift.cache': mock_cache}
+        self.assertEqual(info_c, get_info(app, env, 'a', 'c'))
+        self.assertEqual(info_c, get_container_info(
+            dict(env, PATH_INFO='/v1/a/c'), app))
+        self.assertEqual(app.responses.stats['account'], 1)
+        self.assertEqual(app.responses.stats['container'], 1)
+        self.assertEqual([], mock_cache.mock_calls)
+        self.assertIn('container/a/c', env['swift.infocache'])
+
+        # another app doesn't share the cache
+        other_app = FakeApp()
+        get_info(other_app, {'swift.cache': mock_cache}, 'a', 'c')
+        self.assertEqual(other_app.responses.stats['container'], 1)
+
+        # clearing the info drops it from the process cache too
+        mock_cache.reset_mock()
+        clear_info_cache(app, {'swift.cache': mock_cache}, 'a', 'c')
+        self.assertEqual([mock.call.delete('container/a/c')],
+                         mock_cache.mock_calls)
+        mock_cache.reset_mock()
+        get_info(app, {'swift.cache': mock_cache}, 'a', 'c')
+        self.assertEqual(app.responses.stats['account'], 1)
+        self.assertEqual(app.responses.stats['container'], 2)
+        # the account is still in the process cache, so only the container
+        # is looked up in memcache
+        self.assertEqual([mock.call.get('container/a/c')],
+                         mock_cache.get.mock_calls)
+        self.assertEqual([], mock_cache.get_many.mock_calls)
+        self.assertEqual(1, info_cache.stats['invalidation'])
+
+    def test_get_info_process_cache_from_memcache(self):
+        info_cache = InfoCache()
+        cached = {'status': 200, 'bytes': 3333, 'total_object_count': 10}
+        memcache = FakeCache(**{'account/a': cached})
+        app = FakeApp()
+        app.info_cache = info_cache
+        info_a = get_info(app, {'swift.cache': memcache}, 'a')
+        self.assertEqual(3333, info_a['bytes'])
+        memcache.store.clear()
+        self.assertEqual(info_a, get_info(app, {'swift.cache': memcache}, 'a'))
+        self.assertEqual(0, app.responses.stats['account'])
+        self.assertEqual({'hit': 1, 'miss': 1, 'expired': 0,
+                          'eviction': 0, 'invalidation': 0},
+                         info_cache.stats)
+
+    def test_app_configures_info_cache(self):
+        app = proxy_server.Application(
+            {'info_cache_size': '5', 'info_cache_ttl': '2.5'},
+            FakeMemcache(), account_ring=FakeRing(),
+            container_ring=FakeRing())
+        self.assertIsInstance(app.info_cache, InfoCache)
+        self.assertEqual(5, app.info_cache.max_entries)
+        self.assertEqual(2.5, app.info_cache.ttl)
+        # a second app doesn't replace the first app's cache
+        other_app = proxy_server.Application(
+            {}, FakeMemcache(), account_ring=FakeRing(),
+            container_ring=FakeRing())
+        self.assertIsNone(other_app.info_cache)
+        self.assertIsInstance(app.info_cache, InfoCache)
+
+    def test_get_info_process_cache_through_middleware(self):
+        class FakeMiddleware(object):
+            def __init__(self, app):
+                self.app = app
+
+            def __call__(self, env, start_response):
+                return self.app(env, start_response)
+
+        info_cache = InfoCache()
+        app = FakeApp()
+        app.info_cache = info_cache
+        # middlewares are passed the next app in the pipeline, not the
+        # proxy application
+        middleware = FakeMiddleware(FakeMiddleware(app))
+        memcache = FakeCache()
+        env = {'PATH_INFO': '/v1/a/c', 'swift.cache': memcache}
+        info_c = get_container_info(env, middleware)
+        self.assertEqual(6666, info_c['bytes'])
+        self.assertIs(info_cache, env['swift.info_cache'])
+        self.assertEqual(1, app.responses.stats['container'])
+
+        # a new request through the middleware is served from the process
+        # cache, as are its subrequests
+        memcache.store.clear()
+        env = {'PATH_INFO': '/v1/a/c', 'swift.cache': memcache}
+        self.assertEqual(info_c, get_container_info(env, middleware))
+        sub_env = make_env(env)
+        del sub_env['swift.infocache']
+        self.assertEqual(info_c, get_container_info(sub_env, middleware.app))
+        self.assertEqual(1, app.responses.stats['container'])
+        self.assertEqual(2, info_cache.stats['hit'])
+        self.assertEqual({}, memcache.store)
+
+        # a pipeline without an InfoCache
+        other_app = FakeApp()
+        env = {'PATH_INFO': '/v1/a/c', 'swift.cache': memcache}
+        get_container_info(env, FakeMiddleware(other_app))
+        self.assertIsNone(env['swift.info_cache'])
+        self.assertEqual(1, other_app.responses.stats['container'])
+
+    def test_app_puts_info_cache_in_env(self):
+        app = proxy_server.Application(
+            {'info_cache_size': '5'}, FakeMemcache(),
+            account_ring=FakeRing(), container_ring=FakeRing())
+        req = Request.blank('/info')
+        req.get_response(app)
+        self.assertIs(app.info_cache, req.environ['swift.info_cache'])
+        # the proxy's InfoCache replaces anything a middleware found
+        req = Request.blank('/info', environ={'swift.info_cache': None})
+        req.get_response(app)
+        self.assertIs(app.info_cache, req.environ['swift.info_cache'])
+
     def test_get_container_info_cache(self):
         cache_stub = {
             'status': 404, 'bytes': 3333, 'object_count': 10,
@@ -372,6 +536,23 @@ class TestFuncs(unittest.TestCase):
         self.assertEqual(resp['status'], 404)
         self.assertEqual(resp['versions'], "\xe1\xbd\x8a\x39")
 
+    def test_get_container_info_fetches_account_with_container(self):
+        cached = {'status': 200, 'bytes': 3333, 'total_object_count': 10}
+        mock_cache = mock.Mock()
+        mock_cache.get_many.return_value = [None, cached]
+        app = FakeApp()
+        env = {'PATH_INFO': '/v1/a/c', 'swift.cache': mock_cache}
+        info = get_container_info(env, app)
+        self.assertEqual(3333, get_account_info(env, app)['bytes'])
+        self.assertEqual(200, info['status'])
+        # one memcache round trip for both, and no account HEAD
+        self.assertEqual([mock.call(['container/a/c', 'account/a'])],
+                         mock_cache.get_many.mock_calls)
+        self.assertEqual([], mock_cache.get.mock_calls)
+        self.assertEqual(0, app.responses.stats['account'])
+        self.assertEqual(1, app.responses.stats['container'])
+        self.assertEqual(cached, env['swift.infocache']['account/a'])
+
     def test_get_container_info_env(self):
         cache_key = get_cache_key("account", "cont")
         req = Request.blank(
@@ -967,6 +1148,85 @@ class TestFuncs(unittest.TestCase):
         app_iter.close()
         self.app.logger.warning.assert_not_called()
 
+    def test_head_releases_source(self):
+        req = Request.blank('/v1/a/c/o', method='HEAD')
+        source = mock.Mock(status=200)
+        source.getheaders.return_value = []
+        source.getheader.return_value = None
+        source.release_conn.return_value = True
+        node = {'ip': '1.2.3.4', 'port': 6200, 'device': 'sda'}
+        handler = GetOrHeadHandler(
+            self.app, req, 'Object', None, None, None, {})
+        with mock.patch.object(handler, '_get_source_and_node',
+                               return_value=(source, node)):
+            resp = handler.get_working_response(req)
+        self.assertEqual(200, resp.status_int)
+        source.release_conn.assert_called_once_with()
+        self.assertFalse(source.nuke_from_orbit.called)
+
+    def test_close_swift_conn(self):
+        src = mock.Mock()
+        src.release_conn.return_value = True
+        close_swift_conn(src)
+        self.assertFalse(src.nuke_from_orbit.called)
+        # a response that has not been read in full can't be reused
+        src.release_conn.return_value = False
+        close_swift_conn(src)
+        src.nuke_from_orbit.assert_called_once_with()
+        # nor can one without a connection pool
+        src = mock.Mock(spec=['nuke_from_orbit'])
+        close_swift_conn(src)
+        src.nuke_from_orbit.assert_called_once_with()
+
+    def _keep_alive_app(self):
+        app = proxy_server.Application({'backend_keep_alive': 'yes'},
+                                       FakeMemcache(),
+                                       account_ring=FakeRing(),
+                                       container_ring=FakeRing())
+        return app, app.container_ring.get_part_nodes(0)[0]
+
+    def test_backend_getresponse_retries_stale_connection(self):
+        app, node = self._keep_alive_app()
+        stale = mock.Mock(reused=True)
+        stale.getresponse.side_effect = socket.error(errno.ECONNRESET, 'x')
+        fresh = mock.Mock(reused=False)
+        with mock.patch('swift.proxy.controllers.base.http_connect',
+                        side_effect=[stale, fresh]) as mock_connect, \
+                mock.patch.object(app.connection_pool, 'clear') as mock_clear:
+            conn, resp = base.backend_getresponse(
+                app, node, 0, 'HEAD', '/a/c',
+                headers={'Connection': 'close'})
+        self.assertIs(fresh, conn)
+        self.assertIs(fresh.getresponse.return_value, resp)
+        stale.close.assert_called_once_with()
+        mock_clear.assert_called_once_with(node['ip'], node['port'])
+        self.assertEqual(2, mock_connect.call_count)
+        for call in mock_connect.call_args_list:
+            self.assertIs(app.connection_pool, call[1]['connection_pool'])
+            self.assertEqual('keep-alive', call[1]['headers']['Connection'])
+        # the node did nothing wrong
+        self.assertEqual({}, app._error_limiting)
+
+    def test_backend_getresponse_retries_once(self):
+        app, node = self._keep_alive_app()
+        conns = [mock.Mock(reused=True), mock.Mock(reused=True)]
+        for conn in conns:
+            conn.getresponse.side_effect = socket.error(errno.ECONNRESET, 'x')
+        with mock.patch('swift.proxy.controllers.base.http_connect',
+                        side_effect=conns) as mock_connect:
+            self.assertRaises(socket.error, base.backend_getresponse,
+                              app, node, 0, 'HEAD', '/a/c')
+        self.assertEqual(2, mock_connect.call_count)
+
+        # errors on a new connection are not retried
+        conn = mock.Mock(reused=False)
+        conn.getresponse.side_effect = socket.error(errno.ECONNRESET, 'x')
+        with mock.patch('swift.proxy.controllers.base.http_connect',
+                        return_value=conn) as mock_connect:
+            self.assertRaises(socket.error, base.backend_getresponse,
+                              app, node, 0, 'HEAD', '/a/c')
+        self.assertEqual(1, mock_connect.call_count)
+
     def test_bytes_to_skip(self):
         # if you start at the beginning, skip nothing
         self.assertEqual(bytes_to_skip(1024, 0), 0)
@@ -1400,7 +1400,8 @@ def capture_http_requests(get_response):
         def __iter__(self):
             return iter(self.connections)
 
-        def __call__(self, ip, port, method, path, headers, qs, ssl):
+        def __call__(self, ip, port, method, path, headers, qs, ssl,
+                     connection_pool=None):
             req = {
                 'ip': ip,
                 'port': port,
@@ -523,12 +523,12 @@ class TestController(unittest.TestCase):
     def test_get_container_info_returns_values_as_strings(self):
         app = mock.MagicMock()
         app.memcache = mock.MagicMock()
-        app.memcache.get = mock.MagicMock()
-        app.memcache.get.return_value = {
+        app.memcache.get_many = mock.MagicMock()
+        app.memcache.get_many.return_value = [{
             u'foo': u'\u2603',
             u'meta': {u'bar': u'\u2603'},
             u'sysmeta': {u'baz': u'\u2603'},
-            u'cors': {u'expose_headers': u'\u2603'}}
+            u'cors': {u'expose_headers': u'\u2603'}}, None]
         env = {'PATH_INFO': '/v1/a/c'}
         ci = get_container_info(env, app)
 
@@ -929,6 +929,36 @@ class TestProxyServer(unittest.TestCase):
         do_test('succès')
         do_test(u'success')
 
+    def test_backend_keep_alive_conf(self):
+        app = proxy_server.Application({}, FakeMemcache(),
+                                       account_ring=FakeRing(),
+                                       container_ring=FakeRing())
+        self.assertIsNone(app.connection_pool)
+        app = proxy_server.Application(
+            {'backend_keep_alive': 'yes',
+             'backend_max_idle_connections': '8',
+             'backend_idle_timeout': '5.5'}, FakeMemcache(),
+            account_ring=FakeRing(), container_ring=FakeRing())
+        self.assertEqual(8, app.connection_pool.max_idle)
+        self.assertEqual(5.5, app.connection_pool.idle_timeout)
+
+    def test_node_errors_clear_idle_connections(self):
+        app = proxy_server.Application({'backend_keep_alive': 'yes'},
+                                       FakeMemcache(),
+                                       account_ring=FakeRing(),
+                                       container_ring=FakeRing(),
+                                       logger=debug_logger('test'))
+        node = app.container_ring.get_part_nodes(0)[0]
+        with mock.patch.object(app.connection_pool, 'clear') as mock_clear:
+            app.error_occurred(node, 'test msg')
+            try:
+                raise Exception('kaboom!')
+            except Exception:
+                app.exception_occurred(node, 'test', 'test msg')
+            app.error_limit(node, 'test msg')
+        self.assertEqual([mock.call(node['ip'], node['port'])] * 3,
+                         mock_clear.call_args_list)
+
     def test_error_limit_methods(self):
         logger = debug_logger('test')
         app = proxy_server.Application({}, FakeMemcache(),
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# Copyright (c) 2010-2017 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure what the ix_object_listing covering index (see the container
+replicator's listing_index option) costs and gains.
+
+Two container DBs are filled with the same objects, in random name order
+like real uploads, one with the index and one without. The time taken to
+merge the objects and the size of each DB are reported, followed by the time
+to list a page of objects and a delimiter listing. With --drop-caches (which
+needs root) the OS page cache is dropped before each listing, so the
+listings are read from disk.
+
+Example::
+
+    sudo python tools/container_listing_benchmark.py --objects 1000000 \\
+        --drop-caches
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+from swift.common.utils import Timestamp
+from swift.container.backend import ContainerBroker
+
+
+def drop_caches():
+    subprocess.check_call('sync; echo 3 > /proc/sys/vm/drop_caches',
+                          shell=True)
+
+
+def make_broker(path, names, listing_index):
+    broker = ContainerBroker(path, account='a', container='c')
+    broker.initialize(Timestamp(1).internal, 0)
+    if listing_index:
+        broker.add_listing_index()
+    timestamp = Timestamp(time.time()).internal
+    start = time.time()
+    for i in range(0, len(names), 10000):
+        broker.merge_items([
+            {'name': name, 'created_at': timestamp, 'size': 1,
+             'content_type': 'application/octet-stream',
+             'etag': 'd41d8cd98f00b204e9800998ecf8427e', 'deleted': 0,
+             'storage_policy_index': 0}
+            for name in names[i:i + 10000]])
+    return time.time() - start
+
+
+def time_listing(path, args, cold):
+    if cold:
+        drop_caches()
+    broker = ContainerBroker(path, account='a', container='c')
+    start = time.time()
+    broker.list_objects_iter(*args)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--objects', type=int, default=200000)
+    parser.add_argument('--drop-caches', action='store_true',
+                        help='read the listings from disk (needs root)')
+    args = parser.parse_args()
+
+    names = ['dir%04d/obj%08d' % (random.randint(0, 999), i)
+             for i in range(args.objects)]
+    listings = [('page', (10000, 'dir0500/', None, None, None)),
+                ('delimiter', (10000, '', None, '', '/'))]
+    tempdir = tempfile.mkdtemp()
+    try:
+        for listing_index in (False, True):
+            path = os.path.join(tempdir, '%s.db' % listing_index)
+            merge_time = make_broker(path, names, listing_index)
+            results = ['%s listing %.3fs' % (
+                name, time_listing(path, listing_args, args.drop_caches))
+                for name, listing_args in listings]
+            print('listing_index=%-5s merge %.2fs, db %.1fMB, %s' % (
+                listing_index, merge_time, os.path.getsize(path) / 1e6,
+                ', '.join(results)))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
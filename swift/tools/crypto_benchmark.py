@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# Copyright (c) 2010-2017 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare object PUT/GET throughput with encryption on and off.
+
+Objects are PUT to and then GET from an in-memory backend app, once
+straight to the backend and once through the keymaster and encryption
+middlewares, so only the cost of the middlewares is measured. The backend
+returns GET bodies in chunks of --backend-chunk-size bytes; making those small
+shows the effect of --decrypt-buffer-size.
+
+Example::
+
+    python tools/crypto_benchmark.py --object-size 1048576 --objects 200 \\
+        --backend-chunk-size 4096 --decrypt-buffer-size 65536
+"""
+
+from __future__ import print_function
+
+import argparse
+import base64
+import os
+import time
+
+from swift.common.middleware import crypto
+from swift.common.middleware.crypto import keymaster
+from swift.common.swob import Request, HTTPCreated, HTTPOk, HTTPNotFound, \
+    HTTPMethodNotAllowed
+
+
+class MemoryBackend(object):
+    """
+    A WSGI app that keeps objects in memory and, like the proxy, calls back
+    for footers once it has read a PUT body.
+    """
+
+    def __init__(self, read_size, chunk_size):
+        self.read_size = read_size
+        self.chunk_size = chunk_size
+        self.objects = {}
+
+    def __call__(self, env, start_response):
+        req = Request(env)
+        if req.method == 'PUT':
+            body = ''.join(iter(
+                lambda: env['wsgi.input'].read(self.read_size), ''))
+            headers = dict(req.headers)
+            if 'swift.callback.update_footers' in env:
+                footers = {}
+                env['swift.callback.update_footers'](footers)
+                headers.update(footers)
+            headers['Content-Length'] = str(len(body))
+            self.objects[req.path] = (headers, body)
+            return HTTPCreated()(env, start_response)
+        if req.method == 'GET':
+            if req.path not in self.objects:
+                return HTTPNotFound()(env, start_response)
+            headers, body = self.objects[req.path]
+            chunks = [body[i:i + self.chunk_size]
+                      for i in range(0, len(body), self.chunk_size)]
+            return HTTPOk(headers=headers, app_iter=chunks)(
+                env, start_response)
+        return HTTPMethodNotAllowed()(env, start_response)
+
+
+def build_app(args, encrypted):
+    app = MemoryBackend(args.client_chunk_size, args.backend_chunk_size)
+    if encrypted:
+        conf = {
+            'encryption_root_secret': base64.b64encode(os.urandom(32)),
+            'key_cache_size': str(args.key_cache_size),
+            'decrypt_buffer_size': str(args.decrypt_buffer_size),
+        }
+        app = crypto.filter_factory(conf)(app)
+        app = keymaster.filter_factory(conf)(app)
+    return app
+
+
+def run_one(args, encrypted):
+    app = build_app(args, encrypted)
+    body = os.urandom(args.object_size)
+    paths = ['/v1/a/c%d/o%d' % (i % args.containers, i)
+             for i in range(args.objects)]
+
+    start = time.time()
+    for path in paths:
+        resp = Request.blank(path, method='PUT', body=body).get_response(app)
+        if resp.status_int != 201:
+            raise Exception('PUT %s: %s' % (path, resp.status))
+    put_time = time.time() - start
+
+    start = time.time()
+    for path in paths:
+        resp = Request.blank(path).get_response(app)
+        if resp.status_int != 200 or resp.body != body:
+            raise Exception('GET %s: %s' % (path, resp.status))
+    get_time = time.time() - start
+    return put_time, get_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--object-size', type=int, default=65536)
+    parser.add_argument('--objects', type=int, default=1000)
+    parser.add_argument('--containers', type=int, default=10)
+    parser.add_argument('--client-chunk-size', type=int, default=65536,
+                        help='size of the reads of PUT bodies')
+    parser.add_argument('--backend-chunk-size', type=int, default=65536,
+                        help='size of the chunks of GET bodies')
+    parser.add_argument('--key-cache-size', type=int, default=1000)
+    parser.add_argument('--decrypt-buffer-size', type=int, default=0)
+    args = parser.parse_args()
+
+    total_mb = args.object_size * args.objects / 1048576.0
+    fmt = '%10s %8s %12s %12s'
+    print(fmt % ('encryption', 'method', 'objects/s', 'MB/s'))
+    results = {}
+    for encrypted in (False, True):
+        results[encrypted] = run_one(args, encrypted)
+        for method, elapsed in zip(('PUT', 'GET'), results[encrypted]):
+            elapsed = max(elapsed, 1e-6)
+            print(fmt % ('on' if encrypted else 'off', method,
+                         '%.1f' % (args.objects / elapsed),
+                         '%.1f' % (total_mb / elapsed)))
+    for i, method in enumerate(('PUT', 'GET')):
+        print('%s with encryption takes %.2fx as long' % (
+            method, results[True][i] / max(results[False][i], 1e-6)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# Copyright (c) 2010-2017 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Time RingBuilder.rebalance() for synthetic clusters of increasing size.
+
+For every cluster size a ring is built and balanced, then a single device's
+weight is changed and the ring is rebalanced again, both the classic way and
+with rebalance(incremental=True). Only the second rebalance is timed; the
+builders are settled by one more rebalance first, which also builds the
+incremental builder's index. The incremental builder is then saved and
+loaded again, like swift-ring-builder does between runs. The
+validate(stats=True) that follows each timed rebalance is timed too.
+
+Example::
+
+    python tools/ring_rebalance_benchmark.py --part-power 16 \\
+        --devices 64 256 1024
+"""
+
+from __future__ import print_function
+
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+from swift.common.ring import RingBuilder
+
+
+def build_cluster(part_power, replicas, num_devs, devs_per_server,
+                  servers_per_zone, zones_per_region):
+    builder = RingBuilder(part_power, replicas, 1)
+    for dev_index in range(num_devs):
+        server, device = divmod(dev_index, devs_per_server)
+        zone, _junk = divmod(server, servers_per_zone)
+        region, _junk = divmod(zone, zones_per_region)
+        builder.add_dev({
+            'region': region, 'zone': zone,
+            'ip': '10.%d.%d.%d' % (region, zone % 256, server % 256),
+            'port': 6200 + server // 256, 'device': 'sd%d' % device,
+            'weight': 100.0})
+    return builder
+
+
+def round_trip(builder):
+    fd, path = tempfile.mkstemp(suffix='.builder')
+    os.close(fd)
+    try:
+        builder.save(path)
+        return RingBuilder.load(path)
+    finally:
+        os.unlink(path)
+
+
+def timed(func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - start, result
+
+
+def run_one(args, num_devs):
+    builder = build_cluster(args.part_power, args.replicas, num_devs,
+                            args.devs_per_server, args.servers_per_zone,
+                            args.zones_per_region)
+    initial_time, _junk = timed(builder.rebalance, seed=args.seed)
+    results = {'devices': num_devs, 'initial': initial_time}
+
+    for mode in ('full', 'incremental'):
+        rb = copy.deepcopy(builder)
+        incremental = (mode == 'incremental')
+        # settle the ring; in incremental mode this also builds the index,
+        # like a tool that rebalances repeatedly would
+        rb.pretend_min_part_hours_passed()
+        rb.rebalance(seed=args.seed, incremental=incremental)
+        if incremental:
+            rb = round_trip(rb)
+        rb.pretend_min_part_hours_passed()
+        rb.set_dev_weight(num_devs // 2, 150.0)
+        results[mode], (changed, _balance, _removed) = timed(
+            rb.rebalance, seed=args.seed + 1, incremental=incremental)
+        results[mode + '_changed'] = changed
+        results[mode + '_validate'], _junk = timed(rb.validate, stats=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--part-power', type=int, default=14)
+    parser.add_argument('--replicas', type=float, default=3)
+    parser.add_argument('--devices', type=int, nargs='+',
+                        default=[16, 64, 256, 1024],
+                        help='cluster sizes, in devices, to time')
+    parser.add_argument('--devs-per-server', type=int, default=8)
+    parser.add_argument('--servers-per-zone', type=int, default=4)
+    parser.add_argument('--zones-per-region', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print('part_power=%d replicas=%s' % (args.part_power, args.replicas))
+    fmt = '%8s %10s %10s %12s %10s %14s %14s'
+    print(fmt % ('devices', 'initial', 'full', 'incremental', 'speedup',
+                 'validate full', 'validate inc'))
+    for num_devs in args.devices:
+        results = run_one(args, num_devs)
+        print(fmt % (
+            num_devs,
+            '%.2fs' % results['initial'],
+            '%.2fs' % results['full'],
+            '%.2fs' % results['incremental'],
+            '%.1fx' % (results['full'] / max(results['incremental'], 1e-6)),
+            '%.2fs' % results['full_validate'],
+            '%.2fs' % results['incremental_validate']))
+        if results['full_changed'] != results['incremental_changed']:
+            print('  WARNING: full rebalance moved %d parts, incremental '
+                  'moved %d' % (results['full_changed'],
+                                results['incremental_changed']))
+
+
+if __name__ == '__main__':
+    main()